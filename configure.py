@@ -9,6 +9,11 @@
 #
 
 import argparse
+import concurrent.futures
+import contextlib
+import functools
+import hashlib
+import json
 import os
 import platform
 import re
@@ -17,6 +22,7 @@ import subprocess
 import sys
 import tempfile
 import textwrap
+import threading
 from distutils.spawn import find_executable
 
 curdir = os.getcwd()
@@ -131,11 +137,60 @@ def try_compile(compiler, source='', flags=[]):
 
 
 def ensure_tmp_dir_exists():
-    if not os.path.exists(tempfile.tempdir):
-        os.makedirs(tempfile.tempdir)
+    os.makedirs(tempfile.tempdir, exist_ok=True)
+
+
+# The results of the compiler probes are cached in probe_cache_file, keyed by
+# the compiler path and version, the flags and the source of the probe, so that
+# re-running configure.py doesn't run the compiler again. The cache is only
+# saved once all the probes passed, a failed requirement is always re-probed.
+probe_cache_file = f'{outdir}/configure-probes.json'
+probe_cache = {}
+probe_cache_lock = threading.Lock()
+
+
+def load_probe_cache():
+    try:
+        with open(probe_cache_file) as f:
+            probe_cache.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+
+def save_probe_cache():
+    os.makedirs(os.path.dirname(probe_cache_file), exist_ok=True)
+    with probe_cache_lock:
+        with open(probe_cache_file + '.tmp', 'w') as f:
+            json.dump(probe_cache, f, indent=0, sort_keys=True)
+    os.replace(probe_cache_file + '.tmp', probe_cache_file)
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_id(compiler):
+    path = find_executable(compiler) or compiler
+    version = subprocess.run([path, '--version'], capture_output=True, encoding='utf-8').stdout
+    return f'{os.path.realpath(path)} {version}'
+
+
+def probe_key(compiler, source, flags):
+    key = json.dumps([compiler_id(compiler), args.user_cflags, flags, source])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
 
 
 def try_compile_and_link(compiler, source='', flags=[], verbose=False):
+    if args.use_probe_cache and not verbose:
+        key = probe_key(compiler, source, flags)
+        with probe_cache_lock:
+            if key in probe_cache:
+                return probe_cache[key]
+        result = run_compile_and_link(compiler, source, flags)
+        with probe_cache_lock:
+            probe_cache[key] = result
+        return result
+    return run_compile_and_link(compiler, source, flags, verbose)
+
+
+def run_compile_and_link(compiler, source='', flags=[], verbose=False):
     ensure_tmp_dir_exists()
     with tempfile.NamedTemporaryFile() as sfile:
         ofd, ofile = tempfile.mkstemp()
@@ -163,6 +218,13 @@ def flag_supported(flag, compiler):
     return try_compile(flags=['-Werror'] + split, compiler=compiler)
 
 
+def supported_flags(flags, compiler):
+    # Probes the flags concurrently, returns the supported ones in order
+    return [flag
+            for flag, supported in zip(flags, probe_pool.map(lambda flag: flag_supported(flag=flag, compiler=compiler), flags))
+            if supported]
+
+
 def linker_flags(compiler):
     src_main = 'int main(int argc, char **argv) { return 0; }'
     link_flags = ['-fuse-ld=lld']
@@ -337,6 +399,33 @@ modes = {
         'default': False,
         'description': 'a mode exclusively used for generating test coverage reports',
     },
+    'release-pgo-instr': {
+        'cxxflags': '-ffunction-sections -fdata-sections -fprofile-instr-generate',
+        'cxx_ld_flags': '-Wl,--gc-sections -fprofile-instr-generate',
+        'stack-usage-threshold': 1024*13,
+        'optimization-level': '3',
+        'per_src_extra_cxxflags': {},
+        'cmake_build_type': 'RelWithDebInfo',
+        'can_have_debug_info': True,
+        'default': False,
+        'build_mode': 'release',
+        'description': 'the release mode instrumented for collecting the profile used by the release-pgo mode',
+    },
+    'release-pgo': {
+        # The profile is generated by running the training workload of
+        # scripts/pgo.py with the release-pgo-instr scylla binary
+        'cxxflags': f'-ffunction-sections -fdata-sections -fprofile-instr-use={outdir}/release-pgo/profiles/scylla.profdata -Wno-profile-instr-out-of-date -Wno-profile-instr-unprofiled',
+        'cxx_ld_flags': '-Wl,--gc-sections -flto=thin',
+        'stack-usage-threshold': 1024*13,
+        'optimization-level': '3',
+        'per_src_extra_cxxflags': {},
+        'cmake_build_type': 'RelWithDebInfo',
+        'can_have_debug_info': True,
+        'default': False,
+        'build_mode': 'release',
+        'profile': f'{outdir}/release-pgo/profiles/scylla.profdata',
+        'description': 'the release mode with profile-guided and link-time optimizations, and BOLT if available',
+    },
 }
 
 scylla_tests = set([
@@ -617,6 +706,8 @@ arg_parser.add_argument('--enable-alloc-failure-injector', dest='alloc_failure_i
                         help='enable allocation failure injection')
 arg_parser.add_argument('--enable-seastar-debug-allocations', dest='seastar_debug_allocations', action='store_true', default=False,
                         help='enable seastar debug allocations')
+arg_parser.add_argument('--instrument-rpc-verbs', dest='instrument_rpc_verbs', action='store_true', default=False,
+                        help='export per-verb metrics (calls, latency, payload size) for all RPC verbs defined in the IDL')
 arg_parser.add_argument('--with-antlr3', dest='antlr3_exec', action='store', default=None,
                         help='path to antlr3 executable')
 arg_parser.add_argument('--with-ragel', dest='ragel_exec', action='store', default='ragel',
@@ -633,8 +724,16 @@ arg_parser.add_argument('--list-artifacts', dest='list_artifacts', action='store
                         help='List all available build artifacts, that can be passed to --with')
 arg_parser.add_argument('--date-stamp', dest='date_stamp', type=str,
                         help='Set datestamp for SCYLLA-VERSION-GEN')
+arg_parser.add_argument('--no-probe-cache', dest='use_probe_cache', action='store_false', default=True,
+                        help=f'Do not use the cached results of the compiler probes ({probe_cache_file})')
+arg_parser.add_argument('--configure-jobs', dest='configure_jobs', type=int, default=os.cpu_count(),
+                        help='Number of compiler probes and Seastar configurations to run concurrently')
 args = arg_parser.parse_args()
 
+probe_pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(args.configure_jobs, 1))
+if args.use_probe_cache:
+    load_probe_cache()
+
 if args.list_artifacts:
     for artifact in sorted(all_artifacts):
         print(artifact)
@@ -1369,9 +1468,7 @@ warnings = [
     '-Wno-dangling-pointer', # false positives with gcc 12
 ]
 
-warnings = [w
-            for w in warnings
-            if flag_supported(flag=w, compiler=args.cxx)]
+warnings = supported_flags(warnings, compiler=args.cxx)
 
 warnings = ' '.join(warnings + ['-Wno-error=deprecated-declarations'])
 
@@ -1401,37 +1498,10 @@ optimization_flags = [
     # gcc also has some trouble: https://gcc.gnu.org/bugzilla/show_bug.cgi?id=103554
     '-fno-slp-vectorize',
 ]
-optimization_flags = [o
-                      for o in optimization_flags
-                      if flag_supported(flag=o, compiler=args.cxx)]
-modes['release']['cxxflags'] += ' ' + ' '.join(optimization_flags)
-
-if flag_supported(flag='-Wstack-usage=4096', compiler=args.cxx):
-    for mode in modes:
-        modes[mode]['cxxflags'] += f' -Wstack-usage={modes[mode]["stack-usage-threshold"]} -Wno-error=stack-usage='
-
-linker_flags = linker_flags(compiler=args.cxx)
-
-dbgflag = '-g -gz' if args.debuginfo else ''
-tests_link_rule = 'link' if args.tests_debuginfo else 'link_stripped'
-perf_tests_link_rule = 'link' if args.perf_tests_debuginfo else 'link_stripped'
-
-# Strip if debuginfo is disabled, otherwise we end up with partial
-# debug info from the libraries we static link with
-regular_link_rule = 'link' if args.debuginfo else 'link_stripped'
-
-# a list element means a list of alternative packages to consider
-# the first element becomes the HAVE_pkg define
-# a string element is a package name with no alternatives
-optional_packages = [[]]
-pkgs = []
-
-# Lua can be provided by lua53 package on Debian-like
-# systems and by Lua on others.
-pkgs.append('lua53' if have_pkg('lua53') else 'lua')
-
-pkgs.append('libsystemd')
-
+optimization_flags = supported_flags(optimization_flags, compiler=args.cxx)
+for mode in modes:
+    if modes[mode].get('build_mode', mode) == 'release':
+        modes[mode]['cxxflags'] += ' ' + ' '.join(optimization_flags)
 
 compiler_test_src = '''
 
@@ -1465,34 +1535,74 @@ compiler_test_src = '''
 
 int main() { return 0; }
 '''
-if not try_compile_and_link(compiler=args.cxx, source=compiler_test_src):
-    try_compile_and_link(compiler=args.cxx, source=compiler_test_src, verbose=True)
-    print('Wrong compiler version or incorrect flags. Scylla needs GCC >= 10.1.1 with coroutines (-fcoroutines) or clang >= 10.0.0 to compile.')
-    sys.exit(1)
 
-if not try_compile(compiler=args.cxx, source='#include <boost/version.hpp>'):
-    print('Boost not installed.  Please install {}.'.format(pkgname("boost-devel")))
-    sys.exit(1)
-
-if not try_compile(compiler=args.cxx, source='''\
+# The remaining probes are independent from each other, run them concurrently
+stack_usage_probe = probe_pool.submit(flag_supported, flag='-Wstack-usage=4096', compiler=args.cxx)
+linker_flags_probe = probe_pool.submit(linker_flags, compiler=args.cxx)
+lua53_probe = probe_pool.submit(have_pkg, 'lua53')
+compiler_probe = probe_pool.submit(try_compile_and_link, compiler=args.cxx, source=compiler_test_src)
+boost_probe = probe_pool.submit(try_compile, compiler=args.cxx, source='#include <boost/version.hpp>')
+boost_version_probe = probe_pool.submit(try_compile, compiler=args.cxx, source='''\
         #include <boost/version.hpp>
         #if BOOST_VERSION < 105500
         #error Boost version too low
         #endif
-        '''):
-    print('Installed boost version too old.  Please update {}.'.format(pkgname("boost-devel")))
-    sys.exit(1)
-
-if try_compile(args.cxx, source = textwrap.dedent('''\
+        ''')
+lz4_compress_default_probe = probe_pool.submit(try_compile, args.cxx, source=textwrap.dedent('''\
         #include <lz4.h>
 
         void m() {
             LZ4_compress_default(static_cast<const char*>(0), static_cast<char*>(0), 0, 0);
         }
-        '''), flags=args.user_cflags.split()):
+        '''), flags=args.user_cflags.split())
+sanitize_address_use_after_scope_probe = probe_pool.submit(try_compile, compiler=args.cxx, flags=['-fsanitize-address-use-after-scope'], source='int f() {}')
+
+if stack_usage_probe.result():
+    for mode in modes:
+        modes[mode]['cxxflags'] += f' -Wstack-usage={modes[mode]["stack-usage-threshold"]} -Wno-error=stack-usage='
+
+linker_flags = linker_flags_probe.result()
+
+dbgflag = '-g -gz' if args.debuginfo else ''
+tests_link_rule = 'link' if args.tests_debuginfo else 'link_stripped'
+perf_tests_link_rule = 'link' if args.perf_tests_debuginfo else 'link_stripped'
+
+# Strip if debuginfo is disabled, otherwise we end up with partial
+# debug info from the libraries we static link with
+regular_link_rule = 'link' if args.debuginfo else 'link_stripped'
+
+# a list element means a list of alternative packages to consider
+# the first element becomes the HAVE_pkg define
+# a string element is a package name with no alternatives
+optional_packages = [[]]
+pkgs = []
+
+# Lua can be provided by lua53 package on Debian-like
+# systems and by Lua on others.
+pkgs.append('lua53' if lua53_probe.result() else 'lua')
+
+pkgs.append('libsystemd')
+
+if not compiler_probe.result():
+    try_compile_and_link(compiler=args.cxx, source=compiler_test_src, verbose=True)
+    print('Wrong compiler version or incorrect flags. Scylla needs GCC >= 10.1.1 with coroutines (-fcoroutines) or clang >= 10.0.0 to compile.')
+    sys.exit(1)
+
+if not boost_probe.result():
+    print('Boost not installed.  Please install {}.'.format(pkgname("boost-devel")))
+    sys.exit(1)
+
+if not boost_version_probe.result():
+    print('Installed boost version too old.  Please update {}.'.format(pkgname("boost-devel")))
+    sys.exit(1)
+
+if lz4_compress_default_probe.result():
     defines.append("HAVE_LZ4_COMPRESS_DEFAULT")
 
-has_sanitize_address_use_after_scope = try_compile(compiler=args.cxx, flags=['-fsanitize-address-use-after-scope'], source='int f() {}')
+has_sanitize_address_use_after_scope = sanitize_address_use_after_scope_probe.result()
+
+if args.use_probe_cache:
+    save_probe_cache()
 
 defines = ' '.join(['-D' + d for d in defines])
 
@@ -1501,8 +1611,29 @@ globals().update(vars(args))
 total_memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
 link_pool_depth = max(int(total_memory / 7e9), 1)
 
-selected_modes = args.selected_modes or modes.keys()
+# The release-pgo modes are only configured when selected with --mode: building
+# them runs a training workload, and they need llvm-profdata
+pgo_modes = ['release-pgo-instr', 'release-pgo']
+selected_modes = args.selected_modes or [mode for mode in modes.keys() if mode not in pgo_modes]
 default_modes = args.selected_modes or [mode for mode, mode_cfg in modes.items() if mode_cfg["default"]]
+
+# The release-pgo mode is compiled with the profile of the release-pgo-instr
+# scylla binary, merged by llvm-profdata, and optimized by BOLT if available.
+llvm_profdata = find_executable('llvm-profdata')
+llvm_bolt = find_executable('llvm-bolt')
+merge_fdata = find_executable('merge-fdata')
+if 'release-pgo' in selected_modes:
+    if not llvm_profdata:
+        print('llvm-profdata not found on PATH, it is required by the release-pgo mode')
+        sys.exit(1)
+    if 'release-pgo-instr' not in selected_modes:
+        selected_modes = list(selected_modes) + ['release-pgo-instr']
+if llvm_bolt and merge_fdata:
+    modes['release-pgo']['bolt'] = True
+    modes['release-pgo']['cxx_ld_flags'] += ' -Wl,--emit-relocs'
+elif 'release-pgo' in selected_modes:
+    print('Note: llvm-bolt or merge-fdata not found, the release-pgo scylla binary will not be optimized with BOLT')
+
 build_modes =  {m: modes[m] for m in selected_modes}
 
 if args.artifacts:
@@ -1534,7 +1665,7 @@ scylla_product = file.read().strip()
 arch = platform.machine()
 
 for m, mode_config in modes.items():
-    mode_config['cxxflags'] += f" -DSCYLLA_BUILD_MODE={m}"
+    mode_config['cxxflags'] += f" -DSCYLLA_BUILD_MODE={mode_config.get('build_mode', m)}"
     cxxflags = "-DSCYLLA_VERSION=\"\\\"" + scylla_version + "\\\"\" -DSCYLLA_RELEASE=\"\\\"" + scylla_release + "\\\"\""
     mode_config["per_src_extra_cxxflags"]["release.cc"] = cxxflags
     if mode_config["can_have_debug_info"]:
@@ -1597,6 +1728,10 @@ def real_relpath(path, start):
 
 def configure_seastar(build_dir, mode, mode_config):
     seastar_build_dir = os.path.join(build_dir, mode, 'seastar')
+    # Seastar is built as in the mode the mode derives from: the link flags of
+    # the release-pgo modes (instrumentation, LTO, relocations for BOLT) only
+    # apply to the link of scylla, and must not end up in seastar.pc
+    seastar_ld_flags = modes[mode_config.get('build_mode', mode)]['cxx_ld_flags']
 
     seastar_cmake_args = [
         '-DCMAKE_BUILD_TYPE={}'.format(mode_config['cmake_build_type']),
@@ -1604,7 +1739,7 @@ def configure_seastar(build_dir, mode, mode_config):
         '-DCMAKE_CXX_COMPILER={}'.format(args.cxx),
         '-DCMAKE_EXPORT_NO_PACKAGE_REGISTRY=ON',
         '-DSeastar_CXX_FLAGS=SHELL:{}'.format(mode_config['lib_cflags']),
-        '-DSeastar_LD_FLAGS={}'.format(semicolon_separated(mode_config['lib_ldflags'], mode_config['cxx_ld_flags'])),
+        '-DSeastar_LD_FLAGS={}'.format(semicolon_separated(mode_config['lib_ldflags'], seastar_ld_flags)),
         '-DSeastar_CXX_DIALECT=gnu++20',
         '-DSeastar_API_LEVEL=6',
         '-DSeastar_UNUSED_RESULT_ERROR=ON',
@@ -1619,7 +1754,7 @@ def configure_seastar(build_dir, mode, mode_config):
 
     dpdk = args.dpdk
     if dpdk is None:
-        dpdk = platform.machine() == 'x86_64' and mode == 'release'
+        dpdk = platform.machine() == 'x86_64' and mode_config.get('build_mode', mode) == 'release'
     if dpdk:
         seastar_cmake_args += ['-DSeastar_DPDK=ON', '-DSeastar_DPDK_MACHINE=wsm']
     if args.split_dwarf:
@@ -1640,11 +1775,18 @@ def configure_seastar(build_dir, mode, mode_config):
     if args.verbose:
         print(" \\\n  ".join(seastar_cmd))
     os.makedirs(seastar_build_dir, exist_ok=True)
-    subprocess.check_call(seastar_cmd, shell=False, cwd=cmake_dir)
+    # The modes are configured concurrently, so the output is printed at once
+    # when the configuration of a mode is done. cooking.sh works in the Seastar
+    # source tree, so it is not run concurrently.
+    with cooking_lock if dpdk else contextlib.nullcontext():
+        result = subprocess.run(seastar_cmd, shell=False, cwd=cmake_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, encoding='utf-8')
+    print(result.stdout, end='')
+    result.check_returncode()
+
+cooking_lock = threading.Lock()
 
 if not args.dist_only:
-    for mode, mode_config in build_modes.items():
-        configure_seastar(outdir, mode, mode_config)
+    list(probe_pool.map(lambda mode: configure_seastar(outdir, mode, build_modes[mode]), build_modes))
 
 pc = {mode: f'{outdir}/{mode}/seastar/seastar.pc' for mode in build_modes}
 ninja = find_executable('ninja') or find_executable('ninja-build')
@@ -1661,12 +1803,14 @@ def query_seastar_flags(pc_file, link_static_cxx=False):
 
     return cflags, libs
 
-for mode in build_modes:
+def query_mode_seastar_flags(mode):
     seastar_pc_cflags, seastar_pc_libs = query_seastar_flags(pc[mode], link_static_cxx=args.staticcxx)
     modes[mode]['seastar_cflags'] = seastar_pc_cflags
     modes[mode]['seastar_libs'] = seastar_pc_libs
     modes[mode]['seastar_testing_libs'] = pkg_config(pc[mode].replace('seastar.pc', 'seastar-testing.pc'), '--libs', '--static')
 
+list(probe_pool.map(query_mode_seastar_flags, build_modes))
+
 abseil_pkgs = [
     'absl_raw_hash_set',
     'absl_hash',
@@ -1699,9 +1843,9 @@ thrift_boost_versions = ["0.{}.".format(n) for n in range(1, 11)]
 if any(filter(thrift_version.startswith, thrift_boost_versions)):
     args.user_cflags += ' -DTHRIFT_USES_BOOST'
 
-for pkg in pkgs:
-    args.user_cflags += ' ' + pkg_config(pkg, '--cflags')
-    libs += ' ' + pkg_config(pkg, '--libs')
+for pkg_cflags, pkg_libs in probe_pool.map(lambda pkg: (pkg_config(pkg, '--cflags'), pkg_config(pkg, '--libs')), pkgs):
+    args.user_cflags += ' ' + pkg_cflags
+    libs += ' ' + pkg_libs
 user_cflags = args.user_cflags + ' -fvisibility=hidden'
 user_ldflags = args.user_ldflags + ' -fvisibility=hidden'
 if args.staticcxx:
@@ -1723,6 +1867,8 @@ if args.ragel_exec:
 else:
     ragel_exec = "ragel"
 
+idl_compiler_flags = '--instrument-verbs' if args.instrument_rpc_verbs else ''
+
 with open(buildfile, 'w') as f:
     f.write(textwrap.dedent('''\
         configure_args = {configure_args}
@@ -1743,8 +1889,9 @@ with open(buildfile, 'w') as f:
             command = {args.seastar_path}/scripts/seastar-json2code.py --create-cc -f $in -o $out
             description = SWAGGER $out
         rule serializer
-            command = {python} ./idl-compiler.py --ns ser -f $in -o $out
-            description = IDL compiler $out
+            command = {python} ./idl-compiler.py --ns ser {idl_compiler_flags} $idl_args
+            description = IDL compiler $idl_mode
+            restat = 1
         rule ninja
             command = {ninja} -C $subdir $target
             restat = 1
@@ -1782,6 +1929,18 @@ with open(buildfile, 'w') as f:
             description = RUST_SOURCE $out
         rule cxxbridge_header
             command = cxxbridge --header > $out
+        rule pgo_train
+            command = {python} scripts/pgo.py train --llvm-profdata {llvm_profdata} $in $out
+            description = PGO TRAIN $out
+            pool = console
+        rule pgo_bolt
+            command = {python} scripts/pgo.py bolt --llvm-bolt {llvm_bolt} --merge-fdata {merge_fdata} $in $out
+            description = BOLT $out
+            pool = console
+        rule pgo_report
+            command = {python} scripts/pgo.py report $in $out
+            description = PGO REPORT $out
+            pool = console
         ''').format(**globals()))
     for mode in build_modes:
         modeval = modes[mode]
@@ -1864,6 +2023,8 @@ with open(buildfile, 'w') as f:
         rust_headers = {}
         seastar_dep = '$builddir/{}/seastar/libseastar.a'.format(mode)
         seastar_testing_dep = '$builddir/{}/seastar/libseastar_testing.a'.format(mode)
+        # Objects compiled with a profile are rebuilt when it changes
+        profile_dep = ' | {}'.format(modeval['profile']) if 'profile' in modeval else ''
         for binary in sorted(build_artifacts):
             if binary in other:
                 continue
@@ -1910,8 +2071,14 @@ with open(buildfile, 'w') as f:
             else:
                 if binary == 'scylla':
                     local_libs += ' ' + "$seastar_testing_libs_{}".format(mode)
-                f.write('build $builddir/{}/{}: {}.{} {} | {} {}\n'.format(mode, binary, regular_link_rule, mode, str.join(' ', objs), seastar_dep, seastar_testing_dep))
-                f.write('   libs = {}\n'.format(local_libs))
+                if binary == 'scylla' and modeval.get('bolt'):
+                    # The linked binary is only an input of BOLT, which needs its symbols
+                    f.write('build $builddir/{}/{}.prebolt: {}.{} {} | {} {}\n'.format(mode, binary, 'link', mode, str.join(' ', objs), seastar_dep, seastar_testing_dep))
+                    f.write('   libs = {}\n'.format(local_libs))
+                    f.write(f'build $builddir/{mode}/{binary}: pgo_bolt $builddir/{mode}/{binary}.prebolt | scripts/pgo.py\n')
+                else:
+                    f.write('build $builddir/{}/{}: {}.{} {} | {} {}\n'.format(mode, binary, regular_link_rule, mode, str.join(' ', objs), seastar_dep, seastar_testing_dep))
+                    f.write('   libs = {}\n'.format(local_libs))
                 f.write(f'build $builddir/{mode}/{binary}.stripped: strip $builddir/{mode}/{binary}\n')
                 f.write(f'build $builddir/{mode}/{binary}.debug: phony $builddir/{mode}/{binary}.stripped\n')
             for src in srcs:
@@ -1978,7 +2145,7 @@ with open(buildfile, 'w') as f:
 
         for obj in compiles:
             src = compiles[obj]
-            f.write('build {}: cxx.{} {} || {} {}\n'.format(obj, mode, src, seastar_dep, gen_headers_dep))
+            f.write('build {}: cxx.{} {}{} || {} {}\n'.format(obj, mode, src, profile_dep, seastar_dep, gen_headers_dep))
             if src in modeval['per_src_extra_cxxflags']:
                 f.write('    cxxflags = {seastar_cflags} $cxxflags $cxxflags_{mode} {extra_cxxflags}\n'.format(mode=mode, extra_cxxflags=modeval["per_src_extra_cxxflags"][src], **modeval))
         for swagger in swaggers:
@@ -1987,10 +2154,13 @@ with open(buildfile, 'w') as f:
             obj = swagger.objects(gen_dir)[0]
             src = swagger.source
             f.write('build {} | {} : swagger {} | {}/scripts/seastar-json2code.py\n'.format(hh, cc, src, args.seastar_path))
-            f.write('build {}: cxx.{} {}\n'.format(obj, mode, cc))
-        for hh in serializers:
-            src = serializers[hh]
-            f.write('build {}: serializer {} | idl-compiler.py\n'.format(hh, src))
+            f.write('build {}: cxx.{} {}{}\n'.format(obj, mode, cc, profile_dep))
+        # All IDL files are compiled by a single idl-compiler.py invocation,
+        # which shares the parser and only rewrites the outputs that changed.
+        if serializers:
+            f.write('build {}: serializer {} | idl-compiler.py\n'.format(' '.join(serializers), ' '.join(serializers.values())))
+            f.write('  idl_args = {}\n'.format(' '.join('-f {} -o {}'.format(src, hh) for hh, src in serializers.items())))
+            f.write('  idl_mode = {}\n'.format(mode))
         for hh in ragels:
             src = ragels[hh]
             f.write('build {}: ragel {}\n'.format(hh, src))
@@ -2000,7 +2170,7 @@ with open(buildfile, 'w') as f:
             cc = hh.replace('.hh', '.cc')
             f.write('build {}: rust_source {}\n'.format(cc, src))
             obj = cc.replace('.cc', '.o')
-            f.write('build {}: cxx.{} {} || {}\n'.format(obj, mode, cc, gen_headers_dep))
+            f.write('build {}: cxx.{} {}{} || {}\n'.format(obj, mode, cc, profile_dep, gen_headers_dep))
         f.write('build {}: cxxbridge_header\n'.format('$builddir/{}/gen/rust/cxx.h'.format(mode)))
         librust = '$builddir/{}/rust-{}/librust_combined'.format(mode, mode)
         f.write('build {}.a: rust_lib.{} rust/Cargo.lock\n  depfile={}.d\n'.format(librust, mode, librust))
@@ -2009,14 +2179,14 @@ with open(buildfile, 'w') as f:
             f.write('build {}: thrift.{} {}\n'.format(outs, mode, thrift.source))
             for cc in thrift.sources('$builddir/{}/gen'.format(mode)):
                 obj = cc.replace('.cpp', '.o')
-                f.write('build {}: cxx.{} {}\n'.format(obj, mode, cc))
+                f.write('build {}: cxx.{} {}{}\n'.format(obj, mode, cc, profile_dep))
         for grammar in antlr3_grammars:
             outs = ' '.join(grammar.generated('$builddir/{}/gen'.format(mode)))
             f.write('build {}: antlr3.{} {}\n  stem = {}\n'.format(outs, mode, grammar.source,
                                                                    grammar.source.rsplit('.', 1)[0]))
             for cc in grammar.sources('$builddir/{}/gen'.format(mode)):
                 obj = cc.replace('.cpp', '.o')
-                f.write('build {}: cxx.{} {} || {}\n'.format(obj, mode, cc, ' '.join(serializers)))
+                f.write('build {}: cxx.{} {}{} || {}\n'.format(obj, mode, cc, profile_dep, ' '.join(serializers)))
                 if cc.endswith('Parser.cpp'):
                     # Unoptimized parsers end up using huge amounts of stack space and overflowing their stack
                     flags = '-O1' if modes[mode]['optimization-level'] in ['0', 'g', 's'] else ''
@@ -2024,6 +2194,11 @@ with open(buildfile, 'w') as f:
                     if has_sanitize_address_use_after_scope:
                         flags += ' -fno-sanitize-address-use-after-scope'
                     f.write('  obj_cxxflags = %s\n' % flags)
+        if 'profile' in modeval:
+            f.write('build {}: pgo_train $builddir/release-pgo-instr/scylla | scripts/pgo.py\n'.format(modeval['profile']))
+            if 'release' in build_modes:
+                f.write(f'build $builddir/{mode}/pgo-report.txt: pgo_report $builddir/release/scylla $builddir/{mode}/scylla | scripts/pgo.py\n')
+                f.write(f'build {mode}-report: phony $builddir/{mode}/pgo-report.txt\n')
         f.write(f'build $builddir/{mode}/gen/empty.cc: gen\n')
         for hh in headers:
             f.write('build $builddir/{mode}/{hh}.o: checkhh.{mode} {hh} | $builddir/{mode}/gen/empty.cc || {gen_headers_dep}\n'.format(
@@ -15,7 +15,16 @@ from numbers import Number
 from pprint import pformat
 from copy import copy
 from typing import List
+from concurrent.futures import ProcessPoolExecutor
+import ast
+import builtins
+import hashlib
+import io
+import json
+import keyword
+import os
 import os.path
+import tempfile
 
 EXTENSION = '.idl.hh'
 READ_BUFF = 'input_buffer'
@@ -302,18 +311,34 @@ class ClassDef(ASTBase):
     def serializer_write_impl(self, cout):
         name = self.ns_qualified_name()
         full_name = name + self.template_param_names_str
+        members = get_members(self)
+        # Fixed-size classes are written to the output all at once
+        fixed = class_fixed_size(self) is not None and members
+        indent = "  " if fixed else ""
 
         fprintln(cout, f"""
 {self.template_declaration}
 template <typename Output>
 void serializer<{full_name}>::write(Output& buf, const {full_name}& obj) {{""")
-        if not self.final:
-            fprintln(cout, f"""  {SETSIZE}(buf, obj);""")
-        for member in self.members:
-            if isinstance(member, ClassDef) or isinstance(member, EnumDef):
-                continue
-            fprintln(cout, f"""  static_assert(is_equivalent<decltype(obj.{member.name}), {param_type(member.type)}>::value, "member value has a wrong type");
-  {SERIALIZER}(buf, obj.{member.name});""")
+        if fixed:
+            sizes = " + ".join(f"serializer<{param_type(m.type)}>::fixed_size" for m in members)
+            fprintln(cout, f"""  static_assert(fixed_size == {sizes}, "fixed size doesn't match the members");
+  serialize_fixed_size<fixed_size>(buf, [&] (auto& buf) {{""")
+        elif not self.final:
+            size = members_fixed_size(self)
+            if size is not None:
+                # No need to serialize the object twice to know its size
+                if members:
+                    sizes = " + ".join(f"serializer<{param_type(m.type)}>::fixed_size" for m in members)
+                    fprintln(cout, f"""  static_assert({size} == {sizes}, "fixed size doesn't match the members");""")
+                fprintln(cout, f"""  {SERIALIZER}(buf, {SIZETYPE}({size} + sizeof({SIZETYPE})));""")
+            else:
+                fprintln(cout, f"""  {SETSIZE}(buf, obj);""")
+        for member in members:
+            fprintln(cout, f"""{indent}  static_assert(is_equivalent<decltype(obj.{member.name}), {param_type(member.type)}>::value, "member value has a wrong type");
+{indent}  {SERIALIZER}(buf, obj.{member.name});""")
+        if fixed:
+            fprintln(cout, "  });")
         fprintln(cout, "}")
 
 
@@ -325,6 +350,8 @@ void serializer<{full_name}>::write(Output& buf, const {full_name}& obj) {{""")
 template <typename Input>
 {name}{self.template_param_names_str} serializer<{name}{self.template_param_names_str}>::read(Input& buf) {{
  return seastar::with_serialized_stream(buf, [] (auto& buf) {{""")
+        # Fixed-size classes are read from the input all at once
+        fixed = class_fixed_size(self) is not None and get_members(self)
         if not self.members:
             if not self.final:
                 fprintln(cout, f"""  {SIZETYPE} size = {DESERIALIZER}(buf, boost::type<{SIZETYPE}>());
@@ -332,6 +359,8 @@ template <typename Input>
         elif not self.final:
             fprintln(cout, f"""  {SIZETYPE} size = {DESERIALIZER}(buf, boost::type<{SIZETYPE}>());
   auto in = buf.read_substream(size - sizeof({SIZETYPE}));""")
+        elif fixed:
+            fprintln(cout, """  return deserialize_fixed_size<fixed_size>(buf, [] (auto& in) {""")
         else:
             fprintln(cout, """  auto& in = buf;""")
         params = []
@@ -354,9 +383,11 @@ template <typename Input>
             params.append("std::move(" + local_param + ")")
         fprintln(cout, f"""
   {name}{self.template_param_names_str} res {{{", ".join(params)}}};
-  return res;
- }});
-}}""")
+  return res;""")
+        if fixed:
+            fprintln(cout, "  });")
+        fprintln(cout, """ });
+}""")
 
 
     def serializer_skip_impl(self, cout):
@@ -370,6 +401,8 @@ void serializer<{name}{self.template_param_names_str}>::skip(Input& buf) {{
         if not self.final:
             fprintln(cout, f"""  {SIZETYPE} size = {DESERIALIZER}(buf, boost::type<{SIZETYPE}>());
   buf.skip(size - sizeof({SIZETYPE}));""")
+        elif class_fixed_size(self) is not None and get_members(self):
+            fprintln(cout, "  buf.skip(fixed_size);")
         else:
             for m in get_members(self):
                 full_type = param_view_type(m.type)
@@ -486,12 +519,16 @@ class RpcVerb(ASTBase):
     - [[one_way]] - the handler function is annotated by
       future<rpc::no_wait_type> return type to designate that a client
       doesn't need to wait for an answer.
+    - [[instrumented]] - the send* method and the handler record the calls
+      in the netw::verb_metrics of the verb: counts, errors, calls in
+      flight, latencies and sampled payload sizes. The --instrument-verbs
+      option of the compiler instruments all verbs.
 
     The `-> return_values` clause is optional for two-way messages. If omitted,
     the return type is set to be `future<>`.
     For one-way verbs, the use of return clause is prohibited and the
     signature of `send*` function always returns `future<>`."""
-    def __init__(self, name, parameters, return_values, with_client_info, with_timeout, cancellable, one_way):
+    def __init__(self, name, parameters, return_values, with_client_info, with_timeout, cancellable, one_way, instrumented=False):
         super().__init__(name)
         self.params = parameters
         self.return_values = return_values
@@ -499,9 +536,10 @@ class RpcVerb(ASTBase):
         self.with_timeout = with_timeout
         self.cancellable = cancellable
         self.one_way = one_way
+        self.instrumented = instrumented
 
     def __str__(self):
-        return f"<RpcVerb(name={self.name}, params={self.params}, return_values={self.return_values}, with_client_info={self.with_client_info}, with_timeout={self.with_timeout}, cancellable={self.cancellable}, one_way={self.one_way})>"
+        return f"<RpcVerb(name={self.name}, params={self.params}, return_values={self.return_values}, with_client_info={self.with_client_info}, with_timeout={self.with_timeout}, cancellable={self.cancellable}, one_way={self.one_way}, instrumented={self.instrumented})>"
 
     def __repr__(self):
         return self.__str__()
@@ -586,6 +624,44 @@ class RpcVerb(ASTBase):
         res += '(' + self.send_message_argument_list() + ');'
         return res
 
+    def is_instrumented(self):
+        return self.instrumented or config.instrument_verbs
+
+    def named_handler_params(self):
+        '''The parameters of the handler, with placeholder names for the unnamed ones'''
+        res = []
+        if self.with_client_info:
+            res.append(RpcVerbParam(type=BasicType(name='rpc::client_info&', is_const=True), name='info'))
+        if self.with_timeout:
+            res.append(RpcVerbParam(type=BasicType(name='rpc::opt_time_point'), name='timeout'))
+        for idx, p in enumerate(self.params or []):
+            res.append(RpcVerbParam(type=p.type, name=p.name or f'_{idx + 1}', attributes=p.attributes))
+        return res
+
+    def payload_size_expression(self, handler):
+        '''Expression of the serialized size of the arguments of the verb'''
+        sizes = []
+        for idx, p in enumerate(self.params or []):
+            name = p.name or f'_{idx + 1}'
+            if handler and p.is_optional():
+                sizes.append(f'({name} ? size_t(get_sizeof(*{name})) : 0)')
+            else:
+                sizes.append(f'size_t(get_sizeof({name}))')
+        return ' + '.join(sizes)
+
+    def instrumented_call(self, side, call, handler):
+        '''Wrap the statement returning call so that it is accounted for in the given side of the verb metrics'''
+        payload = self.payload_size_expression(handler)
+        sample = f'''
+    if (stats.start()) {{
+        stats.payload_size.add({payload});
+    }}''' if payload else '''
+    stats.start();'''
+        return f'''auto& stats = ms->get_verb_metrics({self.messaging_verb_enum_case()}, "{self.name}").{side};{sample}
+    return netw::track_verb_call(stats, [&] {{
+        {call}
+    }});'''
+
 class NamespaceDef(ASTBase):
     '''AST node representing a namespace scope.
 
@@ -690,20 +766,36 @@ def rpc_verb_parse_action(tokens):
     cancellable = not raw_attrs.empty() and 'cancellable' in raw_attrs.attr_items
     with_client_info = not raw_attrs.empty() and 'with_client_info' in raw_attrs.attr_items
     one_way = not raw_attrs.empty() and 'one_way' in raw_attrs.attr_items
+    instrumented = not raw_attrs.empty() and 'instrumented' in raw_attrs.attr_items
     if one_way and 'return_values' in tokens:
         raise Exception(f"Invalid return type specification for one-way RPC verb '{name}'")
     if with_timeout and cancellable:
         raise Exception(f"Error in verb {name}: [[with_timeout]] cannot be used together with [[cancellable]] in the same verb")
-    return RpcVerb(name=name, parameters=params, return_values=tokens.get('return_values'), with_client_info=with_client_info, with_timeout=with_timeout, cancellable=cancellable, one_way=one_way)
+    return RpcVerb(name=name, parameters=params, return_values=tokens.get('return_values'), with_client_info=with_client_info, with_timeout=with_timeout, cancellable=cancellable, one_way=one_way, instrumented=instrumented)
 
 
 def namespace_parse_action(tokens):
     return NamespaceDef(name=tokens['name'], members=tokens['ns_members'].asList())
 
 
-def parse_file(file_name):
-    '''Parse the input from the file using IDL grammar syntax and generate AST'''
+_grammar = None
+
+
+def idl_grammar():
+    '''Return the IDL grammar, building it on first use
+
+    Building the grammar is expensive, so it is built only once per process
+    and shared by all parsed files. Packrat caching is enabled too, as the
+    grammar backtracks a lot (e.g. between class members and nested types).
+    '''
+    global _grammar
+    if _grammar is None:
+        pp.ParserElement.enablePackrat()
+        _grammar = build_grammar()
+    return _grammar
+
 
+def build_grammar():
     number = pp.pyparsing_common.signed_integer
     identifier = pp.pyparsing_common.identifier
 
@@ -799,13 +891,19 @@ def parse_file(file_name):
 
     rt = pp.OneOrMore(content)
     rt.ignore(pp.cppStyleComment)
-    return rt.parseFile(file_name, parseAll=True)
+    return rt
 
 
-def declare_methods(hout, name, template_param=""):
+def parse_file(file_name):
+    '''Parse the input from the file using IDL grammar syntax and generate AST'''
+    return list(idl_grammar().parseFile(file_name, parseAll=True))
+
+
+def declare_methods(hout, name, template_param="", size=None):
+    fixed_size_decl = f"\n  static constexpr size_type fixed_size = {size};\n" if size is not None else ""
     fprintln(hout, f"""
 template <{template_param}>
-struct serializer<{name}> {{
+struct serializer<{name}> {{{fixed_size_decl}
   template <typename Output>
   static void write(Output& buf, const {name}& v);
 
@@ -834,7 +932,7 @@ def handle_enum(enum, hout, cout):
     '''Generate serializer declarations and definitions for an IDL enum'''
     temp_def = template_params_str(enum.parent_template_params)
     name = enum.ns_qualified_name()
-    declare_methods(hout, name, temp_def)
+    declare_methods(hout, name, temp_def, fixed_size(BasicType(name)))
 
     enum.serializer_write_impl(cout)
     enum.serializer_read_impl(cout)
@@ -861,6 +959,84 @@ def flat_type(t):
 local_types = {}
 local_writable_types = {}
 rpc_verbs = {}
+fixed_sizes = {}
+
+# Serialized sizes of the basic types, which are the same for all values
+FIXED_SIZE_TYPES = {
+    'bool': 1,
+    'int8_t': 1,
+    'uint8_t': 1,
+    'int16_t': 2,
+    'uint16_t': 2,
+    'int32_t': 4,
+    'uint32_t': 4,
+    'int64_t': 8,
+    'uint64_t': 8,
+    'int': 4,
+    'unsigned': 4,
+    'long': 8,
+    # Final class of idl/uuid.idl.hh, checked by the static_assert of its users
+    'utils::UUID': 16,
+}
+
+
+def fixed_size(t, scope=()):
+    '''The serialized size of type t if it is the same for all values, None otherwise
+
+    Only basic types, and the enums and final classes of the current file are
+    known to have a fixed size. Like in C++, the name of t is looked up in the
+    given enclosing scopes, from the innermost one outwards.
+    '''
+    if not isinstance(t, BasicType):
+        return None
+    if t.name in FIXED_SIZE_TYPES:
+        return FIXED_SIZE_TYPES[t.name]
+    name = t.name.removeprefix('::')
+    for i in range(0 if t.name.startswith('::') else len(scope), -1, -1):
+        qualified_name = ASTBase.combine_ns(list(scope[:i]) + [name])
+        if qualified_name in fixed_sizes:
+            return fixed_sizes[qualified_name]
+    return None
+
+
+def class_scope(cls):
+    '''The scopes enclosing the members of cls, outermost first'''
+    return cls.ns_context + [cls.name]
+
+
+def members_fixed_size(cls):
+    '''The total serialized size of the members of cls, if it is fixed'''
+    sizes = [fixed_size(m.type, class_scope(cls)) for m in get_members(cls)]
+    return None if None in sizes else sum(sizes)
+
+
+def class_fixed_size(cls):
+    '''The serialized size of cls if it is fixed, that is if cls is a final class made
+    only of fixed-size members. Non-final classes may be extended by a later version.'''
+    return fixed_sizes.get(cls.ns_qualified_name()) if cls.final else None
+
+
+def register_fixed_sizes(tree):
+    '''Record the serialized size of the enums and final classes which have a fixed one
+
+    Sizes are recorded by fully qualified name. The other types are recorded
+    with None, so that they hide the types of the same name of outer scopes.
+    '''
+    def register(obj, size):
+        fixed_sizes[obj.ns_qualified_name()] = size
+
+    for obj in tree:
+        if isinstance(obj, NamespaceDef):
+            register_fixed_sizes(obj.members)
+        elif isinstance(obj, EnumDef):
+            register(obj, FIXED_SIZE_TYPES.get(obj.underlying_type))
+        elif isinstance(obj, ClassDef):
+            register_fixed_sizes([m for m in obj.members if isinstance(m, ClassDef) or isinstance(m, EnumDef)])
+            # Stubs have hand-written serializers, templates depend on their parameters
+            if obj.final and not obj.stub and not obj.template_params and not obj.parent_template_params:
+                register(obj, members_fixed_size(obj))
+            else:
+                register(obj, None)
 
 
 def resolve_basic_type_ref(type: BasicType):
@@ -1001,6 +1177,11 @@ def vector_add_method(current, base_state):
   void add_{current.name}({param_type(typ.template_parameters[0])} t)  {{
         serialize(_out, t);
         _count++;
+  }}
+  template<std::ranges::forward_range Range>
+  requires std::ranges::sized_range<Range> && std::convertible_to<std::ranges::range_reference_t<Range>, {param_type(typ.template_parameters[0])}>
+  void add_all_{current.name}(const Range& r) {{
+        _count += serialize_range<{param_type(typ.template_parameters[0])}>(_out, r);
   }}"""
     else:
         res = res + f"""
@@ -1012,6 +1193,11 @@ def vector_add_method(current, base_state):
   void add({param_view_type(typ.template_parameters[0])} v) {{
         serialize(_out, v);
         _count++;
+  }}
+  template<std::ranges::forward_range Range>
+  requires std::ranges::sized_range<Range> && std::convertible_to<std::ranges::range_reference_t<Range>, {param_view_type(typ.template_parameters[0])}>
+  void add_all(const Range& r) {{
+        _count += serialize_range<{param_view_type(typ.template_parameters[0])}>(_out, r);
   }}"""
     return res + f"""
   after_{base_state}__{current.name}<Output> end_{current.name}() && {{
@@ -1448,9 +1634,37 @@ def add_view(cout, cls):
             }}
         """))
 
-    skip = "" if cls.final else "ser::skip(in, boost::type<size_type>());"
+    # What to skip to get to the current member, in order: either a number of bytes,
+    # for consecutive fixed-size members, or the type of a variable-size member
+    skips = [] if cls.final else [FIXED_SIZE_TYPES['uint32_t']]
+    # The C++ sizes of the members merged into each number of bytes of skips
+    frame_size = f"sizeof({SIZETYPE})"
+    merged_sizes = [] if cls.final else [[frame_size]]
+
+    def add_skip(item, size=None):
+        if not item:
+            return
+        if isinstance(item, int) and skips and isinstance(skips[-1], int):
+            skips[-1] += item
+            merged_sizes[-1].append(size)
+        else:
+            skips.append(item)
+            merged_sizes.append([size])
+
+    def skip_one(x, sizes):
+        if not isinstance(x, int):
+            return f"ser::skip(in, boost::type<{x}>());"
+        if sizes == [frame_size]:
+            return f"in.skip({x});"
+        return f"""static_assert({" + ".join(sizes)} == {x}, "fixed size doesn't match the members");
+       in.skip({x});"""
+
+    def skip_code():
+        return "\n       ".join(skip_one(x, sizes) for x, sizes in zip(skips, merged_sizes))
+
     local_names = {}
     for m in members:
+        skip = skip_code()
         name = get_member_name(m.name)
         local_names[name] = "this->" + name + "()"
         full_type = param_view_type(m.type)
@@ -1484,11 +1698,15 @@ def add_view(cout, cls):
                 }}
             """).format(f=DESERIALIZER, **locals()))
 
-        skip = skip + f"\n       ser::skip(in, boost::type<{full_type}>());"
+        size = fixed_size(m.type, class_scope(cls))
+        if size:
+            add_skip(size, f"serializer<{param_type(m.type)}>::fixed_size")
+        else:
+            add_skip(full_type)
 
     fprintln(cout, "};")
-    skip_impl = "auto& in = v;\n       " + skip if cls.final else "v.skip(read_frame_size(v));"
-    if skip == "":
+    skip_impl = "auto& in = v;\n       " + skip_code() if cls.final else "v.skip(read_frame_size(v));"
+    if not skips:
         skip_impl = ""
 
     fprintln(cout, f"""
@@ -1570,7 +1788,7 @@ def handle_class(cls, hout, cout):
             handle_class(member, hout, cout)
         elif isinstance(member, EnumDef):
             handle_enum(member, hout, cout)
-    declare_methods(hout, full_name, template_params)
+    declare_methods(hout, full_name, template_params, class_fixed_size(cls))
 
     cls.serializer_write_impl(cout)
     cls.serializer_read_impl(cout)
@@ -1596,6 +1814,15 @@ def handle_objects(tree, hout, cout):
             print(f"Unknown type: {obj}")
 
 
+def has_instrumented_verbs(tree):
+    for obj in tree:
+        if isinstance(obj, NamespaceDef) and has_instrumented_verbs(obj.members):
+            return True
+        if isinstance(obj, RpcVerb) and obj.is_instrumented():
+            return True
+    return False
+
+
 def generate_rpc_verbs_declarations(hout, module_name):
     fprintln(hout, f"\n// RPC verbs defined in the '{module_name}' module\n")
     fprintln(hout, f'struct {module_name}_rpc_verbs {{')
@@ -1613,10 +1840,20 @@ static {verb.send_function_return_type()} send_{name}({verb.send_function_signat
 def generate_rpc_verbs_definitions(cout, module_name):
     fprintln(cout, f"\n// RPC verbs defined in the '{module_name}' module")
     for name, verb in rpc_verbs.items():
+        if verb.is_instrumented():
+            params = verb.named_handler_params()
+            handler_call = verb.instrumented_call('handled', f"return f({', '.join(f'std::move({p.name})' for p in params)});", handler=True).replace('\n', '\n    ')
+            send_call = verb.instrumented_call('sent', verb.send_function_invocation(), handler=False)
+            register = f'''register_handler(ms, {verb.messaging_verb_enum_case()}, [ms, f = std::move(f)] ({', '.join(p.to_string() for p in params)}) {{
+        {handler_call}
+    }});'''
+        else:
+            send_call = verb.send_function_invocation()
+            register = f'register_handler(ms, {verb.messaging_verb_enum_case()}, std::move(f));'
         fprintln(cout, f'''
 void {module_name}_rpc_verbs::register_{name}(netw::messaging_service* ms,
         std::function<{verb.handler_function_return_values()} ({verb.handler_function_parameters_str()})>&& f) {{
-    register_handler(ms, {verb.messaging_verb_enum_case()}, std::move(f));
+    {register}
 }}
 
 future<> {module_name}_rpc_verbs::unregister_{name}(netw::messaging_service* ms) {{
@@ -1624,7 +1861,7 @@ future<> {module_name}_rpc_verbs::unregister_{name}(netw::messaging_service* ms)
 }}
 
 {verb.send_function_return_type()} {module_name}_rpc_verbs::send_{name}({verb.send_function_signature_params_list(include_placeholder_names=True)}) {{
-    {verb.send_function_invocation()}
+    {send_call}
 }}''')
 
     fprintln(cout, f'''
@@ -1697,13 +1934,112 @@ def setup_additional_metadata(tree, ns_context = [], parent_template_params=[]):
             setup_additional_metadata(obj.members, ns_context + [current_scope], nested_template_params)
 
 
-def load_file(name):
-    if config.o:
-        cout = open(config.o.replace('.hh', '.impl.hh'), "w+")
-        hout = open(config.o, "w+")
-    else:
-        cout = open(name.replace(EXTENSION, '.dist.impl.hh'), "w+")
-        hout = open(name.replace(EXTENSION, '.dist.hh'), "w+")
+def reset_state():
+    '''Reset the state accumulated while generating code for a file'''
+    for state in (local_types, local_writable_types, rpc_verbs, fixed_sizes, created_writers, stubs, optional_nodes, writers, read_sizes):
+        state.clear()
+
+
+def write_atomically(file_name, content):
+    '''Replace file_name with content, via a temporary file and a rename
+
+    Readers never see a partially written file, even if the compiler is
+    interrupted.
+    '''
+    fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)),
+                                    prefix=os.path.basename(file_name) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def write_if_changed(file_name, content):
+    '''Write content to file_name, unless it already has the same content
+
+    Leaving unchanged outputs untouched keeps their mtime, so the build system
+    doesn't rebuild everything depending on them. Returns True if the file was
+    (re)written.
+    '''
+    try:
+        with open(file_name, "r") as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    write_atomically(file_name, content)
+    return True
+
+
+_compiler_version = None
+
+
+def compiler_version():
+    '''Hash identifying the code generator: the compiler script and the parser library'''
+    global _compiler_version
+    if _compiler_version is None:
+        h = hashlib.sha256()
+        with open(os.path.abspath(__file__), "rb") as f:
+            h.update(f.read())
+        h.update(pp.__version__.encode())
+        _compiler_version = h.hexdigest()
+    return _compiler_version
+
+
+class OutputCache:
+    '''Remembers which input each output was last generated from
+
+    Maps each output file to the hash of its input file, the namespace and the
+    compiler version. Inputs which have the same hash as when their outputs
+    were last generated are skipped altogether, without being parsed.
+    '''
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.dirty = False
+        try:
+            with open(file_name, "r") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(name):
+        h = hashlib.sha256()
+        h.update(compiler_version().encode())
+        h.update(config.ns.encode())
+        h.update(str(config.instrument_verbs).encode())
+        with open(name, "rb") as f:
+            h.update(f.read())
+        return h.hexdigest()
+
+    def is_fresh(self, name, output):
+        return (self.entries.get(os.path.abspath(output)) == self.key(name)
+                and os.path.exists(output)
+                and os.path.exists(output.replace('.hh', '.impl.hh')))
+
+    def update(self, name, output):
+        self.entries[os.path.abspath(output)] = self.key(name)
+        self.dirty = True
+
+    def save(self):
+        if self.dirty:
+            write_atomically(self.file_name, json.dumps(self.entries, indent=1, sort_keys=True))
+
+
+def load_file(name, output='', data=None):
+    '''Generate the serializers for the IDL file name
+
+    If data is not provided, the file is parsed first. Returns the number of
+    output files rewritten.
+    '''
+    if not output:
+        output = name.replace(EXTENSION, '.dist.hh')
+    reset_state()
+    cout = io.StringIO()
+    hout = io.StringIO()
     print_cw(hout)
     fprintln(hout, """
  /*
@@ -1723,12 +2059,16 @@ def load_file(name):
             printed = True
         return printed
 
-    data = parse_file(name)
+    if data is None:
+        data = parse_file(name)
     if data:
         handle_includes(data, hout, cout)
+        if has_instrumented_verbs(data):
+            fprintln(cout, '#include "message/verb_metrics.hh"')
         printed = maybe_open_namespace()
         setup_additional_metadata(data)
         handle_types(data)
+        register_fixed_sizes(data)
         handle_objects(data, hout, cout)
 
         module_name = os.path.basename(name)
@@ -1739,37 +2079,907 @@ def load_file(name):
     if config.ns != '':
         fprintln(hout, f"}} // {config.ns}")
         fprintln(cout, f"}} // {config.ns}")
-    cout.close()
-    hout.close()
+    rewritten = write_if_changed(output.replace('.hh', '.impl.hh'), cout.getvalue())
+    rewritten += write_if_changed(output, hout.getvalue())
+    return rewritten
+
+
+def default_cache_file(outputs):
+    return os.path.join(os.path.commonpath([os.path.dirname(os.path.abspath(o)) for o in outputs]), '.idl-compiler.cache')
+
+
+def load_files(names, outputs, jobs=None, cache_file=None):
+    '''Generate the serializers for many IDL files
+
+    Files whose outputs were generated from the same input by the same
+    compiler are skipped, when a cache_file is provided. The rest are parsed
+    concurrently, in a process pool, then the code is generated serially, as
+    generation relies on global state.
+    '''
+    outputs = [o or n.replace(EXTENSION, '.dist.hh') for n, o in zip(names, outputs)]
+    cache = OutputCache(cache_file) if cache_file else None
+    pending = [(n, o) for n, o in zip(names, outputs) if not cache or not cache.is_fresh(n, o)]
+    rewritten = 0
+    if len(pending) == 1:
+        rewritten += load_file(*pending[0])
+    elif pending:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for (name, output), data in zip(pending, executor.map(parse_file, [n for n, _ in pending])):
+                rewritten += load_file(name, output, data)
+    if cache:
+        for name, output in pending:
+            cache.update(name, output)
+        cache.save()
+    print(f"idl-compiler: rewrote {rewritten} of {2 * len(names)} output files ({len(names) - len(pending)} inputs unchanged since last run)")
+
+
+###
+### Python decoders
+###
+# Runtime support for the generated Python decoders, copied verbatim in the
+# generated module, so the module has no dependency besides the standard library.
+PY_RUNTIME = r'''
+import collections
+import enum
+import functools
+import ipaddress
+import struct
+
+
+class DecodeError(Exception):
+    pass
+
+
+_u32 = struct.Struct('<I').unpack_from
+_u32_pair = struct.Struct('<II').unpack_from
+_UNKNOWN = object()
+
+# All types implement the same protocol:
+#  - _decode(buf, pos): the value at pos, nested objects are decoded lazily
+#  - _skip(buf, pos): the position just past the value at pos
+#  - _fixed_size(): the serialized size, if it doesn't depend on the value
+# buf is always a memoryview of unsigned bytes.
+
+
+class Fixed:
+    """Fixed-size little-endian scalar"""
+    __slots__ = ('name', 'fmt', 'size', 'unpack_from', 'convert')
+
+    def __init__(self, name, fmt, convert=None):
+        s = struct.Struct('<' + fmt)
+        self.name = name
+        self.fmt = fmt
+        self.size = s.size
+        self.unpack_from = s.unpack_from
+        self.convert = convert
+
+    def _fixed_size(self):
+        return self.size
+
+    def _skip(self, buf, pos):
+        return pos + self.size
+
+    def _decode(self, buf, pos):
+        v = self.unpack_from(buf, pos)[0]
+        return v if self.convert is None else self.convert(v)
+
+    def __repr__(self):
+        return self.name
+
+
+class Enum(Fixed):
+    """Enum, serialized as its underlying type. Unknown values are left as plain ints."""
+    __slots__ = ('cls',)
+
+    def __init__(self, cls, fmt):
+        super().__init__(cls.__name__, fmt, lambda v: cls._value2member_map_.get(v, v))
+        self.cls = cls
+
+
+BOOL = Fixed('bool', '?')
+I8 = Fixed('int8_t', 'b')
+U8 = Fixed('uint8_t', 'B')
+I16 = Fixed('int16_t', 'h')
+U16 = Fixed('uint16_t', 'H')
+I32 = Fixed('int32_t', 'i')
+U32 = Fixed('uint32_t', 'I')
+I64 = Fixed('int64_t', 'q')
+U64 = Fixed('uint64_t', 'Q')
+# gc_clock::duration is 32-bit, unless the cluster uses the 3.1 format, see use_64bit_gc_clock_duration().
+GC_DURATION = Fixed('gc_clock::duration', 'i')
+
+
+def use_64bit_gc_clock_duration(enable=True):
+    """Decode gc_clock::duration as 64-bit, as serialized since 3.1. Call before decoding anything."""
+    GC_DURATION.__init__('gc_clock::duration', 'q' if enable else 'i')
+
+
+class Blob:
+    """bytes and sstring: uint32 length, then the data"""
+    __slots__ = ('name', 'convert')
+
+    def __init__(self, name, convert=None):
+        self.name = name
+        self.convert = convert
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        return pos + 4 + _u32(buf, pos)[0]
+
+    def _decode(self, buf, pos):
+        end = pos + 4 + _u32(buf, pos)[0]
+        if end > len(buf):
+            raise DecodeError(f"{self.name} at {pos} overflows the buffer ({end} > {len(buf)})")
+        v = buf[pos + 4:end]
+        return v if self.convert is None else self.convert(v)
+
+    def __repr__(self):
+        return self.name
+
+
+BYTES = Blob('bytes')
+STRING = Blob('sstring', lambda v: str(v, 'utf-8', 'surrogateescape'))
+
+
+class InetAddress:
+    """gms::inet_address: a host-order uint32 IPv4 address, or 0xffffffff then 16 bytes of IPv6 address"""
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        return pos + (20 if _u32(buf, pos)[0] == 0xffffffff else 4)
+
+    def _decode(self, buf, pos):
+        v = _u32(buf, pos)[0]
+        if v == 0xffffffff:
+            return ipaddress.IPv6Address(bytes(buf[pos + 4:pos + 20]))
+        return ipaddress.IPv4Address(v)
+
+    def __repr__(self):
+        return 'gms::inet_address'
+
+
+INET_ADDRESS = InetAddress()
+
+
+class Empty:
+    """std::monostate, takes no space"""
+
+    def _fixed_size(self):
+        return 0
+
+    def _skip(self, buf, pos):
+        return pos
+
+    def _decode(self, buf, pos):
+        return None
+
+    def __repr__(self):
+        return 'std::monostate'
+
+
+MONOSTATE = Empty()
+
+
+class Unsupported:
+    """A type with a hand-written serializer, which has no Python decoder"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        raise DecodeError(f"don't know how to decode {self.name}")
+
+    _decode = _skip
+
+    def __repr__(self):
+        return self.name
+
+
+@functools.lru_cache(maxsize=None)
+def unsupported(name):
+    return Unsupported(name)
+
+
+class SequenceView:
+    """Lazy view of the elements of a serialized sequence
+
+    Elements are decoded on access. Offsets of variable-size elements are
+    computed once, as they are reached.
+    """
+    __slots__ = ('_buf', '_pos', '_len', '_elem', '_stride', '_offsets')
+
+    def __init__(self, buf, pos, length, elem):
+        self._buf = buf
+        self._pos = pos
+        self._len = length
+        self._elem = elem
+        self._stride = elem._fixed_size()
+        self._offsets = None if self._stride is not None else [pos]
+
+    def __len__(self):
+        return self._len
+
+    def _offset(self, i):
+        if self._stride is not None:
+            return self._pos + i * self._stride
+        offsets = self._offsets
+        skip = self._elem._skip
+        while len(offsets) <= i:
+            offsets.append(skip(self._buf, offsets[-1]))
+        return offsets[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._len))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('sequence index out of range')
+        return self._elem._decode(self._buf, self._offset(i))
+
+    def __iter__(self):
+        elem = self._elem
+        if type(elem) is Fixed and elem.convert is None:
+            return iter(struct.unpack_from(f'<{self._len}{elem.fmt}', self._buf, self._pos))
+        return self._iter()
+
+    def _iter(self):
+        buf = self._buf
+        decode = self._elem._decode
+        skip = self._elem._skip
+        pos = self._pos
+        for _ in range(self._len):
+            yield decode(buf, pos)
+            pos = skip(buf, pos)
+
+    def __repr__(self):
+        return f'<{self._elem!r}[{self._len}] at {self._pos}>'
+
+
+class Sequence:
+    """std::vector and friends: uint32 count, then the elements; std::array: just the elements"""
+
+    def __init__(self, elem, count=None):
+        self.elem = elem
+        self.count = count
+
+    def _fixed_size(self):
+        if self.count is None:
+            return None
+        size = self.elem._fixed_size()
+        return None if size is None else size * self.count
+
+    def _skip(self, buf, pos):
+        n = self.count
+        if n is None:
+            n = _u32(buf, pos)[0]
+            pos += 4
+        size = self.elem._fixed_size()
+        if size is not None:
+            return pos + n * size
+        skip = self.elem._skip
+        for _ in range(n):
+            pos = skip(buf, pos)
+        return pos
+
+    def _decode(self, buf, pos):
+        n = self.count
+        if n is None:
+            n = _u32(buf, pos)[0]
+            pos += 4
+        return SequenceView(buf, pos, n, self.elem)
+
+    def __repr__(self):
+        return f'vector<{self.elem!r}>' if self.count is None else f'array<{self.elem!r}, {self.count}>'
+
+
+@functools.lru_cache(maxsize=None)
+def vector(elem):
+    return Sequence(elem)
+
+
+@functools.lru_cache(maxsize=None)
+def array(elem, count):
+    return Sequence(elem, count)
+
+
+class Mapping:
+    """std::map and std::unordered_map: uint32 count, then the key and value pairs, decoded to a dict"""
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        n = _u32(buf, pos)[0]
+        pos += 4
+        for _ in range(n):
+            pos = self.value._skip(buf, self.key._skip(buf, pos))
+        return pos
+
+    def _decode(self, buf, pos):
+        n = _u32(buf, pos)[0]
+        pos += 4
+        res = {}
+        for _ in range(n):
+            k = self.key._decode(buf, pos)
+            pos = self.key._skip(buf, pos)
+            res[k] = self.value._decode(buf, pos)
+            pos = self.value._skip(buf, pos)
+        return res
+
+    def __repr__(self):
+        return f'map<{self.key!r}, {self.value!r}>'
+
+
+@functools.lru_cache(maxsize=None)
+def mapping(key, value):
+    return Mapping(key, value)
+
+
+class Optional:
+    """std::optional and std::unique_ptr: a bool, then the value if it is engaged"""
+
+    def __init__(self, elem):
+        self.elem = elem
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        return self.elem._skip(buf, pos + 1) if buf[pos] else pos + 1
+
+    def _decode(self, buf, pos):
+        return self.elem._decode(buf, pos + 1) if buf[pos] else None
+
+    def __repr__(self):
+        return f'optional<{self.elem!r}>'
+
+
+@functools.lru_cache(maxsize=None)
+def optional(elem):
+    return Optional(elem)
+
+
+Variant = collections.namedtuple('Variant', 'index value')
+
+
+class BoostVariant:
+    """IDL variant: uint32 size, uint32 index, then the value
+
+    Values of unknown alternatives are returned as raw bytes.
+    """
+
+    def __init__(self, alternatives):
+        self.alternatives = alternatives
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        return pos + _u32(buf, pos)[0]
+
+    def _decode(self, buf, pos):
+        size, index = _u32_pair(buf, pos)
+        if index < len(self.alternatives):
+            return Variant(index, self.alternatives[index]._decode(buf, pos + 8))
+        return Variant(index, buf[pos + 8:pos + size])
+
+    def __repr__(self):
+        return f'boost::variant<{", ".join(map(repr, self.alternatives))}>'
+
+
+class StdVariant:
+    """std::variant: uint8 index, then the value"""
+
+    def __init__(self, alternatives):
+        self.alternatives = alternatives
+
+    def _alternative(self, buf, pos):
+        index = buf[pos]
+        if index >= len(self.alternatives):
+            raise DecodeError(f"std::variant at {pos} has an unknown alternative {index}")
+        return index, self.alternatives[index]
+
+    def _fixed_size(self):
+        return None
+
+    def _skip(self, buf, pos):
+        return self._alternative(buf, pos)[1]._skip(buf, pos + 1)
+
+    def _decode(self, buf, pos):
+        index, alternative = self._alternative(buf, pos)
+        return Variant(index, alternative._decode(buf, pos + 1))
+
+    def __repr__(self):
+        return f'std::variant<{", ".join(map(repr, self.alternatives))}>'
+
+
+@functools.lru_cache(maxsize=None)
+def boost_variant(*alternatives):
+    return BoostVariant(alternatives)
+
+
+@functools.lru_cache(maxsize=None)
+def std_variant(*alternatives):
+    return StdVariant(alternatives)
+
+
+class View:
+    """Lazy view of a serialized IDL class, like the generated C++ *_view classes
+
+    Members are properties, decoded on each access. Offsets of members are
+    computed once, as they are reached. Non-final classes are prefixed with
+    their size, so members added in a later version ([[version]]) are None
+    when missing, and skipping over the whole object is O(1).
+    """
+    __slots__ = ('_buf', '_start', '_end', '_offsets')
+    _name = None
+    _final = False
+    _fields = ()
+    _types = ()
+    _size = _UNKNOWN
+
+    def __init__(self, buf, pos=0):
+        self._buf = buf
+        self._start = pos
+        if self._final:
+            self._end = None
+            self._offsets = [pos]
+        else:
+            self._end = pos + _u32(buf, pos)[0]
+            self._offsets = [pos + 4]
+
+    @classmethod
+    def _fixed_size(cls):
+        if cls._size is _UNKNOWN:
+            sizes = [t._fixed_size() for t in cls._types] if cls._final else [None]
+            cls._size = None if None in sizes else sum(sizes)
+        return cls._size
+
+    @classmethod
+    def _skip(cls, buf, pos):
+        if not cls._final:
+            return pos + _u32(buf, pos)[0]
+        size = cls._fixed_size()
+        if size is not None:
+            return pos + size
+        for t in cls._types:
+            pos = t._skip(buf, pos)
+        return pos
+
+    @classmethod
+    def _decode(cls, buf, pos):
+        return cls(buf, pos)
+
+    def _offset(self, i):
+        offsets = self._offsets
+        end = self._end
+        while len(offsets) <= i:
+            pos = offsets[-1]
+            if end is not None and pos >= end:
+                offsets.append(pos)
+            else:
+                offsets.append(self._types[len(offsets) - 1]._skip(self._buf, pos))
+        return offsets[i]
+
+    def _get(self, i):
+        pos = self._offset(i)
+        if self._end is not None and pos >= self._end:
+            return None
+        return self._types[i]._decode(self._buf, pos)
+
+    def _raw(self):
+        """The serialized object"""
+        end = self._end if self._end is not None else self._offset(len(self._types))
+        return self._buf[self._start:end]
+
+    def _asdict(self):
+        buf = self._buf
+        end = self._end
+        pos = self._offsets[0]
+        res = {}
+        for name, t in zip(self._fields, self._types):
+            if end is not None and pos >= end:
+                res[name] = None
+                continue
+            res[name] = t._decode(buf, pos)
+            pos = t._skip(buf, pos)
+        return res
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._raw() == other._raw()
+
+    def __hash__(self):
+        return hash(bytes(self._raw()))
+
+    def __repr__(self):
+        return f'<{self._name} at {self._start}>'
+
+
+def _member(i):
+    return property(lambda self: self._get(i))
+
+
+def view_class(name, final, fields, types):
+    """Create the view class of an IDL class; types is a callable returning the member types"""
+    cls = type(name.split('::')[-1], (View,), {'__slots__': (), '_name': name, '_final': final, '_fields': fields})
+    for i, field in enumerate(fields):
+        setattr(cls, field, _member(i))
+    cls._types_fn = types
+    _pending.append(cls)
+    return cls
+
+
+_pending = []
+
+
+def _resolve():
+    # Member types are resolved once all types are defined, as classes may refer to later ones.
+    while _pending:
+        cls = _pending.pop()
+        cls._types = cls._types_fn()
+
+
+def _instantiate(cls):
+    _resolve()
+    return cls
+
+
+def as_buffer(data):
+    """A memoryview of unsigned bytes over data, without copying it"""
+    buf = data if isinstance(data, memoryview) else memoryview(data)
+    return buf if buf.format == 'B' and buf.ndim == 1 else buf.cast('B')
+
+
+def decode(t, data, pos=0):
+    """Decode an object of type t at position pos of data (bytes, bytearray, mmap...)"""
+    return t._decode(as_buffer(data), pos)
+
+
+def skip(t, data, pos=0):
+    """The position just past the object of type t at position pos of data"""
+    return t._skip(as_buffer(data), pos)
+
+
+_SCALARS = {int, bool, str}
+
+
+def to_python(v):
+    """Decode v recursively, to plain Python objects (e.g. to dump them as JSON)"""
+    if v is None or type(v) in _SCALARS:
+        return v
+    if isinstance(v, View):
+        return {k: to_python(x) for k, x in v._asdict().items()}
+    if isinstance(v, SequenceView):
+        return [to_python(x) for x in v]
+    if isinstance(v, Variant):
+        return Variant(v.index, to_python(v.value))
+    if isinstance(v, dict):
+        items = [(to_python(k), to_python(x)) for k, x in v.items()]
+        try:
+            return dict(items)
+        except TypeError:
+            # Keys are objects, which are not hashable once decoded
+            return items
+    if isinstance(v, memoryview):
+        return bytes(v)
+    return v
+
+
+def decode_verb(name, data):
+    """Decode the arguments of an RPC verb, serialized one after the other
+
+    Trailing arguments marked with [[version]] may be missing, in which case
+    they are None.
+    """
+    buf = as_buffer(data)
+    pos = 0
+    res = []
+    for t in VERBS[name]:
+        if pos >= len(buf):
+            res.append(None)
+            continue
+        res.append(t._decode(buf, pos))
+        pos = t._skip(buf, pos)
+    return res
+'''
+
+# Types with hand-written serializers, which have an equivalent in the runtime
+PY_BUILTIN_TYPES = {
+    'bool': 'BOOL',
+    'int8_t': 'I8',
+    'uint8_t': 'U8',
+    'int16_t': 'I16',
+    'uint16_t': 'U16',
+    'int32_t': 'I32',
+    'uint32_t': 'U32',
+    'int64_t': 'I64',
+    'uint64_t': 'U64',
+    'int': 'I32',
+    'unsigned': 'U32',
+    'long': 'I64',
+    'size_t': 'U64',
+    'bytes': 'BYTES',
+    'bytes_ostream': 'BYTES',
+    'bytes_opt': 'optional(BYTES)',
+    'sstring': 'STRING',
+    'std::monostate': 'MONOSTATE',
+    'gms::inet_address': 'INET_ADDRESS',
+    'api::timestamp_type': 'I64',
+    'gc_clock::duration': 'GC_DURATION',
+    'gc_clock::time_point': 'I64',
+    'db_clock::time_point': 'I64',
+    'lowres_system_clock::time_point': 'I64',
+    'std::chrono::seconds': 'I64',
+    'std::chrono::milliseconds': 'I64',
+    'raft::command': 'BYTES',
+    # bool_class
+    'query::is_first_page': 'BOOL',
+    'query::short_read': 'BOOL',
+    # enum_set
+    'query::partition_slice::option_set': 'U64',
+    'tracing::trace_state_props_set': 'U64',
+}
+
+# Type aliases defined in C++, in terms of types defined in the IDL
+PY_TYPE_ALIASES = {
+    'inet_address_vector_replica_set': TemplateType('utils::small_vector', [BasicType('gms::inet_address'), BasicType('3')]),
+    'dht::partition_range_vector': TemplateType('std::vector', [TemplateType('nonwrapping_range', [BasicType('dht::ring_position')])]),
+    'clustering_key': BasicType('clustering_key_prefix'),
+    'db::per_partition_rate_limit::info': TemplateType('std::variant', [BasicType('std::monostate'),
+        BasicType('db::per_partition_rate_limit::account_only'), BasicType('db::per_partition_rate_limit::account_and_enforce')]),
+    'dht::token_range': TemplateType('nonwrapping_range', [BasicType('dht::token')]),
+    'compat::wrapping_partition_range': TemplateType('range', [BasicType('dht::ring_position')]),
+    'raft::server_id': TemplateType('raft::internal::tagged_id', [BasicType('raft::server_id_tag')]),
+    'raft::group_id': TemplateType('raft::internal::tagged_id', [BasicType('raft::group_id_tag')]),
+    'raft::snapshot_id': TemplateType('raft::internal::tagged_id', [BasicType('raft::snapshot_id_tag')]),
+    'raft::term_t': TemplateType('raft::internal::tagged_uint64', [BasicType('raft::term_tag')]),
+    'raft::index_t': TemplateType('raft::internal::tagged_uint64', [BasicType('raft::index_tag')]),
+    'raft::read_id': TemplateType('raft::internal::tagged_uint64', [BasicType('raft::read_id_tag')]),
+}
+
+PY_SEQUENCES = {'std::vector', 'utils::chunked_vector', 'utils::small_vector', 'std::list',
+                'std::set', 'std::unordered_set', 'absl::btree_set'}
+PY_MAPPINGS = {'std::map', 'std::unordered_map'}
+PY_OPTIONALS = {'std::optional', 'std::unique_ptr'}
+PY_POINTERS = {'lw_shared_ptr', 'seastar::lw_shared_ptr', 'foreign_ptr', 'seastar::foreign_ptr'}
+
+
+_py_reserved_names = None
+
+
+def py_name(name):
+    '''The identifier of the type name in the generated module
+
+    Names which would shadow Python builtins or the runtime get a trailing underscore.
+    '''
+    global _py_reserved_names
+    if _py_reserved_names is None:
+        _py_reserved_names = set(dir(builtins)) | set(keyword.kwlist)
+        for node in ast.parse(PY_RUNTIME).body:
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+                _py_reserved_names.add(node.name)
+            elif isinstance(node, ast.Assign):
+                _py_reserved_names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                _py_reserved_names.update(a.asname or a.name for a in node.names)
+        _py_reserved_names.update(['TYPES', 'VERBS'])
+    name = name.replace('::', '__')
+    return name + '_' if name in _py_reserved_names else name
+
+
+class PyModule:
+    '''Generates a Python module decoding the types defined in IDL files
+
+    Types are collected from all the files first, as they refer to each other
+    across files. The generated views mirror the C++ views: they keep a
+    memoryview of the serialized object and decode members on access.
+    '''
+    def __init__(self):
+        self.classes = {}
+        self.enums = {}
+        self.verbs = []
+
+    def collect(self, tree, scope=[]):
+        for obj in tree:
+            if isinstance(obj, NamespaceDef):
+                self.collect(obj.members, scope + [obj.name])
+            elif isinstance(obj, ClassDef):
+                qualified = '::'.join(scope + [obj.name])
+                self.classes[qualified] = (obj, scope)
+                self.collect([m for m in obj.members if isinstance(m, (ClassDef, EnumDef))], scope + obj.name.split('::'))
+            elif isinstance(obj, EnumDef):
+                self.enums['::'.join(scope + [obj.name])] = obj
+            elif isinstance(obj, RpcVerb):
+                self.verbs.append((obj, scope))
+
+    def lookup(self, name, scope):
+        '''Resolve name the way C++ does, from the innermost scope outwards'''
+        if name.startswith('::'):
+            scope, name = [], name[2:]
+        for i in range(len(scope), -1, -1):
+            qualified = '::'.join(scope[:i] + [name])
+            if qualified in self.classes or qualified in self.enums or qualified in PY_BUILTIN_TYPES or qualified in PY_TYPE_ALIASES:
+                return qualified
+        return None
+
+    def type_expr(self, t, scope, template_params=(), framed_variants=False):
+        '''The Python expression of the type descriptor of t
+
+        The writers of [[writable]] classes write a std::variant member like a
+        boost::variant, with a size and a uint32 index, which is also how their
+        views read it, so framed_variants is set for their members.
+        '''
+        def sub(a):
+            return self.type_expr(a, scope, template_params, framed_variants)
+        if isinstance(t, BasicType):
+            if t.name in template_params:
+                return t.name
+            name = self.lookup(t.name, scope)
+            if name in PY_BUILTIN_TYPES:
+                return PY_BUILTIN_TYPES[name]
+            if name in PY_TYPE_ALIASES:
+                return self.type_expr(PY_TYPE_ALIASES[name], [])
+            if name is not None:
+                return py_name(name)
+            return f"unsupported({t.name!r})"
+        args = t.template_parameters
+        if t.name in PY_SEQUENCES:
+            return f"vector({sub(args[0])})"
+        if t.name == 'std::array':
+            return f"array({sub(args[0])}, {args[1].name})"
+        if t.name in PY_MAPPINGS:
+            return f"mapping({sub(args[0])}, {sub(args[1])})"
+        if t.name in PY_OPTIONALS:
+            return f"optional({sub(args[0])})"
+        if t.name in PY_POINTERS:
+            return sub(args[0])
+        if t.name == 'std::chrono::duration':
+            return sub(args[0])
+        if t.name == 'std::chrono::time_point':
+            return 'I64'
+        if t.name in ('boost::variant', 'std::variant'):
+            fn = 'boost_variant' if t.name == 'boost::variant' or framed_variants else 'std_variant'
+            return f"{fn}({', '.join(sub(a) for a in args)})"
+        if t.name == 'enum_set':
+            return 'U64'
+        if t.name == 'bool_class':
+            return 'BOOL'
+        name = self.lookup(t.name, scope)
+        if name in self.classes:
+            return f"{py_name(name)}({', '.join(sub(a) for a in args)})"
+        return f"unsupported({t.to_string()!r})"
+
+    def enum_code(self, name, enum):
+        fmt = PY_BUILTIN_TYPES[enum.underlying_type]
+        values = []
+        value = -1
+        for m in enum.members:
+            if m.initializer is None:
+                value += 1
+            else:
+                value = m.initializer if isinstance(m.initializer, Number) else int(m.initializer, 0)
+            values.append((m.name, value))
+        return f"{py_name(name)} = Enum(enum.IntEnum({enum.name!r}, {values!r}), {fmt}.fmt)\n"
+
+    def class_code(self, name, cls, scope):
+        members = get_members(cls)
+        fields = tuple(get_member_name(m.name) for m in members)
+        params = [p.name for p in cls.template_params] if cls.template_params else []
+        member_scope = scope + cls.name.split('::')
+        framed_variants = cls.attribute == 'writable'
+        types = ', '.join(self.type_expr(m.type, member_scope, params, framed_variants) for m in members)
+        types = f"lambda: ({types}{',' if len(members) == 1 else ''})"
+        final = bool(cls.final)
+        if not params:
+            return f"{py_name(name)} = view_class({name!r}, {final}, {fields!r}, {types})\n"
+        args = ', '.join(params)
+        return textwrap.dedent(f"""
+            @functools.lru_cache(maxsize=None)
+            def {py_name(name)}({args}):
+                name = {name!r} + '<' + ', '.join(map(repr, ({args},))) + '>'
+                return _instantiate(view_class(name, {final}, {fields!r}, {types}))
+            """)
+
+    def verb_code(self, verb, scope):
+        params = verb.params or []
+        types = ''.join(self.type_expr(p.type, scope) + ', ' for p in params)
+        return f"    {verb.name!r}: ({types}),\n"
+
+    def generate(self, names):
+        out = io.StringIO()
+        sources = textwrap.fill(', '.join(os.path.basename(n) for n in names), 76,
+                                initial_indent='#   ', subsequent_indent='#   ')
+        fprintln(out, "# Generated by idl-compiler.py, do not edit. Sources:")
+        fprintln(out, sources)
+        fprintln(out, textwrap.dedent("""\
+            #
+            # Decoders for the IDL wire format. Look up types by their C++ name in
+            # TYPES, then decode(TYPES[name], data) returns a lazy view over data.
+            #
+            # SPDX-License-Identifier: AGPL-3.0-or-later"""))
+        fprintln(out, PY_RUNTIME)
+        fprintln(out, "\n# Enums\n")
+        for name, enum in sorted(self.enums.items()):
+            fprint(out, self.enum_code(name, enum))
+        fprintln(out, "\n# Classes\n")
+        for name, (cls, scope) in sorted(self.classes.items()):
+            fprint(out, self.class_code(name, cls, scope))
+        fprintln(out, "\n_resolve()\n")
+        fprintln(out, "TYPES = {")
+        for name in sorted(list(self.enums) + list(self.classes)):
+            fprintln(out, f"    {name!r}: {py_name(name)},")
+        fprintln(out, "}\n")
+        fprintln(out, "# Argument types of RPC verbs\nVERBS = {")
+        for verb, scope in sorted(self.verbs, key=lambda v: v[0].name):
+            fprint(out, self.verb_code(verb, scope))
+        fprintln(out, "}")
+        return out.getvalue()
+
+
+def generate_python(names, output, jobs=None):
+    '''Generate a Python module decoding all the types of the IDL files names'''
+    module = PyModule()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for tree in executor.map(parse_file, names):
+            module.collect(tree)
+    write_if_changed(output, module.generate(names))
 
 
 def general_include(files):
     '''Write serialization-related header includes in the generated files'''
-    name = config.o if config.o else "serializer.dist.hh"
+    name = config.o[0] if config.o else "serializer.dist.hh"
     # Header file containing implementation of serializers and other supporting classes 
-    cout = open(name.replace('.hh', '.impl.hh'), "w+")
+    cout = io.StringIO()
     # Header file with serializer declarations
-    hout = open(name, "w+")
+    hout = io.StringIO()
     print_cw(cout)
     print_cw(hout)
     for n in files:
         fprintln(hout, '#include "' + n + '"')
         fprintln(cout, '#include "' + n.replace(".dist.hh", '.dist.impl.hh') + '"')
-    cout.close()
-    hout.close()
+    write_if_changed(name.replace('.hh', '.impl.hh'), cout.getvalue())
+    write_if_changed(name, hout.getvalue())
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="""Generate serializer helper function""")
 
-    parser.add_argument('-o', help='Output file', default='')
-    parser.add_argument('-f', help='input file', default='')
+    parser.add_argument('-o', help="""Output file, can be repeated to generate
+    many files in one go, in which case there has to be one for each input file""", action='append', default=[])
+    parser.add_argument('-f', help='input file, can be repeated', action='append', default=[])
     parser.add_argument('--ns', help="""namespace, when set function will be created
     under the given namespace""", default='')
+    parser.add_argument('-j', '--jobs', type=int, help="""number of processes to parse
+    input files with, defaults to the number of CPUs""", default=None)
+    parser.add_argument('--cache', help="""file to cache the hashes of the inputs of the
+    generated files in, defaults to .idl-compiler.cache in the output directory""", default=None)
+    parser.add_argument('--no-cache', action='store_true', help="always regenerate all inputs")
+    parser.add_argument('--instrument-verbs', action='store_true', help="""record metrics for all
+    RPC verbs, as if they were declared with the [[instrumented]] attribute""")
+    parser.add_argument('--python', metavar='OUTPUT', help="""instead of C++ serializers, generate
+    a Python module with decoders for all the types of the input files""", default=None)
     parser.add_argument('file', nargs='*', help="combine one or more file names for the genral include files")
 
     config = parser.parse_args()
-    if config.file:
+    if config.o and len(config.o) != max(len(config.f), 1):
+        parser.error('the number of output files (-o) has to match the number of input files (-f)')
+    if config.python:
+        generate_python(config.f, config.python, config.jobs)
+    elif config.file:
         general_include(config.file)
-    elif config.f != '':
-        load_file(config.f)
+    elif config.f:
+        outputs = config.o or [f.replace(EXTENSION, '.dist.hh') for f in config.f]
+        cache_file = None if config.no_cache else (config.cache or default_cache_file(outputs))
+        load_files(config.f, outputs, config.jobs, cache_file)
@@ -55,6 +55,12 @@ struct writable_variants stub [[writable]] {
     boost::variant<writable_vector, simple_compound, writable_final_simple_compound> third;
 };
 
+class fixed_size_compound {
+    utils::UUID id;
+    int64_t timestamp;
+    bool flag;
+};
+
 struct compound_with_optional {
     std::optional<simple_compound> first;
     simple_compound second;
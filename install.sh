@@ -519,6 +519,7 @@ fi
 
 
 install -m755 scylla-gdb.py -Dt "$rprefix"/scripts/
+install -m644 scylla_memory_analysis.py -Dt "$rprefix"/scripts/
 
 PYSCRIPTS=$(find dist/common/scripts/ -maxdepth 1 -type f -exec grep -Pls '\A#!/usr/bin/env python3' {} +)
 for i in $PYSCRIPTS; do
@@ -11,6 +11,9 @@
 #include <seastar/coroutine/exception.hh>
 
 #include "message/messaging_service.hh"
+#include "message/verb_metrics.hh"
+#include <seastar/core/metrics.hh>
+#include "utils/histogram_metrics_helper.hh"
 #include <seastar/core/distributed.hh>
 #include "gms/failure_detector.hh"
 #include "gms/gossiper.hh"
@@ -208,6 +211,36 @@ const uint64_t* messaging_service::get_dropped_messages() const {
     return _dropped_messages;
 }
 
+verb_metrics& messaging_service::get_verb_metrics(messaging_verb verb, std::string_view verb_name) {
+    auto& m = _verb_metrics[static_cast<size_t>(verb)];
+    if (!m) [[unlikely]] {
+        m = std::make_unique<verb_metrics>(verb_name);
+    }
+    return *m;
+}
+
+verb_metrics::verb_metrics(std::string_view verb_name) {
+    namespace sm = seastar::metrics;
+    auto add_side = [&] (std::string_view side_name, const side& s) {
+        std::vector<sm::label_instance> labels{sm::label("verb")(verb_name), sm::label("side")(side_name)};
+        _metrics.add_group("rpc_verb", {
+            sm::make_counter("calls", s.calls,
+                    sm::description("Number of calls of the verb"), labels),
+            sm::make_counter("errors", s.errors,
+                    sm::description("Number of calls of the verb which failed"), labels),
+            sm::make_gauge("in_flight", s.in_flight,
+                    sm::description("Number of calls of the verb which are in progress"), labels),
+            sm::make_histogram("latency", sm::description("Latency histogram of the calls of the verb"), labels,
+                    [&s] { return to_metrics_histogram(s.latency); }),
+            sm::make_histogram("payload_size", sm::description(format("Size histogram of the serialized arguments of the verb, "
+                    "measured on one in {} calls", payload_sample_period)), labels,
+                    [&s] { return s.payload_size.get_histogram(64, 20); }),
+        });
+    };
+    add_side("send", sent);
+    add_side("handle", handled);
+}
+
 int32_t messaging_service::get_raw_version(const gms::inet_address& endpoint) const {
     // FIXME: messaging service versioning
     return current_version;
@@ -199,6 +199,8 @@ namespace netw {
 
 struct serializer {};
 
+class verb_metrics;
+
 struct schema_pull_options {
     bool remote_supports_canonical_mutation_retval = true;
 
@@ -237,6 +239,10 @@ class messaging_service : public seastar::async_sharded_service<messaging_servic
 
     const uint64_t* get_dropped_messages() const;
 
+    // Statistics of an instrumented verb, see verb_metrics.hh. They are created,
+    // and exported as metrics labeled with verb_name, on first use.
+    verb_metrics& get_verb_metrics(messaging_verb verb, std::string_view verb_name);
+
     int32_t get_raw_version(const gms::inet_address& endpoint) const;
 
     bool knows_version(const gms::inet_address& endpoint) const;
@@ -307,6 +313,7 @@ class messaging_service : public seastar::async_sharded_service<messaging_servic
     std::array<std::unique_ptr<rpc_protocol_server_wrapper>, 2> _server_tls;
     std::vector<clients_map> _clients;
     uint64_t _dropped_messages[static_cast<int32_t>(messaging_verb::LAST)] = {};
+    std::array<std::unique_ptr<verb_metrics>, static_cast<size_t>(messaging_verb::LAST)> _verb_metrics;
     bool _shutting_down = false;
     connection_drop_signal_t _connection_dropped;
     scheduling_config _scheduling_config;
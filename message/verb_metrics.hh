@@ -0,0 +1,68 @@
+/*
+ * Copyright (C) 2023-present ScyllaDB
+ */
+
+/*
+ * SPDX-License-Identifier: AGPL-3.0-or-later
+ */
+
+#pragma once
+
+#include <seastar/core/future.hh>
+#include <seastar/core/metrics_registration.hh>
+#include "seastarx.hh"
+#include "utils/estimated_histogram.hh"
+
+namespace netw {
+
+// Statistics of an RPC verb declared with the [[instrumented]] attribute in
+// the IDL (or of any verb, when the IDL compiler is run with
+// --instrument-verbs). The generated send_* and handler wrappers record the
+// calls of both sides, and messaging_service exports them as metrics labeled
+// with the verb name, on the shard the calls are made on.
+class verb_metrics {
+public:
+    // Measuring the payload takes an extra serialization pass over the
+    // arguments, so only one in payload_sample_period calls is measured.
+    static constexpr uint64_t payload_sample_period = 16;
+
+    struct side {
+        uint64_t calls = 0;
+        uint64_t errors = 0;
+        int64_t in_flight = 0;
+        utils::time_estimated_histogram latency;
+        utils::estimated_histogram payload_size;
+
+        // Counts a new call, returns true if its payload should be measured
+        bool start() noexcept {
+            return calls++ % payload_sample_period == 0;
+        }
+    };
+
+    side sent;
+    side handled;
+private:
+    seastar::metrics::metric_groups _metrics;
+public:
+    explicit verb_metrics(std::string_view verb_name);
+    verb_metrics(verb_metrics&&) = delete;
+};
+
+// Invokes func, which starts a call of a verb, and accounts for it in s until
+// the future it returns resolves. The verb_metrics must outlive the call,
+// which messaging_service does.
+template <typename Func>
+futurize_t<std::invoke_result_t<Func>> track_verb_call(verb_metrics::side& s, Func&& func) {
+    auto start = utils::time_estimated_histogram::clock::now();
+    ++s.in_flight;
+    return futurize_invoke(std::forward<Func>(func)).then_wrapped([&s, start] (auto f) {
+        --s.in_flight;
+        s.latency.add(utils::time_estimated_histogram::clock::now() - start);
+        if (f.failed()) {
+            ++s.errors;
+        }
+        return f;
+    });
+}
+
+} // namespace netw
@@ -15,6 +15,8 @@
 #include "idl/mutation.dist.impl.hh"
 #include "frozen_mutation.hh"
 
+#include <ranges>
+
 using namespace db;
 
 namespace {
@@ -41,9 +43,11 @@ auto write_counter_cell(Writer&& writer, atomic_cell_view c)
             auto ccv = counter_cell_view(c);
             auto shards = std::move(value).start_value_counter_cell_full()
                                           .start_shards();
-            for (auto csv : ccv.shards()) {
-                shards.add_shards(counter_shard(csv));
-            }
+            // Shards have a fixed size, so they are all written to a single region of the stream
+            auto shard_bytes = c.value();
+            shards.add_all_shards(std::views::iota(size_t(0), ccv.shard_count()) | std::views::transform([&] (size_t i) {
+                return counter_shard(counter_shard_view(shard_bytes.substr(i * counter_shard_view::size, counter_shard_view::size)));
+            }));
             return std::move(shards).end_shards().end_counter_cell_full();
         }
     }().end_counter_cell();
@@ -164,6 +164,7 @@ def exclude_submodules(tarinfo):
     return tarinfo
 ar.reloc_add('tools', filter=exclude_submodules)
 ar.reloc_add('scylla-gdb.py')
+ar.reloc_add('scylla_memory_analysis.py')
 ar.reloc_add('build/debian/debian', arcname='debian')
 ar.reloc_add('build/node_exporter', arcname='node_exporter')
 if not args.stripped:
@@ -277,12 +277,18 @@ then
         git pull -q --no-recurse-submodules origin $MAIN_BRANCH
         log "Copying scylla-gdb.py from ${SCYLLA_REPO_PATH}"
         cp scylla-gdb.py ${WORKDIR}/scylla-gdb.py
+        cp scylla_memory_analysis.py ${WORKDIR}/scylla_memory_analysis.py
         git checkout -q ${COMMIT_HASH}
         cd $WORKDIR
     elif [[ "${SCYLLA_GDB_PY_SOURCE}" == "package" ]]
     then
         log "Copying scylla-gdb.py from package"
         cp -n ${ARTIFACT_DIR}/scylla.package/scylla-gdb.py .
+        # Older packages don't have it, their scylla-gdb.py doesn't need it either
+        if [[ -f ${ARTIFACT_DIR}/scylla.package/scylla_memory_analysis.py ]]
+        then
+            cp -n ${ARTIFACT_DIR}/scylla.package/scylla_memory_analysis.py .
+        fi
     else
         log "scylla-gdb.py was not requested"
     fi
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+
+"""Profile-guided optimization of the scylla binary
+
+Drives the steps of the `release-pgo` build mode of configure.py, which ninja
+runs in order:
+
+* train  - run the training workload with the instrumented scylla binary built
+           by the `release-pgo-instr` mode, and merge the raw profiles into the
+           .profdata file the `release-pgo` objects are compiled with;
+* bolt   - optimize the layout of the linked `release-pgo` binary with BOLT,
+           profiling it on the same training workload;
+* report - compare the throughput of a `release` and a `release-pgo` binary.
+
+The training workload is made of the perf tests built into the scylla binary
+(`scylla perf-simple-query`, `perf-fast-forward`, `perf-row-cache-update` and
+`perf-sstable`), so both the instrumented and the BOLT-instrumented binaries
+can run it without building the perf test executables.
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+def training_workload(workdir, smp, memory):
+    """The scylla command lines of the training workload
+
+    The workload should exercise the hot paths of the read-heavy production
+    workloads the `release-pgo` binary is tuned for: the CQL read and write
+    paths, the row cache, the sstable readers and writers and compaction.
+    Each run is short, what matters is the relative frequency of the code
+    paths, not the absolute counts. The commands are run in order, some of
+    them use the data populated by the previous ones.
+    """
+    seastar_args = ['--smp', str(smp), '--memory', memory, '--overprovisioned', '--default-log-level', 'error']
+    ffwd_data = os.path.join(workdir, 'perf_fast_forward_data')
+    ffwd_output = os.path.join(workdir, 'perf_fast_forward_output')
+    sstables = os.path.join(workdir, 'perf_sstable')
+    os.makedirs(sstables, exist_ok=True)
+    commands = [
+        ['perf-simple-query', '--duration', '5'],
+        ['perf-simple-query', '--duration', '5', '--write'],
+        ['perf-simple-query', '--duration', '5', '--flush', '--enable-cache', '0'],
+        ['perf-fast-forward', '--populate', '--rows', '100000', '--data-directory', ffwd_data],
+        ['perf-fast-forward', '--data-directory', ffwd_data, '--output-directory', ffwd_output],
+        ['perf-fast-forward', '--data-directory', ffwd_data, '--output-directory', ffwd_output, '--enable-cache'],
+        ['perf-row-cache-update'],
+        ['perf-sstable', '--mode', 'write', '--partitions', '200000', '--iterations', '3', '--testdir', sstables],
+        ['perf-sstable', '--mode', 'index_read', '--partitions', '200000', '--iterations', '3', '--testdir', sstables],
+        ['perf-sstable', '--mode', 'sequential_read', '--partitions', '200000', '--iterations', '3', '--testdir', sstables],
+        ['perf-sstable', '--mode', 'compaction', '--sstables', '4', '--partitions', '50000', '--iterations', '3', '--testdir', sstables],
+    ]
+    return [cmd + seastar_args for cmd in commands]
+
+
+def run_workload(scylla, workdir, smp, memory, env=None, verbose=False):
+    """Run the training workload with the given scylla binary"""
+    for cmd in training_workload(workdir, smp, memory):
+        cmd = [os.path.abspath(scylla)] + cmd
+        if verbose:
+            print(' '.join(cmd))
+        subprocess.check_call(cmd, cwd=workdir, env=dict(os.environ, **(env or {})),
+                              stdout=None if verbose else subprocess.DEVNULL)
+
+
+def train(scylla, output, llvm_profdata='llvm-profdata', smp=2, memory='2G', verbose=False):
+    """Generate the profile the `release-pgo` objects are compiled with
+
+    Runs the training workload with `scylla`, which has to be built with
+    -fprofile-instr-generate, and merges the raw profiles of all the runs into
+    `output`.
+    """
+    with tempfile.TemporaryDirectory(prefix='scylla-pgo-') as workdir:
+        profiles = os.path.join(workdir, 'profiles')
+        os.makedirs(profiles)
+        # %m keeps the profiles of different binaries apart, %p those of the
+        # different runs of the workload
+        env = {'LLVM_PROFILE_FILE': os.path.join(profiles, 'scylla-%m-%p.profraw')}
+        run_workload(scylla, workdir, smp, memory, env=env, verbose=verbose)
+        raw = sorted(glob.glob(os.path.join(profiles, '*.profraw')))
+        if not raw:
+            raise RuntimeError(f'The training workload of {scylla} produced no profile, is it built with -fprofile-instr-generate?')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        subprocess.check_call([llvm_profdata, 'merge', '--sparse', '-o', output] + raw)
+
+
+def bolt(scylla, output, llvm_bolt='llvm-bolt', merge_fdata='merge-fdata', smp=2, memory='2G', verbose=False):
+    """Optimize the code layout of the linked `scylla` with BOLT
+
+    `scylla` has to be linked with --emit-relocs. It is instrumented with
+    llvm-bolt, profiled on the training workload, then rewritten using the
+    profile into `output`.
+    """
+    with tempfile.TemporaryDirectory(prefix='scylla-bolt-') as workdir:
+        profiles = os.path.join(workdir, 'profiles')
+        os.makedirs(profiles)
+        instrumented = os.path.join(workdir, 'scylla.bolt-instr')
+        subprocess.check_call([llvm_bolt, scylla, '-instrument', '-instrumentation-file-append-pid',
+                               f'-instrumentation-file={os.path.join(profiles, "scylla.fdata")}',
+                               '-o', instrumented])
+        run_workload(instrumented, workdir, smp, memory, verbose=verbose)
+        fdata = os.path.join(workdir, 'scylla.fdata')
+        with open(fdata, 'w') as f:
+            subprocess.check_call([merge_fdata] + sorted(glob.glob(os.path.join(profiles, 'scylla.fdata*'))), stdout=f)
+        subprocess.check_call([llvm_bolt, scylla, '-o', output, f'-data={fdata}',
+                               '-reorder-blocks=ext-tsp', '-reorder-functions=hfsort+', '-split-functions',
+                               '-split-all-cold', '-split-eh', '-dyno-stats'])
+
+
+def measure(scylla, args, smp, memory, workdir):
+    """Run perf-simple-query with `args`, returns its json results"""
+    result = os.path.join(workdir, 'result.json')
+    cmd = [os.path.abspath(scylla), 'perf-simple-query', '--json-result', result,
+           '--smp', str(smp), '--memory', memory, '--default-log-level', 'error'] + args
+    subprocess.check_call(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    with open(result) as f:
+        return json.load(f)['stats']
+
+
+def report(baseline, optimized, output=None, runs=3, smp=2, memory='2G', duration=10):
+    """Compare the throughput of the `optimized` binary against `baseline`
+
+    Both binaries run the same perf-simple-query configurations, alternately,
+    `runs` times each. The report has the median of the median tps and of the
+    instructions per operation of each binary, and their relative difference.
+    """
+    configurations = {
+        'read': [],
+        'read (no cache)': ['--flush', '--enable-cache', '0'],
+        'write': ['--write'],
+    }
+    lines = [f"{'workload':16} {'metric':20} {'release':>14} {'release-pgo':>14} {'diff':>8}"]
+    with tempfile.TemporaryDirectory(prefix='scylla-pgo-report-') as workdir:
+        for name, args in configurations.items():
+            args = args + ['--duration', str(duration)]
+            results = {baseline: [], optimized: []}
+            for _ in range(runs):
+                for scylla in results:
+                    results[scylla].append(measure(scylla, args, smp, memory, workdir))
+            for metric in ['median tps', 'instructions_per_op']:
+                before = statistics.median(r[metric] for r in results[baseline])
+                after = statistics.median(r[metric] for r in results[optimized])
+                diff = (after - before) / before * 100 if before else 0
+                lines.append(f'{name:16} {metric:20} {before:14.1f} {after:14.1f} {diff:+7.2f}%')
+    text = '\n'.join(lines) + '\n'
+    print(text, end='')
+    if output:
+        with open(output, 'w') as f:
+            f.write(text)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--smp', type=int, default=2, help='number of shards of the scylla runs')
+    parser.add_argument('--memory', default='2G', help='memory of the scylla runs')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the output of the training workload')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='generate the profile of an instrumented scylla binary')
+    train_parser.add_argument('scylla', help='scylla binary built in the release-pgo-instr mode')
+    train_parser.add_argument('output', help='the merged .profdata file')
+    train_parser.add_argument('--llvm-profdata', default='llvm-profdata', help='llvm-profdata executable')
+
+    bolt_parser = subparsers.add_parser('bolt', help='optimize the layout of a scylla binary with BOLT')
+    bolt_parser.add_argument('scylla', help='scylla binary linked with --emit-relocs')
+    bolt_parser.add_argument('output', help='the optimized binary')
+    bolt_parser.add_argument('--llvm-bolt', default='llvm-bolt', help='llvm-bolt executable')
+    bolt_parser.add_argument('--merge-fdata', default='merge-fdata', help='merge-fdata executable')
+
+    report_parser = subparsers.add_parser('report', help='compare the throughput of two scylla binaries')
+    report_parser.add_argument('baseline', help='scylla binary built in the release mode')
+    report_parser.add_argument('optimized', help='scylla binary built in the release-pgo mode')
+    report_parser.add_argument('output', nargs='?', help='file to write the report to, in addition to stdout')
+    report_parser.add_argument('--runs', type=int, default=3, help='number of runs of each configuration')
+    report_parser.add_argument('--duration', type=int, default=10, help='duration of each run, in seconds')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        train(args.scylla, args.output, args.llvm_profdata, args.smp, args.memory, args.verbose)
+    elif args.command == 'bolt':
+        bolt(args.scylla, args.output, args.llvm_bolt, args.merge_fdata, args.smp, args.memory, args.verbose)
+    elif args.command == 'report':
+        report(args.baseline, args.optimized, args.output, args.runs, args.smp, args.memory, args.duration)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
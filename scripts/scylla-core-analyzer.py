@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+
+"""Offline memory analysis of scylla coredumps, without gdb
+
+Analyzes the seastar allocator and LSA state of each shard, reading the
+coredump directly. The analyses are those of the `scylla memory` and
+`scylla heapprof` gdb commands, implemented in scylla_memory_analysis.py
+for both, the results are written as JSON.
+
+The type layout (sizes and field offsets) is not extracted from the debug
+info, instead it has to be exported once per binary, with gdb:
+
+    $ gdb -x scylla-gdb.py --core core /path/to/scylla
+    (gdb) scylla memory-layout -o scylla-layout.json
+
+The exported layout can be reused for all cores generated by the same
+binary:
+
+    $ ./scylla-core-analyzer.py --layout scylla-layout.json core > report.json
+
+Heap profile backtraces are reported as raw addresses, symbolize them with
+gdb or addr2line.
+
+Only x86_64 ELF cores are supported.
+"""
+
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+
+# The analyses are shared with scylla-gdb.py
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from scylla_memory_analysis import LAYOUT_VERSION, ALL_SECTIONS, analyze, memory_reader, memory_read_error
+
+
+class core_file_reader(memory_reader):
+    """memory_reader backed by a mmap()-ed ELF64 (x86_64) core file"""
+
+    PT_LOAD = 1
+    PT_NOTE = 4
+    NT_PRSTATUS = 1
+    # Offsets in struct elf_prstatus on x86_64
+    PRSTATUS_PID_OFFSET = 32
+    PRSTATUS_REG_OFFSET = 112
+    # Index of fs_base in struct user_regs_struct on x86_64
+    REG_FS_BASE = 21
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data = memoryview(self._mmap)
+        self._segments = [] # (vaddr, memsz, offset, filesz), sorted by vaddr
+        self._threads = []
+
+        if bytes(self._data[0:4]) != b'\x7fELF' or self._data[4] != 2:
+            raise ValueError(f"{path} is not an ELF64 file")
+        e_type, = struct.unpack_from('<H', self._data, 16)
+        if e_type != 4: # ET_CORE
+            raise ValueError(f"{path} is not a core file")
+
+        e_phoff, = struct.unpack_from('<Q', self._data, 32)
+        e_phentsize, e_phnum = struct.unpack_from('<HH', self._data, 54)
+        for i in range(e_phnum):
+            p_type, _, p_offset, p_vaddr, _, p_filesz, p_memsz, _ = struct.unpack_from('<IIQQQQQQ', self._data, e_phoff + i * e_phentsize)
+            if p_type == self.PT_LOAD:
+                self._segments.append((p_vaddr, p_memsz, p_offset, p_filesz))
+            elif p_type == self.PT_NOTE:
+                self._parse_notes(p_offset, p_filesz)
+
+        self._segments.sort()
+        self._segment_starts = [s[0] for s in self._segments]
+
+    def _parse_notes(self, offset, size):
+        end = offset + size
+        while offset + 12 <= end:
+            namesz, descsz, note_type = struct.unpack_from('<III', self._data, offset)
+            desc_offset = offset + 12 + ((namesz + 3) & ~3)
+            if note_type == self.NT_PRSTATUS:
+                pid, = struct.unpack_from('<I', self._data, desc_offset + self.PRSTATUS_PID_OFFSET)
+                fs_base, = struct.unpack_from('<Q', self._data, desc_offset + self.PRSTATUS_REG_OFFSET + self.REG_FS_BASE * 8)
+                self._threads.append((pid, fs_base))
+            offset = desc_offset + ((descsz + 3) & ~3)
+
+    def threads(self):
+        return self._threads
+
+    def read(self, addr, size):
+        idx = bisect.bisect_right(self._segment_starts, addr) - 1
+        if idx < 0:
+            raise memory_read_error(f"address 0x{addr:x} is not in the core")
+        vaddr, memsz, offset, filesz = self._segments[idx]
+        if addr + size > vaddr + memsz:
+            if addr >= vaddr + memsz:
+                raise memory_read_error(f"address 0x{addr:x} is not in the core")
+            # Straddles segments, fall back to copying.
+            head = vaddr + memsz - addr
+            return bytes(self.read(addr, head)) + bytes(self.read(addr + head, size - head))
+        start = addr - vaddr
+        if start + size <= filesz:
+            return self._data[offset + start:offset + start + size]
+        # Part of the segment which is not dumped, reads as zeroes.
+        available = max(0, filesz - start)
+        return bytes(self._data[offset + start:offset + start + available]) + bytes(size - available)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("core", help="path to the coredump")
+    parser.add_argument("-l", "--layout", required=True,
+            help="path to the layout file, exported with `scylla memory-layout` in gdb")
+    parser.add_argument("-o", "--output", default=None,
+            help="path to the output file, defaults to stdout")
+    parser.add_argument("-s", "--sections", default=','.join(ALL_SECTIONS),
+            help="comma-separated list of analyses to run, defaults to all: {}".format(','.join(ALL_SECTIONS)))
+    parser.add_argument("--top-regions", type=int, default=10,
+            help="number of LSA regions to report, ordered by the number of segments they own")
+    args = parser.parse_args()
+
+    sections = args.sections.split(',')
+    for section in sections:
+        if section not in ALL_SECTIONS:
+            parser.error(f"unknown section {section}, valid sections are: {', '.join(ALL_SECTIONS)}")
+
+    with open(args.layout) as f:
+        layout = json.load(f)
+    if layout.get('version') != LAYOUT_VERSION:
+        parser.error(f"unsupported layout version {layout.get('version')}")
+
+    result = analyze(core_file_reader(args.core), layout, sections, args.top_regions)
+    result['core'] = args.core
+    result['executable'] = layout.get('executable')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=4)
+    else:
+        json.dump(result, sys.stdout, indent=4)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,78 @@ import os
 import subprocess
 import time
 import socket
+import json
+import math
+import heapq
+import statistics
+
+# The memory analyses shared with scripts/scylla-core-analyzer.py live next to
+# this file.
+sys.path.insert(1, os.path.dirname(os.path.abspath(__file__)))
+import scylla_memory_analysis
+
+
+class gdb_cache:
+    """Central memo for resolved types, constants, offsets and other type information.
+
+    Looking up types, evaluating constants and walking the fields of types is
+    slow in gdb and a lot of helpers and pretty-printers do it in their
+    constructors, often called in hot loops. All such information only depends
+    on the debug-info of the loaded objfiles, so it is memoized here, keyed by
+    the kind of the information and the name of the type or expression. Failed
+    lookups are memoized too (and re-raised), as some helpers probe several
+    alternative names, for compatibility with older versions.
+
+    The cache is invalidated whenever a new objfile is loaded, or the objfiles
+    are cleared.
+    """
+    _entries = {}
+
+    @staticmethod
+    def get(kind, key, compute):
+        if key is None:
+            return compute()
+        try:
+            value = gdb_cache._entries[(kind, key)]
+        except KeyError:
+            try:
+                value = compute()
+            except gdb.error as e:
+                value = e
+            gdb_cache._entries[(kind, key)] = value
+        if isinstance(value, gdb.error):
+            raise value
+        return value
+
+    @staticmethod
+    def clear(event=None):
+        gdb_cache._entries.clear()
+
+
+gdb.events.new_objfile.connect(gdb_cache.clear)
+gdb.events.clear_objfiles.connect(gdb_cache.clear)
+
+
+def type_key(gdb_type):
+    """Key identifying gdb_type in gdb_cache.
+
+    Anonymous types all have the same name, so they are not cacheable, None is
+    returned for them.
+    """
+    name = str(gdb_type)
+    if '{...}' in name:
+        return None
+    return name
+
+
+def cached_lookup_type(type_name):
+    """Memoized gdb.lookup_type()"""
+    return gdb_cache.get('type', type_name, lambda: gdb.lookup_type(type_name))
+
+
+def cached_constant(expr):
+    """Memoized int(gdb.parse_and_eval(expr)), for compile-time constants only"""
+    return gdb_cache.get('constant', expr, lambda: int(gdb.parse_and_eval(expr)))
 
 
 def align_up(ptr, alignment):
@@ -25,14 +97,17 @@ def align_up(ptr, alignment):
     return ptr + alignment - res
 
 
-def template_arguments(gdb_type):
-    n = 0
+def _template_arguments(gdb_type):
+    args = []
     while True:
         try:
-            yield gdb_type.template_argument(n)
-            n += 1
+            args.append(gdb_type.template_argument(len(args)))
         except RuntimeError:
-            return
+            return tuple(args)
+
+
+def template_arguments(gdb_type):
+    return iter(gdb_cache.get('template_arguments', type_key(gdb_type), lambda: _template_arguments(gdb_type)))
 
 
 def get_template_arg_with_prefix(gdb_type, prefix):
@@ -41,7 +116,7 @@ def get_template_arg_with_prefix(gdb_type, prefix):
             return arg
 
 
-def get_base_class_offset(gdb_type, base_class_name):
+def _get_base_class_offset(gdb_type, base_class_name):
     name_pattern = re.escape(base_class_name) + "(<.*>)?$"
     for field in gdb_type.fields():
         if field.is_base_class:
@@ -53,12 +128,124 @@ def get_base_class_offset(gdb_type, base_class_name):
                 return field_offset + offset
 
 
-def get_field_offset(gdb_type, name):
+def get_base_class_offset(gdb_type, base_class_name):
+    key = type_key(gdb_type)
+    return gdb_cache.get('base_class_offset', key and (key, base_class_name),
+                         lambda: _get_base_class_offset(gdb_type, base_class_name))
+
+
+def _get_field_offset(gdb_type, name):
     for field in gdb_type.fields():
         if field.name == name:
             return int(field.bitpos / 8)
 
 
+def get_field_offset(gdb_type, name):
+    key = type_key(gdb_type)
+    return gdb_cache.get('field_offset', key and (key, name), lambda: _get_field_offset(gdb_type, name))
+
+
+def _find_field(gdb_type, name):
+    """Find field `name` in the type or its base classes.
+
+    Also looks into anonymous unions and structs. Returns (bitpos, field),
+    where bitpos is relative to the start of gdb_type.
+    """
+    for field in gdb_type.fields():
+        if field.name == name:
+            return field.bitpos, field
+    for field in gdb_type.fields():
+        if field.is_base_class or field.name is None:
+            res = _find_field(field.type.strip_typedefs(), name)
+            if res is not None:
+                return field.bitpos + res[0], res[1]
+    return None
+
+
+class type_layout:
+    """Offsets, sizes and types of the (nested) fields of a type.
+
+    Computed once per type and field path and memoized in gdb_cache. Allows walking data structures by reading raw memory, instead
+    of navigating gdb.Value fields, which is very slow for large containers.
+
+    Example:
+        layout = type_layout.get(gdb.lookup_type('seastar::memory::page'))
+        layout.offset('link', '_next')
+    """
+    def __init__(self, gdb_type):
+        self.type = gdb_type.strip_typedefs()
+        self.sizeof = self.type.sizeof
+        self._fields = {}
+
+    @staticmethod
+    def get(gdb_type):
+        return gdb_cache.get('layout', type_key(gdb_type.strip_typedefs()), lambda: type_layout(gdb_type))
+
+    def field(self, *path):
+        """Return (bitpos, bitsize, type) of the field at path.
+
+        bitsize is 0 for fields which are not bit-fields.
+        """
+        try:
+            return self._fields[path]
+        except KeyError:
+            pass
+        t = self.type
+        bitpos = 0
+        field = None
+        for name in path:
+            direct_offset = get_field_offset(t, name)
+            if direct_offset is not None:
+                field = next(f for f in t.fields() if f.name == name)
+                bitpos += field.bitpos
+            else:
+                res = _find_field(t, name)
+                if res is None:
+                    raise gdb.error("There is no member named {} in {}".format(name, t))
+                bitpos += res[0]
+                field = res[1]
+            t = field.type.strip_typedefs()
+        self._fields[path] = (bitpos, field.bitsize, t)
+        return self._fields[path]
+
+    def offset(self, *path):
+        return self.field(*path)[0] // 8
+
+    def field_type(self, *path):
+        return self.field(*path)[2]
+
+    def get_bits(self, data, base, *path):
+        """Decode the (bit-)field at path from the object at offset base of the buffer."""
+        bitpos, bitsize, t = self.field(*path)
+        if not bitsize:
+            return int.from_bytes(data[base + bitpos // 8:base + bitpos // 8 + t.sizeof], 'little')
+        first_byte = bitpos // 8
+        last_byte = (bitpos + bitsize + 7) // 8
+        word = int.from_bytes(data[base + first_byte:base + last_byte], 'little')
+        return (word >> (bitpos % 8)) & ((1 << bitsize) - 1)
+
+    def read_bits(self, addr, *path):
+        """Read the (bit-)field at path of the object at addr"""
+        bitpos, bitsize, t = self.field(*path)
+        first_byte = bitpos // 8
+        size = (bitpos + bitsize + 7) // 8 - first_byte if bitsize else t.sizeof
+        return self.get_bits(read_memory(addr + first_byte, size), -first_byte, *path)
+
+
+def read_memory(addr, size):
+    """Read size bytes of inferior memory at addr"""
+    return bytes(gdb.selected_inferior().read_memory(addr, size))
+
+
+def read_pointer(addr):
+    return struct.unpack('<Q', read_memory(addr, 8))[0]
+
+
+def value_at(addr, gdb_type):
+    """Materialize the object of gdb_type at addr as a gdb.Value"""
+    return gdb.Value(addr).cast(gdb_type.pointer()).dereference()
+
+
 # Defer initialization to first use
 # Don't prevent loading `scylla-gdb.py` due to any problem in the init code.
 vtable_symbol_pattern = None
@@ -89,7 +276,7 @@ def downcast_vptr(ptr):
 
     m = _check_vptr(ptr)
 
-    actual_type = gdb.lookup_type(m.group(1))
+    actual_type = cached_lookup_type(m.group(1))
     actual_type_ptr = actual_type.pointer()
 
     if int(m.group(2)) == 16:
@@ -136,13 +323,20 @@ class intrusive_list:
                 self.link_offset = get_base_class_offset(self.node_type, "boost::intrusive::list_base_hook")
                 if self.link_offset is None:
                     raise Exception("Class does not extend list_base_hook: " + str(self.node_type))
+        self.link_offset = int(self.link_offset)
+
+    def addresses(self):
+        """Yield the address of each node, without materializing them"""
+        root = int(self.root.address)
+        next_offset = type_layout.get(self.root.type).offset('next_')
+        hook = read_pointer(root + next_offset)
+        while hook and hook != root:
+            yield hook - self.link_offset
+            hook = read_pointer(hook + next_offset)
 
     def __iter__(self):
-        hook = self.root['next_']
-        while hook and hook != self.root.address:
-            node_ptr = hook.cast(self.size_t) - self.link_offset
-            yield node_ptr.cast(self.node_type.pointer()).dereference()
-            hook = hook['next_']
+        for addr in self.addresses():
+            yield value_at(addr, self.node_type)
 
     def __nonzero__(self):
         return self.root['next_'] != self.root.address
@@ -173,13 +367,20 @@ class intrusive_slist:
                 self.link_offset = get_base_class_offset(self.node_type, "boost::intrusive::slist_base_hook")
                 if self.link_offset is None:
                     raise Exception("Class does not extend slist_base_hook: " + str(self.node_type))
+        self.link_offset = int(self.link_offset)
+
+    def addresses(self):
+        """Yield the address of each node, without materializing them"""
+        root = int(self.root.address)
+        next_offset = type_layout.get(self.root.type).offset('next_')
+        hook = read_pointer(root + next_offset)
+        while hook != root:
+            yield hook - self.link_offset
+            hook = read_pointer(hook + next_offset)
 
     def __iter__(self):
-        hook = self.root['next_']
-        while hook != self.root.address:
-            node_ptr = hook.cast(self.size_t) - self.link_offset
-            yield node_ptr.cast(self.node_type.pointer()).dereference()
-            hook = hook['next_']
+        for addr in self.addresses():
+            yield value_at(addr, self.node_type)
 
     def __nonzero__(self):
         return self.root['next_'] != self.root.address
@@ -247,22 +448,20 @@ class intrusive_set:
             if not member_hook:
                 raise Exception('Expected member_hook<> option not found in container\'s template parameters')
             self.link_offset = member_hook.template_argument(2).cast(self.size_t)
+        self.link_offset = int(self.link_offset)
         self.root = ref['holder']['root']['parent_']
 
-    def __visit(self, node):
-        if node:
-            for n in self.__visit(node['left_']):
-                yield n
-
-            node_ptr = node.cast(self.size_t) - self.link_offset
-            yield node_ptr.cast(self.node_type.pointer()).dereference()
-
-            for n in self.__visit(node['right_']):
-                yield n
+    def addresses(self):
+        """Yield the address of each node in order, without materializing them"""
+        layout = type_layout.get(self.root.type.target())
+        left_offset = layout.offset('left_')
+        right_offset = layout.offset('right_')
+        for hook in _walk_binary_tree(int(self.root), layout.sizeof, left_offset, right_offset):
+            yield hook - self.link_offset
 
     def __iter__(self):
-        for n in self.__visit(self.root):
-            yield n
+        for addr in self.addresses():
+            yield value_at(addr, self.node_type)
 
 
 class compact_radix_tree:
@@ -278,101 +477,160 @@ class compact_radix_tree:
         return 'compact radix tree @ 0x%x' % self.root
 
 
+def _walk_binary_tree(root, node_size, left_offset, right_offset):
+    """In-order walk of a binary tree, reading each node with a single memory read.
+
+    Yields the address of each node.
+    """
+    stack = []
+    node = root
+    while stack or node:
+        while node:
+            data = read_memory(node, node_size)
+            left, = struct.unpack_from('<Q', data, left_offset)
+            right, = struct.unpack_from('<Q', data, right_offset)
+            stack.append((node, right))
+            node = left
+        node, right = stack.pop()
+        yield node
+        node = right
+
+
 class intrusive_btree:
     def __init__(self, ref):
         container_type = ref.type.strip_typedefs()
         self.tree = ref
-        self.leaf_node_flag = gdb.parse_and_eval('intrusive_b::node_base::NODE_LEAF')
+        self.leaf_node_flag = cached_constant('intrusive_b::node_base::NODE_LEAF')
         self.key_type = container_type.template_argument(0)
 
-    def __visit_node_base(self, base, kids):
-        for i in range(0, base['num_keys']):
-            if kids:
-                for r in self.__visit_node(kids[i]):
-                    yield r
-
-            yield base['keys'][i].cast(self.key_type.pointer()).dereference()
-
-        if kids:
-            for r in self.__visit_node(kids[base['num_keys']]):
-                yield r
+        node_layout = type_layout.get(self.tree['_root'].type.target())
+        base_layout = type_layout.get(node_layout.field_type('_base'))
+        self._base_offset = node_layout.offset('_base')
+        self._kids_offset = node_layout.offset('_kids')
+        self._num_keys_offset = base_layout.offset('num_keys')
+        self._flags_offset = base_layout.offset('flags')
+        self._keys_offset = base_layout.offset('keys')
+        tree_layout = type_layout.get(container_type)
+        self._root_offset = tree_layout.offset('_root')
+        self._inline_offset = tree_layout.offset('_inline')
+
+    def _read_node_base(self, addr):
+        """Return (num_keys, flags, keys) of the node_base at addr"""
+        header = read_memory(addr, self._keys_offset)
+        num_keys, = struct.unpack_from('<H', header, self._num_keys_offset)
+        flags, = struct.unpack_from('<H', header, self._flags_offset)
+        keys = struct.unpack('<{}Q'.format(num_keys), read_memory(addr + self._keys_offset, num_keys * 8))
+        return num_keys, flags, keys
+
+    def _visit_node(self, addr):
+        num_keys, flags, keys = self._read_node_base(addr + self._base_offset)
+        if flags & self.leaf_node_flag:
+            yield from keys
+            return
+        kids = struct.unpack('<{}Q'.format(num_keys + 1), read_memory(addr + self._kids_offset, (num_keys + 1) * 8))
+        for i in range(num_keys):
+            yield from self._visit_node(kids[i])
+            yield keys[i]
+        yield from self._visit_node(kids[num_keys])
 
-    def __visit_node(self, node):
-        base = node['_base']
-        kids = node['_kids'] if not base['flags'] & self.leaf_node_flag else None
+    def addresses(self, tree_addr=None):
+        """Yield the address of each key in order, without materializing them
 
-        for r in self.__visit_node_base(base, kids):
-            yield r
+        Walks the tree at tree_addr if provided, allowing the offsets computed
+        for this instance to be reused for other trees of the same type.
+        """
+        if tree_addr is None:
+            tree_addr = int(self.tree.address)
+        root = read_pointer(tree_addr + self._root_offset)
+        if root:
+            yield from self._visit_node(root)
+        else:
+            yield from self._read_node_base(tree_addr + self._inline_offset)[2]
 
     def __iter__(self):
-        if self.tree['_root']:
-            for r in self.__visit_node(self.tree['_root']):
-                yield r
-        else:
-            for r in self.__visit_node_base(self.tree['_inline'], None):
-                yield r
+        for addr in self.addresses():
+            yield value_at(addr, self.key_type)
 
 
 class bplus_tree:
     def __init__(self, ref):
         self.tree = ref
-        self.leaf_node_flag = int(gdb.parse_and_eval(self.tree.type.name + "::node::NODE_LEAF"))
-        self.rightmost_leaf_flag = int(gdb.parse_and_eval(self.tree.type.name + "::node::NODE_RIGHTMOST"))
+        self.leaf_node_flag = cached_constant(self.tree.type.name + "::node::NODE_LEAF")
+        self.rightmost_leaf_flag = cached_constant(self.tree.type.name + "::node::NODE_RIGHTMOST")
+
+        node_layout = type_layout.get(self.tree['_left'].type.target())
+        self._node_size = node_layout.sizeof
+        self._num_keys_offset = node_layout.offset('_num_keys')
+        self._flags_offset = node_layout.offset('_flags')
+        self._kids_offset = node_layout.offset('_kids')
+        self._next_offset = node_layout.offset('__next')
+        kid_type = node_layout.field_type('_kids').target().strip_typedefs()
+        data_layout = type_layout.get(type_layout.get(kid_type).field_type('d').target())
+        self._value_offset = data_layout.offset('value')
+        self.value_type = data_layout.field_type('value')
 
     def __len__(self):
         i = 0
-        for _ in self:
+        for _ in self.addresses():
             i += 1
         return i
 
-    def __iter__(self):
-        node_p = self.tree['_left']
-        while node_p:
-            node = node_p.dereference()
-            if not node['_flags'] & self.leaf_node_flag:
+    def addresses(self):
+        """Yield the address of each value in order, without materializing them"""
+        node = int(self.tree['_left'])
+        while node:
+            data = read_memory(node, self._node_size)
+            num_keys, = struct.unpack_from('<H', data, self._num_keys_offset)
+            flags, = struct.unpack_from('<H', data, self._flags_offset)
+            if not flags & self.leaf_node_flag:
                 raise ValueError("Expected B+ leaf node")
 
-            for i in range(0, node['_num_keys']):
-                yield node['_kids'][i+1]['d'].dereference()['value']
+            for d in struct.unpack_from('<{}Q'.format(num_keys), data, self._kids_offset + 8):
+                yield d + self._value_offset
 
-            if node['_flags'] & self.rightmost_leaf_flag:
-                node_p = None
+            if flags & self.rightmost_leaf_flag:
+                node = None
             else:
-                node_p = node['__next']
+                node, = struct.unpack_from('<Q', data, self._next_offset)
+
+    def __iter__(self):
+        for addr in self.addresses():
+            yield value_at(addr, self.value_type)
 
 
 class double_decker:
     def __init__(self, ref):
         self.tree = ref['_tree']
-        self.leaf_node_flag = int(gdb.parse_and_eval(self.tree.type.name + "::node::NODE_LEAF"))
-        self.rightmost_leaf_flag = int(gdb.parse_and_eval(self.tree.type.name + "::node::NODE_RIGHTMOST"))
         self.max_conflicting_partitions = 128
 
-    def __iter__(self):
-        node_p = self.tree['_left']
-        while node_p:
-            node = node_p.dereference()
-            if not node['_flags'] & self.leaf_node_flag:
-                raise ValueError("Expected B+ leaf node")
-
-            for i in range(0, node['_num_keys']):
-                parts = node['_kids'][i+1]['d'].dereference()['value']
-                p = 0
-                while True:
-                    ce = parts['_data'][p]['object']
-                    if p == 0 and not ce['_flags']['_head']:
-                        raise ValueError("Expected head cache_entry")
-                    yield ce
-                    if ce['_flags']['_tail']:
-                        break
-                    if p >= self.max_conflicting_partitions:
-                        raise ValueError("Too many conflicting partitions")
-                    p += 1
+        self._tree = bplus_tree(self.tree)
+        parts_layout = type_layout.get(self._tree.value_type)
+        element_type = parts_layout.field_type('_data').target().strip_typedefs()
+        element_layout = type_layout.get(element_type)
+        self._data_offset = parts_layout.offset('_data')
+        self._element_size = element_type.sizeof
+        self._object_offset = element_layout.offset('object')
+        self.value_type = element_layout.field_type('object')
+        self._value_layout = type_layout.get(self.value_type)
+
+    def addresses(self):
+        """Yield the address of each entry in order, without materializing them"""
+        for parts in self._tree.addresses():
+            p = 0
+            while True:
+                ce = parts + self._data_offset + p * self._element_size + self._object_offset
+                if p == 0 and not self._value_layout.read_bits(ce, '_flags', '_head'):
+                    raise ValueError("Expected head cache_entry")
+                yield ce
+                if self._value_layout.read_bits(ce, '_flags', '_tail'):
+                    break
+                if p >= self.max_conflicting_partitions:
+                    raise ValueError("Too many conflicting partitions")
+                p += 1
 
-            if node['_flags'] & self.rightmost_leaf_flag:
-                node_p = None
-            else:
-                node_p = node['__next']
+    def __iter__(self):
+        for addr in self.addresses():
+            yield value_at(addr, self.value_type)
 
 
 class boost_variant:
@@ -429,24 +687,22 @@ class std_map:
         container_type = ref.type.strip_typedefs()
         kt = container_type.template_argument(0)
         vt = container_type.template_argument(1)
-        self.value_type = gdb.lookup_type('::std::pair<{} const, {} >'.format(str(kt), str(vt)))
+        self.value_type = cached_lookup_type('::std::pair<{} const, {} >'.format(str(kt), str(vt)))
         self.root = ref['_M_t']['_M_impl']['_M_header']['_M_parent']
         self.size = int(ref['_M_t']['_M_impl']['_M_node_count'])
 
-    def __visit(self, node):
-        if node:
-            for n in self.__visit(node['_M_left']):
-                yield n
-
-            value = (node + 1).cast(self.value_type.pointer()).dereference()
-            yield value['first'], value['second']
-
-            for n in self.__visit(node['_M_right']):
-                yield n
+    def addresses(self):
+        """Yield the address of each value (key-value pair) in order, without materializing them"""
+        layout = type_layout.get(self.root.type.target())
+        left_offset = layout.offset('_M_left')
+        right_offset = layout.offset('_M_right')
+        for node in _walk_binary_tree(int(self.root), layout.sizeof, left_offset, right_offset):
+            yield node + layout.sizeof
 
     def __iter__(self):
-        for n in self.__visit(self.root):
-            yield n
+        for addr in self.addresses():
+            value = value_at(addr, self.value_type)
+            yield value['first'], value['second']
 
     def __len__(self):
         return self.size
@@ -536,7 +792,7 @@ class std_unordered_map:
         self.ht = ref['_M_h']
         kt = ref.type.template_argument(0)
         vt = ref.type.template_argument(1)
-        value_type = gdb.lookup_type('::std::pair<{} const, {} >'.format(str(kt), str(vt)))
+        value_type = cached_lookup_type('::std::pair<{} const, {} >'.format(str(kt), str(vt)))
         _, node_type = lookup_type(['::std::__detail::_Hash_node<{}, {}>'.format(value_type.name, cache)
                                     for cache in ('false', 'true')])
         self.node_ptr_type = node_type.pointer()
@@ -563,7 +819,7 @@ class flat_hash_map:
     def __init__(self, ref):
         kt = ref.type.template_argument(0)
         vt = ref.type.template_argument(1)
-        slot_ptr_type = gdb.lookup_type('::std::pair<const {}, {} >'.format(str(kt), str(vt))).pointer()
+        slot_ptr_type = cached_lookup_type('::std::pair<const {}, {} >'.format(str(kt), str(vt))).pointer()
         self.slots = ref['slots_'].cast(slot_ptr_type)
         self.size = ref['size_']
 
@@ -678,7 +934,7 @@ class std_list:
 
     @staticmethod
     def _make_dereference_func(value_type):
-        list_node_type = gdb.lookup_type('std::_List_node<{}>'.format(str(value_type))).pointer()
+        list_node_type = cached_lookup_type('std::_List_node<{}>'.format(str(value_type))).pointer()
         def deref(node):
             list_node = node.cast(list_node_type)
             return list_node['_M_storage']['_M_storage'].cast(value_type.pointer()).dereference()
@@ -853,7 +1109,9 @@ class sstring_printer(gdb.printing.PrettyPrinter):
         if self.val['u']['internal']['size'] >= 0:
             array = self.val['u']['internal']['str']
             len = int(self.val['u']['internal']['size'])
-            return ''.join([chr(array[x]) for x in range(len)])
+            if array.address is None:
+                return ''.join([chr(array[x]) for x in range(len)])
+            return read_memory(int(array.address), len).decode('latin-1')
         else:
             return self.val['u']['external']['str']
 
@@ -882,18 +1140,21 @@ class managed_bytes_printer(gdb.printing.PrettyPrinter):
         self.val = val
 
     def pure_bytes(self):
-        inf = gdb.selected_inferior()
-        def to_bytes(data, size):
-            return bytes(inf.read_memory(data, size))
-
         if self.val['_u']['small']['size'] >= 0:
-            return to_bytes(self.val['_u']['small']['data'], int(self.val['_u']['small']['size']))
+            return read_memory(int(self.val['_u']['small']['data'].address), int(self.val['_u']['small']['size']))
         else:
-            ref = self.val['_u']['ptr']
+            # Walk the fragments via raw memory, offsets are computed once per blob_storage type.
+            ptr = self.val['_u']['ptr']['ptr']
+            layout = type_layout.get(ptr.type.target())
+            header_size = layout.offset('data')
+            next_offset = layout.offset('next', 'ptr')
             chunks = list()
-            while ref['ptr']:
-                chunks.append(to_bytes(ref['ptr']['data'], int(ref['ptr']['frag_size'])))
-                ref = ref['ptr']['next']
+            ptr = int(ptr)
+            while ptr:
+                header = read_memory(ptr, header_size)
+                frag_size = layout.get_bits(header, 0, 'frag_size')
+                chunks.append(read_memory(ptr + header_size, frag_size))
+                ptr, = struct.unpack_from('<Q', header, next_offset)
             return b''.join(chunks)
 
     def bytes_as_hex(self):
@@ -963,9 +1224,9 @@ class row_printer(gdb.printing.PrettyPrinter):
         self.val = val
 
     def __to_string_legacy(self):
-        if self.val['_type'] == gdb.parse_and_eval('row::storage_type::vector'):
+        if int(self.val['_type']) == cached_constant('row::storage_type::vector'):
             cells = str(self.val['_storage']['vector'])
-        elif self.val['_type'] == gdb.parse_and_eval('row::storage_type::set'):
+        elif int(self.val['_type']) == cached_constant('row::storage_type::set'):
             cells = '[%s]' % (', '.join(str(cell) for cell in intrusive_set(self.val['_storage']['set'])))
         else:
             raise Exception('Unsupported storage type: ' + self.val['_type'])
@@ -1147,7 +1408,7 @@ def for_each_table(db=None):
 def lookup_type(type_names):
     for type_name in type_names:
         try:
-            return (type_name, gdb.lookup_type(type_name))
+            return (type_name, cached_lookup_type(type_name))
         except gdb.error:
             continue
     raise gdb.error('none of the types found')
@@ -1199,6 +1460,34 @@ def addr_in_ranges(ranges, addr):
     return False
 
 
+def add_json_argument(parser):
+    """Add the common `--json FILE` argument to a command's argument parser."""
+    parser.add_argument("--json", action="store", type=str, metavar="FILE", default=None,
+            help="Write the collected data as JSON to FILE, instead of printing it.")
+
+
+def write_json(file_name, data):
+    """Write the data collected by a command to file_name as JSON.
+
+    The data is expected to be composed of dicts, lists and scalars. Any
+    gdb.Value found in it is converted to an int if possible, otherwise to
+    its string representation.
+    """
+    def convert(obj):
+        if isinstance(obj, gdb.Value):
+            try:
+                return int(obj)
+            except gdb.error:
+                return str(obj)
+        if isinstance(obj, set):
+            return list(obj)
+        return str(obj)
+
+    with open(file_name, 'w') as f:
+        json.dump(data, f, indent=4, default=convert)
+    gdb.write('Wrote {}\n'.format(file_name))
+
+
 class histogram:
     """Simple histogram.
 
@@ -1269,6 +1558,9 @@ class histogram:
     def add(self, item):
         self._counts[item] += 1
 
+    def items(self):
+        return self._counts.items()
+
     def __str__(self):
         if not self._counts:
             return ''
@@ -1312,6 +1604,111 @@ class histogram:
         gdb.write(str(self) + '\n')
 
 
+class sample_estimator:
+    """Estimate per-item totals from a simple random sample.
+
+    The population consists of `population_size` units (e.g. pages), out of
+    which a uniform random sample is drawn (without replacement). Each sampled
+    unit contributes a count for zero or more items. The total of an item is
+    estimated as the mean count per unit, multiplied by the population size.
+    The confidence interval uses the normal approximation, with the finite
+    population correction.
+
+    Example:
+
+        e = sample_estimator(population_size=1000)
+        e.add_unit({'item1': 3, 'item2': 1})
+        e.add_unit({}) # a sampled unit with no items
+        estimate, half_width = e.estimate('item1')
+    """
+    def __init__(self, population_size, confidence=0.95):
+        self._population_size = population_size
+        self._z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        self._units = 0
+        self._sums = defaultdict(int)
+        self._sums_of_squares = defaultdict(int)
+
+    @property
+    def units(self):
+        return self._units
+
+    def add_unit(self, counts):
+        self._units += 1
+        for item, count in counts.items():
+            self._sums[item] += count
+            self._sums_of_squares[item] += count * count
+
+    def estimate(self, item):
+        """Return the estimated total of the item and the half-width of its confidence interval."""
+        n = self._units
+        N = self._population_size
+        if n == 0:
+            return 0, 0
+        mean = self._sums[item] / n
+        if n == 1 or n >= N:
+            return mean * N, 0
+        variance = max(0, (self._sums_of_squares[item] - n * mean * mean) / (n - 1))
+        return mean * N, self._z * N * math.sqrt((1 - n / N) * variance / n)
+
+    def items(self):
+        """Return (item, estimate, half-width) for all items, in descending estimate order."""
+        results = [(item,) + self.estimate(item) for item in self._sums.keys()]
+        return sorted(results, key=lambda x: x[1], reverse=True)
+
+    def converged(self, precision, limit=None):
+        """Check whether the top `limit` items have a relative half-width of at most `precision`."""
+        top = self.items()[:limit]
+        return bool(top) and all(estimate > 0 and half_width <= precision * estimate for _, estimate, half_width in top)
+
+    def print_to_console(self, formatter=str, limit=None):
+        for item, estimate, half_width in self.items()[:limit]:
+            gdb.write('{:9d} +/- {:<9d} {}\n'.format(int(estimate), int(half_width), formatter(item)))
+
+
+def random_small_pages(nr_samples, object_size=0):
+    """Sample pages of the seastar allocator uniformly at random.
+
+    Yields (span_page, objects) for each sampled page, where span_page is the
+    seastar::memory::page of the first page of the small span the sampled page
+    belongs to and objects is a range with the address of the small objects
+    starting in the sampled page. Pages which do not belong to a small span (or
+    a small span of a different object size, if `object_size` is set) yield
+    (None, []), they still have to be accounted for by estimators.
+
+    Works from the page metadata alone, so it doesn't need to walk the spans,
+    but since interior pages of large and free spans may contain stale
+    metadata, a page is considered only when it is consistent with the
+    alleged first page of its span.
+    """
+    cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
+    page_size = cached_constant('\'seastar::memory::page_size\'')
+    mem_start = int(cpu_mem['memory'])
+    pages = cpu_mem['pages']
+    nr_pages = int(cpu_mem['nr_pages'])
+
+    for idx in random.sample(range(1, nr_pages), min(nr_samples, nr_pages - 1)):
+        page = pages[idx]
+        pool = page['pool']
+        if not pool or page['free']:
+            yield None, []
+            continue
+        offset_in_span = int(page['offset_in_span'])
+        span_page = pages[idx - offset_in_span]
+        if (span_page['pool'] != pool or span_page['free'] or int(span_page['offset_in_span']) != 0
+                or int(span_page['span_size']) <= offset_in_span):
+            yield None, []
+            continue
+        objsize = int(pool.dereference()['_object_size'])
+        if object_size and objsize != object_size:
+            yield None, []
+            continue
+        span_start = mem_start + (idx - offset_in_span) * page_size
+        page_start = mem_start + idx * page_size
+        first = span_start + (page_start - span_start + objsize - 1) // objsize * objsize
+        span_end = span_start + int(span_page['span_size']) * page_size
+        yield span_page, range(first, min(page_start + page_size, span_end - objsize + 1), objsize)
+
+
 class task_symbol_matcher:
     def __init__(self):
         self._coro_pattern = re.compile(r'\)( \[clone \.\w+\])?$')
@@ -1452,6 +1849,19 @@ class scylla_task_histogram(gdb.Command):
      (1): Number of objects of this type.
      (2): The address of the class's vtable.
      (3): The name of the class's vtable symbol.
+
+    With `--estimate`, pages are sampled uniformly at random instead and the
+    histogram shows the estimated total number of objects of each type in the
+    shard, with a confidence interval. Up to `--samples` pages are sampled,
+    sampling stops earlier once the estimates of the shown items are precise
+    enough (see `--precision`). This gives a quick answer for large shards,
+    where an exhaustive scan would take too long.
+
+    Example:
+        (gdb) scylla task_histogram --estimate -m 5000 -c 3
+        Sampled 1200 out of 26214400 pages (0.00%), 95% confidence intervals
+           4530176 +/- 201325    0x4bc5878 vtable for seastar::file_data_source_impl + 16
+           ...
     """
     def __init__(self):
         gdb.Command.__init__(self, 'scylla task_histogram', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
@@ -1471,6 +1881,14 @@ class scylla_task_histogram(gdb.Command):
                 help="Include only task objects in the histogram, reduces noise but might exclude items due to inexact filtering.")
         parser.add_argument("-g", "--scheduling-groups", action="store_true",
                 help="Histogram is made from the scheduling groups of the sampled task objects. Implies -f.")
+        parser.add_argument("-e", "--estimate", action="store_true",
+                help="Sample random pages and estimate the total number of objects, with confidence intervals."
+                " The number of sampled pages is at most `--samples`.")
+        parser.add_argument("--confidence", action="store", type=float, default=0.95,
+                help="Confidence level of the intervals, used with `--estimate`. Defaults to 0.95.")
+        parser.add_argument("--precision", action="store", type=float, default=0.1,
+                help="Stop sampling once the confidence interval of each shown item is within PRECISION of its estimate"
+                " (relative half-width). Used with `--estimate`. Defaults to 0.1. Set to 0 to disable early stopping.")
 
         try:
             args = parser.parse_args(arg.split())
@@ -1479,7 +1897,7 @@ class scylla_task_histogram(gdb.Command):
 
         size = args.size
         cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-        page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+        page_size = cached_constant('\'seastar::memory::page_size\'')
         mem_start = cpu_mem['memory']
 
         vptr_type = gdb.lookup_type('uintptr_t').pointer()
@@ -1488,9 +1906,7 @@ class scylla_task_histogram(gdb.Command):
         sg_offset = int(task_fields['_sg'].bitpos / 8)
         sg_ptr = gdb.lookup_type('unsigned').pointer()
 
-        pages = cpu_mem['pages']
         nr_pages = int(cpu_mem['nr_pages'])
-        page_samples = range(0, nr_pages) if args.all else random.sample(range(0, nr_pages), nr_pages)
 
         text_ranges = get_text_ranges()
 
@@ -1503,9 +1919,56 @@ class scylla_task_histogram(gdb.Command):
                 return "0x{:x} {}".format(o, resolve(o))
 
         limit = None if args.all or args.count == 0 else args.count
-        h = histogram(print_indicators=False, formatter=formatter, limit=limit)
         symbol_matcher = task_symbol_matcher()
 
+        def classify(obj_addr):
+            """Return the histogram key of the object, or None if it is not of interest."""
+            addr = int(gdb.Value(obj_addr).reinterpret_cast(vptr_type).dereference())
+            if not addr_in_ranges(text_ranges, addr):
+                return None
+            if args.filter_tasks:
+                sym = resolve(addr)
+                if not sym or not symbol_matcher(sym):
+                    return None # we only want tasks
+            if args.scheduling_groups:
+                # This is a dirty trick to make this reasonably fast even with 100K+ or 1M+ objects
+                # We have two good choices here:
+                # 1) gdb.Value(obj_addr).reinterpret_cast(task_type).dereference()['_sg']['_id']
+                #    This prints tons of warning about missing RTTI symbols
+                #    and is quite slow.
+                # 2) gdb.parse_and_eval("(seastar::task*)0x{:x}".format(obj_addr))
+                #    Works well but is horrendously slow: one type lookup per
+                #    obj + parsing is too much apparently.
+                #
+                # So we bypass casting to seastar::task* and use the known
+                # offset of the _id field instead directly.
+                key = int(gdb.Value(obj_addr + sg_offset).reinterpret_cast(sg_ptr).dereference())
+                # Task matching is not exact, we'll have some non-task
+                # objects here, with invalid sg derived, ignore these.
+                if key not in scheduling_group_names:
+                    return None
+                return key
+            return addr
+
+        if args.estimate:
+            estimator = sample_estimator(nr_pages, args.confidence)
+            for _, objects in random_small_pages(args.samples or nr_pages, size):
+                counts = defaultdict(int)
+                for obj_addr in objects:
+                    key = classify(obj_addr)
+                    if key is not None:
+                        counts[key] += 1
+                estimator.add_unit(counts)
+                if args.precision and estimator.units % 100 == 0 and estimator.converged(args.precision, limit):
+                    break
+            gdb.write('Sampled {} out of {} pages ({:.2f}%), {:.0f}% confidence intervals\n'.format(
+                estimator.units, nr_pages, estimator.units * 100 / nr_pages, args.confidence * 100))
+            estimator.print_to_console(formatter=formatter, limit=limit)
+            return
+
+        page_samples = range(0, nr_pages) if args.all else random.sample(range(0, nr_pages), nr_pages)
+        h = histogram(print_indicators=False, formatter=formatter, limit=limit)
+
         sc = span_checker()
         vptr_count = defaultdict(int)
         scanned_pages = 0
@@ -1520,34 +1983,9 @@ class scylla_task_histogram(gdb.Command):
             objsize = size if size != 0 else int(pool.dereference()['_object_size'])
             span_size = span.used_span_size() * page_size
             for idx2 in range(0, int(span_size / objsize)):
-                obj_addr = span.start + idx2 * objsize
-                addr = int(gdb.Value(obj_addr).reinterpret_cast(vptr_type).dereference())
-                if not addr_in_ranges(text_ranges, addr):
-                    continue
-                if args.filter_tasks:
-                    sym = resolve(addr)
-                    if not sym or not symbol_matcher(sym):
-                        continue # we only want tasks
-                if args.scheduling_groups:
-                    # This is a dirty trick to make this reasonably fast even with 100K+ or 1M+ objects
-                    # We have two good choices here:
-                    # 1) gdb.Value(obj_addr).reinterpret_cast(task_type).dereference()['_sg']['_id']
-                    #    This prints tons of warning about missing RTTI symbols
-                    #    and is quite slow.
-                    # 2) gdb.parse_and_eval("(seastar::task*)0x{:x}".format(obj_addr))
-                    #    Works well but is horrendously slow: one type lookup per
-                    #    obj + parsing is too much apparently.
-                    #
-                    # So we bypass casting to seastar::task* and use the known
-                    # offset of the _id field instead directly.
-                    key = int(gdb.Value(obj_addr + sg_offset).reinterpret_cast(sg_ptr).dereference())
-                    # Task matching is not exact, we'll have some non-task
-                    # objects here, with invalid sg derived, ignore these.
-                    if key not in scheduling_group_names:
-                        continue
-                else:
-                    key = addr
-                h[key] += 1
+                key = classify(span.start + idx2 * objsize)
+                if key is not None:
+                    h[key] += 1
             if args.all or args.samples == 0:
                 continue
             if scanned_pages >= args.samples or len(vptr_count) >= args.samples:
@@ -1558,7 +1996,7 @@ class scylla_task_histogram(gdb.Command):
 
 def find_vptrs():
     cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-    page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+    page_size = cached_constant('\'seastar::memory::page_size\'')
     mem_start = cpu_mem['memory']
     vptr_type = gdb.lookup_type('uintptr_t').pointer()
     pages = cpu_mem['pages']
@@ -1647,7 +2085,7 @@ def find_active_sstables():
 
 class schema_ptr:
     def __init__(self, ptr):
-        schema_ptr_type = gdb.lookup_type('schema').pointer()
+        schema_ptr_type = cached_lookup_type('schema').pointer()
         self.ptr = ptr['_p'].reinterpret_cast(schema_ptr_type)
 
     @property
@@ -1751,9 +2189,9 @@ class seastar_lw_shared_ptr():
 
     def _no_esft_type(self):
         try:
-            return gdb.lookup_type('seastar::lw_shared_ptr_no_esft<%s>' % remove_prefix(str(self.elem_type.unqualified()), 'class ')).pointer()
+            return cached_lookup_type('seastar::lw_shared_ptr_no_esft<%s>' % remove_prefix(str(self.elem_type.unqualified()), 'class ')).pointer()
         except:
-            return gdb.lookup_type('seastar::shared_ptr_no_esft<%s>' % remove_prefix(str(self.elem_type.unqualified()), 'class ')).pointer()
+            return cached_lookup_type('seastar::shared_ptr_no_esft<%s>' % remove_prefix(str(self.elem_type.unqualified()), 'class ')).pointer()
 
     def get(self):
         if has_enable_lw_shared_from_this(self.elem_type):
@@ -1771,7 +2209,7 @@ def all_tables(db):
 
 class lsa_region():
     def __init__(self, region):
-        impl_ptr_type = gdb.lookup_type('logalloc::region_impl').pointer()
+        impl_ptr_type = cached_lookup_type('logalloc::region_impl').pointer()
         self.region = seastar_shared_ptr(region['_impl']).get().cast(impl_ptr_type)
         self.segment_size = int(gdb.parse_and_eval('\'logalloc::segment::size\''))
 
@@ -1881,7 +2319,7 @@ class span(object):
 
 def spans():
     cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-    page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+    page_size = cached_constant('\'seastar::memory::page_size\'')
     nr_pages = int(cpu_mem['nr_pages'])
     pages = cpu_mem['pages']
     mem_start = int(cpu_mem['memory'])
@@ -1900,7 +2338,7 @@ def spans():
 
 class span_checker(object):
     def __init__(self):
-        self._page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+        self._page_size = cached_constant('\'seastar::memory::page_size\'')
         span_list = list(spans())
         self._start_to_span = dict((s.start, s) for s in span_list)
         self._starts = list(s.start for s in span_list)
@@ -1919,6 +2357,41 @@ class span_checker(object):
         return s
 
 
+class gdb_memory_reader(scylla_memory_analysis.memory_reader):
+    """memory_reader backed by the inferior (live process or core) of gdb"""
+
+    def read(self, addr, size):
+        try:
+            return gdb.selected_inferior().read_memory(addr, size)
+        except gdb.MemoryError as e:
+            raise scylla_memory_analysis.memory_read_error(str(e))
+
+    def threads(self):
+        orig = gdb.selected_thread()
+        try:
+            results = []
+            for thread in gdb.selected_inferior().threads():
+                thread.switch()
+                results.append((thread.ptid[1], int(gdb.parse_and_eval('$fs_base'))))
+            return results
+        finally:
+            orig.switch()
+
+
+def memory_analysis_layout():
+    """The layout of the types read by scylla_memory_analysis, see `scylla memory-layout`.
+
+    It only depends on the debug-info, so it is collected once per binary.
+    """
+    return gdb_cache.get('memory_layout', gdb.current_progspace().filename, scylla_memory_layout.collect)
+
+
+def shard_memory_analyzer():
+    """The scylla_memory_analysis.shard_analyzer of the current shard"""
+    return scylla_memory_analysis.shard_analyzer(gdb_memory_reader(), memory_analysis_layout(),
+            gdb.selected_thread().ptid[1], int(gdb.parse_and_eval('$fs_base')))
+
+
 class scylla_memory(gdb.Command):
     """Summarize the state of the shard's memory.
 
@@ -1992,10 +2465,10 @@ class scylla_memory(gdb.Command):
         return sp['_global_stats'], per_sg_stats
 
     @staticmethod
-    def print_coordinator_stats():
+    def collect_coordinator_stats():
         sp = sharded(gdb.parse_and_eval('service::_the_storage_proxy')).local()
         if not sp:
-            return
+            return None
         global_sp_stats, per_sg_sp_stats = scylla_memory.summarize_storage_proxy_coordinator_stats(sp)
 
         try:
@@ -2005,20 +2478,43 @@ class scylla_memory(gdb.Command):
             hm = sp['_hints_manager']
         view_hm = sp['_hints_for_views_manager']
 
+        scheduling_groups = []
+        for sg_tq, stats in per_sg_sp_stats.items():
+            scheduling_groups.append({
+                'id': None if sg_tq is None else int(sg_tq['_id']),
+                'name': None if sg_tq is None else str(sg_tq['_name']),
+                'fg_writes': int(stats['writes']) - int(stats['background_writes']),
+                'bg_writes': int(stats['background_writes']),
+                'fg_reads': int(stats['foreground_reads']),
+                'bg_reads': int(stats['reads']) - int(stats['foreground_reads']),
+            })
+
+        return {
+            'bg_write_bytes': int(global_sp_stats['background_write_bytes']),
+            'hints': int(hm['_stats']['size_of_hints_in_progress']),
+            'view_hints': int(view_hm['_stats']['size_of_hints_in_progress']),
+            'scheduling_groups': scheduling_groups,
+        }
+
+    @staticmethod
+    def print_coordinator_stats(coordinator):
+        if not coordinator:
+            return
+
         gdb.write('Coordinator:\n'
                 '  bg write bytes: {bg_wr_bytes:>13} B\n'
                 '  hints:          {regular:>13} B\n'
                 '  view hints:     {views:>13} B\n'
                 .format(
-                        bg_wr_bytes=int(global_sp_stats['background_write_bytes']),
-                        regular=int(hm['_stats']['size_of_hints_in_progress']),
-                        views=int(view_hm['_stats']['size_of_hints_in_progress'])))
+                        bg_wr_bytes=coordinator['bg_write_bytes'],
+                        regular=coordinator['hints'],
+                        views=coordinator['view_hints']))
 
-        for sg_tq, stats in per_sg_sp_stats.items():
-            if sg_tq is None:
+        for sg in coordinator['scheduling_groups']:
+            if sg['id'] is None:
                 sg_header = ''
             else:
-                sg_header = '  {sg_id:02} {sg_name}\n'.format(sg_id=int(sg_tq['_id']), sg_name=str(sg_tq['_name']))
+                sg_header = '  {sg_id:02} {sg_name}\n'.format(sg_id=sg['id'], sg_name=sg['name'])
 
             gdb.write(
                     '{sg_header}'
@@ -2028,46 +2524,48 @@ class scylla_memory(gdb.Command):
                     '    bg reads:   {bg_rd:>13}\n'
                     .format(
                         sg_header=sg_header,
-                        fg_wr=int(stats['writes']) - int(stats['background_writes']),
-                        bg_wr=int(stats['background_writes']),
-                        fg_rd=int(stats['foreground_reads']),
-                        bg_rd=int(stats['reads']) - int(stats['foreground_reads'])))
+                        fg_wr=sg['fg_writes'],
+                        bg_wr=sg['bg_writes'],
+                        fg_rd=sg['fg_reads'],
+                        bg_rd=sg['bg_reads']))
 
         gdb.write('\n')
 
     @staticmethod
-    def format_semaphore_stats(semaphore):
-        semaphore_name = "{}:".format(str(semaphore['_name'])[1:-1].split("_")[1])
+    def collect_semaphore_stats(semaphore):
         initial_count = int(semaphore["_initial_resources"]["count"])
         initial_memory = int(semaphore["_initial_resources"]["memory"])
-        used_count = initial_count - int(semaphore["_resources"]["count"])
-        used_memory = initial_memory - int(semaphore["_resources"]["memory"])
         try:
             waiters = int(semaphore["_wait_list"]["_admission_queue"]["_size"])
         except gdb.error: # 5.1 compatibility
             waiters = int(semaphore["_wait_list"]["_size"])
-        return f'{semaphore_name:<16} {used_count:>3}/{initial_count:>3}, {used_memory:>13}/{initial_memory:>13}, queued: {waiters}'
+        return {
+            'name': str(semaphore['_name'])[1:-1].split("_")[1],
+            'used_count': initial_count - int(semaphore["_resources"]["count"]),
+            'initial_count': initial_count,
+            'used_memory': initial_memory - int(semaphore["_resources"]["memory"]),
+            'initial_memory': initial_memory,
+            'waiters': waiters,
+        }
 
     @staticmethod
-    def print_replica_stats():
+    def format_semaphore_stats(stats):
+        semaphore_name = "{}:".format(stats['name'])
+        return '{:<16} {:>3}/{:>3}, {:>13}/{:>13}, queued: {}'.format(semaphore_name, stats['used_count'], stats['initial_count'],
+                stats['used_memory'], stats['initial_memory'], stats['waiters'])
+
+    @staticmethod
+    def collect_replica_stats():
         db = find_db()
         if not db:
-            return
+            return None
 
-        database_typename = lookup_type(['replica::database', 'database'])[1].name
-        gdb.write('Replica:\n')
-        gdb.write('  Read Concurrency Semaphores:\n    {}\n    {}\n    {}\n'.format(
-                scylla_memory.format_semaphore_stats(db['_read_concurrency_sem']),
-                scylla_memory.format_semaphore_stats(db['_streaming_concurrency_sem']),
-                scylla_memory.format_semaphore_stats(db['_system_read_concurrency_sem'])))
+        semaphores = [scylla_memory.collect_semaphore_stats(db[name])
+                for name in ['_read_concurrency_sem', '_streaming_concurrency_sem', '_system_read_concurrency_sem']]
 
-        gdb.write('  Execution Stages:\n')
+        execution_stages = []
         for es_path in [('_apply_stage',)]:
             machine_name = es_path[0]
-            human_name = machine_name.replace('_', ' ').strip()
-            total = 0
-
-            gdb.write('    {}:\n'.format(human_name))
             es = db
             for path_component in es_path:
                 try:
@@ -2075,55 +2573,115 @@ class scylla_memory(gdb.Command):
                 except gdb.error:
                     break
 
-            for sg_id, sg_name, count in scylla_memory.summarize_inheriting_execution_stage(es):
-                total += count
-                gdb.write('      {:02} {:32} {}\n'.format(sg_id, sg_name, count))
-            gdb.write('         {:32} {}\n'.format('Total', total))
+            scheduling_groups = [{'id': sg_id, 'name': sg_name, 'count': count}
+                    for sg_id, sg_name, count in scylla_memory.summarize_inheriting_execution_stage(es)]
+            execution_stages.append({
+                'name': machine_name.replace('_', ' ').strip(),
+                'scheduling_groups': scheduling_groups,
+                'total': sum(sg['count'] for sg in scheduling_groups),
+            })
 
-        gdb.write('  Tables - Ongoing Operations:\n')
+        phased_barriers = []
         for machine_name in ['_pending_writes_phaser', '_pending_reads_phaser', '_pending_streams_phaser']:
-            human_name = machine_name.replace('_', ' ').strip()
-            gdb.write('    {} (top 10):\n'.format(human_name))
-            total = 0
-            i = 0
-            for count, tables in scylla_memory.summarize_table_phased_barrier_users(db, machine_name):
-                total += count
-                if i < 10:
-                    gdb.write('      {:9} {}\n'.format(count, ', '.join(tables)))
-                i += 1
-            gdb.write('      {:9} Total (all)\n'.format(total))
+            users = [{'count': count, 'tables': tables}
+                    for count, tables in scylla_memory.summarize_table_phased_barrier_users(db, machine_name)]
+            phased_barriers.append({
+                'name': machine_name.replace('_', ' ').strip(),
+                'users': users,
+                'total': sum(u['count'] for u in users),
+            })
+
+        return {
+            'semaphores': semaphores,
+            'execution_stages': execution_stages,
+            'phased_barriers': phased_barriers,
+        }
+
+    @staticmethod
+    def print_replica_stats(replica):
+        if not replica:
+            return
+
+        gdb.write('Replica:\n')
+        gdb.write('  Read Concurrency Semaphores:\n')
+        for semaphore in replica['semaphores']:
+            gdb.write('    {}\n'.format(scylla_memory.format_semaphore_stats(semaphore)))
+
+        gdb.write('  Execution Stages:\n')
+        for stage in replica['execution_stages']:
+            gdb.write('    {}:\n'.format(stage['name']))
+            for sg in stage['scheduling_groups']:
+                gdb.write('      {:02} {:32} {}\n'.format(sg['id'], sg['name'], sg['count']))
+            gdb.write('         {:32} {}\n'.format('Total', stage['total']))
+
+        gdb.write('  Tables - Ongoing Operations:\n')
+        for barrier in replica['phased_barriers']:
+            gdb.write('    {} (top 10):\n'.format(barrier['name']))
+            for user in barrier['users'][:10]:
+                gdb.write('      {:9} {}\n'.format(user['count'], ', '.join(user['tables'])))
+            gdb.write('      {:9} Total (all)\n'.format(barrier['total']))
         gdb.write('\n')
 
     def invoke(self, arg, from_tty):
-        cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-        page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
-        free_mem = int(cpu_mem['nr_free_pages']) * page_size
-        total_mem = int(cpu_mem['nr_pages']) * page_size
-        gdb.write('Used memory: {used_mem:>13}\nFree memory: {free_mem:>13}\nTotal memory: {total_mem:>12}\n\n'
-                  .format(used_mem=total_mem - free_mem, free_mem=free_mem, total_mem=total_mem))
+        parser = argparse.ArgumentParser(description="scylla memory")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
 
-        lsa = get_lsa_segment_pool()
-        segment_size = int(gdb.parse_and_eval('\'logalloc::segment::size\''))
-        lsa_free = int(lsa['_free_segments']) * segment_size
-        non_lsa_mem = int(lsa['_non_lsa_memory_in_use'])
-        lsa_used = int(lsa['_segments_in_use']) * segment_size + non_lsa_mem
-        lsa_allocated = lsa_used + lsa_free
+        analyzer = shard_memory_analyzer()
+        lsa = analyzer.lsa_summary()
+        lsa_allocated = lsa['allocated']
+
+        db = find_db()
+        cache_region = lsa_region(db['_row_cache_tracker']['_region'])
+
+        data = {
+            'memory': analyzer.memory_summary(),
+            'lsa': lsa,
+            'cache': {
+                'total': cache_region.total(),
+                'used': cache_region.used(),
+                'free': cache_region.free(),
+            },
+            'memtables': {
+                'total': lsa_allocated - cache_region.total(),
+                'regular': {
+                    'real_dirty': dirty_mem_mgr(db['_dirty_memory_manager']).real_dirty(),
+                    'unspooled': dirty_mem_mgr(db['_dirty_memory_manager']).unspooled(),
+                },
+                'system': {
+                    'real_dirty': dirty_mem_mgr(db['_system_dirty_memory_manager']).real_dirty(),
+                    'unspooled': dirty_mem_mgr(db['_system_dirty_memory_manager']).unspooled(),
+                },
+            },
+            'coordinator': scylla_memory.collect_coordinator_stats(),
+            'replica': scylla_memory.collect_replica_stats(),
+            'small_pools': analyzer.small_pools(),
+            'page_spans': analyzer.page_spans(),
+        }
+
+        if args.json:
+            write_json(args.json, data)
+            return
+
+        gdb.write('Used memory: {used_mem:>13}\nFree memory: {free_mem:>13}\nTotal memory: {total_mem:>12}\n\n'
+                  .format(used_mem=data['memory']['used'], free_mem=data['memory']['free'], total_mem=data['memory']['total']))
 
         gdb.write('LSA:\n'
                   '  allocated: {lsa:>13}\n'
                   '  used:      {lsa_used:>13}\n'
                   '  free:      {lsa_free:>13}\n\n'
-                  .format(lsa=lsa_allocated, lsa_used=lsa_used, lsa_free=lsa_free))
-
-        db = find_db()
-        cache_region = lsa_region(db['_row_cache_tracker']['_region'])
+                  .format(lsa=lsa_allocated, lsa_used=lsa['used'], lsa_free=lsa['free']))
 
         gdb.write('Cache:\n'
                   '  total:     {cache_total:>13}\n'
                   '  used:      {cache_used:>13}\n'
                   '  free:      {cache_free:>13}\n\n'
-                  .format(cache_total=cache_region.total(), cache_used=cache_region.used(), cache_free=cache_region.free()))
+                  .format(cache_total=data['cache']['total'], cache_used=data['cache']['used'], cache_free=data['cache']['free']))
 
+        memtables = data['memtables']
         gdb.write('Memtables:\n'
                   ' total:       {total:>13}\n'
                   ' Regular:\n'
@@ -2132,74 +2690,36 @@ class scylla_memory(gdb.Command):
                   ' System:\n'
                   '  real dirty: {sys_real_dirty:>13}\n'
                   '  unspooled:  {sys_unspooled:>13}\n\n'
-                  .format(total=(lsa_allocated-cache_region.total()),
-                          reg_real_dirty=dirty_mem_mgr(db['_dirty_memory_manager']).real_dirty(),
-                          reg_unspooled=dirty_mem_mgr(db['_dirty_memory_manager']).unspooled(),
-                          sys_real_dirty=dirty_mem_mgr(db['_system_dirty_memory_manager']).real_dirty(),
-                          sys_unspooled=dirty_mem_mgr(db['_system_dirty_memory_manager']).unspooled()))
+                  .format(total=memtables['total'],
+                          reg_real_dirty=memtables['regular']['real_dirty'],
+                          reg_unspooled=memtables['regular']['unspooled'],
+                          sys_real_dirty=memtables['system']['real_dirty'],
+                          sys_unspooled=memtables['system']['unspooled']))
 
-        scylla_memory.print_coordinator_stats()
-        scylla_memory.print_replica_stats()
+        scylla_memory.print_coordinator_stats(data['coordinator'])
+        scylla_memory.print_replica_stats(data['replica'])
 
         gdb.write('Small pools:\n')
-        small_pools = cpu_mem['small_pools']
-        nr = small_pools['nr_small_pools']
         gdb.write('{objsize:>5} {span_size:>6} {use_count:>10} {memory:>12} {unused:>12} {wasted_percent:>5}\n'
                   .format(objsize='objsz', span_size='spansz', use_count='usedobj', memory='memory',
                           unused='unused', wasted_percent='wst%'))
         total_small_bytes = 0
-        sc = span_checker()
-        free_object_size = gdb.parse_and_eval('sizeof(\'seastar::memory::free_object\')')
-        for i in range(int(nr)):
-            sp = small_pools['_u']['a'][i]
-            object_size = int(sp['_object_size'])
-            # Skip pools that are smaller than sizeof(free_object), they won't have any content
-            if object_size < free_object_size:
-                continue
-            span_size = int(sp['_span_sizes']['preferred']) * page_size
-            free_count = int(sp['_free_count'])
-            pages_in_use = 0
-            use_count = 0
-            for s in sc.spans():
-                if not s.is_free() and s.pool() == sp.address:
-                    pages_in_use += s.size()
-                    use_count += int(s.used_span_size() * page_size / object_size)
-            memory = pages_in_use * page_size
-            total_small_bytes += memory
-            use_count -= free_count
-            wasted = free_count * object_size
-            unused = memory - use_count * object_size
-            wasted_percent = wasted * 100.0 / memory if memory else 0
+        for sp in data['small_pools']:
+            total_small_bytes += sp['memory']
             gdb.write('{objsize:5} {span_size:6} {use_count:10} {memory:12} {unused:12} {wasted_percent:5.1f}\n'
-                      .format(objsize=object_size, span_size=span_size, use_count=use_count, memory=memory, unused=unused,
-                              wasted_percent=wasted_percent))
+                      .format(objsize=sp['object_size'], span_size=sp['span_size'], use_count=sp['use_count'], memory=sp['memory'],
+                              unused=sp['unused'], wasted_percent=sp['wasted_percent']))
         gdb.write('Small allocations: %d [B]\n' % total_small_bytes)
 
-        large_allocs = defaultdict(int) # key: span size [B], value: span count
-        for s in sc.spans():
-            span_size = s.size()
-            if s.is_large():
-                large_allocs[span_size * page_size] += 1
-
         gdb.write('Page spans:\n')
         gdb.write('{index:5} {size:>13} {total:>13} {allocated_size:>13} {allocated_count:>7}\n'.format(
             index="index", size="size [B]", total="free [B]", allocated_size="large [B]", allocated_count="[spans]"))
         total_large_bytes = 0
-        for index in range(int(cpu_mem['nr_span_lists'])):
-            span_list = cpu_mem['free_spans'][index]
-            front = int(span_list['_front'])
-            pages = cpu_mem['pages']
-            total = 0
-            while front:
-                span = pages[front]
-                total += int(span['span_size'])
-                front = int(span['link']['_next'])
-            span_size = (1 << index) * page_size
-            allocated_size = large_allocs[span_size] * span_size
-            total_large_bytes += allocated_size
-            gdb.write('{index:5} {size:13} {total:13} {allocated_size:13} {allocated_count:7}\n'.format(index=index, size=span_size, total=total * page_size,
-                                                                allocated_count=large_allocs[span_size],
-                                                                allocated_size=allocated_size))
+        for ps in data['page_spans']:
+            total_large_bytes += ps['large']
+            gdb.write('{index:5} {size:13} {total:13} {allocated_size:13} {allocated_count:7}\n'.format(index=ps['index'], size=ps['size'], total=ps['free'],
+                                                                allocated_count=ps['large_spans'],
+                                                                allocated_size=ps['large']))
         gdb.write('Large allocations: %d [B]\n' % total_large_bytes)
 
 
@@ -2308,6 +2828,106 @@ def print_tree(root_node,
         print_node(root_node, [])
 
 
+def heapprof_sites():
+    """Yield (size, count, backtrace) for each live allocation site of the heap profiler.
+
+    The backtrace is a tuple of raw frame addresses, callee first.
+    """
+    sites = shard_memory_analyzer().heapprof()
+    if sites is None:
+        raise gdb.GdbError('The heap profiler is not compiled in')
+    for site in sites:
+        yield site['size'], site['count'], tuple(site['backtrace'])
+
+
+class heapprof_snapshot:
+    """Compact binary file format for raw heap profiler allocation sites.
+
+    Layout (little endian):
+    * header: magic (4 bytes), version (u32), number of sites (u64);
+    * for each site: size (u64), count (u64), number of frames (u32),
+      followed by the frame addresses (u64 each).
+
+    Addresses are saved unresolved, resolution is done when the snapshot is
+    loaded, in bulk, against the symbols of the binary loaded in gdb.
+    """
+    _magic = b'SHPS'
+    _version = 1
+    _header = struct.Struct('<4sIQ')
+    _site_header = struct.Struct('<QQI')
+
+    @staticmethod
+    def save(file_name, sites):
+        sites = list(sites)
+        with open(file_name, 'wb') as f:
+            f.write(heapprof_snapshot._header.pack(heapprof_snapshot._magic, heapprof_snapshot._version, len(sites)))
+            for size, count, backtrace in sites:
+                f.write(heapprof_snapshot._site_header.pack(size, count, len(backtrace)))
+                f.write(struct.pack('<{}Q'.format(len(backtrace)), *backtrace))
+        return len(sites)
+
+    @staticmethod
+    def load(file_name):
+        """Return the list of (size, count, backtrace) saved in the file."""
+        with open(file_name, 'rb') as f:
+            data = f.read()
+        magic, version, nr_sites = heapprof_snapshot._header.unpack_from(data, 0)
+        if magic != heapprof_snapshot._magic or version != heapprof_snapshot._version:
+            raise ValueError("{} is not a heapprof snapshot (version {})".format(file_name, heapprof_snapshot._version))
+        pos = heapprof_snapshot._header.size
+        sites = []
+        for _ in range(nr_sites):
+            size, count, nr_frames = heapprof_snapshot._site_header.unpack_from(data, pos)
+            pos += heapprof_snapshot._site_header.size
+            sites.append((size, count, struct.unpack_from('<{}Q'.format(nr_frames), data, pos)))
+            pos += nr_frames * 8
+        return sites
+
+
+def resolve_many(addresses, batch_size=1024):
+    """Resolve the addresses in bulk, populating the cache of resolve().
+
+    The distinct addresses which are not cached yet are looked up in batches,
+    with a single multi-line gdb command of batch_size `info symbol` each, so
+    the per-command overhead of gdb is paid once per batch. `info symbol`
+    prints one line per address, if the output of a batch doesn't line up
+    with its addresses, they are looked up one by one.
+    """
+    todo = sorted(set(addresses) - names.keys())
+    for i in range(0, len(todo), batch_size):
+        batch = todo[i:i + batch_size]
+        output = gdb.execute('\n'.join('info symbol 0x%x' % addr for addr in batch), False, True).splitlines()
+        if len(output) != len(batch):
+            for addr in batch:
+                resolve(addr)
+            continue
+        for addr, infosym in zip(batch, output):
+            name = parse_info_symbol(infosym)
+            if name is not None:
+                names[addr] = name
+
+
+def heapprof_frames(root, min_size=0):
+    """Yield the frames of the nodes of a heapprof tree, skipping branches allocating less than min_size"""
+    nodes = [root]
+    while nodes:
+        n = nodes.pop()
+        if n.key is not None:
+            yield n.key
+        yield from n.tail
+        nodes.extend(c for c in n.children if c.size >= min_size)
+
+
+def heapprof_resolver(addresses=False, no_symbols=False):
+    def resolver(addr):
+        if no_symbols:
+            return '0x%x' % addr
+        if addresses:
+            return '0x%x %s' % (addr, resolve(addr) or '')
+        return resolve(addr) or ('0x%x' % addr)
+    return resolver
+
+
 class scylla_heapprof(gdb.Command):
     def __init__(self):
         gdb.Command.__init__(self, 'scylla heapprof', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
@@ -2324,43 +2944,58 @@ class scylla_heapprof(gdb.Command):
                             help="Write flamegraph data to heapprof.stacks instead of showing the profile")
         parser.add_argument("--min", action="store", type=int, default=0,
                             help="Drop branches allocating less than given amount")
+        parser.add_argument("--save", action="store", type=str, metavar="FILE",
+                            help="Save the raw allocation sites to FILE, without resolving symbols, see `scylla heapprof-diff`")
+        parser.add_argument("--load", action="store", type=str, metavar="FILE",
+                            help="Show the profile from a snapshot saved previously with --save, instead of the current one")
+        add_json_argument(parser)
         try:
             args = parser.parse_args(arg.split())
         except SystemExit:
             return
 
-        root = ProfNode(None)
-        cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-        site = cpu_mem['alloc_site_list_head']
+        if args.save:
+            nr_sites = heapprof_snapshot.save(args.save, heapprof_sites())
+            gdb.write('Wrote {} allocation sites to {}\n'.format(nr_sites, args.save))
+            return
 
-        while site:
-            size = int(site['size'])
-            count = int(site['count'])
-            if size:
-                n = root
+        if args.load:
+            sites = heapprof_snapshot.load(args.load)
+        else:
+            sites = list(heapprof_sites())
+
+        root = ProfNode(None)
+        for size, count, addresses in sites:
+            n = root
+            n.size += size
+            n.count += count
+            if args.inverted:
+                seq = reversed(addresses)
+            else:
+                seq = addresses
+            for addr in seq:
+                n = n.get_or_add(addr)
                 n.size += size
                 n.count += count
-                bt = site['backtrace']['_main']
-                addresses = list(int(f['addr']) for f in static_vector(bt['_frames']))
-                addresses.pop(0)  # drop memory::get_backtrace()
-                if args.inverted:
-                    seq = reversed(addresses)
-                else:
-                    seq = addresses
-                for addr in seq:
-                    n = n.get_or_add(addr)
-                    n.size += size
-                    n.count += count
-            site = site['next']
-
-        def resolver(addr):
-            if args.no_symbols:
-                return '0x%x' % addr
-            if args.addresses:
-                return '0x%x %s' % (addr, resolve(addr) or '')
-            return resolve(addr) or ('0x%x' % addr)
-
-        if args.flame:
+
+        if not args.flame:
+            collapse_similar(root)
+        if not args.no_symbols:
+            # Only the frames which are shown are resolved, the flamegraph has all of them
+            resolve_many(heapprof_frames(root, 0 if args.flame else args.min))
+        resolver = heapprof_resolver(args.addresses, args.no_symbols)
+
+        if args.json:
+            def node_to_dict(n):
+                return {
+                    'frames': [resolver(addr) for addr in ([n.key] if n.key is not None else []) + n.tail],
+                    'size': n.size,
+                    'count': n.count,
+                    'children': [node_to_dict(c) for c in sorted(n.children, key=lambda c: -c.size) if c.size >= args.min],
+                }
+
+            write_json(args.json, node_to_dict(root))
+        elif args.flame:
             file_name = 'heapprof.stacks'
             with open(file_name, 'w') as out:
                 trace = list()
@@ -2388,7 +3023,6 @@ class scylla_heapprof(gdb.Command):
             def node_filter(n):
                 return n.size >= args.min
 
-            collapse_similar(root)
             print_tree(root,
                        formatter=node_formatter,
                        order_by=lambda n: -n.size,
@@ -2396,9 +3030,121 @@ class scylla_heapprof(gdb.Command):
                        printer=gdb.write)
 
 
+class scylla_heapprof_diff(gdb.Command):
+    """Compare two heap profiles and show which allocation sites grew.
+
+    The profiles are snapshots saved with `scylla heapprof --save FILE`,
+    possibly from different cores of the same binary. Use `-` instead of a
+    file name to refer to the profile of the current process (or core).
+    Sites are matched by their backtrace and are listed in descending order
+    of growth. With --shrunk, the sites which shrunk follow, the ones which
+    shrunk the most first.
+
+    Example:
+    (gdb) scylla heapprof --save /tmp/before.heapprof
+    ...
+    (gdb) scylla heapprof-diff /tmp/before.heapprof -
+    +    1048576 (#+256)            0 ->    1048576 (#0 -> #256)
+        seastar::memory::allocate(unsigned long)
+        ...
+
+    For more details on usage see `scylla heapprof-diff --help`.
+    """
+    def __init__(self):
+        gdb.Command.__init__(self, 'scylla heapprof-diff', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
+
+    @staticmethod
+    def _load(file_name):
+        if file_name == '-':
+            return list(heapprof_sites())
+        return heapprof_snapshot.load(file_name)
+
+    @staticmethod
+    def diff(old_sites, new_sites):
+        """Return the list of (backtrace, (old size, old count), (new size, new count)) for all sites which changed."""
+        old = defaultdict(lambda: [0, 0])
+        new = defaultdict(lambda: [0, 0])
+        for sites, by_backtrace in ((old_sites, old), (new_sites, new)):
+            for size, count, backtrace in sites:
+                by_backtrace[backtrace][0] += size
+                by_backtrace[backtrace][1] += count
+
+        results = []
+        for backtrace in set(old.keys()) | set(new.keys()):
+            o = tuple(old.get(backtrace, (0, 0)))
+            n = tuple(new.get(backtrace, (0, 0)))
+            if o != n:
+                results.append((backtrace, o, n))
+        results.sort(key=lambda r: r[2][0] - r[1][0], reverse=True)
+        return results
+
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla heapprof-diff")
+        parser.add_argument("old", help="The old profile: a file saved with `scylla heapprof --save`, or `-` for the current one")
+        parser.add_argument("new", help="The new profile: a file saved with `scylla heapprof --save`, or `-` for the current one")
+        parser.add_argument("-t", "--top", action="store", type=int, default=20,
+                            help="Show only the top TOP sites which grew, and the top TOP sites which shrunk with --shrunk."
+                            " Defaults to 20. Set to 0 to show all sites.")
+        parser.add_argument("--min", action="store", type=int, default=0,
+                            help="Drop sites which grew less than the given amount")
+        parser.add_argument("--shrunk", action="store_true",
+                            help="Also show sites which shrunk, after those which grew")
+        parser.add_argument("-d", "--depth", action="store", type=int, default=0,
+                            help="Consider only the first DEPTH frames of each backtrace, merging sites which have these in common."
+                            " Defaults to 0 (all frames).")
+        parser.add_argument("-a", "--addresses", action="store_true",
+                            help="Show raw addresses before resolved symbol names")
+        parser.add_argument("--no-symbols", action="store_true",
+                            help="Show only raw addresses")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        old_sites = self._load(args.old)
+        new_sites = self._load(args.new)
+        if args.depth:
+            # Sites with the same first DEPTH frames are merged
+            old_sites = [(size, count, backtrace[:args.depth]) for size, count, backtrace in old_sites]
+            new_sites = [(size, count, backtrace[:args.depth]) for size, count, backtrace in new_sites]
+
+        grown = []
+        shrunk = []
+        for backtrace, old, new in scylla_heapprof_diff.diff(old_sites, new_sites):
+            growth = new[0] - old[0]
+            if growth >= args.min:
+                grown.append((backtrace, old, new))
+            elif args.shrunk and growth < 0:
+                shrunk.append((backtrace, old, new))
+        # The sites which shrunk the most come first, --top applies to both groups
+        shrunk.reverse()
+        if args.top:
+            grown = grown[:args.top]
+            shrunk = shrunk[:args.top]
+        results = grown + shrunk
+
+        if not args.no_symbols:
+            resolve_many(addr for backtrace, _, _ in results for addr in backtrace)
+        resolver = heapprof_resolver(args.addresses, args.no_symbols)
+
+        if args.json:
+            write_json(args.json, [{
+                    'backtrace': [resolver(addr) for addr in backtrace],
+                    'old': {'size': old[0], 'count': old[1]},
+                    'new': {'size': new[0], 'count': new[1]},
+                } for backtrace, old, new in results])
+            return
+
+        for backtrace, old, new in results:
+            gdb.write('{:+11} (#{:+}) {:12} -> {:10} (#{} -> #{})\n'.format(new[0] - old[0], new[1] - old[1], old[0], new[0], old[1], new[1]))
+            for addr in backtrace:
+                gdb.write('    {}\n'.format(resolver(addr)))
+
+
 def get_seastar_memory_start_and_size():
     cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-    page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+    page_size = cached_constant('\'seastar::memory::page_size\'')
     total_mem = int(cpu_mem['nr_pages']) * page_size
     start = int(cpu_mem['memory'])
     return start, total_mem
@@ -2517,88 +3263,167 @@ class scylla_ptr(gdb.Command):
             return False
 
     @staticmethod
-    def _do_analyze(ptr):
-        owning_thread = None
-        for t, start, size in seastar_memory_layout():
-            if ptr >= start and ptr < start + size:
-                owning_thread = t
-                break
+    def _free_objects(freelist_head):
+        """Return the set of addresses on the free-list starting at freelist_head"""
+        free = set()
+        next_free = freelist_head
+        while next_free:
+            free.add(next_free)
+            next_free = read_pointer(next_free)
+        return free
 
-        ptr_meta = pointer_metadata(ptr, owning_thread)
+    @staticmethod
+    def _do_analyze_shard(thread, ptrs, results):
+        """Classify ptrs, all of which belong to the memory of the shard run by thread.
 
-        if not owning_thread:
-            return ptr_meta
+        ptrs should be sorted, the span metadata and free-lists are walked once
+        for all of them.
+        """
+        thread.switch()
 
-        owning_thread.switch()
-
-        cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
-        page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
-        offset = ptr - int(cpu_mem['memory'])
-        ptr_page_idx = offset / page_size
-        pages = cpu_mem['pages']
-        page = pages[ptr_page_idx]
-
-        span = span_checker().get_span(ptr)
-        offset_in_span = ptr - span.start
-        if offset_in_span >= span.used_span_size() * page_size:
-            ptr_meta.mark_free()
-        elif span.is_small():
-            pool = span.pool()
-            object_size = int(pool['_object_size'])
-            ptr_meta.size = object_size
-            ptr_meta.is_small = True
-            offset_in_object = offset_in_span % object_size
-            free_object_ptr = gdb.lookup_type('void').pointer().pointer()
-            char_ptr = gdb.lookup_type('char').pointer()
-            # pool's free list
-            next_free = pool['_free']
-            free = False
-            while next_free:
-                if ptr >= next_free and ptr < next_free.reinterpret_cast(char_ptr) + object_size:
-                    free = True
-                    break
-                next_free = next_free.reinterpret_cast(free_object_ptr).dereference()
-            if not free:
-                # span's free list
-                first_page_in_span = span.page
-                next_free = first_page_in_span['freelist']
-                while next_free:
-                    if ptr >= next_free and ptr < next_free.reinterpret_cast(char_ptr) + object_size:
-                        free = True
-                        break
-                    next_free = next_free.reinterpret_cast(free_object_ptr).dereference()
-            ptr_meta.offset_in_object = offset_in_object
-            ptr_meta.is_live = not free
-        else:
-            ptr_meta.is_small = False
-            ptr_meta.is_live = not span.is_free()
-            ptr_meta.size = span.size() * page_size
-            ptr_meta.offset_in_object = ptr - span.start
+        page_size = cached_constant('\'seastar::memory::page_size\'')
+        checker = span_checker()
+        free_objects = {} # free-list head -> set of free objects
 
         # FIXME: handle debug-mode build
         segment_pool = get_lsa_segment_pool()
         segments_base = get_segment_base(segment_pool)
-        segment_size = int(gdb.parse_and_eval('\'logalloc::segment\'::size'))
-        index = int((int(ptr) - segments_base) / segment_size)
-        desc = std_vector(segment_pool["_segments"])[index]
-        ptr_meta.is_lsa = bool(desc['_region'])
+        segment_size = cached_constant('\'logalloc::segment\'::size')
+        segment_descs = std_vector(segment_pool["_segments"])
+        nr_segments = len(segment_descs)
+
+        for ptr in ptrs:
+            ptr_meta = pointer_metadata(ptr, thread)
+            results[ptr] = ptr_meta
+
+            span = checker.get_span(ptr)
+            if span is None or ptr - span.start >= span.used_span_size() * page_size:
+                ptr_meta.mark_free()
+            elif span.is_small():
+                pool = span.pool()
+                object_size = int(pool['_object_size'])
+                ptr_meta.size = object_size
+                ptr_meta.is_small = True
+                ptr_meta.offset_in_object = (ptr - span.start) % object_size
+                free = False
+                # pool's free list, then span's free list
+                for head in (int(pool['_free']), int(span.page['freelist'])):
+                    if head not in free_objects:
+                        free_objects[head] = scylla_ptr._free_objects(head)
+                    if ptr_meta.obj_ptr in free_objects[head]:
+                        free = True
+                        break
+                ptr_meta.is_live = not free
+            else:
+                ptr_meta.is_small = False
+                ptr_meta.is_live = not span.is_free()
+                ptr_meta.size = span.size() * page_size
+                ptr_meta.offset_in_object = ptr - span.start
 
-        return ptr_meta
+            index = (ptr - segments_base) // segment_size
+            ptr_meta.is_lsa = 0 <= index < nr_segments and bool(segment_descs[index]['_region'])
 
     @staticmethod
-    def analyze(ptr):
+    def _do_analyze_many(addresses):
+        layout = sorted(seastar_memory_layout(), key=lambda x: x[1])
+        starts = [start for _, start, _ in layout]
+        results = {}
+        shard_ptrs = defaultdict(list) # index in layout -> sorted pointers
+
+        for ptr in sorted(set(addresses)):
+            idx = bisect.bisect_right(starts, ptr) - 1
+            if idx >= 0 and ptr < layout[idx][1] + layout[idx][2]:
+                shard_ptrs[idx].append(ptr)
+            else:
+                results[ptr] = pointer_metadata(ptr, None)
+
+        for idx, ptrs in shard_ptrs.items():
+            scylla_ptr._do_analyze_shard(layout[idx][0], ptrs, results)
+
+        return [results[ptr] for ptr in addresses]
+
+    @staticmethod
+    def analyze_many(addresses):
+        """Classify many pointers at once.
+
+        Pointers are grouped by the shard owning them and each shard's span
+        metadata and small-object free-lists are walked only once, for all
+        pointers. Much faster than calling analyze() for each pointer.
+        Returns the list of pointer_metadata, in the order of addresses.
+        """
         orig = gdb.selected_thread()
         try:
-            return scylla_ptr._do_analyze(ptr)
+            return scylla_ptr._do_analyze_many([int(ptr) for ptr in addresses])
         finally:
             orig.switch()
 
+    @staticmethod
+    def analyze(ptr):
+        return scylla_ptr.analyze_many([ptr])[0]
+
+    @staticmethod
+    def to_dict(ptr_meta):
+        return {
+            'address': ptr_meta.ptr,
+            'thread': ptr_meta.thread.num if ptr_meta.is_managed_by_seastar() else None,
+            'page_free': ptr_meta.is_containing_page_free,
+            'small': ptr_meta.is_small,
+            'live': ptr_meta.is_live,
+            'lsa': ptr_meta.is_lsa,
+            'size': ptr_meta.size,
+            'object': ptr_meta.obj_ptr,
+            'offset_in_object': ptr_meta.offset_in_object,
+        }
+
+    @staticmethod
+    def read_addresses(file_name):
+        """Extract all hexadecimal addresses from the file, e.g. a log or an ASAN report"""
+        addresses = []
+        with open(file_name, 'r') as f:
+            for line in f:
+                addresses.extend(int(m, 16) for m in re.findall(r'\b0x[0-9a-fA-F]+\b', line))
+        return addresses
+
     def invoke(self, arg, from_tty):
-        ptr = int(gdb.parse_and_eval(arg))
+        parser = argparse.ArgumentParser(description="scylla ptr")
+        parser.add_argument("-f", "--from-file", action="store", type=str,
+                help="classify all hexadecimal addresses (0x...) found in the file, e.g. a log or an ASAN report")
+        add_json_argument(parser)
+        parser.add_argument("expression", nargs='*', help="expression evaluating to the pointer to classify")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
 
-        ptr_meta = self.analyze(ptr)
+        if args.from_file:
+            addresses = scylla_ptr.read_addresses(args.from_file)
+        elif args.expression:
+            addresses = [int(gdb.parse_and_eval(' '.join(args.expression)))]
+        else:
+            gdb.write("Error: either an expression or --from-file has to be provided\n")
+            return
+
+        results = self.analyze_many(addresses)
 
-        gdb.write("{}\n".format(str(ptr_meta)))
+        if args.json:
+            write_json(args.json, [scylla_ptr.to_dict(ptr_meta) for ptr_meta in results])
+            return
+
+        if not args.from_file:
+            gdb.write("{}\n".format(str(results[0])))
+            return
+
+        for ptr_meta in results:
+            gdb.write("0x{:x}: {}\n".format(ptr_meta.ptr, str(ptr_meta)))
+
+        seastar_ptrs = [p for p in results if p.is_managed_by_seastar()]
+        gdb.write("\n{} pointers: {} seastar-managed ({} live, {} LSA-managed, {} in free pages), {} other\n".format(
+            len(results),
+            len(seastar_ptrs),
+            sum(1 for p in seastar_ptrs if p.is_live),
+            sum(1 for p in seastar_ptrs if p.is_lsa),
+            sum(1 for p in seastar_ptrs if p.is_containing_page_free),
+            len(results) - len(seastar_ptrs)))
 
 
 class segment_descriptor:
@@ -2637,19 +3462,194 @@ class scylla_segment_descs(gdb.Command):
             else:
                 gdb.write('0x%x: std\n' % (seg_addr))
 
-        if base is None: # debug mode build
-            segs = std_vector(segment_pool["_store"]["_segments"])
-            descs = std_vector(segment_pool["_segments"])
+        if base is None: # debug mode build
+            segs = std_vector(segment_pool["_store"]["_segments"])
+            descs = std_vector(segment_pool["_segments"])
+
+            for seg, desc_ref in zip(segs, descs):
+                desc = segment_descriptor(desc_ref)
+                print_desc(int(seg), desc)
+        else:
+            addr = base
+            for desc in std_vector(segment_pool["_segments"]):
+                desc = segment_descriptor(desc)
+                print_desc(addr, desc)
+                addr += segment_size
+
+
+class scylla_memory_layout(gdb.Command):
+    """Export the memory-layout description needed for offline core analysis.
+
+    Writes a JSON file with the sizes, field offsets and TLS offsets of the
+    seastar allocator and LSA structures, as seen by the binary loaded in gdb.
+    The file has to be generated only once per binary (it doesn't depend on the
+    state of the process) and allows scripts/scylla-core-analyzer.py to analyze
+    cores of the same binary without gdb, e.g. on a batch machine.
+
+    Should be invoked on a reactor thread.
+
+    Example:
+    (gdb) scylla memory-layout -o scylla-layout.json
+    """
+    def __init__(self):
+        gdb.Command.__init__(self, 'scylla memory-layout', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
+
+    @staticmethod
+    def _field(t, *path):
+        """Return [offset, size] of the (nested) field at `path` in type `t`."""
+        v = gdb.Value(0).cast(t.pointer()).dereference()
+        for p in path:
+            v = v[p]
+        return [int(v.address), v.type.sizeof]
+
+    @staticmethod
+    def _tls_offset(value):
+        return int(value.address) - int(gdb.parse_and_eval('$fs_base'))
+
+    @classmethod
+    def _seastar_layout(cls):
+        cpu_mem = gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')
+        cpu_mem_type = cpu_mem.type.strip_typedefs()
+        page_type = cpu_mem['pages'].type.strip_typedefs().target()
+        small_pool_type = cpu_mem['small_pools']['_u']['a'].type.strip_typedefs().target()
+        span_list_type = cpu_mem['free_spans'].type.strip_typedefs().target()
+
+        layout = {
+            'page_size': cached_constant('\'seastar::memory::page_size\''),
+            'free_object_size': int(gdb.parse_and_eval('sizeof(\'seastar::memory::free_object\')')),
+            'cpu_mem': {
+                'tls_offset': cls._tls_offset(cpu_mem),
+                'fields': {
+                    'memory': cls._field(cpu_mem_type, 'memory'),
+                    'pages': cls._field(cpu_mem_type, 'pages'),
+                    'nr_pages': cls._field(cpu_mem_type, 'nr_pages'),
+                    'nr_free_pages': cls._field(cpu_mem_type, 'nr_free_pages'),
+                    'nr_span_lists': cls._field(cpu_mem_type, 'nr_span_lists'),
+                    'free_spans': cls._field(cpu_mem_type, 'free_spans'),
+                    'small_pools': cls._field(cpu_mem_type, 'small_pools', '_u', 'a'),
+                    'nr_small_pools': cls._field(cpu_mem_type, 'small_pools', 'nr_small_pools'),
+                },
+            },
+            'page': {
+                'sizeof': page_type.sizeof,
+                'fields': {
+                    'free': cls._field(page_type, 'free'),
+                    'offset_in_span': cls._field(page_type, 'offset_in_span'),
+                    'span_size': cls._field(page_type, 'span_size'),
+                    'link_next': cls._field(page_type, 'link', '_next'),
+                    'pool': cls._field(page_type, 'pool'),
+                },
+            },
+            'span_list': {
+                'sizeof': span_list_type.sizeof,
+                'fields': {
+                    'front': cls._field(span_list_type, '_front'),
+                },
+            },
+            'small_pool': {
+                'sizeof': small_pool_type.sizeof,
+                'fields': {
+                    'object_size': cls._field(small_pool_type, '_object_size'),
+                    'span_size_preferred': cls._field(small_pool_type, '_span_sizes', 'preferred'),
+                    'free_count': cls._field(small_pool_type, '_free_count'),
+                },
+            },
+        }
+
+        try:
+            site_type = cpu_mem['alloc_site_list_head'].type.strip_typedefs().target()
+        except gdb.error: # not a heapprof-enabled build
+            return layout
+
+        frames = gdb.Value(0).cast(site_type.pointer()).dereference()['backtrace']['_main']['_frames']
+        frame_type = frames.type.strip_typedefs().template_argument(0)
+        layout['cpu_mem']['fields']['alloc_site_list_head'] = cls._field(cpu_mem_type, 'alloc_site_list_head')
+        layout['allocation_site'] = {
+            'fields': {
+                'size': cls._field(site_type, 'size'),
+                'count': cls._field(site_type, 'count'),
+                'next': cls._field(site_type, 'next'),
+                'nr_frames': cls._field(site_type, 'backtrace', '_main', '_frames', 'm_holder', 'm_size'),
+                'frames': cls._field(site_type, 'backtrace', '_main', '_frames', 'm_holder', 'storage'),
+            },
+            'frame_sizeof': frame_type.sizeof,
+            'frame_addr': cls._field(frame_type, 'addr'),
+        }
+        return layout
+
+    @classmethod
+    def _lsa_layout(cls):
+        # Path from the TLS root object to the segment_pool. Each element is an
+        # offset, where a pointer has to be dereferenced.
+        pointer_path = []
+        try:
+            tracker = gdb.parse_and_eval('\'logalloc::tracker_instance\'')
+            if tracker.type.code == gdb.TYPE_CODE_REF:
+                tracker = tracker.referenced_value()
+            root = tracker
+            impl_ptr = std_unique_ptr(tracker['_impl']).get()
+            pointer_path.append(int(impl_ptr.address) - int(tracker.address))
+            impl = impl_ptr.dereference()
+            pool_ptr = std_unique_ptr(impl['_segment_pool']).get()
+            pointer_path.append(int(pool_ptr.address) - int(impl.address))
+            segment_pool = pool_ptr.dereference()
+        except gdb.error:
+            root = gdb.parse_and_eval('\'logalloc::shard_segment_pool\'')
+            segment_pool = root
+
+        segment_pool_type = segment_pool.type.strip_typedefs()
+        segments = segment_pool['_segments']
+        desc_type = segments.type.strip_typedefs().template_argument(0)
+        segments_offset = int(segments.address) - int(segment_pool.address)
+
+        return {
+            'segment_size': int(gdb.parse_and_eval('\'logalloc::segment::size\'')),
+            'size_mask': int(gdb.parse_and_eval('\'logalloc::segment::size_mask\'')),
+            'root_tls_offset': cls._tls_offset(root),
+            'segment_pool_path': pointer_path,
+            'segment_pool': {
+                'fields': {
+                    'segments_in_use': cls._field(segment_pool_type, '_segments_in_use'),
+                    'free_segments': cls._field(segment_pool_type, '_free_segments'),
+                    'non_lsa_memory_in_use': cls._field(segment_pool_type, '_non_lsa_memory_in_use'),
+                    'segments_begin': [segments_offset + int(segments['_M_impl']['_M_start'].address) - int(segments.address), 8],
+                    'segments_end': [segments_offset + int(segments['_M_impl']['_M_finish'].address) - int(segments.address), 8],
+                },
+            },
+            'segment_descriptor': {
+                'sizeof': desc_type.sizeof,
+                'fields': {
+                    'free_space': cls._field(desc_type, '_free_space'),
+                    'region': cls._field(desc_type, '_region'),
+                },
+            },
+        }
 
-            for seg, desc_ref in zip(segs, descs):
-                desc = segment_descriptor(desc_ref)
-                print_desc(int(seg), desc)
-        else:
-            addr = base
-            for desc in std_vector(segment_pool["_segments"]):
-                desc = segment_descriptor(desc)
-                print_desc(addr, desc)
-                addr += segment_size
+    @classmethod
+    def collect(cls):
+        return {
+            'version': scylla_memory_analysis.LAYOUT_VERSION,
+            'executable': gdb.current_progspace().filename,
+            'seastar': cls._seastar_layout(),
+            'lsa': cls._lsa_layout(),
+        }
+
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla memory-layout")
+        parser.add_argument("-o", "--output-file", action="store", type=str, default="scylla-layout.json",
+                help="Output file. Default: scylla-layout.json")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        if not has_reactor():
+            gdb.write('Current thread is not a reactor thread, switch to one first\n')
+            return
+
+        with open(args.output_file, 'w') as f:
+            json.dump(memory_analysis_layout(), f, indent=4)
+        gdb.write('Wrote {}\n'.format(args.output_file))
 
 
 def shard_of(ptr):
@@ -2748,15 +3748,21 @@ class scylla_lsa(gdb.Command):
 names = {}  # addr (int) -> name (str)
 
 
+def parse_info_symbol(infosym):
+    """The symbol name in the output of `info symbol`, None if there is none"""
+    if infosym.startswith('No symbol'):
+        return None
+    return infosym[:infosym.find('in section')]
+
+
 def resolve(addr, cache=True, startswith=None):
     if addr in names:
         return names[addr]
 
     infosym = gdb.execute('info symbol 0x%x' % (addr), False, True)
-    if infosym.startswith('No symbol'):
+    name = parse_info_symbol(infosym)
+    if name is None:
         return None
-
-    name = infosym[:infosym.find('in section')]
     if startswith and not name.startswith(startswith):
         return None
     if cache:
@@ -3225,6 +4231,170 @@ class scylla_threads(gdb.Command):
                 self._do_list_threads(shard, args.vtable)
 
 
+class scylla_sample(gdb.Command):
+    """Poor man's sampling profiler for a live scylla process
+
+    Samples the native backtraces of all reactor threads, together with the
+    task each reactor is currently running (identified by its vtable symbol).
+    Between samples, gdb detaches from the process, letting it run undisturbed
+    for the sampling interval, then re-attaches to take the next sample.
+    Requires gdb to be attached to a live process (gdb -p $pid), it doesn't
+    work with coredumps.
+
+    The result is written in the folded-stack format, which can be fed
+    directly to flamegraph.pl, to generate a flamegraph. Each line is a stack,
+    with the frames separated by ';', starting with the outermost one, followed
+    by the number of times the stack was observed. The running task is added as
+    the root frame, as `[task] $name`, pass --per-shard to also prefix the stacks
+    with the shard they were observed on.
+
+    After sampling, statistics about the sampling are printed: the wall-clock
+    time it took to collect the samples, which includes the sampling interval,
+    and the pauses the process was subjected to. Those are reported separately
+    for taking the samples and for detaching from and re-attaching to the
+    process between samples, which also stops all of its threads.
+
+    Note that each sample stops all threads of the process, so use a long
+    enough interval on production nodes, the default is 1 sample per second.
+
+    Example (timings elided, they depend on the process and the machine):
+    (gdb) scylla sample -n 60 -o /tmp/scylla.folded
+    Collected 60 samples from 4 reactor threads in ...s
+    Sampling pauses: avg=...ms, max=...ms, total=...ms
+    Detach and re-attach pauses: avg=...ms, max=...ms, total=...ms
+    Wrote 187 folded stacks to /tmp/scylla.folded
+
+    $ flamegraph.pl /tmp/scylla.folded > scylla.svg
+    """
+    def __init__(self):
+        gdb.Command.__init__(self, 'scylla sample', gdb.COMMAND_USER, gdb.COMPLETE_NONE, True)
+
+    @staticmethod
+    def current_task_name():
+        try:
+            task = gdb.parse_and_eval('\'seastar\'::local_engine->_current_task')
+        except gdb.error:
+            return None
+        if not task:
+            return None
+        name = resolve(read_pointer(int(task)))
+        if name is None:
+            return 'unknown'
+        m = re.match(r'vtable for (.*) \+ [0-9]+', name.strip())
+        return m.group(1) if m else name.strip()
+
+    @staticmethod
+    def backtrace(max_depth):
+        frames = []
+        frame = gdb.newest_frame()
+        while frame is not None and len(frames) < max_depth:
+            name = frame.name()
+            if name is None:
+                name = resolve(frame.pc())
+            if name is None:
+                name = '0x{:x}'.format(frame.pc())
+            frames.append(name.strip().replace(';', ':'))
+            try:
+                frame = frame.older()
+            except gdb.error:
+                break
+        frames.reverse()
+        return frames
+
+    def find_reactor_threads(self):
+        """Return {lwp: shard} for all reactor threads"""
+        shards = {}
+        for t in reactor_threads():
+            with thread_switched_in(t):
+                shards[t.ptid[1]] = current_shard()
+        return shards
+
+    def take_sample(self, shards, stacks, args):
+        orig = gdb.selected_thread()
+        try:
+            for t in gdb.selected_inferior().threads():
+                lwp = t.ptid[1]
+                if lwp not in shards:
+                    continue
+                t.switch()
+                frames = self.backtrace(args.max_depth)
+                if not args.no_task:
+                    frames.insert(0, '[task] {}'.format(self.current_task_name() or 'idle'))
+                if args.per_shard:
+                    frames.insert(0, 'shard {}'.format(shards[lwp]))
+                stacks[';'.join(frames)] += 1
+        finally:
+            orig.switch()
+
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla sample")
+        parser.add_argument("-n", "--samples", action="store", type=int, default=10,
+                help="number of samples to take (default: %(default)s)")
+        parser.add_argument("-i", "--interval", action="store", type=int, default=1000,
+                help="time to let the process run between samples, in milliseconds (default: %(default)s)")
+        parser.add_argument("-o", "--output", action="store", type=str,
+                help="file to write the folded stacks to, by default they are printed")
+        parser.add_argument("-d", "--max-depth", action="store", type=int, default=256,
+                help="maximum number of frames to collect per stack (default: %(default)s)")
+        parser.add_argument("--per-shard", action="store_true",
+                help="prefix stacks with the shard they were observed on")
+        parser.add_argument("--no-task", action="store_true",
+                help="don't add the currently running task to the stacks")
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        inferior = gdb.selected_inferior()
+        if not inferior.pid or not inferior.was_attached:
+            gdb.write('Error: scylla sample requires gdb to be attached to a live process (gdb -p $pid)\n')
+            return
+        pid = inferior.pid
+
+        shards = self.find_reactor_threads()
+        stacks = defaultdict(int)
+        sampling_times = []
+        attach_times = []
+
+        start = time.monotonic()
+        for i in range(args.samples):
+            t0 = time.monotonic()
+            self.take_sample(shards, stacks, args)
+            sampling_times.append(time.monotonic() - t0)
+
+            if i == args.samples - 1:
+                break
+
+            t0 = time.monotonic()
+            gdb.execute('detach', False, True)
+            detach_time = time.monotonic() - t0
+            time.sleep(args.interval / 1000)
+            t0 = time.monotonic()
+            gdb.execute('attach {}'.format(pid), False, True)
+            attach_times.append(detach_time + time.monotonic() - t0)
+        elapsed = time.monotonic() - start
+
+        def ms(seconds):
+            return '{:.1f}ms'.format(seconds * 1000)
+
+        def stats(times):
+            return 'avg={}, max={}, total={}'.format(ms(statistics.mean(times)), ms(max(times)), ms(sum(times)))
+
+        gdb.write('Collected {} samples from {} reactor threads in {:.1f}s\n'.format(len(sampling_times), len(shards), elapsed))
+        gdb.write('Sampling pauses: {}\n'.format(stats(sampling_times)))
+        if attach_times:
+            gdb.write('Detach and re-attach pauses: {}\n'.format(stats(attach_times)))
+
+        lines = ['{} {}\n'.format(stack, count) for stack, count in sorted(stacks.items())]
+        if args.output:
+            with open(args.output, 'w') as f:
+                f.writelines(lines)
+            gdb.write('Wrote {} folded stacks to {}\n'.format(len(lines), args.output))
+        else:
+            for line in lines:
+                gdb.write(line)
+
+
 class circular_buffer(object):
     def __init__(self, ref):
         self.ref = ref
@@ -3297,19 +4467,29 @@ class chunked_vector(object):
         self._max_contiguous_allocation = int(list(template_arguments(self.ref.type))[1])
 
     def max_chunk_capacity(self):
-        return max(self._max_contiguous_allocation / self.ref.type.sizeof, 1);
+        return max(self._max_contiguous_allocation // self.ref.type.template_argument(0).sizeof, 1)
 
     def __len__(self):
         return int(self.ref['_size'])
 
-    def __iter__(self):
+    def addresses(self):
+        """Yield the address of each element, without materializing them"""
         sz = len(self)
-        for chunk in small_vector(self.ref['_chunks']):
-            chunk = std_unique_ptr(chunk).get()
-            for i in range(min(sz, self.max_chunk_capacity())):
-                yield chunk[i]
+        elem_size = self.ref.type.template_argument(0).sizeof
+        chunk_capacity = self.max_chunk_capacity()
+        chunks = self.ref['_chunks']
+        begin = int(chunks['_begin'])
+        nr_chunks = (int(chunks['_end']) - begin) // 8
+        for chunk in struct.unpack('<{}Q'.format(nr_chunks), read_memory(begin, nr_chunks * 8)):
+            for i in range(min(sz, chunk_capacity)):
+                yield chunk + i * elem_size
                 sz -= 1
 
+    def __iter__(self):
+        elem_type = self.ref.type.template_argument(0)
+        for addr in self.addresses():
+            yield value_at(addr, elem_type)
+
     def external_memory_footprint(self):
         return int(self.ref['_capacity']) * self.ref.type.template_argument(0).sizeof \
                + small_vector(self.ref['_chunks']).external_memory_footprint()
@@ -3436,15 +4616,35 @@ class scylla_task_queues(gdb.Command):
         return ' '
 
     def invoke(self, arg, for_tty):
+        parser = argparse.ArgumentParser(description="scylla task-queues")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        task_queues = [{
+                'id': int(tq['_id']),
+                'name': str(tq['_name']),
+                'shares': float(tq['_shares']),
+                'tasks': len(circular_buffer(tq['_q'])),
+                'active': bool(tq['_active']),
+                'current': bool(tq['_current']),
+            } for tq in get_local_task_queues()]
+
+        if args.json:
+            write_json(args.json, task_queues)
+            return
+
         gdb.write('   {:2} {:32} {:7} {}\n'.format("id", "name", "shares", "tasks"))
-        for tq in get_local_task_queues():
+        for tq in task_queues:
             gdb.write('{}{} {:02} {:32} {:>7.2f} {}\n'.format(
-                    self._current(bool(tq['_current'])),
-                    self._active(bool(tq['_active'])),
-                    int(tq['_id']),
-                    str(tq['_name']),
-                    float(tq['_shares']),
-                    len(circular_buffer(tq['_q']))))
+                    self._current(tq['current']),
+                    self._active(tq['active']),
+                    tq['id'],
+                    tq['name'],
+                    tq['shares'],
+                    tq['tasks']))
 
 
 class scylla_io_queues(gdb.Command):
@@ -3484,15 +4684,40 @@ class scylla_io_queues(gdb.Command):
         def __init__(self, ref):
             self.ref = ref
 
+        def to_dict(self):
+            return {'weight': int(self.ref['_weight']), 'size': int(self.ref['_size'])}
+
         def __str__(self):
             return f"Ticket(weight: {self.ref['_weight']}, size: {self.ref['_size']})"
 
+    # Labels of the fair-group capacity values, in printing order
+    _capacity_labels = [
+        ('cost_capacity', 'Cost capacity:'),
+        ('max_capacity', 'Max capacity:'),
+        ('capacity_tail', 'Capacity tail:'),
+        ('capacity_head', 'Capacity head:'),
+        ('capacity_ceil', 'Capacity ceil:'),
+    ]
+
+    @staticmethod
+    def _format_capacity(value):
+        if isinstance(value, dict):
+            return "Ticket(weight: {}, size: {})".format(value['weight'], value['size'])
+        return str(value)
+
     @staticmethod
-    def _print_io_priority_class(pclass, names_from_ptrs, indent = '\t\t'):
-        gdb.write("{}Class {}:\n".format(indent, names_from_ptrs.get(pclass.address, pclass.address)))
+    def _collect_io_priority_class(pclass, names_from_ptrs):
         slist = intrusive_slist(pclass['_queue'], link='_hook')
-        for entry in slist:
-            gdb.write("{}\t{}\n".format(indent, scylla_io_queues.ticket(entry['_ticket'])))
+        return {
+            'class': str(names_from_ptrs.get(pclass.address, pclass.address)),
+            'tickets': [scylla_io_queues.ticket(entry['_ticket']).to_dict() for entry in slist],
+        }
+
+    @staticmethod
+    def _print_io_priority_class(pclass, indent = '\t\t'):
+        gdb.write("{}Class {}:\n".format(indent, pclass['class']))
+        for t in pclass['tickets']:
+            gdb.write("{}\t{}\n".format(indent, scylla_io_queues._format_capacity(t)))
 
     def _get_classes_infos(self, ioq):
         try:
@@ -3501,22 +4726,42 @@ class scylla_io_queues(gdb.Command):
             # Compatibility: io_queue::_registered_... stuff moved onto io_priority_class in version 4.6
             return [ { 'name': x[0], 'shares': x[1] } for x in zip(std_array(ioq['_registered_names']), std_array(ioq['_registered_shares'])) ]
 
-    def invoke(self, arg, for_tty):
+    def _collect_capacity(self, fg):
+        try:
+            capacity = {'cost_capacity': self.ticket(fg['_cost_capacity']).to_dict()}
+            try:
+                capacity['capacity_tail'] = int(std_atomic(fg['_token_bucket']['_rovers']['tail']).get())
+                capacity['capacity_head'] = int(std_atomic(fg['_token_bucket']['_rovers']['head']).get())
+                capacity['capacity_ceil'] = int(std_atomic(fg['_token_bucket']['_rovers']['ceil']).get())
+            except gdb.error:
+                capacity['capacity_tail'] = int(std_atomic(fg['_capacity_tail']).get())
+                capacity['capacity_head'] = int(std_atomic(fg['_capacity_head']).get())
+                capacity['capacity_ceil'] = int(std_atomic(fg['_capacity_ceil']).get())
+        except gdb.error:
+            capacity = {
+                'max_capacity': self.ticket(fg['_maximum_capacity']).to_dict(),
+                'capacity_tail': self.ticket(std_atomic(fg['_capacity_tail']).get()).to_dict(),
+                'capacity_head': self.ticket(std_atomic(fg['_capacity_head']).get()).to_dict(),
+            }
+        return capacity
+
+    def collect(self):
+        devices = []
         for dev, ioq in get_local_io_queues():
-            gdb.write("Dev {}:\n".format(dev))
-
             infos = self._get_classes_infos(ioq)
             pclasses = std_vector(ioq['_priority_classes'])
 
             names_from_ptrs = {}
-
-            gdb.write("\t{:24}|{:16}|{:46}\n".format("Class:", "shares:", "ptr:"))
-            gdb.write("\t" + '-'*64 + "\n")
+            classes = []
             for i, pclass in enumerate(pclasses):
                 pclass_ptr = std_unique_ptr(pclass).get()
                 names_from_ptrs[pclass_ptr] = infos[i]['name']
-                gdb.write("\t{:24}|{:16}|({:30}){:16}\n".format(str(infos[i]['name']), str(infos[i]['shares']), str(pclass_ptr.type), str(pclass_ptr)))
-            gdb.write("\n")
+                classes.append({
+                    'name': str(infos[i]['name']),
+                    'shares': str(infos[i]['shares']),
+                    'type': str(pclass_ptr.type),
+                    'ptr': str(pclass_ptr),
+                })
 
             group = std_shared_ptr(ioq['_group']).get().dereference()
             try:
@@ -3528,38 +4773,65 @@ class scylla_io_queues(gdb.Command):
                 f_queues = [ ioq['_fq'] ]
                 fq_pclass = lambda x : seastar_lw_shared_ptr(x).get().dereference()
 
-            gdb.write("\t{} streams\n".format(len(f_groups)))
+            streams = []
+            for fg, fq in zip(f_groups, f_queues):
+                streams.append({
+                    'capacity': self._collect_capacity(fg),
+                    'resources_executing': self.ticket(fq['_resources_executing']).to_dict(),
+                    'resources_queued': self.ticket(fq['_resources_queued']).to_dict(),
+                    'handles': [self._collect_io_priority_class(fq_pclass(pclass_ptr), names_from_ptrs)
+                            for pclass_ptr in std_priority_queue(fq['_handles'])],
+                })
+
+            devices.append({
+                'dev': int(dev),
+                'classes': classes,
+                'streams': streams,
+                'pending_in_sink': [str(op['_completion']) for op in circular_buffer(ioq['_sink']['_pending_io'])],
+            })
+        return devices
+
+    def invoke(self, arg, for_tty):
+        parser = argparse.ArgumentParser(description="scylla io-queues")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        devices = self.collect()
+
+        if args.json:
+            write_json(args.json, devices)
+            return
+
+        for device in devices:
+            gdb.write("Dev {}:\n".format(device['dev']))
+
+            gdb.write("\t{:24}|{:16}|{:46}\n".format("Class:", "shares:", "ptr:"))
+            gdb.write("\t" + '-'*64 + "\n")
+            for pclass in device['classes']:
+                gdb.write("\t{:24}|{:16}|({:30}){:16}\n".format(pclass['name'], pclass['shares'], pclass['type'], pclass['ptr']))
             gdb.write("\n")
 
-            for fg, fq in zip(f_groups, f_queues):
-                try:
-                    gdb.write("\tCost capacity:       {}\n".format(self.ticket(fg['_cost_capacity'])))
-                    try:
-                        gdb.write("\tCapacity tail:       {}\n".format(std_atomic(fg['_token_bucket']['_rovers']['tail']).get()))
-                        gdb.write("\tCapacity head:       {}\n".format(std_atomic(fg['_token_bucket']['_rovers']['head']).get()))
-                        gdb.write("\tCapacity ceil:       {}\n".format(std_atomic(fg['_token_bucket']['_rovers']['ceil']).get()))
-                    except gdb.error:
-                        gdb.write("\tCapacity tail:       {}\n".format(std_atomic(fg['_capacity_tail']).get()))
-                        gdb.write("\tCapacity head:       {}\n".format(std_atomic(fg['_capacity_head']).get()))
-                        gdb.write("\tCapacity ceil:       {}\n".format(std_atomic(fg['_capacity_ceil']).get()))
-                    gdb.write("\n")
-                except gdb.error:
-                    gdb.write("\tMax capacity:        {}\n".format(self.ticket(fg['_maximum_capacity'])))
-                    gdb.write("\tCapacity tail:       {}\n".format(self.ticket(std_atomic(fg['_capacity_tail']).get())))
-                    gdb.write("\tCapacity head:       {}\n".format(self.ticket(std_atomic(fg['_capacity_head']).get())))
-                    gdb.write("\n")
+            gdb.write("\t{} streams\n".format(len(device['streams'])))
+            gdb.write("\n")
+
+            for stream in device['streams']:
+                for key, label in self._capacity_labels:
+                    if key in stream['capacity']:
+                        gdb.write("\t{:20} {}\n".format(label, self._format_capacity(stream['capacity'][key])))
+                gdb.write("\n")
 
-                gdb.write("\tResources executing: {}\n".format(self.ticket(fq['_resources_executing'])))
-                gdb.write("\tResources queued:    {}\n".format(self.ticket(fq['_resources_queued'])))
-                handles = std_priority_queue(fq['_handles'])
-                gdb.write("\tHandles: ({})\n".format(len(handles)))
-                for pclass_ptr in handles:
-                    self._print_io_priority_class(fq_pclass(pclass_ptr), names_from_ptrs)
+                gdb.write("\tResources executing: {}\n".format(self._format_capacity(stream['resources_executing'])))
+                gdb.write("\tResources queued:    {}\n".format(self._format_capacity(stream['resources_queued'])))
+                gdb.write("\tHandles: ({})\n".format(len(stream['handles'])))
+                for pclass in stream['handles']:
+                    self._print_io_priority_class(pclass)
 
-            pending = circular_buffer(ioq['_sink']['_pending_io'])
-            gdb.write("\tPending in sink: ({})\n".format(len(pending)))
-            for op in pending:
-                gdb.write("Completion {}\n".format(op['_completion']))
+            gdb.write("\tPending in sink: ({})\n".format(len(device['pending_in_sink'])))
+            for completion in device['pending_in_sink']:
+                gdb.write("Completion {}\n".format(completion))
 
 
 
@@ -3584,6 +4856,28 @@ class scylla_fiber(gdb.Command):
     4) Pointer to the task's vtable.
     5) Symbol name of the task's vtable.
 
+    With `--all`, the command builds the waits-on graph of all the tasks in the
+    task queues of the current shard and reports the longest chains and the
+    hottest join points (tasks which are waited on by the most chains).
+
+    Example (cropped for brevity):
+    (gdb) scylla fiber --all
+    Waits-on graph: 2012 tasks, 1450 edges, starting from 562 queued tasks
+
+    Longest chains:
+      length head -> tail
+          14 (task*) 0x0000600016217c80 vtable for seastar::continuation<...> + 16
+             -> (task*) 0x0000600023f59a50 vtable for seastar::continuation<...> + 16
+
+    Hottest join points:
+      waiters chains task
+           12     48 (task*) 0x000060000ac42940 vtable for seastar::internal::when_all_state<...> + 16
+
+    Probe results and the edges found between tasks are cached for the
+    duration of the gdb session, so walking overlapping fibers repeatedly is
+    cheap. When debugging a live process, use `--clear-cache` after the
+    process was resumed.
+
     Invoke `scylla fiber --help` for more information on usage.
     """
 
@@ -3592,6 +4886,14 @@ class scylla_fiber(gdb.Command):
         self._vptr_type = gdb.lookup_type('uintptr_t').pointer()
         self._task_symbol_matcher = task_symbol_matcher()
         self._thread_map = None
+        # (ptr, scanned_region_size, using_seastar_allocator) -> _probe_pointer() result
+        self._probe_cache = {}
+        # (walk method name, ptr) -> next task in that direction (_probe_pointer() result)
+        self._edge_cache = {}
+
+    def clear_cache(self):
+        self._probe_cache = {}
+        self._edge_cache = {}
 
     def _name_is_on_whitelist(self, name):
         return self._task_symbol_matcher(name)
@@ -3616,6 +4918,19 @@ class scylla_fiber(gdb.Command):
         else:
             ptr_meta = None
 
+        key = (int(ptr), scanned_region_size, using_seastar_allocator)
+        try:
+            res = self._probe_cache[key]
+            self._maybe_log("\t(cached) {}\n".format("Task found" if res else "Not a task"), verbose)
+            return res
+        except KeyError:
+            pass
+
+        res = self._do_probe_pointer(ptr, ptr_meta, scanned_region_size, using_seastar_allocator, verbose)
+        self._probe_cache[key] = res
+        return res
+
+    def _do_probe_pointer(self, ptr, ptr_meta, scanned_region_size, using_seastar_allocator, verbose):
         try:
             maybe_vptr = int(gdb.Value(ptr).reinterpret_cast(self._vptr_type).dereference())
             self._maybe_log("\t-> 0x{:016x}\n".format(maybe_vptr), verbose)
@@ -3749,6 +5064,20 @@ class scylla_fiber(gdb.Command):
 
         return res
 
+    def _step(self, walk_method, tptr_meta, name, i, max_depth, scanned_region_size, using_seastar_allocator, verbose):
+        """Like walk_method() but consults and populates the edge cache"""
+        key = (walk_method.__name__, int(tptr_meta.ptr), scanned_region_size, using_seastar_allocator)
+        try:
+            res = self._edge_cache[key]
+            self._maybe_log("Using cached edge for task #{} @ 0x{:016x}\n".format(i, int(tptr_meta.ptr)), verbose)
+            return res
+        except KeyError:
+            pass
+
+        res = walk_method(tptr_meta, name, i, max_depth, scanned_region_size, using_seastar_allocator, verbose)
+        self._edge_cache[key] = res
+        return res
+
     def _walk(self, walk_method, tptr_meta, name, max_depth, scanned_region_size, using_seastar_allocator, verbose):
         i = 0
         fiber = []
@@ -3758,7 +5087,7 @@ class scylla_fiber(gdb.Command):
                 break
 
             self._maybe_log("_walk() 0x{:x} {}\n".format(int(tptr_meta.ptr), name), verbose)
-            res = walk_method(tptr_meta, name, i + 1, max_depth, scanned_region_size, using_seastar_allocator, verbose)
+            res = self._step(walk_method, tptr_meta, name, i + 1, max_depth, scanned_region_size, using_seastar_allocator, verbose)
             if res is None:
                 break
 
@@ -3776,6 +5105,115 @@ class scylla_fiber(gdb.Command):
 
         return fiber
 
+    def _build_waits_on_graph(self, max_depth, scanned_region_size, using_seastar_allocator, verbose):
+        """Build the waits-on graph of all the tasks in the local task queues.
+
+        Each queued task is walked forward, until the end of its chain, a task
+        already walked or max_depth is reached.
+        Returns (roots, tasks, successors), where:
+        * roots: the list of the addresses of the queued tasks, which are tasks;
+        * tasks: address -> (ptr_meta, vptr, name) of all the discovered tasks;
+        * successors: address -> address of the task waiting on the task (if any);
+        """
+        roots = []
+        tasks = {}
+        successors = {}
+
+        for ptr in get_local_tasks():
+            res = self._probe_pointer(int(ptr), scanned_region_size, using_seastar_allocator, verbose)
+            if res is None:
+                continue
+            root = int(res[0].ptr)
+            roots.append(root)
+            tasks[root] = res
+
+            current = root
+            depth = 0
+            while current not in successors:
+                if max_depth > -1 and depth >= max_depth:
+                    break
+                tptr_meta, _, name = tasks[current]
+                res = self._step(self._walk_forward, tptr_meta, name, depth + 1, max_depth, scanned_region_size, using_seastar_allocator, verbose)
+                if res is None:
+                    successors[current] = None
+                    break
+                nxt = int(res[0].ptr)
+                successors[current] = nxt
+                if nxt in tasks:
+                    break # joined an already walked chain, or a loop
+                tasks[nxt] = res
+                current = nxt
+                depth += 1
+
+        return roots, tasks, successors
+
+    def _analyze_waits_on_graph(self, roots, successors):
+        """Return (chains, waiters, chains_through) for the graph.
+
+        * chains: list of (length, root, tail), one for each root;
+        * waiters: address -> number of distinct tasks directly waiting on it;
+        * chains_through: address -> number of chains passing through it;
+        """
+        waiters = defaultdict(int)
+        for ptr, nxt in successors.items():
+            if nxt is not None:
+                waiters[nxt] += 1
+
+        chains = []
+        chains_through = defaultdict(int)
+        for root in roots:
+            seen = set()
+            current = root
+            while True:
+                seen.add(current)
+                chains_through[current] += 1
+                nxt = successors.get(current)
+                if nxt is None or nxt in seen:
+                    break
+                current = nxt
+            chains.append((len(seen), root, current))
+
+        chains.sort(key=lambda c: c[0], reverse=True)
+        return chains, waiters, chains_through
+
+    def _invoke_all(self, args, using_seastar_allocator):
+        roots, tasks, successors = self._build_waits_on_graph(args.max_depth, args.scanned_region_size, using_seastar_allocator, args.verbose)
+        chains, waiters, chains_through = self._analyze_waits_on_graph(roots, successors)
+        join_points = sorted((ptr for ptr, n in waiters.items() if n > 1), key=lambda ptr: (waiters[ptr], chains_through[ptr]), reverse=True)
+
+        def task_to_dict(ptr):
+            tptr_meta, vptr, name = tasks[ptr]
+            return {'task': ptr, 'vptr': int(vptr), 'name': name}
+
+        if args.json:
+            write_json(args.json, {
+                'tasks': len(tasks),
+                'edges': sum(1 for nxt in successors.values() if nxt is not None),
+                'queued_tasks': len(roots),
+                'chains': [{'length': length, 'head': task_to_dict(head), 'tail': task_to_dict(tail)} for length, head, tail in chains],
+                'join_points': [dict(waiters=waiters[ptr], chains=chains_through[ptr], **task_to_dict(ptr)) for ptr in join_points],
+            })
+            return
+
+        def format_task(ptr):
+            tptr_meta, vptr, name = tasks[ptr]
+            return "(task*) 0x{:016x} {}".format(ptr, name)
+
+        gdb.write("Waits-on graph: {} tasks, {} edges, starting from {} queued tasks\n\n".format(
+                len(tasks), sum(1 for nxt in successors.values() if nxt is not None), len(roots)))
+
+        gdb.write("Longest chains:\n")
+        gdb.write("  {:>6} {}\n".format("length", "head -> tail"))
+        for length, head, tail in chains[:args.top]:
+            gdb.write("  {:6} {}\n".format(length, format_task(head)))
+            if tail != head:
+                gdb.write("  {:6} -> {}\n".format("", format_task(tail)))
+
+        gdb.write("\nHottest join points:\n")
+        gdb.write("  {:>7} {:>6} {}\n".format("waiters", "chains", "task"))
+        for ptr in join_points[:args.top]:
+            gdb.write("  {:7} {:6} {}\n".format(waiters[ptr], chains_through[ptr], format_task(ptr)))
+
     def invoke(self, arg, for_tty):
         parser = argparse.ArgumentParser(description="scylla fiber")
         parser.add_argument("-v", "--verbose", action="store_true", default=False,
@@ -3789,13 +5227,31 @@ class scylla_fiber(gdb.Command):
         parser.add_argument("--force-fallback-mode", action="store_true", default=False,
                 help="Force fallback mode to be used, that is, scan a fixed-size region of memory"
                 " (configurable via --scanned-region-size), instead of relying on `scylla ptr` for determining the size of the task objects.")
-        parser.add_argument("task", action="store", help="An expression that evaluates to a valid `seastar::task*` value. Cannot contain white-space.")
+        parser.add_argument("-a", "--all", action="store_true", default=False,
+                help="Build the waits-on graph of all tasks in the task queues of the current shard and report the longest chains"
+                " and the hottest join points, instead of walking a single fiber.")
+        parser.add_argument("-t", "--top", action="store", type=int, default=10,
+                help="The number of chains and join points to report with `--all`. Defaults to 10.")
+        parser.add_argument("--clear-cache", action="store_true", default=False,
+                help="Drop the probe results and edges cached by previous invocations."
+                " Should be used when debugging a live process, after the process was resumed.")
+        add_json_argument(parser)
+        parser.add_argument("task", action="store", nargs="?",
+                help="An expression that evaluates to a valid `seastar::task*` value. Cannot contain white-space. Required, unless `--all` is used.")
 
         try:
             args = parser.parse_args(arg.split())
         except SystemExit:
             return
 
+        if args.clear_cache:
+            self.clear_cache()
+
+        if args.task is None and not args.all:
+            if not args.clear_cache:
+                gdb.write("Either a task or `--all` has to be provided, see `scylla fiber --help`\n")
+            return
+
         if self._thread_map is None:
             self._thread_map = {}
             for r in reactors():
@@ -3812,6 +5268,10 @@ class scylla_fiber(gdb.Command):
             if not using_seastar_allocator:
                 gdb.write("Not using the seastar allocator, falling back to scanning a fixed-size region of memory\n")
 
+            if args.all:
+                self._invoke_all(args, using_seastar_allocator)
+                return
+
             initial_task_ptr = int(gdb.parse_and_eval(args.task))
             this_task = self._probe_pointer(initial_task_ptr, args.scanned_region_size, using_seastar_allocator, args.verbose)
             if this_task is None:
@@ -3841,11 +5301,13 @@ class scylla_fiber(gdb.Command):
 
 
 def find_objects(mem_start, mem_size, value, size_selector='g', only_live=True):
+    hits = []
     for line in gdb.execute("find/%s 0x%x, +0x%x, 0x%x" % (size_selector, mem_start, mem_size, value), to_string=True).split('\n'):
         if line.startswith('0x'):
-            ptr_meta = scylla_ptr.analyze(int(line, base=16))
-            if not only_live or ptr_meta.is_live:
-                yield ptr_meta
+            hits.append(int(line.split()[0], base=16))
+    for ptr_meta in scylla_ptr.analyze_many(hits):
+        if not only_live or ptr_meta.is_live:
+            yield ptr_meta
 
 
 class scylla_find(gdb.Command):
@@ -4052,7 +5514,8 @@ class scylla_cache(gdb.Command):
     def __init__(self):
         gdb.Command.__init__(self, 'scylla cache', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
 
-    def __partitions(self, table):
+    @staticmethod
+    def partitions(table):
         try:
             return double_decker(table['_cache']['_partitions'])
         except gdb.error:
@@ -4065,7 +5528,7 @@ class scylla_cache(gdb.Command):
             schema = table['_schema']['_p'].reinterpret_cast(schema_ptr_type)
             name = '%s.%s' % (schema['_raw']['_ks_name'], schema['_raw']['_cf_name'])
             gdb.write("%s:\n" % (name))
-            for e in self.__partitions(table):
+            for e in scylla_cache.partitions(table):
                 gdb.write('  (cache_entry*) 0x%x {_key=%s, _flags=%s, _pe=%s}\n' % (
                     int(e.address), e['_key'], e['_flags'], e['_pe']))
             gdb.write("\n")
@@ -4136,6 +5599,7 @@ class scylla_sstables(gdb.Command):
         parser = argparse.ArgumentParser(description="scylla sstables")
         parser.add_argument("-t", "--tables", action="store_true", help="Only consider sstables attached to tables")
         parser.add_argument("--histogram", action="store_true", help="Instead of printing all sstables, print a histogram of the number of sstables per table")
+        add_json_argument(parser)
         try:
             args = parser.parse_args(arg.split())
         except SystemExit:
@@ -4149,6 +5613,7 @@ class scylla_sstables(gdb.Command):
 
         sstable_generator = find_sstables_attached_to_tables if args.tables else find_sstables
         sstable_histogram = histogram(print_indicators=False)
+        sstables = []
 
         for sst in sstable_generator():
             try:
@@ -4196,6 +5661,18 @@ class scylla_sstables(gdb.Command):
             schema = schema_ptr(sst['_schema'])
             if args.histogram:
                 sstable_histogram.add(schema.table_name())
+            elif args.json:
+                sstables.append({
+                    'address': int(sst),
+                    'local': bool(local),
+                    'data_file': int(data_file_size),
+                    'in_memory': int(size),
+                    'bf': int(bf_size),
+                    'summary': int(summary_size),
+                    'sm': int(sm_size),
+                    'table': str(schema.table_name()),
+                    'filename': scylla_sstables.filename(sst),
+                })
             else:
                 gdb.write('(sstables::sstable*) 0x%x: local=%d data_file=%d, in_memory=%d (bf=%d, summary=%d, sm=%d) %s filename=%s\n'
                           % (int(sst), local, data_file_size, size, bf_size, summary_size, sm_size, schema.table_name(), scylla_sstables.filename(sst)))
@@ -4204,6 +5681,15 @@ class scylla_sstables(gdb.Command):
                 total_size += size
                 total_on_disk_size += data_file_size
 
+        if args.json:
+            data = {'total': {'count': count, 'data_file': int(total_on_disk_size), 'in_memory': int(total_size)}}
+            if args.histogram:
+                data['histogram'] = {str(table): c for table, c in sstable_histogram.items()}
+            else:
+                data['sstables'] = sstables
+            write_json(args.json, data)
+            return
+
         if args.histogram:
            sstable_histogram.print_to_console()
 
@@ -4217,29 +5703,263 @@ class scylla_memtables(gdb.Command):
         gdb.Command.__init__(self, 'scylla memtables', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
 
     @staticmethod
-    def dump_memtable_list(memtable_list):
+    def collect_memtable_list(memtable_list):
         region_ptr_type = gdb.lookup_type('logalloc::region').pointer()
+        memtables = []
         for mt_ptr in std_vector(memtable_list['_memtables']):
             mt = seastar_lw_shared_ptr(mt_ptr).get()
             reg = lsa_region(mt.cast(region_ptr_type))
-            gdb.write('  (memtable*) 0x%x: total=%d, used=%d, free=%d, flushed=%d\n' % (mt, reg.total(), reg.used(), reg.free(), mt['_flushed_memory']))
+            memtables.append({
+                'address': int(mt),
+                'total': int(reg.total()),
+                'used': int(reg.used()),
+                'free': int(reg.free()),
+                'flushed': int(mt['_flushed_memory']),
+            })
+        return memtables
+
+    @staticmethod
+    def collect_compaction_group_memtables(compaction_group):
+        return scylla_memtables.collect_memtable_list(seastar_lw_shared_ptr(compaction_group['_memtables']).get())
+
+    @staticmethod
+    def collect_table_memtables(table):
+        try:
+            memtables = []
+            for cg_ptr in std_vector(table["_compaction_groups"]):
+                memtables += scylla_memtables.collect_compaction_group_memtables(std_unique_ptr(cg_ptr).get())
+            return memtables
+        except gdb.error:
+            try:
+                return scylla_memtables.collect_compaction_group_memtables(std_unique_ptr(table["_compaction_group"]).get())
+            except gdb.error:
+                return scylla_memtables.collect_memtable_list(seastar_lw_shared_ptr(table['_memtables']).get()) # Scylla 5.1 compatibility
+
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla memtables")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
+        db = find_db()
+        tables = [{
+                'table': str(schema_ptr(table['_schema']).table_name()),
+                'memtables': scylla_memtables.collect_table_memtables(table),
+            } for table in all_tables(db)]
+
+        if args.json:
+            write_json(args.json, tables)
+            return
+
+        for table in tables:
+            gdb.write('table %s:\n' % table['table'])
+            for mt in table['memtables']:
+                gdb.write('  (memtable*) 0x%x: total=%d, used=%d, free=%d, flushed=%d\n' % (mt['address'], mt['total'], mt['used'], mt['free'], mt['flushed']))
+
+class partition_entry_walker:
+    """Reads the versions and rows of cache and memtable entries from raw memory.
+
+    Works with any entry type which holds a partition_entry in a `_pe` member,
+    i.e. cache_entry and memtable_entry.
+    """
+    def __init__(self, entry_type):
+        self.entry_type = entry_type.strip_typedefs()
+        layout = type_layout.get(self.entry_type)
+        self._version_offset = layout.offset('_pe', '_version', '_version')
+        version_type = layout.field_type('_pe', '_version', '_version').target()
+        version_layout = type_layout.get(version_type)
+        self._version_size = version_type.sizeof
+        self._next_offset = version_layout.offset('_next')
+        self._rows_offset = version_layout.offset('_partition', '_rows')
+        self._rows_type = version_layout.field_type('_partition', '_rows')
+        self._rows_tree = None
+
+    def versions(self, entry):
+        v = read_pointer(entry + self._version_offset)
+        while v:
+            yield v
+            v = read_pointer(v + self._next_offset)
+
+    def rows(self, version):
+        rows = version + self._rows_offset
+        if self._rows_tree is None:
+            self._rows_tree = intrusive_btree(value_at(rows, self._rows_type))
+        return sum(1 for _ in self._rows_tree.addresses(rows))
+
+    def footprint(self, entry, count_rows=True):
+        """Return (versions, rows, size lower bound) of the entry at address entry.
+
+        The size only accounts for the fixed-size part of the entry, its
+        versions and rows. Cells, keys and tree nodes are not included, so it
+        is a lower bound of the LSA memory used by the partition.
+        """
+        nr_versions = 0
+        nr_rows = 0
+        for v in self.versions(entry):
+            nr_versions += 1
+            if count_rows:
+                nr_rows += self.rows(v)
+        size = self.entry_type.sizeof + nr_versions * self._version_size
+        if self._rows_tree is not None:
+            size += nr_rows * self._rows_tree.key_type.sizeof
+        return nr_versions, nr_rows, size
+
+
+class scylla_cache_stats(gdb.Command):
+    """Report the row-cache and memtable memory footprint of each table on the current shard.
+
+    For each table, report the number of cache entries, the ratio of dummy and
+    continuous entries, the number of rows and partition versions, as well as
+    a lower bound of the memory used by them. For memtables, the number of
+    partitions and rows is reported, together with the LSA memory occupied by
+    the memtable regions. Finally, the top-N partitions with the most rows are
+    listed, across all tables.
+
+    Entries are walked via their raw memory layout, so this is fast enough to
+    be used on production-sized caches. Note that size_lower_bound only
+    accounts for the fixed-size part of the entries, their versions and rows:
+    cells, keys and B-tree nodes are not walked, so it can be much lower than
+    the actual LSA memory of the entries, especially for wide cells. The
+    total memory of the cache region is reported for reference.
+
+    Counting rows requires walking the rows of each partition, use --no-rows to
+    skip this on very large caches.
+
+    Example:
+    (gdb) scylla cache-stats --top 2
+    table ks.cf:
+      cache: partitions=1024, dummy=1 (0.1%), continuous=1023 (99.9%), versions=1023, rows=51200, size_lower_bound=13144064
+      memtables: count=1, partitions=12, versions=12, rows=600, lsa_total=1048576, lsa_used=262144
+
+    cache region: total=134217728, used=100663296
+    top 2 partitions by rows:
+      (cache_entry*) 0x60000b2d0080 table=ks.cf versions=1 rows=2000 size_lower_bound=512216 key={...}
+      (replica::memtable_entry*) 0x60000b2e0480 table=ks.cf versions=1 rows=600 size_lower_bound=153816 key={...}
+    """
+
+    def __init__(self):
+        gdb.Command.__init__(self, 'scylla cache-stats', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
+
+    @staticmethod
+    def percent(n, total):
+        return 100 * n / total if total else 0
+
+    @staticmethod
+    def add_top(top, nr_top, item):
+        """Maintain the nr_top greatest items in the top min-heap"""
+        if len(top) < nr_top:
+            heapq.heappush(top, item)
+        elif nr_top and item > top[0]:
+            heapq.heapreplace(top, item)
+
+    @staticmethod
+    def collect_cache(table, name, top, nr_top, count_rows):
+        parts = scylla_cache.partitions(table)
+        entry_type = parts.value_type if isinstance(parts, double_decker) else parts.node_type
+        walker = partition_entry_walker(entry_type)
+        layout = type_layout.get(entry_type)
+        stats = {'partitions': 0, 'dummy': 0, 'continuous': 0, 'versions': 0, 'rows': 0, 'size_lower_bound': 0}
+        for e in parts.addresses():
+            stats['partitions'] += 1
+            if layout.read_bits(e, '_flags', '_dummy_entry'):
+                stats['dummy'] += 1
+            if layout.read_bits(e, '_flags', '_continuous'):
+                stats['continuous'] += 1
+            nr_versions, nr_rows, size = walker.footprint(e, count_rows)
+            stats['versions'] += nr_versions
+            stats['rows'] += nr_rows
+            stats['size_lower_bound'] += size
+            scylla_cache_stats.add_top(top, nr_top, (nr_rows, nr_versions, size, e, name, str(entry_type)))
+        return stats
 
     @staticmethod
-    def dump_compaction_group_memtables(compaction_group):
-        scylla_memtables.dump_memtable_list(seastar_lw_shared_ptr(compaction_group['_memtables']).get())
+    def collect_memtables(table, name, top, nr_top, count_rows):
+        memtable_type = lookup_type(['replica::memtable', 'memtable'])[1]
+        stats = {'count': 0, 'partitions': 0, 'versions': 0, 'rows': 0, 'lsa_total': 0, 'lsa_used': 0}
+        walker = None
+        for mt in scylla_memtables.collect_table_memtables(table):
+            stats['count'] += 1
+            stats['lsa_total'] += mt['total']
+            stats['lsa_used'] += mt['used']
+            parts = double_decker(value_at(mt['address'], memtable_type)['partitions'])
+            if walker is None:
+                walker = partition_entry_walker(parts.value_type)
+            for e in parts.addresses():
+                stats['partitions'] += 1
+                nr_versions, nr_rows, size = walker.footprint(e, count_rows)
+                stats['versions'] += nr_versions
+                stats['rows'] += nr_rows
+                scylla_cache_stats.add_top(top, nr_top, (nr_rows, nr_versions, size, e, name, str(parts.value_type)))
+        return stats
 
     def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla cache-stats")
+        parser.add_argument("-t", "--top", action="store", type=int, default=10,
+                help="Number of partitions with the most rows to list (default: %(default)s)")
+        parser.add_argument("--table", action="store", type=str,
+                help="Only report the table with this name (ks.cf)")
+        parser.add_argument("--no-rows", action="store_true",
+                help="Don't walk the rows of partitions, faster but rows are not counted")
+        parser.add_argument("--no-memtables", action="store_true", help="Don't report memtables")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
+
         db = find_db()
+        count_rows = not args.no_rows
+        tables = []
+        top = []
         for table in all_tables(db):
-            gdb.write('table %s:\n' % schema_ptr(table['_schema']).table_name())
-            try:
-                for cg_ptr in std_vector(table["_compaction_groups"]):
-                    scylla_memtables.dump_compaction_group_memtables(std_unique_ptr(cg_ptr).get())
-            except gdb.error:
-                try:
-                    scylla_memtables.dump_compaction_group_memtables(std_unique_ptr(table["_compaction_group"]).get())
-                except gdb.error:
-                    scylla_memtables.dump_memtable_list(seastar_lw_shared_ptr(table['_memtables']).get()) # Scylla 5.1 compatibility
+            name = str(schema_ptr(table['_schema']).table_name()).replace('"', '')
+            if args.table is not None and name != args.table:
+                continue
+            data = {'table': name, 'cache': scylla_cache_stats.collect_cache(table, name, top, args.top, count_rows)}
+            if not args.no_memtables:
+                data['memtables'] = scylla_cache_stats.collect_memtables(table, name, top, args.top, count_rows)
+            tables.append(data)
+
+        cache_region = lsa_region(db['_row_cache_tracker']['_region'])
+        top_partitions = [{
+                'address': addr,
+                'type': entry_type,
+                'table': name,
+                'versions': versions,
+                'rows': rows,
+                'size_lower_bound': size,
+                'key': str(value_at(addr, gdb.lookup_type(entry_type))['_key']),
+            } for rows, versions, size, addr, name, entry_type in sorted(top, reverse=True)]
+
+        if args.json:
+            write_json(args.json, {
+                'tables': tables,
+                'cache_region': {'total': int(cache_region.total()), 'used': int(cache_region.used())},
+                'top_partitions_by_rows': top_partitions,
+            })
+            return
+
+        for data in tables:
+            c = data['cache']
+            gdb.write('table {}:\n'.format(data['table']))
+            gdb.write('  cache: partitions={}, dummy={} ({:.1f}%), continuous={} ({:.1f}%), versions={}, rows={}, size_lower_bound={}\n'.format(
+                    c['partitions'],
+                    c['dummy'], scylla_cache_stats.percent(c['dummy'], c['partitions']),
+                    c['continuous'], scylla_cache_stats.percent(c['continuous'], c['partitions']),
+                    c['versions'], c['rows'], c['size_lower_bound']))
+            if 'memtables' in data:
+                m = data['memtables']
+                gdb.write('  memtables: count={}, partitions={}, versions={}, rows={}, lsa_total={}, lsa_used={}\n'.format(
+                        m['count'], m['partitions'], m['versions'], m['rows'], m['lsa_total'], m['lsa_used']))
+
+        gdb.write('\ncache region: total={}, used={}\n'.format(int(cache_region.total()), int(cache_region.used())))
+        gdb.write('top {} partitions by rows:\n'.format(len(top_partitions)))
+        for p in top_partitions:
+            gdb.write('  ({}*) 0x{:x} table={} versions={} rows={} size_lower_bound={} key={}\n'.format(
+                    p['type'], p['address'], p['table'], p['versions'], p['rows'], p['size_lower_bound'], p['key']))
+
 
 def escape_html(s):
     return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
@@ -4559,6 +6279,8 @@ class scylla_small_objects(gdb.Command):
     To list a certain page, use the `-p|--page` flag. To find out the number of
     total objects and pages, use `--summarize`.
     To sample random pages, use `--random-page`.
+    To estimate the number of objects without scanning the entire pool, use
+    `--summarize --estimate`.
 
     If objects have a vtable, its type is resolved and this will appear in the
     listing.
@@ -4579,6 +6301,12 @@ class scylla_small_objects(gdb.Command):
     page size        : 20
     number of pages  : 3009845
 
+    (gdb) scylla small-objects -o 32 --summarize --estimate
+    sampled pages    : 4200 out of 26214400
+    number of objects: 60211548 +/- 1771019 (95% confidence)
+    page size        : 20
+    number of pages  : 3010577
+
     (gdb) scylla small-objects -o 32 -p 100
     page 100: 2000-2019
     [2000] 0x635002ecba00
@@ -4610,7 +6338,7 @@ class scylla_small_objects(gdb.Command):
             self._text_ranges = get_text_ranges()
             self._vptr_type = gdb.lookup_type('uintptr_t').pointer()
             self._free_object_ptr = gdb.lookup_type('void').pointer().pointer()
-            self._page_size = int(gdb.parse_and_eval('\'seastar::memory::page_size\''))
+            self._page_size = cached_constant('\'seastar::memory::page_size\'')
             self._free_in_pool = set()
             self._free_in_span = set()
 
@@ -4696,6 +6424,39 @@ class scylla_small_objects(gdb.Command):
 
         return None
 
+    @staticmethod
+    def estimate_objects(small_pool, nr_samples, precision):
+        """Estimate the number of live objects in the pool by sampling random pages.
+
+        Returns a sample_estimator, with the pool's object size as the sole item.
+        """
+        object_size = int(small_pool['_object_size'])
+        free_object_ptr = gdb.lookup_type('void').pointer().pointer()
+        nr_pages = int(gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')['nr_pages'])
+
+        def free_list(head):
+            objs = set()
+            while head:
+                objs.add(int(head))
+                head = head.reinterpret_cast(free_object_ptr).dereference()
+            return objs
+
+        free_in_pool = free_list(small_pool['_free'])
+        free_in_spans = {} # span page address -> free objects
+        estimator = sample_estimator(nr_pages)
+        for span_page, objects in random_small_pages(nr_samples, object_size):
+            count = 0
+            if span_page is not None and span_page['pool'] == small_pool.address:
+                span_key = int(span_page.address)
+                if span_key not in free_in_spans:
+                    free_in_spans[span_key] = free_list(span_page['freelist'])
+                free_in_span = free_in_spans[span_key]
+                count = sum(1 for obj in objects if obj not in free_in_span and obj not in free_in_pool)
+            estimator.add_unit({object_size: count})
+            if precision and estimator.units % 100 == 0 and estimator.converged(precision):
+                break
+        return estimator
+
     def init_parser(self):
         parser = argparse.ArgumentParser(description="scylla small-objects")
         parser.add_argument("-o", "--object-size", action="store", type=int, required=True,
@@ -4706,8 +6467,16 @@ class scylla_small_objects(gdb.Command):
         parser.add_argument("--random-page", action="store_true", help="Show a random page.")
         parser.add_argument("--summarize", action="store_true",
                 help="Print the number of objects and pages in the pool.")
+        parser.add_argument("--estimate", action="store_true",
+                help="Estimate the number of objects from random pages instead of scanning the pool. Used with `--summarize`.")
+        parser.add_argument("-m", "--samples", action="store", type=int, default=20000,
+                help="Maximum number of pages to sample with `--estimate`. Defaults to 20000.")
+        parser.add_argument("--precision", action="store", type=float, default=0.05,
+                help="Stop sampling once the confidence interval is within PRECISION of the estimate (relative half-width)."
+                " Used with `--estimate`. Defaults to 0.05. Set to 0 to disable early stopping.")
         parser.add_argument("--verbose", action="store_true",
                 help="Print additional details on what is going on.")
+        add_json_argument(parser)
 
         self._parser = parser
 
@@ -4748,12 +6517,44 @@ class scylla_small_objects(gdb.Command):
         if small_pool is None:
             raise ValueError("{} is not a valid object size for any small pools, valid object sizes are: {}", scylla_small_objects.get_object_sizes())
 
+        if args.summarize and args.estimate:
+            estimator = scylla_small_objects.estimate_objects(small_pool, args.samples, args.precision)
+            num_objects, half_width = estimator.estimate(args.object_size)
+            if args.json:
+                write_json(args.json, {
+                    'sampled_pages': estimator.units,
+                    'objects': int(num_objects),
+                    'objects_half_width': int(half_width),
+                    'page_size': args.page_size,
+                    'pages': int(num_objects / args.page_size),
+                })
+                return
+            gdb.write("sampled pages    : {} out of {}\n"
+                      "number of objects: {} +/- {} (95% confidence)\n"
+                      "page size        : {}\n"
+                      "number of pages  : {}\n"
+                .format(
+                    estimator.units,
+                    int(gdb.parse_and_eval('\'seastar::memory::cpu_mem\'')['nr_pages']),
+                    int(num_objects),
+                    int(half_width),
+                    args.page_size,
+                    int(num_objects / args.page_size)))
+            return
+
         if args.summarize:
             if self._last_object_size != args.object_size:
                 if args.verbose:
                     gdb.write("Object size changed ({} -> {}), scanning pool.\n".format(self._last_object_size, args.object_size))
                 self._num_objects = len(self.get_objects(small_pool, verbose=args.verbose))
                 self._last_object_size = args.object_size
+            if args.json:
+                write_json(args.json, {
+                    'objects': self._num_objects,
+                    'page_size': args.page_size,
+                    'pages': int(self._num_objects / args.page_size),
+                })
+                return
             gdb.write("number of objects: {}\n"
                       "page size        : {}\n"
                       "number of pages  : {}\n"
@@ -4774,8 +6575,16 @@ class scylla_small_objects(gdb.Command):
             page = args.page
 
         offset = page * args.page_size
+        objects = self.get_objects(small_pool, offset, args.page_size, resolve_symbols=True, verbose=args.verbose)
+        if args.json:
+            write_json(args.json, {
+                'page': page,
+                'objects': [{'index': offset + i, 'address': obj, 'symbol': sym} for i, (obj, sym) in enumerate(objects)],
+            })
+            return
+
         gdb.write("page {}: {}-{}\n".format(page, offset, offset + args.page_size - 1))
-        for i, (obj, sym) in enumerate(self.get_objects(small_pool, offset, args.page_size, resolve_symbols=True, verbose=args.verbose)):
+        for i, (obj, sym) in enumerate(objects):
             if sym is None:
                 sym_text = ""
             else:
@@ -5189,7 +6998,8 @@ class scylla_read_stats(gdb.Command):
         gdb.Command.__init__(self, 'scylla read-stats', gdb.COMMAND_USER, gdb.COMPLETE_COMMAND)
 
     @staticmethod
-    def dump_reads_from_semaphore(semaphore):
+    def collect_reads_from_semaphore(semaphore):
+        """Summarize the reads of the semaphore, returns None if the semaphore has no reads."""
         try:
             permit_list = semaphore['_permit_list']
         except gdb.error:
@@ -5222,7 +7032,7 @@ class scylla_read_stats(gdb.Command):
             total.add(summary)
 
         if not permit_summaries:
-            return
+            return None
 
         semaphore_name = str(semaphore['_name'])[1:-1]
         initial_count = int(semaphore['_initial_resources']['count'])
@@ -5239,25 +7049,55 @@ class scylla_read_stats(gdb.Command):
         except gdb.error: # 5.1 compatibility
             waiters = int(semaphore["_wait_list"]["_size"])
 
+        permit_summaries_sorted = [(t, d, s, v) for (t, d, s), v in permit_summaries.items()]
+        permit_summaries_sorted.sort(key=lambda x: x[3].resource_memory, reverse=True)
+
+        def stats_to_dict(stats):
+            return {'permits': stats.permits, 'count': stats.resource_count, 'memory': stats.resource_memory}
+
+        return {
+            'name': semaphore_name,
+            'used_count': initial_count - int(semaphore['_resources']['count']),
+            'initial_count': initial_count,
+            'used_memory': initial_memory - int(semaphore['_resources']['memory']),
+            'initial_memory': initial_memory,
+            'waiters': waiters,
+            'inactive_reads': inactive_read_count,
+            'reads': [dict(table=table, description=description, state=state, **stats_to_dict(stats))
+                    for table, description, state, stats in permit_summaries_sorted],
+            'total': stats_to_dict(total),
+        }
+
+    @staticmethod
+    def dump_reads_from_semaphore(semaphore):
+        stats = scylla_read_stats.collect_reads_from_semaphore(semaphore)
+        if stats is None:
+            return
+
         gdb.write("Semaphore {} with: {}/{} count and {}/{} memory resources, queued: {}, inactive={}\n".format(
-                semaphore_name,
-                initial_count - int(semaphore['_resources']['count']), initial_count,
-                initial_memory - int(semaphore['_resources']['memory']), initial_memory,
-                waiters, inactive_read_count))
+                stats['name'],
+                stats['used_count'], stats['initial_count'],
+                stats['used_memory'], stats['initial_memory'],
+                stats['waiters'], stats['inactive_reads']))
 
         gdb.write("{:>10} {:5} {:>12} {}\n".format('permits', 'count', 'memory', 'table/description/state'))
 
-        permit_summaries_sorted = [(t, d, s, v) for (t, d, s), v in permit_summaries.items()]
-        permit_summaries_sorted.sort(key=lambda x: x[3].resource_memory, reverse=True)
+        for read in stats['reads']:
+            gdb.write("{:10} {:5} {:12} {}/{}/{}\n".format(read['permits'], read['count'], read['memory'], read['table'], read['description'], read['state']))
 
-        for table, description, state, stats in permit_summaries_sorted:
-            gdb.write("{:10} {:5} {:12} {}/{}/{}\n".format(stats.permits, stats.resource_count, stats.resource_memory, table, description, state))
+        gdb.write("{:10} {:5} {:12} Total\n".format(stats['total']['permits'], stats['total']['count'], stats['total']['memory']))
 
-        gdb.write("{:10} {:5} {:12} Total\n".format(total.permits, total.resource_count, total.resource_memory))
+    def invoke(self, arg, from_tty):
+        parser = argparse.ArgumentParser(description="scylla read-stats")
+        parser.add_argument("semaphores", nargs="*", help="Expressions evaluating to the semaphores to summarize")
+        add_json_argument(parser)
+        try:
+            args = parser.parse_args(arg.split())
+        except SystemExit:
+            return
 
-    def invoke(self, args, from_tty):
-        if args:
-            semaphores = [gdb.parse_and_eval(arg) for arg in args.split(' ')]
+        if args.semaphores:
+            semaphores = [gdb.parse_and_eval(expr) for expr in args.semaphores]
         else:
             db = find_db()
             semaphores = [db["_read_concurrency_sem"], db["_streaming_concurrency_sem"], db["_system_read_concurrency_sem"]]
@@ -5267,6 +7107,11 @@ class scylla_read_stats(gdb.Command):
                 # 2020.1 compatibility
                 pass
 
+        if args.json:
+            stats = [scylla_read_stats.collect_reads_from_semaphore(semaphore) for semaphore in semaphores]
+            write_json(args.json, [s for s in stats if s is not None])
+            return
+
         for semaphore in semaphores:
             scylla_read_stats.dump_reads_from_semaphore(semaphore)
 
@@ -5631,16 +7476,19 @@ scylla_ptr()
 scylla_mem_ranges()
 scylla_mem_range()
 scylla_heapprof()
+scylla_heapprof_diff()
 scylla_lsa()
 scylla_lsa_segment()
 scylla_lsa_check()
 scylla_segment_descs()
+scylla_memory_layout()
 scylla_timers()
 scylla_apply()
 scylla_shard()
 scylla_thread()
 scylla_unthread()
 scylla_threads()
+scylla_sample()
 scylla_task_stats()
 scylla_tasks()
 scylla_task_queues()
@@ -5656,6 +7504,7 @@ scylla_sstable_summary()
 scylla_sstable_index_cache()
 scylla_sstables()
 scylla_memtables()
+scylla_cache_stats()
 scylla_generate_object_graph()
 scylla_smp_queues()
 scylla_features()
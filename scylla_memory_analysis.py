@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+
+"""Memory analysis of a scylla process, shared by scylla-gdb.py and scripts/scylla-core-analyzer.py
+
+Implements the analyses of the seastar allocator and LSA state of a shard
+behind `scylla memory` and `scylla heapprof` in gdb, and of the offline core
+analyzer. The memory of the process is accessed through a memory_reader, gdb
+provides one reading the inferior and the core analyzer one reading the
+coredump directly. Types are described by the layout exported with
+`scylla memory-layout`, so this module doesn't depend on gdb.
+"""
+
+import struct
+from collections import defaultdict
+
+LAYOUT_VERSION = 1
+
+
+class memory_read_error(Exception):
+    pass
+
+
+class memory_reader:
+    """Interface for reading the memory of a (possibly dead) process"""
+
+    def read(self, addr, size):
+        """Return `size` bytes at `addr`, as a buffer.
+
+        Raises memory_read_error if (part of) the range is not available.
+        """
+        raise NotImplementedError()
+
+    def threads(self):
+        """Return the list of (tid, fs_base) of the threads of the process"""
+        raise NotImplementedError()
+
+    def read_uint(self, addr, size):
+        return int.from_bytes(self.read(addr, size), 'little')
+
+    def read_pointer(self, addr):
+        return self.read_uint(addr, 8)
+
+
+class struct_layout:
+    """Field accessors for a type, described by an exported layout"""
+
+    _formats = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}
+
+    def __init__(self, desc):
+        self.sizeof = desc.get('sizeof')
+        self._fields = {}
+        for name, (offset, size) in desc['fields'].items():
+            self._fields[name] = (offset, size, struct.Struct('<' + self._formats.get(size, 'Q')))
+
+    def offset(self, name):
+        return self._fields[name][0]
+
+    def has(self, name):
+        return name in self._fields
+
+    def get(self, reader, addr, name):
+        offset, size, _ = self._fields[name]
+        return reader.read_uint(addr + offset, min(size, 8))
+
+    def get_from(self, buf, base, name):
+        """Read field `name` of the object at offset `base` of the buffer `buf`."""
+        offset, _, s = self._fields[name]
+        return s.unpack_from(buf, base + offset)[0]
+
+
+class shard_analyzer:
+    """The analyses of the shard whose reactor thread has the given fs_base"""
+
+    def __init__(self, reader, layout, tid, fs_base):
+        self._reader = reader
+        self._tid = tid
+        self._fs_base = fs_base
+
+        seastar = layout['seastar']
+        self._page_size = seastar['page_size']
+        self._free_object_size = seastar['free_object_size']
+        self._cpu_mem = struct_layout(seastar['cpu_mem'])
+        self._cpu_mem_addr = fs_base + seastar['cpu_mem']['tls_offset']
+        self._page = struct_layout(seastar['page'])
+        self._span_list = struct_layout(seastar['span_list'])
+        self._small_pool = struct_layout(seastar['small_pool'])
+        self._site = struct_layout(seastar['allocation_site']) if 'allocation_site' in seastar else None
+        if self._site:
+            self._frame_sizeof = seastar['allocation_site']['frame_sizeof']
+            self._frame_addr_offset = seastar['allocation_site']['frame_addr'][0]
+        self._lsa = layout['lsa']
+        self._segment_pool = struct_layout(self._lsa['segment_pool'])
+        self._segment_desc = struct_layout(self._lsa['segment_descriptor'])
+
+        self.memory_start = self._cpu_mem.get(reader, self._cpu_mem_addr, 'memory')
+        self.nr_pages = self._cpu_mem.get(reader, self._cpu_mem_addr, 'nr_pages')
+        self._pages_buf = None
+
+    def is_reactor(self):
+        return self.memory_start != 0 and self.nr_pages != 0
+
+    @property
+    def shard(self):
+        # See shard_of() in scylla-gdb.py
+        return (self.memory_start >> 36) & 0xff
+
+    def _pages(self):
+        """The whole cpu_mem.pages array, read in one go"""
+        if self._pages_buf is None:
+            pages = self._cpu_mem.get(self._reader, self._cpu_mem_addr, 'pages')
+            self._pages_buf = self._reader.read(pages, self.nr_pages * self._page.sizeof)
+        return self._pages_buf
+
+    def spans(self):
+        """Yield (index, span_size, is_free, pool) for each span, see spans() in scylla-gdb.py"""
+        buf = self._pages()
+        page_sizeof = self._page.sizeof
+        idx = 1
+        while idx < self.nr_pages:
+            base = idx * page_sizeof
+            span_size = self._page.get_from(buf, base, 'span_size')
+            if span_size == 0:
+                idx += 1
+                continue
+            yield idx, span_size, bool(self._page.get_from(buf, base, 'free')), self._page.get_from(buf, base, 'pool')
+            idx += span_size
+
+    def _used_span_size(self, idx, span_size, pool):
+        """See span.used_span_size() in scylla-gdb.py"""
+        buf = self._pages()
+        page_sizeof = self._page.sizeof
+        n_pages = 0
+        for i in range(span_size):
+            base = (idx + i) * page_sizeof
+            if self._page.get_from(buf, base, 'pool') != pool or self._page.get_from(buf, base, 'offset_in_span') != i:
+                break
+            n_pages += 1
+        return n_pages
+
+    def memory_summary(self):
+        free_mem = self._cpu_mem.get(self._reader, self._cpu_mem_addr, 'nr_free_pages') * self._page_size
+        total_mem = self.nr_pages * self._page_size
+        return {
+            'start': self.memory_start,
+            'total': total_mem,
+            'free': free_mem,
+            'used': total_mem - free_mem,
+        }
+
+    def small_pools(self):
+        pools = self._cpu_mem_addr + self._cpu_mem.offset('small_pools')
+        nr = self._cpu_mem.get(self._reader, self._cpu_mem_addr, 'nr_small_pools')
+
+        pages_in_use = defaultdict(int) # pool -> pages
+        used_objects_pages = defaultdict(int) # pool -> used pages
+        for idx, span_size, is_free, pool in self.spans():
+            if is_free or not pool:
+                continue
+            pages_in_use[pool] += span_size
+            used_objects_pages[pool] += self._used_span_size(idx, span_size, pool)
+
+        results = []
+        for i in range(nr):
+            sp = pools + i * self._small_pool.sizeof
+            object_size = self._small_pool.get(self._reader, sp, 'object_size')
+            # Skip pools that are smaller than sizeof(free_object), they won't have any content
+            if object_size < self._free_object_size:
+                continue
+            free_count = self._small_pool.get(self._reader, sp, 'free_count')
+            memory = pages_in_use[sp] * self._page_size
+            use_count = int(used_objects_pages[sp] * self._page_size / object_size) - free_count
+            results.append({
+                'object_size': object_size,
+                'span_size': self._small_pool.get(self._reader, sp, 'span_size_preferred') * self._page_size,
+                'use_count': use_count,
+                'memory': memory,
+                'unused': memory - use_count * object_size,
+                'wasted': free_count * object_size,
+                'wasted_percent': free_count * object_size * 100.0 / memory if memory else 0,
+            })
+        return results
+
+    def page_spans(self):
+        large_allocs = defaultdict(int) # key: span size [B], value: span count
+        for idx, span_size, is_free, pool in self.spans():
+            if not is_free and not pool:
+                large_allocs[span_size * self._page_size] += 1
+
+        buf = self._pages()
+        page_sizeof = self._page.sizeof
+        free_spans = self._cpu_mem_addr + self._cpu_mem.offset('free_spans')
+        results = []
+        for index in range(self._cpu_mem.get(self._reader, self._cpu_mem_addr, 'nr_span_lists')):
+            front = self._span_list.get(self._reader, free_spans + index * self._span_list.sizeof, 'front')
+            free = 0
+            while front:
+                free += self._page.get_from(buf, front * page_sizeof, 'span_size')
+                front = self._page.get_from(buf, front * page_sizeof, 'link_next')
+            span_size = (1 << index) * self._page_size
+            results.append({
+                'index': index,
+                'size': span_size,
+                'free': free * self._page_size,
+                'large_spans': large_allocs[span_size],
+                'large': large_allocs[span_size] * span_size,
+            })
+        return results
+
+    def _segment_pool_addr(self):
+        addr = self._fs_base + self._lsa['root_tls_offset']
+        for offset in self._lsa['segment_pool_path']:
+            addr = self._reader.read_pointer(addr + offset)
+        return addr
+
+    def lsa_summary(self):
+        segment_size = self._lsa['segment_size']
+        pool = self._segment_pool_addr()
+        non_lsa = self._segment_pool.get(self._reader, pool, 'non_lsa_memory_in_use')
+        free_segments = self._segment_pool.get(self._reader, pool, 'free_segments')
+        lsa_used = self._segment_pool.get(self._reader, pool, 'segments_in_use') * segment_size + non_lsa
+        return {
+            'allocated': lsa_used + free_segments * segment_size,
+            'used': lsa_used,
+            'free': free_segments * segment_size,
+            'non_lsa_memory_in_use': non_lsa,
+        }
+
+    def lsa(self, top_regions):
+        segment_size = self._lsa['segment_size']
+        size_mask = self._lsa['size_mask']
+        pool = self._segment_pool_addr()
+
+        begin = self._segment_pool.get(self._reader, pool, 'segments_begin')
+        end = self._segment_pool.get(self._reader, pool, 'segments_end')
+        desc_sizeof = self._segment_desc.sizeof
+        descs = self._reader.read(begin, end - begin)
+        lsa_segments = 0
+        lsa_free_space = 0
+        regions = defaultdict(lambda: [0, 0]) # region -> [segments, free space]
+        for base in range(0, end - begin, desc_sizeof):
+            region = self._segment_desc.get_from(descs, base, 'region')
+            if not region:
+                continue
+            free_space = self._segment_desc.get_from(descs, base, 'free_space') & size_mask
+            lsa_segments += 1
+            lsa_free_space += free_space
+            r = regions[region]
+            r[0] += 1
+            r[1] += free_space
+
+        top = sorted(regions.items(), key=lambda r: -r[1][0])[:top_regions]
+        result = self.lsa_summary()
+        result.update({
+            # See get_segment_base() in scylla-gdb.py
+            'segments_base': (self.memory_start + segment_size - 1) & ~(segment_size - 1),
+            'segments': len(descs) // desc_sizeof,
+            'lsa_segments': lsa_segments,
+            'lsa_free_space': lsa_free_space,
+            'top_regions': [{
+                'region': region,
+                'segments': segments,
+                'total': segments * segment_size,
+                'free': free_space,
+            } for region, (segments, free_space) in top],
+        })
+        return result
+
+    def heapprof(self):
+        if not self._site:
+            return None
+        sites = []
+        site = self._cpu_mem.get(self._reader, self._cpu_mem_addr, 'alloc_site_list_head')
+        while site:
+            size = self._site.get(self._reader, site, 'size')
+            if size:
+                nr_frames = self._site.get(self._reader, site, 'nr_frames')
+                frames = site + self._site.offset('frames')
+                buf = self._reader.read(frames, nr_frames * self._frame_sizeof)
+                addresses = [struct.unpack_from('<Q', buf, i * self._frame_sizeof + self._frame_addr_offset)[0] for i in range(nr_frames)]
+                sites.append({
+                    'size': size,
+                    'count': self._site.get(self._reader, site, 'count'),
+                    'backtrace': addresses[1:], # drop memory::get_backtrace()
+                })
+            site = self._site.get(self._reader, site, 'next')
+        sites.sort(key=lambda s: -s['size'])
+        return sites
+
+
+ALL_SECTIONS = ['memory', 'small-pools', 'page-spans', 'lsa', 'heapprof']
+
+
+def analyze(reader, layout, sections=ALL_SECTIONS, top_regions=10):
+    shards = []
+    for tid, fs_base in reader.threads():
+        try:
+            sa = shard_analyzer(reader, layout, tid, fs_base)
+            if not sa.is_reactor():
+                continue
+        except memory_read_error:
+            continue
+
+        result = {'shard': sa.shard, 'thread': tid}
+        for section in sections:
+            try:
+                if section == 'memory':
+                    result[section] = sa.memory_summary()
+                elif section == 'small-pools':
+                    result[section] = sa.small_pools()
+                elif section == 'page-spans':
+                    result[section] = sa.page_spans()
+                elif section == 'lsa':
+                    result[section] = sa.lsa(top_regions)
+                elif section == 'heapprof':
+                    result[section] = sa.heapprof()
+            except memory_read_error as e:
+                result[section] = {'error': str(e)}
+        shards.append(result)
+
+    shards.sort(key=lambda s: s['shard'])
+    return {'shards': shards}
@@ -10,6 +10,8 @@
 #include "bytes_ostream.hh"
 #include "serializer.hh"
 
+#include <ranges>
+
 namespace ser {
 
 // frame represents a place holder for object size which will be known later
@@ -180,4 +182,57 @@ inline frame<seastar::memory_output_stream<Iterator>> start_frame(seastar::memor
     return frame<seastar::memory_output_stream<Iterator>>(substream, start_left);
 }
 
+// Views of objects which are already serialized, e.g. collection_element_view
+template<typename T>
+concept SerializedView = requires (const T& view) {
+    { view.v.size() } -> std::convertible_to<size_t>;
+};
+
+// Serializes the elements of r as T, for the bulk add methods of the vector writers.
+// When the serialized size of each element is known without serializing it, that is
+// when T has a fixed size or is a view, the elements are written to a bytes_ostream in
+// batches of up to bytes_ostream::max_chunk_size() bytes, each going to a single
+// contiguous region reserved up front.
+template<typename T, typename Output, std::ranges::forward_range Range>
+requires std::ranges::sized_range<Range>
+size_type serialize_range(Output& out, const Range& r) {
+    if constexpr (std::is_same_v<Output, bytes_ostream> && (FixedSizeSerializable<T> || SerializedView<T>)) {
+        auto it = std::ranges::begin(r);
+        auto end = std::ranges::end(r);
+        while (it != end) {
+            auto batch_end = it;
+            size_t batch_size = 0;
+            if constexpr (FixedSizeSerializable<T>) {
+                // The batch is found without reading the elements
+                constexpr size_t size = serializer<T>::fixed_size;
+                constexpr std::ranges::range_difference_t<Range> per_batch = size ? bytes_ostream::max_chunk_size() / size : 0;
+                batch_size = (per_batch - std::ranges::advance(batch_end, per_batch, end)) * size;
+            } else {
+                auto size_of = [] (const T& e) -> size_t {
+                    return e.v.size();
+                };
+                while (batch_end != end && batch_size + size_of(*batch_end) <= bytes_ostream::max_chunk_size()) {
+                    batch_size += size_of(*batch_end);
+                    ++batch_end;
+                }
+            }
+            if (batch_size == 0) {
+                // Too large to fit in a chunk, or empty
+                serializer<T>::write(out, *it++);
+                continue;
+            }
+            auto ptr = out.write_place_holder(batch_size);
+            seastar::simple_output_stream stream(reinterpret_cast<char*>(ptr), batch_size);
+            for (; it != batch_end; ++it) {
+                serializer<T>::write(stream, *it);
+            }
+        }
+    } else {
+        for (auto&& e : r) {
+            serializer<T>::write(out, e);
+        }
+    }
+    return std::ranges::size(r);
+}
+
 }
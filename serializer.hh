@@ -205,6 +205,7 @@ struct serializer;
 
 template<typename T>
 struct integral_serializer {
+    static constexpr size_type fixed_size = sizeof(T);
     template<typename Input>
     static T read(Input& v) {
         return deserialize_integral<T>(v);
@@ -220,6 +221,7 @@ struct integral_serializer {
 };
 
 template<> struct serializer<bool> {
+    static constexpr size_type fixed_size = sizeof(uint8_t);
     template <typename Input>
     static bool read(Input& i) {
         return deserialize_integral<uint8_t>(i);
@@ -243,6 +245,15 @@ template<> struct serializer<uint32_t> : public integral_serializer<uint32_t> {}
 template<> struct serializer<int64_t> : public integral_serializer<int64_t> {};
 template<> struct serializer<uint64_t> : public integral_serializer<uint64_t> {};
 
+/// Types whose serialized size is the same for all values declare it as
+/// serializer<T>::fixed_size, which allows skipping over them in O(1) and
+/// computing their size without serializing them. The IDL compiler declares
+/// it for enums and for final classes made only of such types.
+template<typename T>
+concept FixedSizeSerializable = requires {
+    { serializer<T>::fixed_size } -> std::convertible_to<size_type>;
+};
+
 template<typename Output>
 void safe_serialize_as_uint32(Output& output, uint64_t data);
 
@@ -33,6 +33,36 @@ void set_size(Stream& os, const T& obj) {
 }
 
 
+// Serializes an object of a fixed-size type with a single write to out:
+// write_members() writes the members to a buffer on the stack instead.
+// Writing the members one by one to a fragmented output costs a bounds check
+// and possibly a fragment switch for each of them.
+template<size_type N, typename Output, typename WriteMembers>
+void serialize_fixed_size(Output& out, WriteMembers&& write_members) {
+    if constexpr (std::is_same_v<Output, seastar::simple_output_stream> || std::is_same_v<Output, seastar::measuring_output_stream>) {
+        write_members(out);
+    } else {
+        std::array<char, N> data;
+        seastar::simple_output_stream os(data.data(), N);
+        write_members(os);
+        out.write(data.data(), N);
+    }
+}
+
+// Deserializes an object of a fixed-size type with a single read from in,
+// then read_members() reads the members from a buffer on the stack.
+template<size_type N, typename Input, typename ReadMembers>
+auto deserialize_fixed_size(Input& in, ReadMembers&& read_members) {
+    if constexpr (std::is_same_v<Input, seastar::simple_input_stream>) {
+        return read_members(in);
+    } else {
+        std::array<char, N> data;
+        in.read(data.data(), N);
+        seastar::simple_input_stream is(data.data(), N);
+        return read_members(is);
+    }
+}
+
 template<typename Output>
 void safe_serialize_as_uint32(Output& out, uint64_t data) {
     if (data > std::numeric_limits<uint32_t>::max()) {
@@ -194,8 +224,12 @@ struct deserialize_array_helper<false, T> {
     }
     template<typename Input>
     static void skip(Input& in, size_t sz) {
-        while (sz--) {
-            serializer<T>::skip(in);
+        if constexpr (FixedSizeSerializable<T>) {
+            in.skip(sz * serializer<T>::fixed_size);
+        } else {
+            while (sz--) {
+                serializer<T>::skip(in);
+            }
         }
     }
 };
@@ -702,6 +736,9 @@ struct serializer<std::monostate> {
 
 template<typename T>
 size_type get_sizeof(const T& obj) {
+    if constexpr (FixedSizeSerializable<T>) {
+        return serializer<T>::fixed_size;
+    }
     seastar::measuring_output_stream ms;
     serialize(ms, obj);
     auto size = ms.size();
@@ -41,7 +41,7 @@ from typing import Dict, List, Callable, Any, Iterable, Optional, Awaitable, Uni
 
 output_is_a_tty = sys.stdout.isatty()
 
-all_modes = set(['debug', 'release', 'dev', 'sanitize', 'coverage'])
+all_modes = set(['debug', 'release', 'dev', 'sanitize', 'coverage', 'release-pgo-instr', 'release-pgo'])
 debug_modes = set(['debug', 'sanitize'])
 
 
@@ -22,6 +22,7 @@
 # counter increases.
 ##############################################################################
 
+import sys
 import pytest
 import requests
 import re
@@ -31,6 +32,10 @@ from botocore.exceptions import ClientError
 
 from util import random_string, new_test_table, is_aws
 
+# Use the scylla_metrics.py library from ../cql-pytest:
+sys.path.insert(1, sys.path[0] + '/../cql-pytest')
+from scylla_metrics import get_metrics, get_metric
+
 # Fixture for checking if we are able to test Scylla metrics. Scylla metrics
 # are not available on AWS (of course), but may also not be available for
 # Scylla if for some reason we have only access to the Alternator protocol
@@ -51,41 +56,12 @@ def metrics(dynamodb):
         pytest.skip('Metrics port 9180 is not available')
     yield url
 
-# Utility function for fetching all metrics from Scylla, using an HTTP request
-# to port 9180. The response format is defined by the Prometheus protocol.
-# Only use get_metrics() in a test using the metrics_available fixture.
-def get_metrics(metrics):
-    response = requests.get(metrics)
-    assert response.status_code == 200
-    return response.text
-
-# Utility function for fetching a metric with a given name and optionally a
-# given sub-metric label (which should be a name-value map). If multiple
-# matches are found, they are summed - this is useful for summing up the
-# counts from multiple shards.
-def get_metric(metrics, name, requested_labels=None, the_metrics=None):
-    if not the_metrics:
-        the_metrics = get_metrics(metrics)
-    total = 0.0
-    lines = re.compile('^'+name+'{.*$', re.MULTILINE)
-    for match in re.findall(lines, the_metrics):
-        a = match.split()
-        metric = a[0]
-        val = float(a[1])
-        # Check if match also matches the requested labels
-        if requested_labels:
-            # we know metric begins with name{ and ends with } - the labels
-            # are what we have between those
-            got_labels = metric[len(name)+1:-1].split(',')
-            # Check that every one of the requested labels is in got_labels:
-            for k, v in requested_labels.items():
-                if not f'{k}="{v}"' in got_labels:
-                    # No match for requested label, skip this metric (python
-                    # doesn't have "continue 2" so let's just set val to 0...
-                    val = 0
-                    break
-        total += float(val)
-    return total
+# get_metrics(metrics) fetches all metrics from Scylla, using an HTTP request
+# to port 9180, and get_metric(metrics, name, requested_labels) a metric with
+# a given name and optionally a given sub-metric label (which should be a
+# name-value map). If multiple matches are found, they are summed - this is
+# useful for summing up the counts from multiple shards. See scylla_metrics.py.
+# Only use them in a test using the metrics fixture.
 
 # context manager for checking that a certain piece of code increases each
 # of the specified metrics. Helps reduce the amount of code duplication
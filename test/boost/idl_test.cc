@@ -15,9 +15,13 @@
 #include <map>
 #include <vector>
 #include <optional>
+#include <fstream>
+#include <iterator>
+#include <string>
 
 #include "bytes.hh"
 #include "bytes_ostream.hh"
+#include "utils/UUID.hh"
 
 struct simple_compound {
     // TODO: change this to test for #905
@@ -57,6 +61,14 @@ std::ostream& operator<<(std::ostream& os, const simple_compound& sc)
     return os << " { foo: " << sc.foo << ", bar: " << sc.bar << " }";
 }
 
+struct fixed_size_compound {
+    utils::UUID id;
+    int64_t timestamp;
+    bool flag;
+
+    bool operator==(const fixed_size_compound&) const = default;
+};
+
 struct compound_with_optional {
     std::optional<simple_compound> first;
     simple_compound second;
@@ -328,6 +340,25 @@ BOOST_AUTO_TEST_CASE(test_variant)
     BOOST_REQUIRE_EQUAL(compound2, sc2);
 }
 
+BOOST_AUTO_TEST_CASE(test_non_final_fixed_size)
+{
+    // The size of a non-final class of fixed-size members is computed by
+    // idl-compiler.py, and checked by a static_assert of the serializer
+    fixed_size_compound obj = { utils::UUID(0x0123456789abcdef, 0x1122334455667788), -17, true };
+
+    bytes_ostream buf;
+    ser::serialize(buf, obj);
+    BOOST_REQUIRE_EQUAL(buf.size(), 29);
+
+    auto in = ser::as_input_stream(buf);
+    BOOST_REQUIRE_EQUAL(ser::deserialize(in, boost::type<uint32_t>()), 29);
+
+    in = ser::as_input_stream(buf);
+    auto deser_obj = ser::deserialize(in, boost::type<fixed_size_compound>());
+    BOOST_REQUIRE(obj == deser_obj);
+    BOOST_REQUIRE_EQUAL(in.size(), 0);
+}
+
 BOOST_AUTO_TEST_CASE(test_compound_with_optional)
 {
     simple_compound foo = { 0xdeadbeef, 0xbadc0ffe };
@@ -472,3 +503,73 @@ BOOST_AUTO_TEST_CASE(test_const_template_arg)
     auto deser_obj = ser::deserialize(in, boost::type<const_template_arg_test_object>());
     BOOST_REQUIRE(obj == deser_obj);
 }
+
+// The objects of test/resource/idl are decoded by the Python decoders
+// generated by idl-compiler.py --python (see test/perf/perf_idl_python.py
+// --verify), check they are what the serializers and writers produce.
+static void check_wire_format_fixture(const char* name, bytes_ostream buf) {
+    auto path = std::string("test/resource/idl/") + name + ".bin";
+    std::ifstream f(path, std::ios::binary);
+    BOOST_REQUIRE_MESSAGE(f, "cannot open " << path);
+    std::string expected((std::istreambuf_iterator<char>(f)), std::istreambuf_iterator<char>());
+    auto actual = buf.linearize();
+    BOOST_REQUIRE_MESSAGE(bytes_view(reinterpret_cast<const int8_t*>(expected.data()), expected.size()) == actual,
+            name << ": serialized " << to_hex(actual) << ", which doesn't match " << path);
+}
+
+BOOST_AUTO_TEST_CASE(test_wire_format_fixtures)
+{
+    simple_compound sc = { 0xdeadbeef, 0xbadc0ffe };
+    std::vector<simple_compound> vec1 = { { 1, 2 }, { 3, 4 }, { 5, 6 }, { 7, 8 }, { 9, 10 } };
+    std::vector<simple_compound> vec2 = { { 11, 12 }, { 13, 14 }, { 15, 16 }, { 17, 18 }, { 19, 20 } };
+
+    bytes_ostream buf;
+    ser::serialize(buf, sc);
+    check_wire_format_fixture("simple_compound", std::move(buf));
+
+    buf = bytes_ostream();
+    ser::serialize(buf, vectors_of_compounds{ vec1, wrapped_vector { vec2 } });
+    check_wire_format_fixture("vectors_of_compounds", std::move(buf));
+
+    buf = bytes_ostream();
+    auto second_writer = ser::writer_of_writable_variants<bytes_ostream>(buf)
+        .write_id(17).write_first_simple_compound(sc).start_second_writable_vector().start_vector();
+    for (auto&& v : vec1) {
+        second_writer.add_vector(v);
+    }
+    std::move(second_writer).end_vector().end_writable_vector().start_third_writable_final_simple_compound()
+        .write_foo(0x12344321).write_bar(0x56788765).end_writable_final_simple_compound().end_writable_variants();
+    check_wire_format_fixture("writable_variants", std::move(buf));
+
+    buf = bytes_ostream();
+    ser::serialize(buf, compound_with_optional{ sc, simple_compound{ 0x12345678, 0x87654321 } });
+    check_wire_format_fixture("compound_with_optional_engaged", std::move(buf));
+
+    buf = bytes_ostream();
+    ser::serialize(buf, compound_with_optional{ {}, sc });
+    check_wire_format_fixture("compound_with_optional_disengaged", std::move(buf));
+
+    buf = bytes_ostream();
+    ser::writer_of_just_a_variant(buf)
+        .start_variant_writable_simple_compound()
+            .write_foo(0x1234abcd)
+            .write_bar(0x1111ffff)
+        .end_writable_simple_compound()
+    .end_just_a_variant();
+    check_wire_format_fixture("just_a_variant_writable", std::move(buf));
+
+    buf = bytes_ostream();
+    ser::writer_of_just_a_variant(buf)
+        .write_variant_simple_compound(simple_compound { 0xaaaabbbb, 0xccccdddd })
+    .end_just_a_variant();
+    check_wire_format_fixture("just_a_variant_simple", std::move(buf));
+
+    buf = bytes_ostream();
+    ser::serialize(buf, const_template_arg_test_object{
+        .first = {
+            simple_compound{ 0xdeadbeef, 0xbadc0ffe },
+            simple_compound{ 0xbaaaaaad, 0xdeadc0de }
+        }
+    });
+    check_wire_format_fixture("const_template_arg_test_object", std::move(buf));
+}
@@ -0,0 +1,42 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+##################################################################
+
+# This file provides helpers for the tests which check Scylla's metrics,
+# shared by the test suites running against a single node (cql-pytest,
+# alternator). The metrics are fetched from the Prometheus API on port 9180
+# and parsed once with the Prometheus text format parser of scyllatop,
+# tools/scyllatop/exposition.py, which only depends on the standard library.
+# The returned object can be queried with selectors like name{label="value"},
+# see that file.
+
+import importlib.util
+import os
+import requests
+
+def _load_exposition():
+    # Only the parser is loaded, not the rest of scyllatop
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tools', 'scyllatop', 'exposition.py')
+    spec = importlib.util.spec_from_file_location('exposition', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+exposition = _load_exposition()
+
+# Fetch all metrics from the given URL of the Prometheus API, parsed.
+def get_metrics(url):
+    response = requests.get(url)
+    assert response.status_code == 200
+    return exposition.parse(response.text)
+
+# Fetch the metric with a given name, with labels, and optionally with the
+# given labels (a name-value map). If multiple series match, they are summed -
+# this is useful for summing up the counts from multiple shards. Series
+# without any label are not matched.
+def get_metric(url, name, requested_labels=None, the_metrics=None):
+    if not the_metrics:
+        the_metrics = get_metrics(url)
+    labels = ','.join(f'{k}="{v}"' for k, v in (requested_labels or {}).items())
+    return sum(sample.value for sample in the_metrics.select(f'{name}{{{labels}}}') if sample.labels)
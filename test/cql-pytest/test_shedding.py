@@ -10,7 +10,7 @@ import pytest
 from cassandra.cluster import NoHostAvailable
 from cassandra.protocol import InvalidRequest
 from util import unique_name, new_cql
-import requests
+from scylla_metrics import get_metrics
 
 
 @pytest.fixture(scope="module")
@@ -45,12 +45,8 @@ def table1(cql, test_keyspace):
 # to guarantee shedding.
 def test_shed_too_large_request(cql, table1, scylla_only):
     def get_protocol_errors():
-        result = 0
-        for line in requests.get(f'http://{cql.cluster.contact_points[0]}:9180/metrics').text.split('\n'):
-            if not line.startswith('scylla_transport_cql_errors_total') or 'protocol_error' not in line:
-                continue
-            result += int(line.split(' ')[1])
-        return result
+        metrics = get_metrics(f'http://{cql.cluster.contact_points[0]}:9180/metrics')
+        return int(metrics.value('scylla_transport_cql_errors_total{type=~".*protocol_error.*"}'))
 
     # protocol_errors metric is always non-zero, since the
     # cassandra python driver use these errors to negotiate the protocol version
@@ -11,9 +11,10 @@ from cassandra.protocol import InvalidRequest
 from cassandra.cluster import NoHostAvailable
 from util import new_test_table, unique_name, new_function, new_aggregate
 
+from scylla_metrics import get_metric
+
 import pytest
 import requests
-import re
 import os.path
 
 # Can be used for marking functions which require
@@ -638,35 +639,6 @@ def metrics(request, scylla_with_wasm_only):
         pytest.skip('Metrics port 9180 is not available')
     yield url
 
-def get_metrics(metrics):
-    response = requests.get(metrics)
-    assert response.status_code == 200
-    return response.text
-
-def get_metric(metrics, name, requested_labels=None, the_metrics=None):
-    if not the_metrics:
-        the_metrics = get_metrics(metrics)
-    total = 0.0
-    lines = re.compile('^'+name+'{.*$', re.MULTILINE)
-    for match in re.findall(lines, the_metrics):
-        a = match.split()
-        metric = a[0]
-        val = float(a[1])
-        # Check if match also matches the requested labels
-        if requested_labels:
-            # we know metric begins with name{ and ends with } - the labels
-            # are what we have between those
-            got_labels = metric[len(name)+1:-1].split(',')
-            # Check that every one of the requested labels is in got_labels:
-            for k, v in requested_labels.items():
-                if not f'{k}="{v}"' in got_labels:
-                    # No match for requested label, skip this metric (python
-                    # doesn't have "continue 2" so let's just set val to 0...
-                    val = 0
-                    break
-        total += float(val)
-    return total
-
 # Test that calling a wasm-based aggregate works.
 # The aggregate calculates the average of integers.
 # Created with scalar function:
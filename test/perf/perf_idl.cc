@@ -13,6 +13,23 @@
 
 #include "mutation/frozen_mutation.hh"
 #include "mutation/mutation_partition_view.hh"
+#include "query-request.hh"
+#include "counters.hh"
+#include "message/verb_metrics.hh"
+
+#include "serializer_impl.hh"
+#include "idl/keys.dist.hh"
+#include "idl/range.dist.hh"
+#include "idl/uuid.dist.hh"
+#include "idl/tracing.dist.hh"
+#include "idl/read_command.dist.hh"
+#include "idl/mutation.dist.hh"
+#include "idl/keys.dist.impl.hh"
+#include "idl/range.dist.impl.hh"
+#include "idl/uuid.dist.impl.hh"
+#include "idl/tracing.dist.impl.hh"
+#include "idl/read_command.dist.impl.hh"
+#include "idl/mutation.dist.impl.hh"
 
 namespace tests {
 
@@ -57,4 +74,193 @@ PERF_TEST_F(frozen_mutation, apply_one_small_row)
     perf_tests::do_not_optimize(m);
 }
 
+// Final classes made only of fixed-size members (ids, UUIDs) are serialized
+// with a single write and skipped in O(1). They are in most RPC messages,
+// e.g. the read_command of read_data.
+class idl_fixed_size {
+public:
+    static constexpr size_t count = 1000;
+private:
+    simple_schema _schema;
+    std::vector<table_id> _ids;
+    bytes_ostream _serialized_ids;
+    query::read_command _read_command;
+    bytes_ostream _serialized_read_command;
+public:
+    idl_fixed_size()
+        : _read_command(_schema.schema()->id(), _schema.schema()->version(), _schema.schema()->full_slice(),
+                query::max_result_size(std::numeric_limits<size_t>::max()), query::tombstone_limit::max)
+    {
+        std::generate_n(std::back_inserter(_ids), count, [] { return table_id::create_random_id(); });
+        ser::serialize(_serialized_ids, _ids);
+        ser::serialize(_serialized_read_command, _read_command);
+    }
+
+    const std::vector<table_id>& ids() const { return _ids; }
+    const bytes_ostream& serialized_ids() const { return _serialized_ids; }
+    const query::read_command& read_command() const { return _read_command; }
+    const bytes_ostream& serialized_read_command() const { return _serialized_read_command; }
+};
+
+PERF_TEST_F(idl_fixed_size, serialize_ids)
+{
+    bytes_ostream out;
+    ser::serialize(out, ids());
+    perf_tests::do_not_optimize(out);
+    return count;
+}
+
+PERF_TEST_F(idl_fixed_size, deserialize_ids)
+{
+    auto in = ser::as_input_stream(serialized_ids());
+    auto ids = ser::deserialize(in, boost::type<std::vector<table_id>>());
+    perf_tests::do_not_optimize(ids);
+    return count;
+}
+
+PERF_TEST_F(idl_fixed_size, skip_ids)
+{
+    auto in = ser::as_input_stream(serialized_ids());
+    ser::skip(in, boost::type<std::vector<table_id>>());
+    perf_tests::do_not_optimize(in);
+    return count;
+}
+
+PERF_TEST_F(idl_fixed_size, serialize_read_command)
+{
+    bytes_ostream out;
+    ser::serialize(out, read_command());
+    perf_tests::do_not_optimize(out);
+}
+
+PERF_TEST_F(idl_fixed_size, deserialize_read_command)
+{
+    auto in = ser::as_input_stream(serialized_read_command());
+    auto cmd = ser::deserialize(in, boost::type<query::read_command>());
+    perf_tests::do_not_optimize(cmd);
+}
+
+
+// Vector writers can append a whole range of fixed-size elements (e.g. counter
+// shards) or of views of already serialized objects (e.g. collection elements
+// copied from another mutation) at once, instead of one element at a time.
+class idl_vector_writer {
+public:
+    static constexpr size_t count = 1000;
+private:
+    std::vector<counter_shard> _shards;
+    bytes_ostream _serialized_cell;
+    std::vector<ser::collection_element_view> _elements;
+public:
+    idl_vector_writer() {
+        for (size_t i = 0; i < count; ++i) {
+            _shards.emplace_back(counter_id::create_random_id(), i, i);
+        }
+
+        auto value = bytes(16, 'v');
+        auto elements = ser::writer_of_collection_cell<bytes_ostream>(_serialized_cell).write_tomb(tombstone()).start_elements();
+        for (size_t i = 0; i < count; ++i) {
+            auto key = serialized(int32_t(i));
+            elements.add().write_key(key)
+                    .start_value_live_cell()
+                        .write_created_at(api::new_timestamp())
+                        .write_value(value)
+                    .end_live_cell()
+                .end_collection_element();
+        }
+        std::move(elements).end_elements().end_collection_cell();
+
+        auto in = ser::as_input_stream(_serialized_cell);
+        auto cell = ser::deserialize(in, boost::type<ser::collection_cell_view>());
+        for (auto&& e : cell.elements()) {
+            _elements.push_back(e);
+        }
+    }
+
+    const std::vector<counter_shard>& shards() const { return _shards; }
+    const std::vector<ser::collection_element_view>& elements() const { return _elements; }
+};
+
+PERF_TEST_F(idl_vector_writer, add_shards)
+{
+    bytes_ostream out;
+    auto writer = ser::writer_of_counter_cell_full<bytes_ostream>(out).start_shards();
+    for (auto&& s : shards()) {
+        writer.add_shards(s);
+    }
+    std::move(writer).end_shards().end_counter_cell_full();
+    perf_tests::do_not_optimize(out);
+    return count;
+}
+
+PERF_TEST_F(idl_vector_writer, add_all_shards)
+{
+    bytes_ostream out;
+    auto writer = ser::writer_of_counter_cell_full<bytes_ostream>(out).start_shards();
+    writer.add_all_shards(shards());
+    std::move(writer).end_shards().end_counter_cell_full();
+    perf_tests::do_not_optimize(out);
+    return count;
+}
+
+PERF_TEST_F(idl_vector_writer, add_elements)
+{
+    bytes_ostream out;
+    auto writer = ser::writer_of_collection_cell<bytes_ostream>(out).write_tomb(tombstone()).start_elements();
+    for (auto&& e : elements()) {
+        writer.add(e);
+    }
+    std::move(writer).end_elements().end_collection_cell();
+    perf_tests::do_not_optimize(out);
+    return count;
+}
+
+PERF_TEST_F(idl_vector_writer, add_all_elements)
+{
+    bytes_ostream out;
+    auto writer = ser::writer_of_collection_cell<bytes_ostream>(out).write_tomb(tombstone()).start_elements();
+    writer.add_all(elements());
+    std::move(writer).end_elements().end_collection_cell();
+    perf_tests::do_not_optimize(out);
+    return count;
+}
+
+
+// The cost instrumented RPC verbs add to each call: accounting it in the
+// verb_metrics, and measuring the arguments of one in payload_sample_period
+// calls, here a read_command as sent by read_data.
+class verb_instrumentation {
+    simple_schema _schema;
+    query::read_command _read_command;
+    netw::verb_metrics _metrics;
+public:
+    verb_instrumentation()
+        : _read_command(_schema.schema()->id(), _schema.schema()->version(), _schema.schema()->full_slice(),
+                query::max_result_size(std::numeric_limits<size_t>::max()), query::tombstone_limit::max)
+        , _metrics("perf_idl")
+    { }
+
+    const query::read_command& read_command() const { return _read_command; }
+    netw::verb_metrics::side& stats() { return _metrics.sent; }
+};
+
+PERF_TEST_F(verb_instrumentation, untracked_call)
+{
+    return make_ready_future<>();
+}
+
+PERF_TEST_F(verb_instrumentation, tracked_call)
+{
+    if (stats().start()) {
+        stats().payload_size.add(ser::get_sizeof(read_command()));
+    }
+    return netw::track_verb_call(stats(), [] { return make_ready_future<>(); });
+}
+
+PERF_TEST_F(verb_instrumentation, payload_size)
+{
+    auto size = ser::get_sizeof(read_command());
+    perf_tests::do_not_optimize(size);
+}
+
 }
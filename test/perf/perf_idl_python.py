@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# Measures the decode throughput of the Python decoders generated by
+# `idl-compiler.py --python`, on large buffers of random objects.
+#
+# Each type is measured in three ways:
+#  - skip: walk the buffer object by object, without decoding anything
+#    (e.g. to index a captured stream);
+#  - lazy: create a view of each object and read its top-level members;
+#  - full: decode each object recursively, with to_python().
+#
+# With --verify, the decoders are first checked against the objects of
+# test/resource/idl, which test/boost/idl_test checks are what the C++
+# serializers and writers produce.
+
+import argparse
+import glob
+import importlib.util
+import os
+import random
+import string
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def load_decoders(idl_dir, output):
+    compiler = os.path.join(os.path.dirname(__file__), '..', '..', 'idl-compiler.py')
+    inputs = sorted(glob.glob(os.path.join(idl_dir, '*.idl.hh')))
+    cmd = [sys.executable, compiler, '--python', output]
+    for f in inputs:
+        cmd += ['-f', f]
+    subprocess.check_call(cmd)
+    spec = importlib.util.spec_from_file_location('idl_decoders', output)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fixtures(m):
+    '''The objects serialized by C++ in test/resource/idl: file, type and the value they were created from'''
+    def sc(foo, bar):
+        return {'foo': foo, 'bar': bar}
+    vec1 = [sc(1, 2), sc(3, 4), sc(5, 6), sc(7, 8), sc(9, 10)]
+    vec2 = [sc(11, 12), sc(13, 14), sc(15, 16), sc(17, 18), sc(19, 20)]
+    return [
+        ('simple_compound', 'simple_compound', sc(0xdeadbeef, 0xbadc0ffe)),
+        ('vectors_of_compounds', 'vectors_of_compounds', {'first': vec1, 'second': {'vector': vec2}}),
+        ('writable_variants', 'writable_variants', {
+            'id': 17,
+            'first': m.Variant(1, sc(0xdeadbeef, 0xbadc0ffe)),
+            'second': m.Variant(0, {'vector': vec1}),
+            'third': m.Variant(2, sc(0x12344321, 0x56788765)),
+        }),
+        ('compound_with_optional_engaged', 'compound_with_optional',
+         {'first': sc(0xdeadbeef, 0xbadc0ffe), 'second': sc(0x12345678, 0x87654321)}),
+        ('compound_with_optional_disengaged', 'compound_with_optional',
+         {'first': None, 'second': sc(0xdeadbeef, 0xbadc0ffe)}),
+        ('just_a_variant_writable', 'just_a_variant', {'variant': m.Variant(0, sc(0x1234abcd, 0x1111ffff))}),
+        ('just_a_variant_simple', 'just_a_variant', {'variant': m.Variant(1, sc(0xaaaabbbb, 0xccccdddd))}),
+        ('const_template_arg_test_object', 'const_template_arg_test_object',
+         {'first': [{'x': sc(0xdeadbeef, 0xbadc0ffe)}, {'x': sc(0xbaaaaaad, 0xdeadc0de)}]}),
+    ]
+
+
+def verify(m, resource_dir):
+    '''Check the decoders against the objects serialized by C++'''
+    for name, type_name, expected in fixtures(m):
+        with open(os.path.join(resource_dir, name + '.bin'), 'rb') as f:
+            data = f.read()
+        t = m.TYPES[type_name]
+        assert m.skip(t, data) == len(data), f"{name}: skipped {m.skip(t, data)} bytes out of {len(data)}"
+        decoded = m.to_python(m.decode(t, data))
+        assert decoded == expected, f"{name}: decoded {decoded}, expected {expected}"
+    print(f"verified the decoders against {len(fixtures(m))} objects serialized by C++")
+
+
+class synthesizer:
+    '''Serializes random objects of the given types, using the type descriptors of the decoders
+
+    Returns the serialized bytes together with the value to_python() is expected to decode them to.
+    The bytes follow the wire format as the decoders see it, so they can't be used to check them.
+    '''
+    def __init__(self, m, rng, width, blob_size):
+        self.m = m
+        self.rng = rng
+        self.width = width
+        self.blob_size = blob_size
+
+    def length(self, depth):
+        return self.rng.randint(0, max(1, self.width // (depth + 1)))
+
+    def __call__(self, t, depth=0):
+        m = self.m
+        rng = self.rng
+        if isinstance(t, m.Enum):
+            v = rng.choice(list(t.cls))
+            return struct.pack('<' + t.fmt, v), v
+        if isinstance(t, m.Fixed):
+            if t.fmt == '?':
+                v = rng.random() < 0.5
+            else:
+                bits = t.size * 8
+                v = rng.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1) if t.fmt.islower() else rng.getrandbits(bits)
+            return struct.pack('<' + t.fmt, v), v
+        if isinstance(t, m.Blob):
+            if t.convert is None:
+                v = rng.randbytes(rng.randint(0, self.blob_size))
+            else:
+                v = ''.join(rng.choices(string.ascii_letters, k=rng.randint(0, self.blob_size)))
+            data = v if isinstance(v, bytes) else v.encode()
+            return struct.pack('<I', len(data)) + data, v
+        if isinstance(t, m.InetAddress):
+            v = rng.getrandbits(32) & 0x7fffffff
+            return struct.pack('<I', v), m.ipaddress.IPv4Address(v)
+        if isinstance(t, m.Empty):
+            return b'', None
+        if isinstance(t, m.Sequence):
+            n = t.count if t.count is not None else self.length(depth)
+            elems = [self(t.elem, depth + 1) for _ in range(n)]
+            prefix = b'' if t.count is not None else struct.pack('<I', n)
+            return prefix + b''.join(e[0] for e in elems), [e[1] for e in elems]
+        if isinstance(t, m.Mapping):
+            pairs = [(self(t.key, depth + 1), self(t.value, depth + 1)) for _ in range(self.length(depth))]
+            expected = [(k[1], v[1]) for k, v in pairs]
+            try:
+                expected = dict(expected)
+            except TypeError:
+                pass
+            return struct.pack('<I', len(pairs)) + b''.join(k[0] + v[0] for k, v in pairs), expected
+        if isinstance(t, m.Optional):
+            if rng.random() < 0.5:
+                return b'\0', None
+            data, v = self(t.elem, depth + 1)
+            return b'\1' + data, v
+        if isinstance(t, m.BoostVariant):
+            index = rng.randrange(len(t.alternatives))
+            data, v = self(t.alternatives[index], depth + 1)
+            return struct.pack('<II', 8 + len(data), index) + data, m.Variant(index, v)
+        if isinstance(t, m.StdVariant):
+            index = rng.randrange(len(t.alternatives))
+            data, v = self(t.alternatives[index], depth + 1)
+            return struct.pack('<B', index) + data, m.Variant(index, v)
+        if isinstance(t, type) and issubclass(t, m.View):
+            members = [self(mt, depth + 1) for mt in t._types]
+            body = b''.join(d for d, _ in members)
+            expected = {name: v for name, (_, v) in zip(t._fields, members)}
+            if t._final:
+                return body, expected
+            return struct.pack('<I', 4 + len(body)) + body, expected
+        raise m.DecodeError(f"can't synthesize {t!r}")
+
+
+def measure(fn, size, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size / best / 1e6
+
+
+def run(m, name, args):
+    t = m.TYPES[name]
+    synthesize = synthesizer(m, random.Random(args.seed), args.width, args.blob_size)
+    chunks = []
+    size = 0
+    while size < args.size * 1e6:
+        data, _ = synthesize(t)
+        chunks.append(data)
+        size += len(data)
+    buf = m.as_buffer(b''.join(chunks))
+    count = len(chunks)
+
+    def walk():
+        pos = 0
+        skip = t._skip
+        for _ in range(count):
+            pos = skip(buf, pos)
+        return pos
+
+    def lazy():
+        pos = 0
+        fields = t._fields
+        for _ in range(count):
+            v = t._decode(buf, pos)
+            for f in fields:
+                getattr(v, f)
+            pos = t._skip(buf, pos)
+
+    def full():
+        pos = 0
+        for _ in range(count):
+            m.to_python(t._decode(buf, pos))
+            pos = t._skip(buf, pos)
+
+    results = [measure(fn, len(buf), args.runs) for fn in (walk, lazy, full)]
+    print(f"{name:40} {count:8} {len(buf) / count:10.1f} " + " ".join(f"{r:10.2f}" for r in results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the decode throughput of the Python IDL decoders',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('types', nargs='*', help='C++ names of the types to decode',
+                        default=['mutation_partition', 'query::read_command', 'reconcilable_result', 'raft::append_request'])
+    parser.add_argument('--idl-dir', default=os.path.join(os.path.dirname(__file__), '..', '..', 'idl'),
+                        help='directory of the IDL files')
+    parser.add_argument('--size', type=float, default=16, help='size of the buffer of each type, in MB')
+    parser.add_argument('--width', type=int, default=8, help='maximum number of elements of the top-level collections')
+    parser.add_argument('--blob-size', type=int, default=32, help='maximum size of bytes and strings')
+    parser.add_argument('--runs', type=int, default=3, help='number of runs, the best one is reported')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random objects')
+    parser.add_argument('--resource-dir', default=os.path.join(os.path.dirname(__file__), '..', 'resource', 'idl'),
+                        help='directory of the objects serialized by C++, for --verify')
+    parser.add_argument('--verify', action='store_true', help='check the decoders against objects serialized by C++ first')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        m = load_decoders(args.idl_dir, os.path.join(tmp, 'idl_decoders.py'))
+
+    if args.verify:
+        verify(m, args.resource_dir)
+
+    print(f"{'type':40} {'objects':>8} {'avg size':>10} {'skip MB/s':>10} {'lazy MB/s':>10} {'full MB/s':>10}")
+    for name in args.types:
+        try:
+            run(m, name, args)
+        except m.DecodeError as e:
+            print(f"{name:40} skipped: {e}")
+
+
+if __name__ == '__main__':
+    main()
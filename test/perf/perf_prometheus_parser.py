@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+# Measures the Prometheus exposition format parser shared by scyllatop and
+# the test suites (tools/scyllatop/exposition.py) on a /metrics payload,
+# against the ad-hoc ways the metrics used to be read:
+#  - regex: what the tests' get_metric() did, a multi-line regex scan of the
+#    whole payload per queried metric, labels compared as strings;
+#  - re.match: what scyllatop's query_val() did, matching a regex against
+#    every line of the payload per query;
+#  - parse: tokenizing the payload once with exposition.parse();
+#  - select: the same queries as selectors on the parsed payload;
+#  - diff: the difference of two parsed payloads.
+#
+# Use a real payload, e.g. saved with `curl http://node:9180/metrics > dump`,
+# with --dump. Without one, a payload shaped like Scylla's is synthesized.
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), '..', '..', 'tools', 'scyllatop'))
+import exposition
+
+
+def synthesize(shards, families, rng):
+    '''A payload shaped like Scylla's: per-shard counters and gauges, some with extra labels, and histograms'''
+    lines = []
+    groups = ['main', 'statement', 'streaming', 'compaction', 'memtable', 'gossip', 'commitlog', 'atexit']
+    for f in range(families):
+        name = f'scylla_family{f}_metric'
+        kind = ['counter', 'gauge', 'histogram'][f % 3]
+        lines.append(f'# HELP {name} Synthetic metric {f}')
+        lines.append(f'# TYPE {name} {kind}')
+        extra = [''] if f % 4 else [f'group="{g}",' for g in groups]
+        for shard in range(shards):
+            for labels in extra:
+                if kind == 'histogram':
+                    total = 0
+                    for le in [10, 20, 40, 80, 160, 320, 640, 1280, 2560, 5120, '+Inf']:
+                        total += rng.randint(0, 1000)
+                        lines.append(f'{name}_bucket{{{labels}le="{le}",shard="{shard}"}} {total}')
+                    lines.append(f'{name}_count{{{labels}shard="{shard}"}} {total}')
+                    lines.append(f'{name}_sum{{{labels}shard="{shard}"}} {total * 100}')
+                else:
+                    lines.append(f'{name}{{{labels}shard="{shard}"}} {rng.randint(0, 1 << 40)}.000000')
+    return '\n'.join(lines) + '\n'
+
+
+def legacy_get_metric(text, name, requested_labels=None):
+    '''The get_metric() the alternator and cql-pytest tests used'''
+    total = 0.0
+    lines = re.compile('^' + name + '{.*$', re.MULTILINE)
+    for match in re.findall(lines, text):
+        a = match.split()
+        val = float(a[1])
+        if requested_labels:
+            got_labels = a[0][len(name) + 1:-1].split(',')
+            for k, v in requested_labels.items():
+                if not f'{k}="{v}"' in got_labels:
+                    val = 0
+                    break
+        total += val
+    return total
+
+
+def legacy_query_val(text, val):
+    '''The query_val() scyllatop used'''
+    return [l for l in text.splitlines() if (not l.startswith('#')) and (val == "" or re.match(val, l))]
+
+
+def measure(fn, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the Prometheus exposition format parser',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--dump', help='file with a /metrics payload, synthesized if not given')
+    parser.add_argument('--shards', type=int, default=32, help='shards of the synthesized payload')
+    parser.add_argument('--families', type=int, default=300, help='metric families of the synthesized payload')
+    parser.add_argument('--queries', type=int, default=20, help='number of metrics queried')
+    parser.add_argument('--runs', type=int, default=3, help='number of runs, the best one is reported')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthesized payload and of the queries')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.dump:
+        with open(args.dump) as f:
+            text = f.read()
+    else:
+        text = synthesize(args.shards, args.families, rng)
+    metrics = exposition.parse(text)
+    names = sorted({sample.name for sample in metrics if any(k == 'shard' for k, _ in sample.labels)})
+    queried = [rng.choice(names) for _ in range(args.queries)]
+    shards = sorted({v for sample in metrics for k, v in sample.labels if k == 'shard'})
+    shard = shards[len(shards) // 2] if shards else '0'
+    print(f"payload: {len(text) / 1e6:.1f} MB, {len(metrics)} samples, {len(metrics.names())} metrics, "
+          f"{args.queries} queries of the shard {shard} series")
+
+    def regex():
+        return [legacy_get_metric(text, name, {'shard': shard}) for name in queried]
+
+    def rematch():
+        return [legacy_query_val(text, f'{name}{{.*shard="{shard}"') for name in queried]
+
+    def select(parsed=metrics):
+        return [parsed.value(f'{name}{{shard="{shard}"}}') for name in queried]
+
+    # both ways must agree before they are compared
+    assert regex() == select(), 'the parser disagrees with the legacy get_metric()'
+    before = exposition.parse(text)
+    results = [
+        ('regex (per query)', measure(regex, args.runs)),
+        ('re.match (per query)', measure(rematch, args.runs)),
+        ('parse', measure(lambda: exposition.parse(text), args.runs)),
+        ('select (per query)', measure(select, args.runs)),
+        ('parse + select', measure(lambda: select(exposition.parse(text)), args.runs)),
+        ('diff', measure(lambda: metrics.diff(before), args.runs)),
+    ]
+    print(f"{'method':24} {'total ms':>10} {'MB/s':>10}")
+    for name, elapsed in results:
+        print(f"{name:24} {elapsed * 1e3:10.2f} {len(text) / elapsed / 1e6:10.1f}")
+
+
+if __name__ == '__main__':
+    main()
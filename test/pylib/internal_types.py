@@ -21,3 +21,11 @@ class ServerInfo(NamedTuple):
     host_id: HostID
     def __str__(self):
         return f"Server({self.server_id}, {self.ip_addr}, {self.host_id})"
+
+
+class ServerTiming(NamedTuple):
+    """Server id (test local) and how long an operation on it took, in seconds"""
+    server_id: ServerNum
+    seconds: float
+    def __str__(self):
+        return f"Server({self.server_id}): {self.seconds:.1f}s"
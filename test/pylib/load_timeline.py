@@ -0,0 +1,211 @@
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+"""This module measures how a client workload behaves while the cluster goes through
+topology changes.
+
+Classes:
+    LoadTimeline
+        Per-second throughput, latency percentiles and error counts of the requests of
+        a workload, and the boundaries of the events that happened meanwhile.
+        .event() is an async context manager marking the start and end of an event,
+        e.g. a node restart.
+        .write() saves the timeline to a JSON file, .format() renders it as text.
+
+    CqlLoad
+        A sustained async CQL workload of writes and reads of a RandomTable, recording
+        every request in a LoadTimeline. It is an async context manager, the workload
+        runs while in the context.
+
+Typical use in a topology test:
+
+    timeline = LoadTimeline()
+    async with CqlLoad(manager.cql, table, timeline, concurrency=32):
+        async with timeline.event(f"restart server {server_id}"):
+            await manager.server_restart(server_id)
+    timeline.write(path)
+"""
+
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
+from test.pylib.random_tables import RandomTable
+from cassandra.cluster import Session  # type: ignore # pylint: disable=no-name-in-module
+
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(latencies: List[float], p: float) -> float:
+    """Nearest-rank percentile p (0-100) of sorted latencies, 0 if there are none"""
+    if not latencies:
+        return 0.0
+    return latencies[max(math.ceil(p / 100 * len(latencies)) - 1, 0)]
+
+
+class TimelineEvent(NamedTuple):
+    """An event of a timeline, with its boundaries in seconds since the start of the timeline"""
+    name: str
+    start: float
+    end: Optional[float]
+    error: Optional[str] = None
+
+
+class LoadTimeline():
+    """Per-second statistics of a workload, annotated with events
+
+    Requests are accounted for in the second they complete in. The latencies of each
+    second are kept until the timeline is rendered, which is fine for the request rates
+    a test cluster sustains.
+    """
+    def __init__(self) -> None:
+        self.start = time.monotonic()
+        self.latencies: Dict[int, List[float]] = {}
+        self.errors: Dict[int, int] = {}
+        self.error_types: Dict[str, int] = {}
+        self.events: List[TimelineEvent] = []
+
+    def now(self) -> float:
+        """Seconds since the start of the timeline"""
+        return time.monotonic() - self.start
+
+    def record(self, latency: float) -> None:
+        """Account for a successful request which took latency seconds"""
+        self.latencies.setdefault(int(self.now()), []).append(latency)
+
+    def record_error(self, exc: BaseException) -> None:
+        """Account for a failed request"""
+        second = int(self.now())
+        self.errors[second] = self.errors.get(second, 0) + 1
+        name = type(exc).__name__
+        self.error_types[name] = self.error_types.get(name, 0) + 1
+
+    @asynccontextmanager
+    async def event(self, name: str) -> AsyncIterator[None]:
+        """Mark the duration of the body of the context as the event name"""
+        logger.info("timeline: %s started at %.1fs", name, self.now())
+        index = len(self.events)
+        self.events.append(TimelineEvent(name, self.now(), None))
+        try:
+            yield
+        except BaseException as exc:
+            self.events[index] = self.events[index]._replace(end=self.now(), error=repr(exc))
+            raise
+        self.events[index] = self.events[index]._replace(end=self.now())
+        logger.info("timeline: %s finished at %.1fs", name, self.now())
+
+    def seconds(self) -> List[Dict[str, Any]]:
+        """The statistics of every second of the timeline, including the idle ones"""
+        last = max([*self.latencies, *self.errors], default=-1)
+        rows = []
+        for second in range(last + 1):
+            latencies = sorted(self.latencies.get(second, []))
+            rows.append({"second": second,
+                         "ops": len(latencies),
+                         "errors": self.errors.get(second, 0),
+                         "p50_ms": percentile(latencies, 50) * 1000,
+                         "p99_ms": percentile(latencies, 99) * 1000,
+                         "p999_ms": percentile(latencies, 99.9) * 1000,
+                         "events": [e.name for e in self.events if self._overlaps(e, second)]})
+        return rows
+
+    def _overlaps(self, event: TimelineEvent, second: int) -> bool:
+        end = event.end if event.end is not None else self.now()
+        return event.start < second + 1 and end >= second
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"seconds": self.seconds(),
+                "events": [e._asdict() for e in self.events],
+                "error_types": self.error_types}
+
+    def write(self, path: str) -> None:
+        """Save the timeline as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, indent=1)
+        logger.info("timeline written to %s", path)
+
+    def format(self) -> str:
+        """Render the timeline as a text table, one line per second"""
+        lines = [f"{'sec':>5} {'ops':>7} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9}  events"]
+        for row in self.seconds():
+            lines.append(f"{row['second']:5} {row['ops']:7} {row['errors']:7} {row['p50_ms']:9.2f} "
+                         f"{row['p99_ms']:9.2f} {row['p999_ms']:9.2f}  {', '.join(row['events'])}")
+        for event in self.events:
+            end = f"{event.end:.1f}s" if event.end is not None else "unfinished"
+            error = f" failed: {event.error}" if event.error is not None else ""
+            lines.append(f"event {event.name}: {event.start:.1f}s - {end}{error}")
+        return "\n".join(lines)
+
+
+class CqlLoad():
+    """A sustained workload of writes and reads of a table
+
+    concurrency workers each send one request at a time for as long as the load
+    runs. Writes insert rows of sequential values, like RandomTable.insert_seq(),
+    reads select the partition of a random row which was successfully written.
+    The statements are prepared, so the workload measures the servers rather
+    than the client.
+    """
+    # Back off after a failed request, so that workers don't spin on a down cluster
+    error_backoff = 0.05
+
+    def __init__(self, cql: Session, table: RandomTable, timeline: LoadTimeline,
+                 concurrency: int = 16, read_ratio: float = 0.5) -> None:
+        self.cql = cql
+        self.table = table
+        self.timeline = timeline
+        self.concurrency = concurrency
+        self.read_ratio = read_ratio
+        self.written: List[int] = []
+        self.tasks: List[asyncio.Task] = []
+        self.stopping = False
+        columns = table.columns
+        self.insert = cql.prepare(f"INSERT INTO {table.full_name} ({table.all_col_names}) "
+                                  f"VALUES ({', '.join(['?'] * len(columns))})")
+        self.select = cql.prepare(f"SELECT * FROM {table.full_name} WHERE {columns[0].name} = ?")
+
+    async def _request(self) -> None:
+        if self.written and random.random() < self.read_ratio:
+            seed = random.choice(self.written)
+            await self.cql.run_async(self.select, [self.table.columns[0].val(seed)])
+        else:
+            seed = self.table.next_seq()
+            await self.cql.run_async(self.insert, [c.val(seed) for c in self.table.columns])
+            self.written.append(seed)
+
+    async def _worker(self) -> None:
+        while not self.stopping:
+            start = time.monotonic()
+            try:
+                await self._request()
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.debug("CqlLoad request failed: %s", exc)
+                self.timeline.record_error(exc)
+                await asyncio.sleep(self.error_backoff)
+            else:
+                self.timeline.record(time.monotonic() - start)
+
+    def start(self) -> None:
+        """Start the workers"""
+        self.stopping = False
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Stop the workers once their current requests complete"""
+        self.stopping = True
+        await asyncio.gather(*self.tasks)
+        self.tasks = []
+
+    async def __aenter__(self) -> 'CqlLoad':
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.stop()
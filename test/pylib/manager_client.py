@@ -9,12 +9,12 @@
    Manages driver refresh when cluster is cycled.
 """
 
-from typing import List, Optional, Callable, Any
+from typing import List, Optional, Callable, Any, Tuple
 from time import time
 import logging
 from test.pylib.rest_client import UnixRESTClient, ScyllaRESTAPIClient
 from test.pylib.util import wait_for
-from test.pylib.internal_types import ServerNum, IPAddress, HostID, ServerInfo
+from test.pylib.internal_types import ServerNum, IPAddress, HostID, ServerInfo, ServerTiming
 from test.pylib.scylla_cluster import ReplaceConfig, ScyllaServer
 from cassandra.cluster import Session as CassandraSession  # type: ignore # pylint: disable=no-name-in-module
 from cassandra.cluster import Cluster as CassandraCluster  # type: ignore # pylint: disable=no-name-in-module
@@ -137,6 +137,15 @@ class ManagerClient():
         logger.debug("ManagerClient stopping gracefully %s", server_id)
         await self.client.get_text(f"/cluster/server/{server_id}/stop_gracefully")
 
+    async def servers_stop(self, server_ids: List[ServerNum], gracefully: bool = False) \
+            -> List[ServerTiming]:
+        """Stop the specified servers concurrently"""
+        logger.debug("ManagerClient stopping %s", server_ids)
+        timings = await self.client.put_json("/cluster/stop-servers",
+                                             {"server_ids": server_ids, "gracefully": gracefully},
+                                             response_type="json")
+        return self._parse_timings(timings)
+
     async def server_start(self, server_id: ServerNum) -> None:
         """Start specified server"""
         logger.debug("ManagerClient starting %s", server_id)
@@ -171,6 +180,45 @@ class ManagerClient():
         self._driver_update()
         return s_info
 
+    async def servers_add(self, count: int, cmdline: Optional[List[str]] = None,
+                          max_concurrency: int = 1) -> Tuple[List[ServerInfo], List[ServerTiming]]:
+        """Add `count` new servers, booting up to `max_concurrency` of them at a time.
+           Scylla still joins them to the token ring one at a time, so concurrency only
+           overlaps the rest of their boot; keep it small, a joining node waits at most
+           a minute for the others.
+           Returns the new servers and how long each boot took."""
+        try:
+            data: dict[str, Any] = {"count": count, "max_concurrency": max_concurrency}
+            if cmdline:
+                data['cmdline'] = cmdline
+            added = await self.client.put_json("/cluster/addservers", data, response_type="json",
+                                               timeout=ScyllaServer.TOPOLOGY_TIMEOUT * max(count, 1))
+        except Exception as exc:
+            raise Exception(f"Failed to add {count} servers") from exc
+        try:
+            s_infos = [ServerInfo(ServerNum(int(info["server_id"])),
+                                  IPAddress(info["ip_addr"]),
+                                  HostID(info["host_id"])) for info in added]
+            timings = self._parse_timings(added)
+        except Exception as exc:
+            raise RuntimeError(f"servers_add got invalid server data {added}") from exc
+        logger.debug("ManagerClient added %s", ", ".join(str(t) for t in timings))
+        self._driver_update()
+        return s_infos, timings
+
+    async def rolling_restart(self, server_ids: List[ServerNum], max_concurrency: int = 1) \
+            -> List[ServerTiming]:
+        """Restart the specified servers, at most `max_concurrency` of them at a time.
+           Each restart waits for the server to serve CQL before the next one starts."""
+        logger.debug("ManagerClient rolling restart of %s", server_ids)
+        timings = await self.client.put_json("/cluster/rolling-restart",
+                                             {"server_ids": server_ids,
+                                              "max_concurrency": max_concurrency},
+                                             response_type="json",
+                                             timeout=ScyllaServer.TOPOLOGY_TIMEOUT * max(len(server_ids), 1))
+        self._driver_update()
+        return self._parse_timings(timings)
+
     async def remove_node(self, initiator_id: ServerNum, server_id: ServerNum,
                           ignore_dead: List[IPAddress] = []) -> None:
         """Invoke remove node Scylla REST API for a specified server"""
@@ -187,6 +235,20 @@ class ManagerClient():
                                    timeout=ScyllaServer.TOPOLOGY_TIMEOUT)
         self._driver_update()
 
+    async def decommission_nodes(self, server_ids: List[ServerNum]) -> List[ServerTiming]:
+        """Decommission the specified servers, one at a time, in a single request"""
+        logger.debug("ManagerClient decommission %s", server_ids)
+        timings = await self.client.put_json("/cluster/decommission-nodes", {"server_ids": server_ids},
+                                             response_type="json",
+                                             timeout=ScyllaServer.TOPOLOGY_TIMEOUT * max(len(server_ids), 1))
+        self._driver_update()
+        return self._parse_timings(timings)
+
+    @staticmethod
+    def _parse_timings(timings: Any) -> List[ServerTiming]:
+        assert isinstance(timings, list), f"expected a list of server timings, got {timings}"
+        return [ServerTiming(ServerNum(int(t["server_id"])), float(t["seconds"])) for t in timings]
+
     async def server_get_config(self, server_id: ServerNum) -> dict[str, object]:
         data = await self.client.get_json(f"/cluster/server/{server_id}/get_config")
         assert isinstance(data, dict), f"server_get_config: got {type(data)} expected dict"
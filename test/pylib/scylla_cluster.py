@@ -681,6 +681,43 @@ class ScyllaCluster:
         self.logger.info("Cluster %s added %s", self, server)
         return ServerInfo(server.server_id, server.ip_addr, server.host_id)
 
+    async def add_servers(self, count: int, cmdline: Optional[List[str]] = None,
+                          max_concurrency: int = 1) -> List[Tuple[ServerInfo, float]]:
+        """Add `count` new servers to the cluster, booting up to `max_concurrency` of them
+           at a time. Returns the info of each server and how long its boot took, in seconds.
+           Scylla serializes the token ring joins itself: with consistent_rangemovement a
+           bootstrapping node waits for the other bootstrapping nodes, for up to a minute.
+           So concurrent boots overlap everything but the joins, and max_concurrency
+           should stay small. The first server of an empty cluster boots alone, as it is
+           the seed of the others."""
+        assert max_concurrency >= 1, f"add_servers: invalid max_concurrency {max_concurrency}"
+        self.is_dirty = True
+
+        async def add_server() -> Tuple[ServerInfo, float]:
+            start = time.time()
+            server_info = await self.add_server(cmdline=cmdline)
+            return server_info, time.time() - start
+
+        added: List[Tuple[ServerInfo, float]] = []
+        if count > 0 and not self.running:
+            added.append(await add_server())
+            count -= 1
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def add_server_bounded() -> Tuple[ServerInfo, float]:
+            async with semaphore:
+                return await add_server()
+
+        # Wait for all the boots to finish before reporting a failure, the servers
+        # that did start are part of the cluster
+        results = await asyncio.gather(*(add_server_bounded() for _ in range(count)),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            added.append(result)
+        return added
+
     def endpoint(self) -> str:
         """Get a server id (IP) from running servers"""
         return next(server.ip_addr for server in self.running.values())
@@ -780,6 +817,35 @@ class ScyllaCluster:
         self.stopped[server_id] = server
         return ScyllaCluster.ActionReturn(success=True, msg=f"{server} stopped")
 
+    async def servers_stop(self, server_ids: List[ServerNum], gracefully: bool) \
+            -> List[Tuple[ActionReturn, float]]:
+        """Stop the given servers concurrently, stopping doesn't change the topology.
+           Returns the result of each stop and how long it took, in seconds."""
+        async def server_stop(server_id: ServerNum) -> Tuple[ScyllaCluster.ActionReturn, float]:
+            start = time.time()
+            ret = await self.server_stop(server_id, gracefully)
+            return ret, time.time() - start
+
+        return list(await asyncio.gather(*(server_stop(server_id) for server_id in server_ids)))
+
+    async def rolling_restart(self, server_ids: List[ServerNum], max_concurrency: int = 1) \
+            -> List[Tuple[ActionReturn, float]]:
+        """Restart the given servers, at most `max_concurrency` of them at a time: the next
+           server is restarted as soon as a restarted one is up again. A restart of a server
+           that is part of the ring doesn't change the topology, max_concurrency only bounds
+           how many servers are down at once.
+           Returns the result of each restart and how long it took, in seconds."""
+        assert max_concurrency >= 1, f"rolling_restart: invalid max_concurrency {max_concurrency}"
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def server_restart(server_id: ServerNum) -> Tuple[ScyllaCluster.ActionReturn, float]:
+            async with semaphore:
+                start = time.time()
+                ret = await self.server_restart(server_id)
+                return ret, time.time() - start
+
+        return list(await asyncio.gather(*(server_restart(server_id) for server_id in server_ids)))
+
     def server_mark_removed(self, server_id: ServerNum) -> None:
         """Mark server as removed."""
         self.logger.debug("Cluster %s marking server %s as removed", self, server_id)
@@ -952,8 +1018,12 @@ class ScyllaClusterManager:
         add_get('/cluster/server/{server_id}/start', self._cluster_server_start)
         add_get('/cluster/server/{server_id}/restart', self._cluster_server_restart)
         add_put('/cluster/addserver', self._cluster_server_add)
+        add_put('/cluster/addservers', self._cluster_servers_add)
+        add_put('/cluster/stop-servers', self._cluster_servers_stop)
+        add_put('/cluster/rolling-restart', self._cluster_rolling_restart)
         add_put('/cluster/remove-node/{initiator}', self._cluster_remove_node)
         add_get('/cluster/decommission-node/{server_id}', self._cluster_decommission_node)
+        add_put('/cluster/decommission-nodes', self._cluster_decommission_nodes)
         add_get('/cluster/server/{server_id}/get_config', self._server_get_config)
         add_put('/cluster/server/{server_id}/update_config', self._server_update_config)
 
@@ -1056,6 +1126,43 @@ class ScyllaClusterManager:
                                           "ip_addr": s_info.ip_addr,
                                           "host_id": s_info.host_id})
 
+    async def _cluster_servers_add(self, request) -> aiohttp.web.Response:
+        """Add new servers, booting up to max_concurrency of them at a time"""
+        assert self.cluster
+        data = await request.json()
+        added = await self.cluster.add_servers(int(data["count"]), data.get('cmdline'),
+                                               int(data.get("max_concurrency", 1)))
+        return aiohttp.web.json_response([{"server_id" : s_info.server_id,
+                                           "ip_addr": s_info.ip_addr,
+                                           "host_id": s_info.host_id,
+                                           "seconds": seconds} for s_info, seconds in added])
+
+    @staticmethod
+    def _timings_response(server_ids: List[ServerNum],
+                          results: List[Tuple[ScyllaCluster.ActionReturn, float]]) -> aiohttp.web.Response:
+        """The per-server timings of a batch operation, or its errors if any server failed"""
+        errors = [ret.msg for ret, _ in results if not ret.success]
+        if errors:
+            return aiohttp.web.Response(status=500, text="\n".join(errors))
+        return aiohttp.web.json_response([{"server_id": server_id, "seconds": seconds}
+                                          for server_id, (_, seconds) in zip(server_ids, results)])
+
+    async def _cluster_servers_stop(self, request) -> aiohttp.web.Response:
+        """Stop the specified servers concurrently"""
+        assert self.cluster
+        data = await request.json()
+        server_ids = [ServerNum(int(server_id)) for server_id in data["server_ids"]]
+        results = await self.cluster.servers_stop(server_ids, bool(data.get("gracefully", False)))
+        return self._timings_response(server_ids, results)
+
+    async def _cluster_rolling_restart(self, request) -> aiohttp.web.Response:
+        """Restart the specified servers, up to max_concurrency of them at a time"""
+        assert self.cluster
+        data = await request.json()
+        server_ids = [ServerNum(int(server_id)) for server_id in data["server_ids"]]
+        results = await self.cluster.rolling_restart(server_ids, int(data.get("max_concurrency", 1)))
+        return self._timings_response(server_ids, results)
+
     async def _cluster_remove_node(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         """Run remove node on Scylla REST API for a specified server"""
         assert self.cluster
@@ -1088,10 +1195,8 @@ class ScyllaClusterManager:
         self.cluster.server_mark_removed(server_id)
         return aiohttp.web.Response(text="OK")
 
-    async def _cluster_decommission_node(self, request) -> aiohttp.web.Response:
-        """Run remove node on Scylla REST API for a specified server"""
-        assert self.cluster
-        server_id = ServerNum(int(request.match_info["server_id"]))
+    async def _decommission_node(self, server_id: ServerNum) -> ScyllaCluster.ActionReturn:
+        """Decommission a server with Scylla REST API and stop it"""
         self.logger.info("_cluster_decommission_node %s", server_id)
         assert server_id in self.cluster.running, "Can't decommission not running node"
         if len(self.cluster.running) == 1:
@@ -1102,10 +1207,31 @@ class ScyllaClusterManager:
         except RuntimeError as exc:
             self.logger.error("_cluster_decommission_node %s, check log at %s", server,
                           server.log_filename)
-            return aiohttp.web.Response(status=500,
-                                        text=f"Error decommissioning {server}: {exc}")
+            return ScyllaCluster.ActionReturn(success=False,
+                                              msg=f"Error decommissioning {server}: {exc}")
         await self.cluster.server_stop(server_id, gracefully=True)
-        return aiohttp.web.Response(text="OK")
+        return ScyllaCluster.ActionReturn(success=True, msg="OK")
+
+    async def _cluster_decommission_node(self, request) -> aiohttp.web.Response:
+        """Run decommission on Scylla REST API for a specified server"""
+        assert self.cluster
+        ret = await self._decommission_node(ServerNum(int(request.match_info["server_id"])))
+        return aiohttp.web.Response(status=200 if ret.success else 500, text=ret.msg)
+
+    async def _cluster_decommission_nodes(self, request) -> aiohttp.web.Response:
+        """Decommission the specified servers. Decommissions change the topology, so
+           they run one at a time, stopping at the first failure."""
+        assert self.cluster
+        data = await request.json()
+        server_ids = [ServerNum(int(server_id)) for server_id in data["server_ids"]]
+        results: List[Tuple[ScyllaCluster.ActionReturn, float]] = []
+        for server_id in server_ids:
+            start = time.time()
+            ret = await self._decommission_node(server_id)
+            results.append((ret, time.time() - start))
+            if not ret.success:
+                break
+        return self._timings_response(server_ids, results)
 
     async def _server_get_config(self, request: aiohttp.web.Request) -> aiohttp.web.Response:
         """Get conf/scylla.yaml of the given server as a dictionary."""
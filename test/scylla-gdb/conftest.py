@@ -31,6 +31,12 @@ def pytest_addoption(parser):
     parser.addoption('--scylla-tmp-dir', action='store', default=None,
         help='Temporary directory where Scylla runs')
 
+# The tests of test_sample.py detach from the Scylla process and re-attach
+# to it, which clears the caches of scylla-gdb.py, and if attaching fails,
+# leaves the other tests without a process to look at. So they run last.
+def pytest_collection_modifyitems(config, items):
+    items.sort(key=lambda item: item.nodeid.startswith('test_sample.py::'))
+
 # Scylla's "scylla-gdb.py" does two things: It configures gdb to add new
 # "scylla" commands, and it implements a bunch of useful functions in Python.
 # Doing just the former is easy (just add "-x scylla-gdb.py" when running
@@ -1,3 +1,6 @@
+import importlib.util
+import json
+import os
 import pytest
 import re
 
@@ -39,6 +42,10 @@ def test_active_sstables(gdb):
 def test_sstables(gdb):
     scylla(gdb, 'sstables')
 
+def test_sstables_json(gdb, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    scylla(gdb, f'sstables --json {tmpdir}/sstables.json')
+
 def test_memtables(gdb):
     scylla(gdb, 'memtables')
 
@@ -51,12 +58,21 @@ def test_gms(gdb):
 def test_heapprof(gdb):
     scylla(gdb, 'heapprof')
 
+def test_heapprof_diff(gdb, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    scylla(gdb, f'heapprof --save {tmpdir}/heapprof.snapshot')
+    scylla(gdb, f'heapprof --load {tmpdir}/heapprof.snapshot')
+    scylla(gdb, f'heapprof-diff {tmpdir}/heapprof.snapshot -')
+
 def test_io_queues(gdb):
     scylla(gdb, 'io-queues')
 
 def test_cache(gdb):
     scylla(gdb, 'cache')
 
+def test_cache_stats(gdb):
+    scylla(gdb, 'cache-stats')
+
 def test_mem_range(gdb):
     scylla(gdb, 'mem-range')
 
@@ -66,15 +82,50 @@ def test_mem_ranges(gdb):
 def test_memory(gdb):
     scylla(gdb, 'memory')
 
+def test_memory_json(gdb, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    scylla(gdb, f'memory --json {tmpdir}/memory.json')
+
 def test_segment_descs(gdb):
     scylla(gdb, 'segment-descs')
 
+def test_memory_layout(gdb, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    scylla(gdb, f'memory-layout -o {tmpdir}/layout.json')
+
+# Smoke test of scripts/scylla-core-analyzer.py, on a core dumped from the
+# running Scylla: the offline analysis has to find all shards and agree with
+# the same analysis run by gdb on the live process.
+def test_core_analyzer(gdb, scylla_gdb, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    layout_file = os.path.join(tmpdir, 'core-analyzer-layout.json')
+    core_file = os.path.join(tmpdir, 'core-analyzer.core')
+    scylla(gdb, f'memory-layout -o {layout_file}')
+    with open(layout_file) as f:
+        layout = json.load(f)
+    gdb.execute(f'gcore {core_file}', to_string=True)
+    try:
+        spec = importlib.util.spec_from_file_location('scylla_core_analyzer',
+                os.path.join(os.path.dirname(__file__), '..', '..', 'scripts', 'scylla-core-analyzer.py'))
+        analyzer = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(analyzer)
+        sections = ['memory', 'small-pools', 'page-spans', 'lsa']
+        offline = analyzer.analyze(analyzer.core_file_reader(core_file), layout, sections)
+    finally:
+        os.unlink(core_file)
+    live = scylla_gdb.scylla_memory_analysis.analyze(scylla_gdb.gdb_memory_reader(), layout, sections)
+    assert len(offline['shards']) == int(gdb.parse_and_eval('::seastar::smp::count'))
+    assert offline == live
+
 def test_small_object_1(gdb):
     scylla(gdb, 'small-object -o 32 --random-page')
 
 def test_small_object_2(gdb):
     scylla(gdb, 'small-object -o 64 --summarize')
 
+def test_small_object_estimate(gdb):
+    scylla(gdb, 'small-object -o 64 --summarize --estimate -m 1000')
+
 def test_lsa(gdb):
     scylla(gdb, 'lsa')
 
@@ -95,6 +146,9 @@ def test_task_histogram_coro(gdb):
     if re.search(r'\) \[clone \.\w+\]', h) is None:
         raise gdb.error('no coroutine entries in task histogram')
 
+def test_task_histogram_estimate(gdb):
+    scylla(gdb, 'task_histogram --estimate -m 1000')
+
 def test_tasks(gdb):
     scylla(gdb, 'tasks')
 
@@ -131,6 +185,12 @@ def test_find(gdb, schema):
 def test_ptr(gdb, schema):
     scylla(gdb, f'ptr {schema}')
 
+def test_ptr_from_file(gdb, schema, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    with open(f'{tmpdir}/pointers.txt', 'w') as f:
+        f.write(f'first pointer: 0x{int(gdb.parse_and_eval(schema)):x}, second pointer: 0x0\n')
+    scylla(gdb, f'ptr --from-file {tmpdir}/pointers.txt')
+
 def test_generate_object_graph(gdb, schema, request):
     tmpdir = request.config.getoption('scylla_tmp_dir')
     scylla(gdb, f'generate-object-graph -o {tmpdir}/og.dot -d 2 -t 10 {schema}')
@@ -150,6 +210,9 @@ def task(gdb, scylla_gdb):
 def test_fiber(gdb, task):
     scylla(gdb, f'fiber {task}')
 
+def test_fiber_all(gdb):
+    scylla(gdb, 'fiber --all')
+
 def test_sstable_summary(gdb, sstable):
     scylla(gdb, f'sstable-summary {sstable}')
 
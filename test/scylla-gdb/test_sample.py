@@ -0,0 +1,17 @@
+# The "scylla sample" command detaches from the Scylla process between the
+# samples and attaches to it again, so these tests are kept in their own
+# module, which conftest.py runs after all the others.
+
+def scylla(gdb, cmd):
+    return gdb.execute('scylla ' + cmd, from_tty=False, to_string=True)
+
+def test_sample(gdb, request):
+    tmpdir = request.config.getoption('scylla_tmp_dir')
+    output = scylla(gdb, f'sample -n 2 -i 10 -o {tmpdir}/sample.folded')
+    assert 'Collected 2 samples' in output
+    # gdb is attached to the process again
+    assert gdb.selected_inferior().pid
+    with open(f'{tmpdir}/sample.folded') as f:
+        for line in f:
+            stack, count = line.rsplit(' ', 1)
+            assert stack and int(count) > 0
@@ -0,0 +1,12 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# This file configures pytest for all tests in this directory. scyllatop is
+# not a package, its modules import each other as top-level modules, so its
+# directory has to be in the path to import them.
+
+import os
+import sys
+
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'tools', 'scyllatop'))
@@ -0,0 +1,132 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+#############################################################################
+# Tests for the Prometheus text format parser of scyllatop, exposition.py,
+# which is also used by the tests checking Scylla's metrics.
+#############################################################################
+
+import pytest
+
+import exposition
+
+PAYLOAD = '''# HELP scylla_reactor_utilization CPU utilization
+# TYPE scylla_reactor_utilization gauge
+scylla_reactor_utilization{shard="0"} 10.000000
+scylla_reactor_utilization{shard="1"} 30.000000
+# HELP scylla_transport_requests_served Counts the number of served requests.
+# TYPE scylla_transport_requests_served counter
+scylla_transport_requests_served{shard="0"} 100
+scylla_transport_requests_served{shard="1"} 200 1700000000000
+# TYPE scylla_transport_cql_errors_total counter
+scylla_transport_cql_errors_total{shard="0",type="protocol_error"} 3
+scylla_transport_cql_errors_total{shard="0",type="server_error"} 1
+scylla_transport_cql_errors_total{shard="1",type="protocol_error"} 4
+scylla_database_queued_reads{class="user",shard="0"} 5
+scylla_database_queued_reads{class="system",shard="0"} 6
+scylla_database_queued_reads{class="streaming",shard="0"} 7
+scylla_alternator_operation{op="GetItem",shard="0"} 8
+scylla_build_info 1
+'''
+
+def test_parse_labels():
+    assert exposition.parseLabels('shard="1",a="x"') == (('a', 'x'), ('shard', '1'))
+    assert exposition.parseLabels('') == ()
+    # Escaped quotes, backslashes and new lines in values
+    assert exposition.parseLabels(r'v="a\"b\\c\nd"') == (('v', 'a"b\\c\nd'),)
+    # A comma in a value doesn't split it
+    assert exposition.parseLabels('v="a,b",w="c"') == (('v', 'a,b'), ('w', 'c'))
+    with pytest.raises(ValueError):
+        exposition.parseLabels('shard=1')
+
+def test_parse_series():
+    assert exposition.parseSeries('name{shard="0"}') == ('name', (('shard', '0'),))
+    assert exposition.parseSeries('name') == ('name', ())
+
+def test_parse():
+    metrics = exposition.parse(PAYLOAD)
+    assert len(metrics) == 12
+    assert metrics.types['scylla_reactor_utilization'] == 'gauge'
+    assert metrics.types['scylla_transport_requests_served'] == 'counter'
+    assert metrics.help['scylla_transport_requests_served'] == 'Counts the number of served requests.'
+    assert 'scylla_build_info' in metrics.names()
+    # The timestamp which follows the value is ignored
+    assert metrics.value('scylla_transport_requests_served{shard="1"}') == 200
+    with pytest.raises(ValueError):
+        exposition.parse('name{shard="0"}\n')
+
+def test_selector_parsing():
+    selector = exposition.Selector('name{a="x", b!="y",c=~"z.*" ,d!~"w"}')
+    assert selector.name == 'name'
+    assert [(label, op) for label, op, _ in selector.matchers] == [('a', '='), ('b', '!='), ('c', '=~'), ('d', '!~')]
+    assert exposition.Selector('name').matchers == []
+    assert exposition.Selector('{a="x"}').name is None
+    # The name can be given as the __name__ label
+    assert exposition.Selector('{__name__="name"}').name == 'name'
+    assert exposition.Selector('name{a="x\\"y"}').matchers[0][2] == 'x"y'
+    for malformed in ['', 'name{', 'name{a=x}', 'name{a=="x"}', '1name', 'name{a="x" b="y"}']:
+        with pytest.raises(ValueError):
+            exposition.Selector(malformed)
+
+def test_selector_is_cached():
+    assert exposition.selector('name{a="x"}') is exposition.selector('name{a="x"}')
+
+def test_label_matchers():
+    labels = (('class', 'user'), ('shard', '0'))
+    def matches(text):
+        return exposition.Selector(text).matches('queued', labels)
+    assert matches('queued')
+    assert not matches('other')
+    assert matches('queued{shard="0"}')
+    assert not matches('queued{shard="1"}')
+    assert matches('queued{shard!="1"}')
+    assert not matches('queued{shard!="0"}')
+    assert matches('queued{class=~"user|system"}')
+    # Regular expressions are anchored at both ends
+    assert not matches('queued{class=~"use"}')
+    assert not matches('queued{class!~"u.*"}')
+    assert matches('queued{class!~"system"}')
+    # A missing label matches the empty string
+    assert matches('queued{missing=""}')
+    assert not matches('queued{missing!=""}')
+    assert matches('{__name__=~"que.*"}')
+    assert not matches('{__name__!~"que.*"}')
+    # All matchers have to match
+    assert not matches('queued{shard="0",class="system"}')
+
+def test_select():
+    metrics = exposition.parse(PAYLOAD)
+    samples = metrics.select('scylla_database_queued_reads{class=~"user|system"}')
+    assert sorted(sample.value for sample in samples) == [5, 6]
+    # Without a name, all metrics are looked at
+    assert len(metrics.select('{shard="1"}')) == 3
+    assert metrics.select('nonexistent') == []
+    assert metrics.select(exposition.Selector('scylla_build_info')) == [exposition.Sample('scylla_build_info', (), 1.0)]
+
+def test_value():
+    metrics = exposition.parse(PAYLOAD)
+    # The values of all matching series are summed, e.g. over all shards
+    assert metrics.value('scylla_reactor_utilization') == 40
+    assert metrics.value('scylla_reactor_utilization{shard="1"}') == 30
+    assert metrics.value('scylla_transport_cql_errors_total{type=~".*protocol_error.*"}') == 7
+    assert metrics.value('scylla_alternator_operation{op="PutItem"}') == 0.0
+    assert metrics.value('scylla_alternator_operation{op="PutItem"}', default=None) is None
+
+def test_diff():
+    before = exposition.parse('''a{shard="0"} 10
+a{shard="1"} 20
+gone 5
+''')
+    after = exposition.parse('''# TYPE a counter
+a{shard="0"} 15
+a{shard="1"} 20
+new 3
+''')
+    diff = after.diff(before)
+    assert diff.value('a{shard="0"}') == 5
+    assert diff.value('a{shard="1"}') == 0
+    # Series which are new count from zero, those which are gone are left out
+    assert diff.value('new') == 3
+    assert diff.select('gone') == []
+    assert diff.types == {'a': 'counter'}
@@ -0,0 +1,64 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+#############################################################################
+# Tests for the groups of metrics of the views of scyllatop, views/groups.py,
+# which aggregate the series of all shards.
+#############################################################################
+
+import pytest
+
+import metric
+from util import CannedSource
+from views import groups
+
+HISTOGRAM = '''# TYPE lat histogram
+# TYPE c counter
+lat_bucket{{le="1.000000",shard="0"}} {}
+lat_bucket{{le="2.000000",shard="0"}} {}
+lat_bucket{{le="+Inf",shard="0"}} {}
+lat_count{{shard="0"}} {}
+lat_bucket{{le="1.000000",shard="1"}} {}
+lat_bucket{{le="2.000000",shard="1"}} {}
+lat_bucket{{le="+Inf",shard="1"}} {}
+lat_count{{shard="1"}} {}
+c{{shard="0"}} {}
+c{{shard="1"}} {}
+'''
+
+def measurements():
+    source = CannedSource([HISTOGRAM.format(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+                           HISTOGRAM.format(10, 10, 10, 10, 0, 30, 30, 30, 10, 30)], [0, 10])
+    results = metric.Metric.discover(source)
+    source.scrape()
+    for m in results.values():
+        m.update()
+    return results.values()
+
+def group(label):
+    return next(g for g in groups.Groups(measurements()).all() if g.label == label)
+
+def test_group_over_shards():
+    assert [(g.label, g.size) for g in groups.Groups(measurements()).all()] == [('c{shard="*"}', 2), ('lat{shard="*"}', 2)]
+
+def test_aggregate_counters():
+    counters = group('c{shard="*"}')
+    assert counters.aggregate(sum) == {'rate': 4, 'delta': 40}
+    assert counters.quantiles() == {}
+    assert counters.rate == 4
+
+def test_aggregate_histograms():
+    histograms = group('lat{shard="*"}')
+    # The quantiles are not merged with the other values
+    assert histograms.aggregate(sum) == {'rate': 4}
+    # They are those of the observations of all shards
+    quantiles = histograms.quantiles()
+    assert quantiles['p50'] == pytest.approx(4 / 3)
+    assert list(quantiles) == ['p50', 'p95', 'p99']
+
+def test_absent_histograms():
+    histograms = group('lat{shard="*"}')
+    for m in histograms.metrics:
+        m.markAbsent()
+    assert histograms.quantiles() == {'p50': 'not available', 'p95': 'not available', 'p99': 'not available'}
@@ -0,0 +1,77 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+#############################################################################
+# Tests for the refresh loop of scyllatop, livedata.py: series which are no
+# longer scraped are shown as absent, until their ttl passes.
+#############################################################################
+
+import livedata
+from util import CannedSource
+
+class Loop(object):
+    def draw_screen(self):
+        pass
+
+class View(object):
+    def __init__(self, clock):
+        self._clock = clock
+        self.updates = []
+
+    # Called once per refresh, before the loop sleeps: the time of the
+    # next refresh goes by then
+    def update(self, liveData):
+        self.updates.append({m.symbol: m.is_absent for m in liveData.measurements})
+        self._clock[0] += 10
+
+def run(payloads, ttl, monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(livedata.time, 'time', lambda: clock[0])
+    source = CannedSource(payloads)
+    liveData = livedata.LiveData(['*'], 0, source, ttl)
+    view = View(clock)
+    liveData.addView(view)
+    liveData.go(Loop())
+    return liveData, view.updates
+
+def test_absent_metrics_expire(monkeypatch):
+    # b is gone at the second scrape, then the set of series doesn't change
+    payloads = ['a 1\nb 2\n'] + ['a 1\n'] * 5
+    liveData, updates = run(payloads, 25, monkeypatch)
+    assert updates[0] == {'a': False, 'b': True}
+    assert updates[1] == {'a': False, 'b': True}
+    assert updates[2] == {'a': False, 'b': True}
+    # b was marked absent at 10 and expires at 35
+    assert updates[3] == {'a': False}
+    assert updates[4] == {'a': False}
+
+def test_absent_metrics_without_ttl(monkeypatch):
+    payloads = ['a 1\nb 2\n'] + ['a 1\n'] * 5
+    liveData, updates = run(payloads, None, monkeypatch)
+    assert updates[-1] == {'a': False, 'b': True}
+
+def test_absent_metrics_come_back(monkeypatch):
+    payloads = ['a 1\nb 2\n', 'a 1\n', 'a 1\nb 3\n', 'a 1\nb 4\n', 'a 1\nb 5\n']
+    liveData, updates = run(payloads, 25, monkeypatch)
+    assert updates[0] == {'a': False, 'b': True}
+    assert updates[1] == {'a': False, 'b': False}
+    assert updates[-1] == {'a': False, 'b': False}
+    assert liveData.results['b'].status == {'value': 5}
+
+def test_discoveries(monkeypatch):
+    payloads = ['a 1\nb 2\n'] + ['a 1\n'] * 5
+    clock = [0.0]
+    monkeypatch.setattr(livedata.time, 'time', lambda: clock[0])
+    liveData = livedata.LiveData(['*'], 0, CannedSource(payloads), 25)
+    discoveries = liveData.discoveries
+    # The set of measurements changes when b is marked absent, then when it
+    # expires, and otherwise stays the same
+    liveData._merge(liveData._refresh())
+    assert liveData.discoveries == discoveries + 1
+    liveData._refresh()
+    liveData._expire(clock[0] + 20)
+    assert liveData.discoveries == discoveries + 1
+    liveData._expire(clock[0] + 25)
+    assert liveData.discoveries == discoveries + 2
+    assert list(liveData.results) == ['a']
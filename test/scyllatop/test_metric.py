@@ -0,0 +1,97 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+#############################################################################
+# Tests for the metrics of scyllatop, metric.py: the rates and deltas of
+# counters and the quantiles of histograms, computed over canned scrapes.
+#############################################################################
+
+import pytest
+
+import metric
+from util import CannedSource
+
+INF = float('inf')
+
+def test_histogram_quantile():
+    buckets = [(1.0, 10), (2.0, 20), (4.0, 40), (INF, 40)]
+    # The quantile is interpolated linearly within its bucket
+    assert metric.histogramQuantile(0.25, buckets) == 1.0
+    assert metric.histogramQuantile(0.375, buckets) == 1.5
+    assert metric.histogramQuantile(0.75, buckets) == 3.0
+    assert metric.histogramQuantile(0, buckets) == 0.0
+    assert metric.histogramQuantile(1, buckets) == 4.0
+
+def test_histogram_quantile_in_inf_bucket():
+    # The upper bound of the last finite bucket is returned
+    assert metric.histogramQuantile(0.99, [(1.0, 10), (INF, 20)]) == 1.0
+
+def test_histogram_quantile_in_empty_bucket():
+    assert metric.histogramQuantile(0, [(1.0, 0), (2.0, 10), (INF, 10)]) == 1.0
+
+def test_histogram_quantile_without_observations():
+    assert metric.histogramQuantile(0.5, []) is None
+    assert metric.histogramQuantile(0.5, [(1.0, 0), (INF, 0)]) is None
+
+def discover(payloads, times=None):
+    source = CannedSource(payloads, times)
+    return source, metric.Metric.discover(source)
+
+def test_counter():
+    source, results = discover(['# TYPE c counter\nc{shard="0"} 100\n', '# TYPE c counter\nc{shard="0"} 160\n'], [0, 2])
+    counter = results['c{shard="0"}']
+    assert counter.status == {'rate': 'not available', 'delta': 'not available'}
+    assert counter.rate is None
+    source.scrape()
+    counter.update()
+    assert counter.status == {'rate': 30, 'delta': 60}
+    assert counter.rate == 30
+
+def test_gauge():
+    source, results = discover(['# TYPE g gauge\ng 5\nuntyped 7\n', 'g 6\nuntyped 8\n'])
+    assert results['g'].status == {'value': 5}
+    assert results['untyped'].status == {'value': 7}
+    source.scrape()
+    results['g'].update()
+    assert results['g'].status == {'value': 6}
+    assert results['g'].rate is None
+
+HISTOGRAM = '''# TYPE lat histogram
+lat_bucket{{le="1.000000",shard="0"}} {}
+lat_bucket{{le="2.000000",shard="0"}} {}
+lat_bucket{{le="+Inf",shard="0"}} {}
+lat_count{{shard="0"}} {}
+lat_sum{{shard="0"}} 0
+'''
+
+def test_histogram():
+    source, results = discover([HISTOGRAM.format(10, 20, 20, 20), HISTOGRAM.format(10, 60, 60, 60)], [0, 4])
+    # The _bucket, _count and _sum series make up a single metric
+    assert list(results) == ['lat{shard="0"}']
+    histogram = results['lat{shard="0"}']
+    # With a single scrape, the quantiles are those of all the observations
+    assert histogram.status == {'p50': 1.0, 'p95': 1.9, 'p99': pytest.approx(1.98), 'rate': 'not available'}
+    source.scrape()
+    histogram.update()
+    # Then those of the observations made since the first scrape: all of
+    # them fell in the second bucket
+    assert histogram.status == {'p50': 1.5, 'p95': 1.95, 'p99': pytest.approx(1.99), 'rate': 10}
+    assert histogram.rate == 10
+
+def test_incomplete_histogram():
+    source, results = discover(['# TYPE lat histogram\nlat_sum{shard="0"} 3\n'])
+    assert results == {}
+
+def test_merge_buckets():
+    shard0 = [(1.0, 10), (2.0, 10), (INF, 10)]
+    shard1 = [(1.0, 0), (2.0, 30), (INF, 30)]
+    merged = metric.mergeBuckets([shard0, shard1])
+    assert merged == [(1.0, 10), (2.0, 40), (INF, 40)]
+    # The median of the merged observations, not the sum or the average of
+    # the medians of the shards (0.5 and 1.5)
+    assert metric.histogramQuantile(0.5, merged) == pytest.approx(4 / 3)
+
+def test_merge_buckets_with_different_bounds():
+    merged = metric.mergeBuckets([[(1.0, 10), (INF, 10)], [(2.0, 5), (INF, 5)], []])
+    assert merged == [(1.0, 10), (2.0, 15), (INF, 15)]
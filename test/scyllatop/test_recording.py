@@ -0,0 +1,118 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+#############################################################################
+# Tests for the recordings of scyllatop, recording.py: a replay must give
+# back the recorded scrapes exactly.
+#############################################################################
+
+import math
+import zlib
+
+import pytest
+
+import recording
+import series
+from util import scrape
+
+# The scrapes to record, with counters growing at a steady or irregular
+# pace, gauges with micro precision, values which can only be recorded as
+# raw doubles, and series which come and go
+SCRAPES = [
+    (1000.0, '''# HELP c Counts things.
+# TYPE c counter
+c{shard="0"} 100
+c{shard="1"} 5
+g{shard="0"} 0.123456
+r 0.1
+gone 1
+'''),
+    (1001.5, '''c{shard="0"} 200
+c{shard="1"} 7
+g{shard="0"} 0.5
+r 1e300
+gone 2
+'''),
+    (1003.0, '''c{shard="0"} 300
+c{shard="1"} 1000003
+g{shard="0"} -2.75
+r nan
+new 42
+'''),
+    (1004.25, '''c{shard="0"} 400
+c{shard="1"} 1000004
+g{shard="0"} -2.75
+r 3.141592653589793
+new 43
+'''),
+]
+
+def same(a, b):
+    return a == b or (math.isnan(a) and math.isnan(b))
+
+def record(path, scrapes):
+    table = series.SeriesTable()
+    recorder = recording.Recorder(path)
+    recorded = []
+    for now, payload in scrapes:
+        scrape(table, payload)
+        table.snapshot(now)
+        recorder.record(table, now)
+        recorded.append({symbol: table.value(slot) for slot, symbol in table.series()})
+    return recorder, table, recorded
+
+def replay(path):
+    source = recording.Replay(path, speed=0)
+    replayed = []
+    with pytest.raises(EOFError):
+        while True:
+            source.scrape()
+            replayed.append({symbol: source.series.value(slot) for slot, symbol in source.series.series()})
+    return source, replayed
+
+def check(recorded, replayed):
+    assert len(replayed) == len(recorded)
+    for expected, actual in zip(recorded, replayed):
+        assert expected.keys() == actual.keys()
+        for symbol in expected:
+            assert same(expected[symbol], actual[symbol]), symbol
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'recording')
+    recorder, table, recorded = record(path, SCRAPES)
+    recorder.close()
+    source, replayed = replay(path)
+    check(recorded, replayed)
+    assert source.series.types == table.types
+    assert source.series.help == table.help
+    # The rates are computed over the recorded times
+    slot = dict((symbol, slot) for slot, symbol in source.series.series())['c{shard="0"}']
+    assert source.series.rate(slot) == pytest.approx(300 / 4.25)
+
+def test_cut_recording(tmp_path):
+    # A recording which was not closed, e.g. when scyllatop crashed, can be
+    # replayed up to its last scrape
+    path = str(tmp_path / 'recording')
+    recorder, table, recorded = record(path, SCRAPES)
+    _, replayed = replay(path)
+    check(recorded, replayed)
+    recorder.close()
+
+def test_steady_counters_are_cheap(tmp_path):
+    path = str(tmp_path / 'recording')
+    scrapes = [(i, ''.join('c{{shard="{}"}} {}\n'.format(shard, 1000 * i * (shard + 1)) for shard in range(64))) for i in range(100)]
+    recorder, _, recorded = record(path, scrapes)
+    recorder.close()
+    with open(path, 'rb') as f:
+        assert f.read(len(recording.MAGIC)) == recording.MAGIC
+        raw = zlib.decompress(f.read())
+    # One byte per value once the pace of the counters is known
+    assert len(raw) < 64 * 100 + 64 * 30
+    check(recorded, replay(path)[1])
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / 'recording'
+    path.write_bytes(b'something else\n')
+    with pytest.raises(Exception, match='not a scyllatop recording'):
+        recording.Replay(str(path))
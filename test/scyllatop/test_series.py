@@ -0,0 +1,146 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+#############################################################################
+# Tests for the series table of scyllatop, series.py, which keeps the values
+# scraped from the Prometheus API and computes the rates of counters.
+#############################################################################
+
+import pytest
+
+import series
+from util import scrape
+
+PAYLOAD = '''# HELP scylla_transport_requests_served Counts the number of served requests.
+# TYPE scylla_transport_requests_served counter
+scylla_transport_requests_served{shard="0"} 100
+scylla_transport_requests_served{shard="1"} 200 1700000000000
+# TYPE scylla_reactor_utilization gauge
+scylla_reactor_utilization{shard="0"} 12.500000
+scylla_build_info{version="5.4"} 1
+'''
+
+def symbols(table):
+    return {symbol: table.value(slot) for slot, symbol in table.series()}
+
+@pytest.mark.parametrize('chunk_size', [None, 1, 7, 64])
+def test_parser(chunk_size):
+    table = series.SeriesTable()
+    scrape(table, PAYLOAD, chunk_size=chunk_size)
+    # The timestamp which follows a value is ignored
+    assert symbols(table) == {
+        'scylla_transport_requests_served{shard="0"}': 100,
+        'scylla_transport_requests_served{shard="1"}': 200,
+        'scylla_reactor_utilization{shard="0"}': 12.5,
+        'scylla_build_info{version="5.4"}': 1,
+    }
+    assert table.types == {'scylla_transport_requests_served': 'counter', 'scylla_reactor_utilization': 'gauge'}
+    assert table.help['scylla_transport_requests_served'].strip() == 'Counts the number of served requests.'
+    assert table.generation == 1
+
+def test_parser_without_trailing_new_line():
+    table = series.SeriesTable()
+    scrape(table, 'a 1\nb 2')
+    assert symbols(table) == {'a': 1, 'b': 2}
+
+def test_parser_skips_malformed_lines():
+    table = series.SeriesTable()
+    scrape(table, 'a 1\nnovalue\nb notanumber\nc 3\n')
+    assert symbols(table) == {'a': 1, 'c': 3}
+
+def test_generation():
+    table = series.SeriesTable()
+    scrape(table, 'a 1\nb 2\n')
+    assert table.generation == 1
+    # The same series with other values: the slots are kept
+    slots = dict((symbol, slot) for slot, symbol in table.series())
+    scrape(table, 'a 3\nb 4\n')
+    assert table.generation == 1
+    assert dict((symbol, slot) for slot, symbol in table.series()) == slots
+    assert symbols(table) == {'a': 3, 'b': 4}
+    # A series which is not part of the response is dropped
+    scrape(table, 'a 5\n')
+    assert table.generation == 2
+    assert symbols(table) == {'a': 5}
+    # A new series reuses the released slot
+    scrape(table, 'a 6\nc 7\n')
+    assert table.generation == 3
+    assert symbols(table) == {'a': 6, 'c': 7}
+    assert len(table.symbols) == 2
+
+def test_instances():
+    table = series.SeriesTable()
+    scrape(table, 'a{shard="0"} 1\nb 2\nc{} 4\n', node='http://n1:9180/metrics', instance='n1:9180')
+    scrape(table, 'a{shard="0"} 3\n', node='http://n2:9180/metrics', instance='n2:9180')
+    assert symbols(table) == {
+        'a{instance="n1:9180",shard="0"}': 1,
+        'b{instance="n1:9180"}': 2,
+        'c{instance="n1:9180"}': 4,
+        'a{instance="n2:9180",shard="0"}': 3,
+    }
+    # The series of a node which could not be scraped are dropped
+    table.forget('http://n1:9180/metrics')
+    assert symbols(table) == {'a{instance="n2:9180",shard="0"}': 3}
+
+def test_reset():
+    table = series.SeriesTable()
+    parser = table.begin('node')
+    parser.feed(b'a 1\nb 2')
+    # The response is interrupted and requested again
+    parser.reset()
+    parser.feed(b'a 1\nb 2\n')
+    parser.finish()
+    assert symbols(table) == {'a': 1, 'b': 2}
+
+def test_rate_and_delta():
+    table = series.SeriesTable(history=3)
+    scrape(table, 'c 100\n')
+    slot = table.series()[0][0]
+    table.snapshot(10)
+    # Nothing can be said from a single sample
+    assert table.rate(slot) is None
+    assert table.delta(slot) is None
+    assert table.increase(slot) is None
+    scrape(table, 'c 130\n')
+    table.snapshot(12)
+    assert table.delta(slot) == 30
+    assert table.increase(slot) == 30
+    assert table.rate(slot) == 15
+    scrape(table, 'c 150\n')
+    table.snapshot(14)
+    assert table.delta(slot) == 20
+    assert table.increase(slot) == 50
+    assert table.rate(slot) == 12.5
+    # The history only keeps the last 3 snapshots
+    scrape(table, 'c 200\n')
+    table.snapshot(16)
+    assert table.increase(slot) == 70
+    assert table.rate(slot) == 70 / 4
+
+def test_counter_reset():
+    table = series.SeriesTable()
+    for now, value in [(0, 100), (1, 150), (2, 20)]:
+        scrape(table, 'c {}\n'.format(value))
+        table.snapshot(now)
+    slot = table.series()[0][0]
+    # The counter restarted from 0 with the node
+    assert table.delta(slot) == 20
+    assert table.increase(slot) == 70
+    assert table.rate(slot) == 35
+
+def test_rate_of_new_series():
+    table = series.SeriesTable()
+    scrape(table, 'a 1\n')
+    table.snapshot(0)
+    scrape(table, 'a 2\n')
+    table.snapshot(1)
+    scrape(table, 'b 1000\n')
+    table.snapshot(2)
+    # b reuses the slot of a, whose samples must not be used
+    slot = table.series()[0][0]
+    assert table.symbols[slot] == 'b'
+    assert table.rate(slot) is None
+    scrape(table, 'b 1010\n')
+    table.snapshot(3)
+    assert table.rate(slot) == 10
@@ -0,0 +1,36 @@
+# Copyright 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+##################################################################
+
+# Various utility functions which are useful for multiple tests.
+
+import series
+
+# Feed a response of the Prometheus API of node to table, in chunks of
+# chunk_size bytes, as the Prometheus metric source does.
+def scrape(table, payload, node='node', instance=None, chunk_size=None):
+    data = payload.encode('utf-8')
+    chunk_size = chunk_size or len(data) or 1
+    parser = table.begin(node, instance)
+    for i in range(0, len(data), chunk_size):
+        parser.feed(data[i:i + chunk_size])
+    parser.finish()
+
+# A metric source serving canned responses, one per scrape, at the given
+# times. Like the Prometheus metric source, it keeps the series in a series
+# table and raises EOFError, like a replay, after the last response.
+class CannedSource(object):
+    def __init__(self, payloads, times=None, history=5):
+        self.series = series.SeriesTable(history)
+        self._payloads = list(payloads)
+        self._times = list(times) if times is not None else list(range(len(self._payloads)))
+        self.scrapes = 0
+
+    def scrape(self):
+        if self.scrapes == len(self._payloads):
+            raise EOFError()
+        scrape(self.series, self._payloads[self.scrapes])
+        self.series.snapshot(self._times[self.scrapes])
+        self.scrapes += 1
+        return self.series.generation
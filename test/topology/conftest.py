@@ -35,6 +35,18 @@ def pytest_addoption(parser):
                      help='Connect to CQL via an encrypted TLSv1.2 connection')
 
 
+def pytest_collection_modifyitems(config, items):
+    """Benchmarks take minutes and measure rather than check, so they are not part of
+    the default run: they only run when selected with a marker expression naming them,
+    e.g. ./test.py --markers benchmark topology/test_topology_churn_load"""
+    if "benchmark" in config.getoption("markexpr"):
+        return
+    skip_benchmark = pytest.mark.skip(reason="benchmark, select it with --markers benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip_benchmark)
+
+
 # This is a constant used in `pytest_runtest_makereport` below to store a flag
 # indicating test failure in a stash which can then be accessed from fixtures.
 FAILED_KEY = pytest.StashKey[bool]()
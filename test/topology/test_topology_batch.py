@@ -0,0 +1,56 @@
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+"""
+Test the batch topology operations of the cluster manager.
+"""
+import time
+from test.topology.util import wait_for_token_ring_and_group0_consistency
+import pytest
+
+
+def server_ids(servers):
+    return [s.server_id for s in servers]
+
+
+@pytest.mark.asyncio
+async def test_batch_add_restart_decommission(manager, random_tables):
+    """Grow the cluster by a batch of servers, restart it and shrink it back"""
+    table = await random_tables.add_table(ncolumns=5)
+    initial = await manager.running_servers()
+
+    start = time.time()
+    added, timings = await manager.servers_add(2, max_concurrency=2)
+    elapsed = time.time() - start
+    assert len(added) == 2
+    # Each boot took some time, and they ran within the request
+    assert all(0 < t.seconds <= elapsed for t in timings)
+    await wait_for_token_ring_and_group0_consistency(manager, time.time() + 30)
+    running = await manager.running_servers()
+    assert sorted(server_ids(running)) == sorted(server_ids(initial) + server_ids(added))
+    await table.add_column()
+    await random_tables.verify_schema()
+
+    start = time.time()
+    timings = await manager.rolling_restart(server_ids(running))
+    elapsed = time.time() - start
+    # The servers were restarted in the requested order, one at a time
+    assert [t.server_id for t in timings] == server_ids(running)
+    assert all(t.seconds > 0 for t in timings)
+    assert sum(t.seconds for t in timings) <= elapsed
+    assert sorted(server_ids(await manager.running_servers())) == sorted(server_ids(running))
+    await table.add_column()
+    await random_tables.verify_schema()
+
+    start = time.time()
+    timings = await manager.decommission_nodes(server_ids(added))
+    elapsed = time.time() - start
+    assert [t.server_id for t in timings] == server_ids(added)
+    assert all(t.seconds > 0 for t in timings)
+    assert sum(t.seconds for t in timings) <= elapsed
+    await wait_for_token_ring_and_group0_consistency(manager, time.time() + 30)
+    assert sorted(server_ids(await manager.running_servers())) == sorted(server_ids(initial))
+    await table.add_column()
+    await random_tables.verify_schema()
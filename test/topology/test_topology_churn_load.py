@@ -0,0 +1,91 @@
+#
+# Copyright (C) 2023-present ScyllaDB
+#
+# SPDX-License-Identifier: AGPL-3.0-or-later
+#
+"""
+Measure the client throughput and latency while the cluster goes through a rolling restart
+and topology changes.
+
+The test runs a sustained CQL workload during a scripted sequence of topology events and
+records a per-second timeline of the throughput, the p50/p99/p999 latencies and the errors
+seen by the client, annotated with the boundaries of the events. The timeline is written to
+load_timeline.json in the pytest temporary directory of the test, and logged as text.
+
+This is a benchmark, it is skipped unless selected: ./test.py --markers benchmark
+topology/test_topology_churn_load
+"""
+import asyncio
+import logging
+import time
+from test.pylib.load_timeline import CqlLoad, LoadTimeline
+from test.pylib.manager_client import ManagerClient
+from test.pylib.random_tables import RandomTable
+from test.pylib.util import unique_name
+from test.topology.util import wait_for_token_ring_and_group0_consistency
+import pytest
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds of steady load before, between and after the events, so that their effect
+# on the workload, and the recovery from it, stand out in the timeline
+SETTLE_TIME = 5
+
+
+@pytest.mark.slow
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_load_during_topology_churn(manager: ManagerClient, tmp_path):
+    """Run a workload through a rolling restart, a decommission and a removenode"""
+    servers = await manager.running_servers()
+    cql = manager.cql
+    assert cql is not None
+    # The load runs at QUORUM, RF=3 keeps the data available while a node is down
+    keyspace = unique_name()
+    await cql.run_async(f"CREATE KEYSPACE {keyspace} WITH REPLICATION = "
+                        "{ 'class' : 'NetworkTopologyStrategy', 'replication_factor' : 3 }")
+    table = RandomTable(manager, keyspace, ncolumns=5)
+    await table.create()
+
+    timeline = LoadTimeline()
+    async with CqlLoad(cql, table, timeline, concurrency=32):
+        await asyncio.sleep(SETTLE_TIME)
+        for server in servers:
+            async with timeline.event(f"restart server {server.server_id}"):
+                await manager.server_restart(server.server_id)
+            await asyncio.sleep(SETTLE_TIME)
+
+        async with timeline.event("add server"):
+            added = await manager.server_add()
+        await asyncio.sleep(SETTLE_TIME)
+        async with timeline.event(f"decommission server {added.server_id}"):
+            await manager.decommission_node(added.server_id)
+        await asyncio.sleep(SETTLE_TIME)
+
+        async with timeline.event("add server"):
+            added = await manager.server_add()
+        await asyncio.sleep(SETTLE_TIME)
+        async with timeline.event(f"stop and remove server {added.server_id}"):
+            await manager.server_stop_gracefully(added.server_id)
+            await manager.remove_node(servers[0].server_id, added.server_id)
+        await asyncio.sleep(SETTLE_TIME)
+        load_end = timeline.now()
+
+    timeline.write(str(tmp_path / "load_timeline.json"))
+    logger.info("Load timeline:\n%s", timeline.format())
+
+    await wait_for_token_ring_and_group0_consistency(manager, time.time() + 30)
+    seconds = timeline.seconds()
+    throughput = sum(s["ops"] for s in seconds) / load_end
+    logger.info("Average throughput: %.1f ops/s", throughput)
+    assert throughput > 0
+    # The cluster is back to its initial size, the workload must have recovered in the
+    # settle time after the last event. The seconds it overlaps, and the last one, cut
+    # short when the load stopped, are left out.
+    last_event_end = timeline.events[-1].end
+    assert last_event_end is not None
+    recovered = [s for s in seconds if s["second"] > last_event_end and s["second"] + 1 <= load_end]
+    assert recovered, f"no complete second of load after the last event ended at {last_event_end:.1f}s"
+    assert sum(s["ops"] for s in recovered) > 0
+    await cql.run_async(f"DROP KEYSPACE {keyspace}")
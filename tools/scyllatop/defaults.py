@@ -12,3 +12,13 @@ DEFAULT_METRIC_PATTERNS = [
     '*memory*',
     '*cpu*',
 ]
+
+# The rows of the heatmap view, the per-shard metrics whose imbalance shows a
+# hot partition or an overloaded shard
+DEFAULT_HEATMAP_METRICS = [
+    'scylla_reactor_utilization',
+    'scylla_scheduler_time_spent_on_task_quota_violations_ms',
+    'scylla_database_queued_reads',
+    'scylla_commitlog_pending_allocations',
+    'scylla_commitlog_pending_flushes',
+]
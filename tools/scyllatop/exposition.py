@@ -0,0 +1,197 @@
+"""Parser of the Prometheus text exposition format, with label-aware queries
+
+Shared by scyllatop and the test suites which check Scylla's metrics, it
+depends on nothing outside the standard library. A payload is tokenized once
+into (name, labels, value) samples, indexed by name, so that queries then
+only look at the samples of the metrics they select:
+
+    metrics = exposition.parse(text)
+    metrics.value('scylla_storage_proxy_coordinator_reads_local_node{shard="3"}')
+    metrics.select('scylla_database_queued_reads{class=~"user|system"}')
+    after.diff(before).value('scylla_transport_requests_served')
+
+Selectors follow PromQL: a metric name and/or braces with label matchers,
+where = and != compare values, and =~ and !~ match them against regular
+expressions anchored at both ends. The name may also be matched as the
+__name__ label.
+"""
+
+import collections
+import functools
+import re
+import sys
+
+Sample = collections.namedtuple('Sample', ['name', 'labels', 'value'])
+Sample.__doc__ = """A sample of a series, its labels are a tuple of (name, value) pairs sorted by name"""
+
+_LABEL_PATTERN = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*="((?:[^"\\]|\\.)*)"\s*,?')
+_MATCHER_PATTERN = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*(=~|!~|!=|=)\s*"((?:[^"\\]|\\.)*)"\s*(,|$)')
+_SELECTOR_PATTERN = re.compile(r'^\s*([a-zA-Z_:][a-zA-Z0-9_:]*)?\s*(?:\{(.*)\})?\s*$', re.DOTALL)
+_ESCAPES = {'\\\\': '\\', '\\"': '"', '\\n': '\n'}
+_ESCAPE_PATTERN = re.compile(r'\\[\\"n]')
+
+
+def _unescape(value):
+    if '\\' not in value:
+        return value
+    return _ESCAPE_PATTERN.sub(lambda match: _ESCAPES[match.group(0)], value)
+
+
+@functools.lru_cache(maxsize=1 << 16)
+def parseLabels(text):
+    """The (name, value) pairs of the labels between the braces of a series, sorted by name"""
+    labels = []
+    pos = 0
+    while pos < len(text):
+        match = _LABEL_PATTERN.match(text, pos)
+        if match is None:
+            if text[pos:].strip():
+                raise ValueError('malformed labels: {{{}}}'.format(text))
+            break
+        labels.append((sys.intern(match.group(1)), sys.intern(_unescape(match.group(2)))))
+        pos = match.end()
+    labels.sort()
+    return tuple(labels)
+
+
+def parseSeries(symbol):
+    """The name and labels of a series written as name{labels}"""
+    brace = symbol.find('{')
+    if brace < 0:
+        return symbol, ()
+    return symbol[:brace], parseLabels(symbol[brace + 1:symbol.rfind('}')])
+
+
+class Selector(object):
+    """A PromQL instant vector selector, e.g. name{shard="3",type=~"read.*"}"""
+    def __init__(self, text):
+        match = _SELECTOR_PATTERN.match(text)
+        if match is None or (match.group(1) is None and match.group(2) is None):
+            raise ValueError('malformed selector: {}'.format(text))
+        self.text = text
+        self.name = match.group(1)
+        self.matchers = []
+        body = match.group(2) or ''
+        pos = 0
+        while body[pos:].strip():
+            matcher = _MATCHER_PATTERN.match(body, pos)
+            if matcher is None:
+                raise ValueError('malformed selector: {}'.format(text))
+            label, op, value = matcher.group(1), matcher.group(2), _unescape(matcher.group(3))
+            if label == '__name__' and op == '=':
+                self.name = value
+            else:
+                self.matchers.append((label, op, re.compile(value) if '~' in op else value))
+            pos = matcher.end()
+
+    def __repr__(self):
+        return 'Selector({!r})'.format(self.text)
+
+    def matches(self, name, labels):
+        if self.name is not None and name != self.name:
+            return False
+        for label, op, expected in self.matchers:
+            if label == '__name__':
+                value = name
+            else:
+                value = next((v for k, v in labels if k == label), '')
+            if op == '=':
+                matched = value == expected
+            elif op == '!=':
+                matched = value != expected
+            else:
+                matched = expected.fullmatch(value) is not None
+                if op == '!~':
+                    matched = not matched
+            if not matched:
+                return False
+        return True
+
+
+@functools.lru_cache(maxsize=1024)
+def selector(text):
+    """The Selector of text, compiled selectors are cached"""
+    return Selector(text)
+
+
+class Metrics(object):
+    """The samples of one payload, indexed by metric name"""
+    def __init__(self, samples=None, hlp=None, types=None):
+        self.help = hlp if hlp is not None else {}
+        self.types = types if types is not None else {}
+        self._byName = {}
+        for sample in samples or []:
+            self._add(sample)
+
+    def _add(self, sample):
+        self._byName.setdefault(sample.name, []).append(sample)
+
+    def __iter__(self):
+        for samples in self._byName.values():
+            yield from samples
+
+    def __len__(self):
+        return sum(len(samples) for samples in self._byName.values())
+
+    def names(self):
+        return list(self._byName)
+
+    def select(self, query):
+        """The samples matching a selector, given as text or as a Selector"""
+        if isinstance(query, str):
+            query = selector(query)
+        if query.name is not None:
+            candidates = self._byName.get(query.name, [])
+        else:
+            candidates = self
+        return [sample for sample in candidates if query.matches(sample.name, sample.labels)]
+
+    def value(self, query, default=0.0):
+        """The sum of the values of the samples matching a selector, e.g. over all shards"""
+        samples = self.select(query)
+        if not samples:
+            return default
+        return sum(sample.value for sample in samples)
+
+    def diff(self, before):
+        """The increase of every series since the before snapshot
+
+        Series which are not part of before count from zero, those which are
+        not part of this snapshot any more are left out.
+        """
+        previous = {(sample.name, sample.labels): sample.value for sample in before}
+        return Metrics((Sample(sample.name, sample.labels, sample.value - previous.get((sample.name, sample.labels), 0.0))
+                        for sample in self), self.help, self.types)
+
+
+def parse(text):
+    """Tokenize a text exposition format payload into Metrics"""
+    metrics = Metrics()
+    byName = metrics._byName
+    for line in text.splitlines():
+        if not line or line[0] == '#':
+            if line.startswith('# HELP '):
+                name, _, description = line[len('# HELP '):].partition(' ')
+                metrics.help[name] = _unescape(description)
+            elif line.startswith('# TYPE '):
+                name, _, kind = line[len('# TYPE '):].partition(' ')
+                metrics.types[name] = kind.strip()
+            continue
+        brace = line.find('{')
+        if brace >= 0:
+            close = line.rfind('}')
+            name = line[:brace]
+            labels = parseLabels(line[brace + 1:close])
+            rest = line[close + 1:]
+        else:
+            name, _, rest = line.partition(' ')
+            labels = ()
+        value = rest.split()
+        if not value:
+            raise ValueError('malformed sample: {}'.format(line))
+        name = sys.intern(name.strip())
+        samples = byName.get(name)
+        if samples is None:
+            samples = byName[name] = []
+        samples.append(Sample(name, labels, float(value[0])))
+    return metrics
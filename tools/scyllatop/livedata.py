@@ -1,6 +1,6 @@
 import logging
-import parseexception
 import fnmatch
+import exposition
 import time
 import metric
 import defaults
@@ -20,7 +20,10 @@ class LiveData(object):
             self._metricPatterns = metricPatterns
         else:
             self._metricPatterns = defaults.DEFAULT_METRIC_PATTERNS
-        self._results = self._discoverMetrics()
+        self._matched = {}
+        self._generation = None
+        self._discoveries = 1
+        self._results = self._refresh()
         self._views = []
         self._stop = False
 
@@ -36,6 +39,25 @@ class LiveData(object):
     def measurements(self):
         return self._results.values()
 
+    @property
+    def discoveries(self):
+        """Changes each time the set of measurements may have changed"""
+        return self._discoveries
+
+    def _refresh(self):
+        """Query the metric source, returns the discovered metrics, or None if the set of series of a
+        scraping metric source did not change, in which case the current metrics were updated in place"""
+        if not hasattr(self._metric_source, 'scrape'):
+            return self._discoverMetrics()
+        generation = self._metric_source.scrape()
+        if generation != self._generation:
+            self._generation = generation
+            return self._discoverMetrics()
+        for metric_obj in self._results.values():
+            if not metric_obj.is_absent:
+                metric_obj.update()
+        return None
+
     def _discoverMetrics(self):
         results = metric.Metric.discover(self._metric_source)
         logging.debug('_discoverMetrics: {} results discovered'.format(len(results)))
@@ -46,50 +68,72 @@ class LiveData(object):
         return results
 
     def _matches(self, symbol, metricPatterns):
+        # series come and go with tables and keyspaces, remember the matches
+        # of the symbols seen so far instead of globbing them on every discovery
+        if symbol not in self._matched:
+            self._matched[symbol] = self._globMatches(symbol, metricPatterns)
+        return self._matched[symbol]
+
+    def _globMatches(self, symbol, metricPatterns):
         for pattern in metricPatterns:
-            match = fnmatch.fnmatch(symbol, pattern)
+            if '{' in pattern:
+                # a PromQL selector, matched against the labels of Prometheus series
+                name, labels = exposition.parseSeries(symbol)
+                match = exposition.selector(pattern).matches(name, labels)
+            else:
+                match = fnmatch.fnmatch(symbol, pattern)
             if match:
                 return True
         return False
 
     def go(self, mainLoop):
-        num_updated = 0
-        num_absent = 0
-        num_expired = 0
-        num_added = 0
-        now = time.time()
         while not self._stop:
-            new_results = self._discoverMetrics();
-            expiration = time.time() + self._ttl if self._ttl else None
-            for metric in self._results:
-                if not metric in new_results:
-                    metric_obj = self._results[metric]
-                    if not metric_obj.is_absent:
-                        metric_obj.markAbsent(expiration)
-                        num_absent += 1
-                    elif metric_obj.expiration and now >= metric_obj.expiration:
-                        self._results.pop(metric)
-                        num_expired += 1
-                    else:
-                        num_absent += 1
-            num_updated = len(self._results) - num_absent
-            num_added = len(new_results) - num_updated
-            self._results.update(new_results)
-            logging.debug('go: updated {} measurements, added {}, {} marked absent, {} expired'.format(num_updated, num_added, num_absent, num_expired))
+            try:
+                new_results = self._refresh()
+            except EOFError:
+                logging.info('go: end of the replayed recording')
+                return
+            if new_results is not None:
+                self._merge(new_results)
+            # absent metrics must expire even while the set of series is
+            # unchanged, so the ttl is checked on every refresh
+            self._expire(time.time())
+            self._updateViews(mainLoop)
+
+    def _merge(self, new_results):
+        """Replace the measurements with the newly discovered ones, keeping the missing ones as absent"""
+        expiration = time.time() + self._ttl if self._ttl else None
+        num_absent = 0
+        for symbol in list(self._results):
+            if not symbol in new_results:
+                metric_obj = self._results[symbol]
+                if not metric_obj.is_absent:
+                    metric_obj.markAbsent(expiration)
+                num_absent += 1
+        num_updated = len(self._results) - num_absent
+        num_added = len(new_results) - num_updated
+        self._results.update(new_results)
+        self._discoveries += 1
+        logging.debug('go: updated {} measurements, added {}, {} marked absent'.format(num_updated, num_added, num_absent))
 
-            for view in self._views:
-                logging.debug('go: updating view {}'.format(view))
-                view.update(self)
-            logging.debug('go: sleeping for {} seconds'.format(self._interval))
-            time.sleep(self._interval)
-            logging.debug('go: drawing screen...')
-            mainLoop.draw_screen()
+    def _expire(self, now):
+        """Drop the absent measurements whose ttl has passed"""
+        expired = [symbol for symbol, metric_obj in self._results.items()
+                   if metric_obj.is_absent and metric_obj.expiration and now >= metric_obj.expiration]
+        for symbol in expired:
+            self._results.pop(symbol)
+        if expired:
+            self._discoveries += 1
+            logging.debug('go: {} measurements expired'.format(len(expired)))
 
-    def _update(self, metric_obj):
-        try:
-            metric_obj.update()
-        except parseexception.ParseException:
-            logging.exception('exception while updating metric {0}'.format(metric_obj))
+    def _updateViews(self, mainLoop):
+        for view in self._views:
+            logging.debug('go: updating view {}'.format(view))
+            view.update(self)
+        logging.debug('go: sleeping for {} seconds'.format(self._interval))
+        time.sleep(self._interval)
+        logging.debug('go: drawing screen...')
+        mainLoop.draw_screen()
 
     def stop(self):
         self._stop = True
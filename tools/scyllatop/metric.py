@@ -1,4 +1,5 @@
 import logging
+import re
 import parseexception
 
 
@@ -31,6 +32,11 @@ class Metric(object):
     def expiration(self):
         return self._expiration
 
+    @property
+    def rate(self):
+        """Per-second rate of the metric, None if it has none"""
+        return None
+
     def update_info(self, line):
         match = self._metric_source._METRIC_INFO_PATTERN.search(line)
         if match is None:
@@ -60,6 +66,8 @@ class Metric(object):
         results[self._symbol] = self
     @classmethod
     def _discover(cls, metric_source, with_help = False):
+        if hasattr(metric_source, 'series'):
+            return SeriesMetric.discoverSeries(metric_source, with_help)
         results = {}
         logging.info('discovering metrics{}...'.format(" with help" if with_help else ""))
         response = metric_source.query_list()
@@ -90,3 +98,183 @@ class Metric(object):
 
     def __repr__(self):
         return '{0}:{1}'.format(self.symbol, self.status)
+
+
+class SeriesMetric(Metric):
+    """A metric whose value is kept in the series table of its metric source
+
+    update() reads the samples the scrapes of the source stored in the slot
+    of the series, it does not query the source. Counters are shown as their
+    per-second rate and their increase since the previous scrape, rather than
+    as their total.
+    """
+    def __init__(self, symbol, metric_source, hlp, slot, counter=False):
+        Metric.__init__(self, symbol, metric_source, hlp)
+        self._slot = slot
+        self._counter = counter
+        self.update()
+
+    @property
+    def slot(self):
+        return self._slot
+
+    @property
+    def rate(self):
+        if not self._counter or self._absent:
+            return None
+        return self._metric_source.series.rate(self._slot)
+
+    def update(self):
+        table = self._metric_source.series
+        if self._counter:
+            self._status = {'rate': _available(table.rate(self._slot)),
+                            'delta': _available(table.delta(self._slot))}
+        else:
+            self._status = {'value': table.value(self._slot)}
+        self._absent = False
+        self._expiration = None
+
+    @classmethod
+    def discoverSeries(cls, metric_source, with_help=False):
+        table = metric_source.series
+        if table.generation == 0:
+            metric_source.scrape()
+        results = {}
+        if with_help:
+            for name, hlp in table.help.items():
+                Metric(name, metric_source, hlp).add_to_results(results)
+            logging.info('found {} metrics'.format(len(results)))
+            return results
+        histograms = {}
+        for slot, symbol in table.series():
+            name = symbol.partition('{')[0]
+            family = HistogramMetric.family(name, table.types)
+            if family is None:
+                cls(symbol, metric_source, '', slot, table.types.get(name) == 'counter').add_to_results(results)
+                continue
+            histogram = HistogramMetric.strip(symbol, name, family)
+            histograms.setdefault(histogram, HistogramMetric(histogram, metric_source, '')).addSeries(symbol, name, slot)
+        for histogram in histograms.values():
+            if histogram.complete():
+                histogram.update()
+                histogram.add_to_results(results)
+        logging.info('found {} metrics'.format(len(results)))
+        return results
+
+
+def _available(value):
+    return 'not available' if value is None else value
+
+
+def histogramQuantile(q, buckets):
+    """The q quantile of a distribution given as cumulative (upper bound, count) buckets
+
+    Like Prometheus' histogram_quantile(), the value is interpolated linearly
+    within the bucket the quantile falls in, and the upper bound of the last
+    finite bucket is returned if it falls in the +Inf one.
+    """
+    if not buckets or buckets[-1][1] <= 0:
+        return None
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0.0
+    for upper, count in buckets:
+        if count >= rank:
+            if upper == float('inf'):
+                return lower
+            if count == below:
+                return upper
+            return lower + (upper - lower) * (rank - below) / (count - below)
+        lower, below = upper, count
+    return lower
+
+
+def mergeBuckets(bucketLists):
+    """Merge cumulative (upper bound, count) buckets of several histograms, e.g. of all shards
+
+    The count of a merged bucket is the sum of the counts of the histograms
+    at its upper bound. A histogram which lacks that bound contributes the
+    count of its nearest lower bound, so the quantiles of histograms with
+    different bounds are approximated from below.
+    """
+    bounds = sorted(set(upper for buckets in bucketLists for upper, _ in buckets))
+    merged = []
+    for bound in bounds:
+        total = 0.0
+        for buckets in bucketLists:
+            below = [count for upper, count in buckets if upper <= bound]
+            if below:
+                total += below[-1]
+        merged.append((bound, total))
+    return merged
+
+
+class HistogramMetric(Metric):
+    """A Prometheus histogram, made of its _bucket and _count series
+
+    It is shown as the p50, p95 and p99 quantiles of the observations made
+    during the history of the series table, and the per-second rate of the
+    observations. Until there are two scrapes the quantiles are those of all
+    the observations since the node started. Quantiles cannot be summed or
+    averaged, the buckets of several histograms are merged first, see
+    mergeBuckets().
+    """
+    QUANTILES = [('p50', 0.5), ('p95', 0.95), ('p99', 0.99)]
+    _LE_PATTERN = re.compile(r',?le="([^"]*)"')
+
+    def __init__(self, symbol, metric_source, hlp):
+        Metric.__init__(self, symbol, metric_source, hlp)
+        self._buckets = []
+        self._count = None
+        self._window = []
+
+    @classmethod
+    def family(cls, name, types):
+        """The name of the histogram series name belongs to, None if it is not part of a histogram"""
+        for suffix in ('_bucket', '_count', '_sum'):
+            if name.endswith(suffix) and types.get(name[:-len(suffix)]) == 'histogram':
+                return name[:-len(suffix)]
+        return None
+
+    @classmethod
+    def strip(cls, symbol, name, family):
+        """The symbol of the histogram a series belongs to: its family name and labels, except le"""
+        labels = cls._LE_PATTERN.sub('', symbol[len(name):]).replace('{,', '{')
+        return family + ('' if labels == '{}' else labels)
+
+    def addSeries(self, symbol, name, slot):
+        if name.endswith('_bucket'):
+            match = self._LE_PATTERN.search(symbol)
+            if match:
+                self._buckets.append((float(match.group(1)), slot))
+                self._buckets.sort()
+        elif name.endswith('_count'):
+            self._count = slot
+
+    def complete(self):
+        return bool(self._buckets) and self._count is not None
+
+    @property
+    def rate(self):
+        if self._absent:
+            return None
+        return self._metric_source.series.rate(self._count)
+
+    @property
+    def buckets(self):
+        """The cumulative (upper bound, count) buckets the quantiles were computed from, empty if absent"""
+        return [] if self._absent else self._window
+
+    @classmethod
+    def quantiles(cls, buckets):
+        return dict((label, _available(histogramQuantile(q, buckets))) for label, q in cls.QUANTILES)
+
+    def update(self):
+        table = self._metric_source.series
+        buckets = [(upper, table.increase(slot)) for upper, slot in self._buckets]
+        if any(count is None for _, count in buckets):
+            buckets = [(upper, table.value(slot)) for upper, slot in self._buckets]
+        self._window = buckets
+        self._status = self.quantiles(buckets)
+        self._status['rate'] = _available(table.rate(self._count))
+        self._absent = False
+        self._expiration = None
@@ -1,24 +1,153 @@
-import urllib.request, urllib.error, urllib.parse
-import re
+import asyncio
+import logging
+import ssl
+import time
+import urllib.parse
+import series
+
+
+class Endpoint(object):
+    """A metrics end-point, scraped over a kept-alive HTTP/1.1 connection"""
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.url = url
+        self.instance = parsed.netloc
+        self._host = parsed.hostname
+        self._ssl = parsed.scheme == 'https'
+        self._port = parsed.port or (443 if self._ssl else 80)
+        self._path = parsed.path or '/'
+        if parsed.query:
+            self._path += '?' + parsed.query
+        self._reader = None
+        self._writer = None
+
+    async def get(self, parser):
+        """Send a request for the metrics and feed the response body to parser"""
+        reused = self._writer is not None
+        try:
+            if not reused:
+                await self._connect()
+            try:
+                await self._request(parser)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if not reused:
+                    raise
+                # the server closed the idle connection, retry on a new one
+                logging.debug('reconnecting to {}'.format(self.url))
+                self.close()
+                parser.reset()
+                await self._connect()
+                await self._request(parser)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self._host, self._port,
+                                                                   ssl=ssl.create_default_context() if self._ssl else None)
+
+    async def _request(self, parser):
+        request = 'GET {} HTTP/1.1\r\nHost: {}\r\nAccept: text/plain\r\nConnection: keep-alive\r\n\r\n'.format(self._path, self.instance)
+        self._writer.write(request.encode('ascii'))
+        await self._writer.drain()
+        status = await self._reader.readline()
+        if not status:
+            raise ConnectionError('connection closed by {}'.format(self.url))
+        code = int(status.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip().lower()
+        if code != 200:
+            self.close()
+            raise Exception('{} replied {}'.format(self.url, status.decode('latin-1').strip()))
+        if headers.get('transfer-encoding') == 'chunked':
+            await self._readChunked(parser)
+        elif 'content-length' in headers:
+            remaining = int(headers['content-length'])
+            while remaining > 0:
+                data = await self._reader.read(min(remaining, self._CHUNK_SIZE))
+                if not data:
+                    raise asyncio.IncompleteReadError(data, remaining)
+                parser.feed(data)
+                remaining -= len(data)
+        else:
+            while True:
+                data = await self._reader.read(self._CHUNK_SIZE)
+                if not data:
+                    break
+                parser.feed(data)
+            headers['connection'] = 'close'
+        if headers.get('connection') == 'close':
+            self.close()
+
+    async def _readChunked(self, parser):
+        while True:
+            size = int((await self._reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                while (await self._reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            parser.feed(await self._reader.readexactly(size))
+            await self._reader.readexactly(2)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
 
 
 class Prometheus(object):
-    _FIRST_LINE_PATTERN = re.compile('^(?P<lines>\d+)')
-    _METRIC_INFO_PATTERN = re.compile('^(?P<key>.+) (?P<value>[^ ]+)[ ]*$')
-    _METRIC_DISCOVER_PATTERN = re.compile('^(?P<metric>[^#].+) (?P<value>[^ ]+)[ ]*$')
-    _METRIC_DISCOVER_PATTERN_WITH_HELP = re.compile('^# HELP (?P<metric>[^ ]+)(?P<help>.*)$')
+    """Scrapes the Prometheus API of one or more nodes into a series table
 
-    def __init__(self, host):
-        self._host = host
+    All the nodes are scraped concurrently, on an event loop owned by this
+    object so that connections are kept alive from one scrape to the next.
+    When several nodes are scraped, the series of each node get an instance
+    label with its address. The series table keeps the values of the last
+    history scrapes, which rates and histogram quantiles are computed over.
+    If a recorder is set, every scrape is recorded with it.
+    """
+    def __init__(self, hosts, timeout=10, history=5):
+        if isinstance(hosts, str):
+            hosts = [hosts]
+        self._endpoints = [Endpoint(host) for host in hosts]
+        self._timeout = timeout
+        self._loop = None
+        self.series = series.SeriesTable(history)
+        self.recorder = None
 
-    def read_metrics(self):
-        return urllib.request.urlopen(self._host).read().decode('utf-8').splitlines()
+    def __repr__(self):
+        return 'Prometheus({})'.format(', '.join(e.url for e in self._endpoints))
 
-    def get_metrics(self):
-        return self.read_metrics()
+    def scrape(self):
+        """Scrape all the nodes, returns the generation of the series table"""
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._scrapeAll())
+        self.series.snapshot(time.monotonic())
+        if self.recorder is not None:
+            self.recorder.record(self.series, time.time())
+        return self.series.generation
 
-    def query_val(self, val):
-        return [l for l in self.get_metrics() if (not l.startswith('#')) and (val == "" or re.match(val, l))]
+    async def _scrapeAll(self):
+        results = await asyncio.gather(*(self._scrape(endpoint) for endpoint in self._endpoints), return_exceptions=True)
+        errors = []
+        for endpoint, result in zip(self._endpoints, results):
+            if isinstance(result, Exception):
+                logging.warning('failed scraping {}: {!r}'.format(endpoint.url, result))
+                self.series.forget(endpoint.url)
+                errors.append(result)
+        if len(errors) == len(self._endpoints):
+            raise errors[0]
 
-    def query_list(self):
-        return self.get_metrics()
+    async def _scrape(self, endpoint):
+        instance = endpoint.instance if len(self._endpoints) > 1 else None
+        parser = self.series.begin(endpoint.url, instance)
+        await asyncio.wait_for(endpoint.get(parser), self._timeout)
+        parser.finish()
@@ -0,0 +1,286 @@
+import atexit
+import logging
+import struct
+import time
+import zlib
+import series
+
+# A recording is an append-only file: a header line, then a zlib stream which
+# is flushed after every scrape, so that a recording cut short, e.g. by a
+# crash of scyllatop, can be replayed up to its last scrape. The stream is a
+# sequence of records:
+#
+#   M <kind> <name> <text>   metadata of a metric, its help (h) or type (t)
+#   S <slot> <symbol>        the series symbol takes slot
+#   X <slot>                 slot is released
+#   F <ms> <values>          a scrape, ms milliseconds after the previous one
+#
+# Integers are varints and strings are a varint length and utf-8 bytes. The
+# values of a scrape are those of every live slot, in the order of the slots.
+# Each value is encoded as the difference between its delta from the previous
+# value of the slot and the previous delta, counted in units if that gives
+# back the exact value, else in micros if that does, else the value is
+# recorded as a raw double. Counters which grow at a steady rate and gauges
+# which do not change are thus recorded as zeros, which zlib shrinks to
+# almost nothing.
+
+MAGIC = b'scyllatop recording 1\n'
+_DOUBLE = struct.Struct('<d')
+
+# The two low bits of the code of a value tell how it is encoded
+_INTEGER = 0
+_MICRO = 1
+_RAW = 3
+# Scylla exports values with 6 decimals, which are recorded as integer micros
+_MICROS = 1e6
+_EXACT = 1 << 53
+
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _predictedMicros(previous, delta):
+    return int(round(previous * _MICROS)) + int(round(delta * _MICROS))
+
+
+def _writeVarint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _writeString(out, text):
+    data = text.encode('utf-8')
+    _writeVarint(out, len(data))
+    out += data
+
+
+class _Encoder(object):
+    """The previous value and delta of every slot, shared by both ends of a recording"""
+    def __init__(self):
+        self._values = []
+        self._deltas = []
+
+    def reset(self, slot):
+        while len(self._values) <= slot:
+            self._values.append(0.0)
+            self._deltas.append(0.0)
+        self._values[slot] = 0.0
+        self._deltas[slot] = 0.0
+
+    def _code(self, value, previous, delta):
+        try:
+            predicted = previous + delta
+            diff = int(round(value - predicted))
+            if predicted + diff == value:
+                return _zigzag(diff) << 2 | _INTEGER
+            micros = int(round(value * _MICROS))
+            if abs(micros) < _EXACT and micros / _MICROS == value:
+                return _zigzag(micros - _predictedMicros(previous, delta)) << 2 | _MICRO
+        except (ValueError, OverflowError):
+            pass
+        return None
+
+    def encode(self, out, slot, value):
+        previous = self._values[slot]
+        delta = self._deltas[slot]
+        code = self._code(value, previous, delta)
+        if code is None:
+            out.append(_RAW)
+            out += _DOUBLE.pack(value)
+        else:
+            _writeVarint(out, code)
+        self._values[slot] = value
+        self._deltas[slot] = value - previous
+
+    def decode(self, reader, slot):
+        code = reader.varint()
+        previous = self._values[slot]
+        delta = self._deltas[slot]
+        kind = code & 3
+        if kind == _RAW:
+            value = _DOUBLE.unpack(reader.read(8))[0]
+        elif kind == _INTEGER:
+            value = previous + delta + _unzigzag(code >> 2)
+        else:
+            value = (_predictedMicros(previous, delta) + _unzigzag(code >> 2)) / _MICROS
+        self._values[slot] = value
+        self._deltas[slot] = value - previous
+        return value
+
+
+class Recorder(object):
+    """Appends every scrape of a series table to a recording"""
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._compressor = zlib.compressobj()
+        self._encoder = _Encoder()
+        self._symbols = []
+        self._live = []
+        self._metadata = set()
+        self._generation = None
+        self._lastMs = 0
+        atexit.register(self.close)
+
+    def record(self, table, now):
+        out = bytearray()
+        if table.generation != self._generation:
+            self._generation = table.generation
+            self._recordSeries(table, out)
+        ms = int(now * 1000)
+        out += b'F'
+        _writeVarint(out, max(ms - self._lastMs, 0))
+        self._lastMs = ms
+        values = table.values
+        encode = self._encoder.encode
+        for slot in self._live:
+            encode(out, slot, values[slot])
+        self._file.write(self._compressor.compress(bytes(out)))
+        self._file.write(self._compressor.flush(zlib.Z_SYNC_FLUSH))
+        self._file.flush()
+
+    def _recordSeries(self, table, out):
+        for kind, metadata in ((b'h', table.help), (b't', table.types)):
+            for name, text in metadata.items():
+                if (kind, name) not in self._metadata:
+                    self._metadata.add((kind, name))
+                    out += b'M' + kind
+                    _writeString(out, name)
+                    _writeString(out, text)
+        while len(self._symbols) < len(table.symbols):
+            self._symbols.append(None)
+        for slot, symbol in enumerate(table.symbols):
+            if symbol == self._symbols[slot]:
+                continue
+            if symbol is None:
+                out += b'X'
+                _writeVarint(out, slot)
+            else:
+                out += b'S'
+                _writeVarint(out, slot)
+                _writeString(out, symbol)
+                self._encoder.reset(slot)
+            self._symbols[slot] = symbol
+        self._live = [slot for slot, symbol in enumerate(self._symbols) if symbol is not None]
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write(self._compressor.flush())
+            self._file.close()
+
+
+class _Reader(object):
+    """Reads the records of a recording, decompressing it as needed"""
+    _CHUNK_SIZE = 256 * 1024
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise Exception('{} is not a scyllatop recording'.format(path))
+        self._decompressor = zlib.decompressobj()
+        self._buffer = b''
+        self._pos = 0
+
+    def _fill(self, n):
+        """Make sure n bytes are buffered, raises EOFError at the end of the recording"""
+        while len(self._buffer) - self._pos < n:
+            data = self._file.read(self._CHUNK_SIZE)
+            if not data:
+                raise EOFError()
+            self._buffer = self._buffer[self._pos:] + self._decompressor.decompress(data)
+            self._pos = 0
+
+    def read(self, n):
+        self._fill(n)
+        data = self._buffer[self._pos:self._pos + n]
+        self._pos += n
+        return data
+
+    def varint(self):
+        result = 0
+        shift = 0
+        while True:
+            if self._pos >= len(self._buffer):
+                self._fill(1)
+            byte = self._buffer[self._pos]
+            self._pos += 1
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def string(self):
+        return self.read(self.varint()).decode('utf-8')
+
+
+class Replay(object):
+    """A metric source replaying a recording, at speed times the recorded pace
+
+    Every scrape returns the next recorded scrape, into a series table like
+    the one of the Prometheus metric source, so all the views work the same.
+    A speed of 0 replays as fast as the views are updated. At the end of the
+    recording, scrape() raises EOFError.
+    """
+    def __init__(self, path, speed=1.0, history=5):
+        self._path = path
+        self._reader = _Reader(path)
+        self._speed = speed
+        self._encoder = _Encoder()
+        self._live = []
+        self._recordedMs = 0
+        self._origin = None
+        self.series = series.SeriesTable(history)
+
+    def __repr__(self):
+        return 'Replay({})'.format(self._path)
+
+    def scrape(self):
+        table = self.series
+        changed = False
+        while True:
+            kind = self._reader.read(1)
+            if kind == b'F':
+                break
+            changed = True
+            if kind == b'M':
+                metadata = table.help if self._reader.read(1) == b'h' else table.types
+                name = self._reader.string()
+                metadata[name] = self._reader.string()
+            elif kind == b'S':
+                slot = self._reader.varint()
+                table.assign(slot, self._reader.string())
+                self._encoder.reset(slot)
+            elif kind == b'X':
+                table.release(self._reader.varint())
+            else:
+                raise Exception('corrupted recording {}: unknown record {!r}'.format(self._path, kind))
+        if changed:
+            self._live = [slot for slot, symbol in table.series()]
+            table.generation += 1
+        self._recordedMs += self._reader.varint()
+        values = table.values
+        decode = self._encoder.decode
+        for slot in self._live:
+            values[slot] = decode(self._reader, slot)
+        recorded = self._recordedMs / 1000
+        self._pace(recorded)
+        table.snapshot(recorded)
+        return table.generation
+
+    def _pace(self, recorded):
+        if self._speed <= 0:
+            return
+        if self._origin is None:
+            self._origin = (recorded, time.monotonic())
+        due = self._origin[1] + (recorded - self._origin[0]) / self._speed
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        logging.debug('replaying the scrape of {}'.format(time.ctime(recorded)))
@@ -8,11 +8,15 @@ import pprint
 import logging
 import collectd
 import prometheus
+import recording
 import metric
 import fake
 import livedata
 import views.simple
 import views.aggregate
+import views.top
+import views.heatmap
+import defaults
 import userinput
 import dumptostdout
 import urwid
@@ -26,13 +30,15 @@ def shell():
         logging.error('shell mode requires IPython to be installed')
 
 
-def fancyUserInterface(metricPatterns, interval, metric_source, ttl):
+def fancyUserInterface(metricPatterns, interval, metric_source, ttl, topShards, heatmapMetrics):
     aggregateView = views.aggregate.Aggregate()
     simpleView = views.simple.Simple()
+    topView = views.top.Top(topShards)
+    heatmapView = views.heatmap.Heatmap(heatmapMetrics)
     userInput = userinput.UserInput()
-    loop = urwid.MainLoop(aggregateView.widget(), unhandled_input=userInput)
+    loop = urwid.MainLoop(aggregateView.widget(), palette=views.heatmap.PALETTE, unhandled_input=userInput)
     userInput.setLoop(loop)
-    userInput.setMap(M=aggregateView, S=simpleView)
+    userInput.setMap(M=aggregateView, S=simpleView, T=topView, H=heatmapView)
     try:
         liveData = livedata.LiveData(metricPatterns, interval, metric_source, ttl)
     except Exception as inst:
@@ -40,6 +46,8 @@ def fancyUserInterface(metricPatterns, interval, metric_source, ttl):
         sys.exit(1)
     liveData.addView(simpleView)
     liveData.addView(aggregateView)
+    liveData.addView(topView)
+    liveData.addView(heatmapView)
     liveDataThread = threading.Thread(target=lambda: liveData.go(loop))
     liveDataThread.daemon = True
     liveDataThread.start()
@@ -51,7 +59,12 @@ def fancyUserInterface(metricPatterns, interval, metric_source, ttl):
 
 if __name__ == '__main__':
     description = '\n'.join(['A top-like tool for scylladb collectd/prometheus metrics.',
-                             'Keyboard shortcuts: S - simple view, M - aggregate over multiple cores, Q -quits',
+                             'Keyboard shortcuts: S - simple view, M - aggregate over multiple cores, T - top rates and their hottest shards, H - per-shard heatmap, Q -quits',
+                             '',
+                             'With Prometheus, counters are shown as their rate per second and their increase since the previous refresh,',
+                             'histograms as the p50, p95 and p99 of the observations of the last refreshes.',
+                             '',
+                             'Use --record to save every refresh into a compact file, and --replay to watch it later, in any view.',
                              '',
                              'By default it would work with the Prometheus API and does not require configuration.',
                              'For collectd, you need to configure the unix-sock plugin for collectd'
@@ -64,10 +77,12 @@ if __name__ == '__main__':
         help='python log level, e.g. DEBUG, INFO or ERROR',
         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
         default='ERROR')
-    parser.add_argument(dest='metricPattern', nargs='*', default=[], help='metrics to query, separated by spaces. You can use shell globs (e.g. *cpu*nice*) here to efficiently specify metrics')
+    parser.add_argument(dest='metricPattern', nargs='*', default=[], help='metrics to query, separated by spaces. You can use shell globs (e.g. *cpu*nice*) here to efficiently specify metrics, '
+                        'or, with Prometheus, selectors filtering on labels (e.g. \'scylla_reactor_utilization{shard=~"1[0-9]"}\')')
     parser.add_argument('-i', '--interval', help="time resolution in seconds, default: 1", type=float, default=1)
     parser.add_argument('-s', '--socket', default='/var/run/collectd-unixsock', help="unixsock plugin to connect to, default: /var/run/collectd-unixsock")
-    parser.add_argument('-p', '--prometheus-address', default='http://localhost:9180/metrics', help="The prometheus end-point")
+    parser.add_argument('-p', '--prometheus-address', action='append', default=None,
+                        help="The prometheus end-point, default: http://localhost:9180/metrics. Repeat it to watch several nodes, which are scraped concurrently")
     parser.add_argument('--print-config', action='store_true',
                         help="print out a configuration to put in your collectd.conf (you can use -s here to define the socket path)")
     parser.add_argument('-l', '--list', action='store_true',
@@ -80,6 +95,13 @@ if __name__ == '__main__':
     parser.add_argument('-F', '--fake', action='store_true', help="fake metric updates - this is for developers only")
     parser.add_argument('-n', '--iterations', type=int, default=None, help="Exit after a given number of iterations. This is only relevant if output is redirected")
     parser.add_argument('-b', '--batch', action='store_true', help="batch mode - dump metrics to stdout instead of using an interactive user session")
+    parser.add_argument('-w', '--window', type=int, default=5, help="Compute rates and histogram quantiles over this many refreshes (default=5)")
+    parser.add_argument('--heatmap-metric', action='append', default=None,
+                        help="Metric shown by the heatmap view, repeat it for several metrics. Default: {}".format(', '.join(defaults.DEFAULT_HEATMAP_METRICS)))
+    parser.add_argument('--top-shards', type=int, default=3, help="Number of hottest shards shown by the top view (default=3)")
+    parser.add_argument('--record', metavar='FILE', help="Record every Prometheus scrape into FILE")
+    parser.add_argument('--replay', metavar='FILE', help="Replay a recording made with --record instead of querying scylla")
+    parser.add_argument('--speed', type=float, default=1, help="Replay speed, relative to the recorded pace, 0 replays as fast as possible (default=1)")
     parser.add_argument('-t', '--ttl', type=int, default=60, help="Keep absent metrics for ttl seconds (default=60)")
     arguments = parser.parse_args()
     stream_log = logging.StreamHandler()
@@ -103,10 +125,20 @@ if __name__ == '__main__':
 
     if arguments.fake:
         fake.fake()
-    if arguments.collectd:
+    if arguments.replay:
+        try:
+            metric_source = recording.Replay(arguments.replay, arguments.speed, history=arguments.window)
+        except Exception as inst:
+            print("scyllatop failed opening recording: '{file}' With an error: {error}".format(file=arguments.replay, error=inst))
+            sys.exit(1)
+        # the recording sets the pace
+        arguments.interval = 0
+    elif arguments.collectd:
         metric_source = collectd.Collectd(arguments.socket)
     else:
-        metric_source = prometheus.Prometheus(arguments.prometheus_address)
+        metric_source = prometheus.Prometheus(arguments.prometheus_address or ['http://localhost:9180/metrics'], history=arguments.window)
+        if arguments.record:
+            metric_source.recorder = recording.Recorder(arguments.record)
     if arguments.shell:
         shell()
         quit()
@@ -119,6 +151,7 @@ if __name__ == '__main__':
         if not sys.stdout.isatty() or arguments.batch:
             dumptostdout.dumpToStdout(arguments.metricPattern, arguments.interval, metric_source, arguments.iterations, arguments.ttl)
         else:
-            fancyUserInterface(arguments.metricPattern, arguments.interval, metric_source, arguments.ttl)
+            fancyUserInterface(arguments.metricPattern, arguments.interval, metric_source, arguments.ttl, arguments.top_shards,
+                               arguments.heatmap_metric or defaults.DEFAULT_HEATMAP_METRICS)
     except KeyboardInterrupt:
         pass
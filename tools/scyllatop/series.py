@@ -0,0 +1,221 @@
+import array
+import collections
+import sys
+
+
+class SeriesTable(object):
+    """The latest value of every series scraped from a set of nodes
+
+    Values live in a flat, preallocated array of doubles indexed by slot. A
+    series gets a slot the first time it is seen, keyed per node by the raw
+    name{labels} bytes of its sample lines, so a scrape of an unchanged node
+    only looks slots up and stores values. Symbols are only decoded and
+    interned for new series, and the generation only changes when the set of
+    series does, which tells consumers when metrics must be re-discovered.
+
+    snapshot() keeps a copy of the values after each scrape in a ring of
+    history snapshots, rates and increases are computed over the ring.
+    """
+    _INITIAL_CAPACITY = 4096
+
+    def __init__(self, history=5):
+        self.values = array.array('d', bytes(8 * self._INITIAL_CAPACITY))
+        self.symbols = []
+        self.help = {}
+        self.types = {}
+        self.generation = 0
+        self._history = collections.deque(maxlen=max(history, 2))
+        self._snapshots = 0
+        self._born = []
+        self._stamps = []
+        self._index = {}
+        self._free = []
+        self._scrapes = 0
+
+    def value(self, slot):
+        return self.values[slot]
+
+    def snapshot(self, now):
+        """Record the values of the scrape which completed at time now"""
+        self._snapshots += 1
+        self._history.append((now, self._snapshots, self.values[:len(self.symbols)]))
+
+    def _samples(self, slot):
+        # a slot may have been reused since a snapshot was taken, only the
+        # snapshots taken since the series got it hold its samples
+        born = self._born[slot]
+        return [(now, values[slot]) for now, snapshot, values in self._history if snapshot >= born]
+
+    @staticmethod
+    def _increase(before, after):
+        # counters restart from 0 when the node restarts
+        return after - before if after >= before else after
+
+    def increase(self, slot):
+        """The increase of a counter over the history, None before it has two samples"""
+        samples = self._samples(slot)
+        if len(samples) < 2:
+            return None
+        return sum(self._increase(a[1], b[1]) for a, b in zip(samples, samples[1:]))
+
+    def delta(self, slot):
+        """The increase of a counter since the previous scrape, None before it has two samples"""
+        samples = self._samples(slot)
+        if len(samples) < 2:
+            return None
+        return self._increase(samples[-2][1], samples[-1][1])
+
+    def rate(self, slot):
+        """The per-second rate of a counter over the history, None before it has two samples"""
+        samples = self._samples(slot)
+        if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+            return None
+        increase = sum(self._increase(a[1], b[1]) for a, b in zip(samples, samples[1:]))
+        return increase / (samples[-1][0] - samples[0][0])
+
+    def series(self):
+        return [(slot, symbol) for slot, symbol in enumerate(self.symbols) if symbol is not None]
+
+    def begin(self, node, instance=None):
+        """Start a scrape of node, returns the parser to feed its response to
+
+        If instance is given, it is added as the instance label of the symbols
+        of the series of node, to tell apart the series of several nodes.
+        """
+        self._scrapes += 1
+        first = node not in self._index
+        return SeriesParser(self, self._index.setdefault(node, {}), self._scrapes, instance, first)
+
+    def forget(self, node):
+        """Drop the series of node, e.g. when it could not be scraped"""
+        index = self._index.pop(node, {})
+        for slot in index.values():
+            self.release(slot)
+        if index:
+            self.generation += 1
+
+    def _allocate(self, symbol):
+        if self._free:
+            slot = self._free.pop()
+            self.symbols[slot] = symbol
+            self._stamps[slot] = 0
+            self._born[slot] = self._snapshots + 1
+            return slot
+        slot = len(self.symbols)
+        self.symbols.append(symbol)
+        self._stamps.append(0)
+        self._born.append(self._snapshots + 1)
+        if slot == len(self.values):
+            self.values.extend(array.array('d', bytes(8 * len(self.values))))
+        return slot
+
+    def assign(self, slot, symbol):
+        """Give slot to the series symbol, as the recording of another table says
+
+        A table is either filled by assign() or by scrapes, never both.
+        """
+        while len(self.symbols) <= slot:
+            self.symbols.append(None)
+            self._stamps.append(0)
+            self._born.append(0)
+        while len(self.values) <= slot:
+            self.values.extend(array.array('d', bytes(8 * len(self.values))))
+        self.symbols[slot] = symbol
+        self._born[slot] = self._snapshots + 1
+
+    def release(self, slot):
+        self.symbols[slot] = None
+        self.values[slot] = 0
+        self._free.append(slot)
+
+
+class SeriesParser(object):
+    """Incremental parser of one Prometheus text format response
+
+    feed() takes the response in chunks as they arrive and stores the samples
+    of the complete lines in the table, finish() processes the last line and
+    drops the series of the node which were not part of the response. Lines
+    fed twice, e.g. by a retried request, are only counted once.
+    """
+    def __init__(self, table, index, scrape, instance, first):
+        self._table = table
+        self._index = index
+        self._scrape = scrape
+        self._instance = instance
+        self._readMetadata = first
+        self._pending = b''
+        self._seen = 0
+        self._added = False
+
+    def feed(self, data):
+        lines = (self._pending + data).split(b'\n')
+        self._pending = lines.pop()
+        self._parse(lines)
+
+    def reset(self):
+        """Drop the incomplete line of a response which was interrupted, before feeding a new one"""
+        self._pending = b''
+
+    def finish(self):
+        if self._pending:
+            self._parse([self._pending])
+            self._pending = b''
+        table = self._table
+        removed = False
+        if self._seen < len(self._index):
+            for key, slot in list(self._index.items()):
+                if table._stamps[slot] != self._scrape:
+                    del self._index[key]
+                    table.release(slot)
+                    removed = True
+        if self._added or removed:
+            table.generation += 1
+
+    def _parse(self, lines):
+        index = self._index
+        values = self._table.values
+        stamps = self._table._stamps
+        scrape = self._scrape
+        for line in lines:
+            if not line or line[0] == 35:  # '#'
+                if self._readMetadata:
+                    self._metadata(line)
+                continue
+            sep = line.find(b' ', line.rfind(b'}') + 1)
+            if sep < 0:
+                continue
+            key = line[:sep]
+            try:
+                value = float(line[sep + 1:])
+            except ValueError:
+                # a timestamp follows the value
+                try:
+                    value = float(line[sep + 1:].split()[0])
+                except (ValueError, IndexError):
+                    continue
+            slot = index.get(key)
+            if slot is None:
+                slot = self._add(key)
+            values[slot] = value
+            if stamps[slot] != scrape:
+                stamps[slot] = scrape
+                self._seen += 1
+
+    def _add(self, key):
+        symbol = key.decode('utf-8')
+        if self._instance is not None:
+            name, _, labels = symbol.partition('{')
+            labels = ['instance="{}"'.format(self._instance)] + [l for l in [labels.rstrip('},')] if l]
+            symbol = '{}{{{}}}'.format(name, ','.join(labels))
+        slot = self._table._allocate(sys.intern(symbol))
+        self._index[key] = slot
+        self._added = True
+        return slot
+
+    def _metadata(self, line):
+        if line.startswith(b'# HELP '):
+            name, space, text = line[len(b'# HELP '):].decode('utf-8').partition(' ')
+            self._table.help.setdefault(name, space + text)
+        elif line.startswith(b'# TYPE '):
+            name, _, kind = line[len(b'# TYPE '):].decode('utf-8').partition(' ')
+            self._table.types.setdefault(name, kind.strip())
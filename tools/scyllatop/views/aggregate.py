@@ -22,6 +22,9 @@ class Aggregate(base.Base):
             formatted = 'avg[{0}] tot[{1}]'.format(
                 helpers.formatValues(group.aggregate(self._mean)),
                 helpers.formatValues(group.aggregate(self._sum)))
+            quantiles = group.quantiles()
+            if quantiles:
+                formatted = '{0} {1}'.format(helpers.formatValues(quantiles), formatted)
             result.add(self._label(group), formatted)
         return result
 
@@ -1,9 +1,12 @@
 import re
+import metric as metricModule
 from . import mergeable
 
 
 class Group(object):
-    _HEAD_PATTERN = re.compile('^([^-]+)-\d+/')
+    _HEAD_PATTERN = re.compile(r'^([^-]+)-\d+/')
+    _SHARD_PATTERN = re.compile(r'shard="(\d+)"')
+    _QUANTILE_LABELS = set(label for label, _ in metricModule.HistogramMetric.QUANTILES)
 
     def __init__(self, label):
         self._label = label
@@ -17,19 +20,44 @@ class Group(object):
         return self._metrics
 
     def aggregate(self, mergeMethod):
+        """Merge the status of the metrics with mergeMethod, except for the quantiles of histograms, see quantiles()"""
         merger = mergeable.Mergeable(mergeMethod)
         for metric in self._metrics:
-            merger.add(metric.status)
+            status = metric.status
+            if isinstance(metric, metricModule.HistogramMetric):
+                status = dict((key, value) for key, value in status.items() if key not in self._QUANTILE_LABELS)
+            merger.add(status)
 
         return merger.merged()
 
+    def quantiles(self):
+        """The quantiles of the histograms of the group, empty if it has none
+
+        Summing or averaging the quantiles of the shards would be meaningless,
+        they are those of the merged buckets of the histograms instead.
+        """
+        histograms = [metric for metric in self._metrics if isinstance(metric, metricModule.HistogramMetric)]
+        if not histograms:
+            return {}
+        return metricModule.HistogramMetric.quantiles(metricModule.mergeBuckets([h.buckets for h in histograms]))
+
     @property
     def label(self):
         return self._label
 
+    @property
+    def rate(self):
+        return sum(metric.rate for metric in self._metrics if metric.rate is not None)
+
     @classmethod
     def extractLabel(cls, metric):
-        return cls._HEAD_PATTERN.sub(r'\1-*/', metric.symbol)
+        label = cls._HEAD_PATTERN.sub(r'\1-*/', metric.symbol)
+        return cls._SHARD_PATTERN.sub('shard="*"', label)
+
+    @classmethod
+    def shard(cls, metric):
+        match = cls._SHARD_PATTERN.search(metric.symbol)
+        return match.group(1) if match else '-'
 
     @property
     def size(self):
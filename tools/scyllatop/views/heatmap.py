@@ -0,0 +1,93 @@
+import re
+from . import base
+from . import groups
+
+# Heat levels, from idle to the hottest shard of a row
+GLYPHS = ' .:-=+*#%@'
+PALETTE = [('heat{}'.format(level), 'black', background) for level, background in enumerate(
+    ['default', 'dark blue', 'dark blue', 'dark cyan', 'dark cyan', 'dark green', 'brown', 'brown', 'dark red', 'light red'])]
+
+
+class _Row(object):
+    def __init__(self, label):
+        self.label = label
+        self.cells = []
+
+    def add(self, shard, metric):
+        self.cells.append((int(shard), metric))
+
+
+class Heatmap(base.Base):
+    """Shards on the horizontal axis, per-shard metrics on the vertical one
+
+    There is a row per metric and per node, its series are summed per shard
+    over their other labels. Counters show their rate, gauges their value.
+    The heat of a cell is scaled by the hottest shard of its row, whose value
+    ends the row, so an overloaded shard stands out whatever the load of the
+    whole node is. The rows are only rebuilt when the metrics change, each
+    refresh only reads the values of their cells.
+    """
+    _INSTANCE_PATTERN = re.compile('instance="([^"]*)"')
+
+    def __init__(self, metricNames):
+        base.Base.__init__(self)
+        self._metricNames = metricNames
+        self._discoveries = None
+        self._rows = []
+        self._shards = 0
+
+    def update(self, liveData):
+        if liveData.discoveries != self._discoveries:
+            self._discoveries = liveData.discoveries
+            self._layout(liveData.measurements)
+        self.clearScreen()
+        self.writeStatusLine(liveData.measurements)
+        width = max([len(row.label) for row in self._rows], default=0)
+        self.writeLine(' ' * width + ' ' + self._ruler())
+        for row in self._rows:
+            values = [0.0] * self._shards
+            for shard, metric in row.cells:
+                values[shard] += self._value(metric)
+            hottest = max(values, default=0.0)
+            self._items.append([row.label.ljust(width) + ' '] + self._cells(values, hottest) + [' {:.1f}'.format(hottest)])
+        self.refresh()
+
+    def _layout(self, measurements):
+        rows = {}
+        shards = 0
+        for metric in measurements:
+            name = metric.symbol.partition('{')[0]
+            shard = groups.Group.shard(metric)
+            if name not in self._metricNames or shard == '-':
+                continue
+            instance = self._INSTANCE_PATTERN.search(metric.symbol)
+            label = '{}@{}'.format(name, instance.group(1)) if instance else name
+            rows.setdefault(label, _Row(label)).add(shard, metric)
+            shards = max(shards, int(shard) + 1)
+        order = {name: i for i, name in enumerate(self._metricNames)}
+        self._rows = sorted(rows.values(), key=lambda row: (order[row.label.partition('@')[0]], row.label))
+        self._shards = shards
+
+    def _value(self, metric):
+        if metric.is_absent:
+            return 0.0
+        rate = metric.rate
+        if rate is not None:
+            return rate
+        value = metric.status.get('value')
+        return value if isinstance(value, float) else 0.0
+
+    def _ruler(self):
+        return ''.join(str(shard // 10 % 10) if shard % 10 == 0 else ' ' for shard in range(self._shards))
+
+    def _cells(self, values, hottest):
+        # consecutive cells of the same heat share one piece of markup
+        markup = []
+        top = len(GLYPHS) - 1
+        for value in values:
+            level = min(int(value / hottest * top + 0.5), top) if hottest > 0 else 0
+            if markup and markup[-1][0] == level:
+                markup[-1][1] += GLYPHS[level]
+            else:
+                markup.append([level, GLYPHS[level]])
+        return [('heat{}'.format(level), glyphs) for level, glyphs in markup]
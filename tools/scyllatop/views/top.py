@@ -0,0 +1,33 @@
+from . import base
+from . import groups
+from . import table
+
+
+class Top(base.Base):
+    """Metrics with a rate, hottest first, with their hottest shards
+
+    The metrics are grouped over the shards, groups are sorted by their total
+    rate and show the topShards shards with the highest rates.
+    """
+    def __init__(self, topShards=3):
+        base.Base.__init__(self)
+        self._topShards = topShards
+
+    def update(self, liveData):
+        self.clearScreen()
+        self.writeStatusLine(liveData.measurements)
+        rated = [metric for metric in liveData.measurements if metric.rate is not None]
+        metricGroups = groups.Groups(rated).all()
+        metricGroups.sort(key=lambda group: group.rate, reverse=True)
+        tableForm = self._prepareTable(metricGroups)
+        for row in tableForm.rows():
+            self.writeLine(row)
+        self.refresh()
+
+    def _prepareTable(self, metricGroups):
+        result = table.Table('lrl')
+        for group in metricGroups:
+            hottest = sorted(group.metrics, key=lambda metric: metric.rate, reverse=True)[:self._topShards]
+            shards = ' '.join('[{}] {:.1f}'.format(groups.Group.shard(metric), metric.rate) for metric in hottest)
+            result.add(group.label, '{:.1f}/s'.format(group.rate), shards)
+        return result